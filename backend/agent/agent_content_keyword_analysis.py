@@ -3,16 +3,121 @@
 使用 LLM 提取文章的核心关键词和主题
 """
 import asyncio
+import contextlib
+import functools
+import hashlib
 import logging
-from typing import Dict, Any, List, Optional
+import sqlite3
+import time
+from typing import AsyncIterator, Dict, Any, List, Optional, Tuple
 import json
 import os
 
 
-from backend.llm import chat_completion, LLMProvider
+from backend.agent.analysis_cache import get_analysis_cache, make_cache_key
+from backend.agent.context_builder import build_analysis_context, split_into_chunks
+from backend.llm import chat_completion, chat_completion_stream, close_providers, LLMFactory, LLMProvider
+from backend.llm.resilience import resilient_call
+from backend.llm.router import get_router, routed_model
+from backend.llm.structured import structured_completion
+from backend.llm.usage import ServedModel, track_served_model
+from backend.schemas.article import ArticleClassification, ContentAnalysis
+from backend.llm.token_estimator import estimate_messages_tokens, estimate_tokens
 
 logger = logging.getLogger(__name__)
 
+# 提示词版本：修改结果格式、分块或摘要合并提示词时递增。
+# 单篇和打包分析的提示词模板已计入版本哈希（见 analysis_version），修改后旧的缓存结果自动失效
+ANALYSIS_PROMPT_VERSION = "1"
+
+# 发送给 LLM 的正文 token 预算，超出时按句子打分抽取（见 context_builder）
+ANALYSIS_CONTEXT_TOKENS = int(os.getenv("LLM_ANALYSIS_CONTEXT_TOKENS", "1200"))
+
+# 长文 map-reduce：正文估算 token 数超过单次调用预算的文章分块并发分析，在本地合并结果
+ANALYSIS_MAP_REDUCE_ENABLED = os.getenv("ANALYSIS_MAP_REDUCE", "1").lower() not in ("0", "false", "no")
+ANALYSIS_SINGLE_CALL_TOKENS = int(os.getenv("LLM_ANALYSIS_SINGLE_CALL_TOKENS", "4000"))
+ANALYSIS_CHUNK_TOKENS = int(os.getenv("LLM_ANALYSIS_CHUNK_TOKENS", "2000"))
+# 块数上限：更长的文章先按上限均分，每块再在 ANALYSIS_CHUNK_TOKENS 内抽取句子
+ANALYSIS_MAX_CHUNKS = int(os.getenv("LLM_ANALYSIS_MAX_CHUNKS", "8"))
+
+# 打包分析：多篇短文章合并为一次请求，输出带编号的 JSON 数组
+ANALYSIS_PACK_ENABLED = os.getenv("ANALYSIS_PACK_ARTICLES", "1").lower() not in ("0", "false", "no")
+ANALYSIS_PACK_MAX_ARTICLES = int(os.getenv("ANALYSIS_PACK_MAX_ARTICLES", "8"))
+# 正文估算 token 数不超过该值的文章才参与打包，长文章仍单独分析
+ANALYSIS_PACK_MAX_ARTICLE_TOKENS = int(os.getenv("ANALYSIS_PACK_MAX_ARTICLE_TOKENS", "1500"))
+# 模型上下文窗口和单次最大输出 token 数，用于确定每批文章数
+LLM_CONTEXT_TOKENS = int(os.getenv("LLM_CONTEXT_TOKENS", "32768"))
+LLM_MAX_OUTPUT_TOKENS = int(os.getenv("LLM_MAX_OUTPUT_TOKENS", "4096"))
+# 每篇文章的分析结果预留的输出 token 数
+PACK_OUTPUT_TOKENS_PER_ARTICLE = 400
+
+# 结构化输出：JSON 模式 + 流式增量校验，输出偏离 ContentAnalysis 时立即停止并修复或重试
+ANALYSIS_STRUCTURED_OUTPUT = os.getenv("ANALYSIS_STRUCTURED_OUTPUT", "1").lower() not in ("0", "false", "no")
+CONTENT_ANALYSIS_SCHEMA = ContentAnalysis.model_json_schema()
+# relevance / analysis_tier / analysis_version / analysis_model 由本地写入，不要求模型输出
+for _field in ("relevance", "analysis_tier", "analysis_version", "analysis_model"):
+    CONTENT_ANALYSIS_SCHEMA["properties"].pop(_field, None)
+# 本地修复的结果至少要包含这些字段，否则重试
+ANALYSIS_REQUIRED_FIELDS = ("keywords", "summary")
+
+# 级联分析：配置 LLM_CLASSIFIER_MODEL 后先用小模型给出分类、情感和相关度，
+# 相关度达到阈值的文章才交给 DEFAULT_LLM_MODEL 做完整分析，其余文章在查看详情时再升级
+ANALYSIS_CLASSIFIER_MODEL = os.getenv("LLM_CLASSIFIER_MODEL") or None
+ANALYSIS_CLASSIFIER_PROVIDER = os.getenv("LLM_CLASSIFIER_PROVIDER") or None
+ANALYSIS_RELEVANCE_THRESHOLD = float(os.getenv("ANALYSIS_RELEVANCE_THRESHOLD", "0.6"))
+ANALYSIS_CLASSIFIER_CONTEXT_TOKENS = int(os.getenv("LLM_CLASSIFIER_CONTEXT_TOKENS", "400"))
+CLASSIFIER_PROMPT_VERSION = "1"
+CLASSIFICATION_SCHEMA = ArticleClassification.model_json_schema()
+# 查看详情时可以升级为完整分析的层级（triage 的本地分析、级联分析的分类模型）
+UPGRADABLE_TIERS = ("local", "classifier")
+
+ANALYSIS_SYSTEM_PROMPT = "你是一个专业的文本分析助手，擅长提取文章的关键词、主题和实体。请严格按照 JSON 格式返回结果。"
+
+
+def _analysis_fields_prompt(max_keywords: int, max_topics: int) -> str:
+    """分析结果字段说明（单篇和打包分析共用）"""
+    return f"""1. keywords: 提取最多 {max_keywords} 个核心关键词（数组）
+2. topics: 提取最多 {max_topics} 个主要主题（数组）
+3. summary: 用 1-2 句话总结文章核心内容
+4. sentiment: 情感倾向（positive/neutral/negative）
+5. category: 文章所属类别（如：科技、财经、社会、娱乐等）
+6. entities: 识别的重要实体，格式为 [{{"name": "实体名", "type": "类型"}}]，类型可以是：人物、组织、地点、产品、技术等"""
+
+
+def build_analysis_messages(
+    title: str,
+    context: str,
+    max_keywords: int = 10,
+    max_topics: int = 5
+) -> List[Dict[str, str]]:
+    """
+    构建单篇文章分析的消息（在线分析和离线批处理共用）
+
+    Args:
+        title: 文章标题
+        context: 已按 token 预算抽取的正文（见 build_analysis_context）
+        max_keywords: 最大关键词数量
+        max_topics: 最大主题数量
+
+    Returns:
+        List[Dict]: 消息列表
+    """
+    prompt = f"""请分析以下文章，提取关键信息。
+
+标题：{title}
+
+内容：
+{context}
+
+请以 JSON 格式返回分析结果，包含以下字段：
+{_analysis_fields_prompt(max_keywords, max_topics)}
+
+只返回 JSON，不要其他说明文字。"""
+    return [
+        {"role": "system", "content": ANALYSIS_SYSTEM_PROMPT},
+        {"role": "user", "content": prompt},
+    ]
+
 
 async def analyze_article_keywords(
     title: str,
@@ -42,84 +147,54 @@ async def analyze_article_keywords(
             "analysis_success": bool         # 分析是否成功
         }
     """
-    # 限制内容长度（避免超过 token 限制）
-    max_content_length = 3000
-    truncated_content = content[:max_content_length] if len(content) > max_content_length else content
-    
-    # 构建提示词
-    prompt = f"""请分析以下文章，提取关键信息。
-
-标题：{title}
-
-内容：
-{truncated_content}
+    if ANALYSIS_MAP_REDUCE_ENABLED and is_long_article(content):
+        return await analyze_long_article(title, content, provider, max_keywords, max_topics)
 
-请以 JSON 格式返回分析结果，包含以下字段：
-1. keywords: 提取最多 {max_keywords} 个核心关键词（数组）
-2. topics: 提取最多 {max_topics} 个主要主题（数组）
-3. summary: 用 1-2 句话总结文章核心内容
-4. sentiment: 情感倾向（positive/neutral/negative）
-5. category: 文章所属类别（如：科技、财经、社会、娱乐等）
-6. entities: 识别的重要实体，格式为 [{{"name": "实体名", "type": "类型"}}]，类型可以是：人物、组织、地点、产品、技术等
-
-只返回 JSON，不要其他说明文字。"""
+    # 在 token 预算内抽取最有信息量的句子（避免超过 token 限制）
+    context = build_analysis_context(title, content, ANALYSIS_CONTEXT_TOKENS)
     
-    messages = [
-        {
-            "role": "system",
-            "content": "你是一个专业的文本分析助手，擅长提取文章的关键词、主题和实体。请严格按照 JSON 格式返回结果。"
-        },
-        {
-            "role": "user",
-            "content": prompt
-        }
-    ]
+    messages = build_analysis_messages(title, context, max_keywords, max_topics)
     
+    model = os.getenv("DEFAULT_LLM_MODEL")
+    cache = get_analysis_cache()
+    cache_key = None
+    if cache is not None:
+        cache_key, *alternatives = _analysis_cache_keys(title, context, provider, model, max_keywords, max_topics)
+        cached = _cache_get(cache, cache_key, *alternatives)
+        if cached is not None:
+            logger.info(f"命中分析缓存: {title[:50]}...")
+            return cached
+
     try:
         # 调用 LLM
-        response = await chat_completion(
-            messages=messages,
-            provider=provider,
-            model=os.getenv("DEFAULT_LLM_MODEL"),
-            temperature=0.3,  # 较低温度，更确定性
-            max_tokens=1000
-        )
-        
-        # 解析 JSON 响应
-        # 尝试提取 JSON（可能包含在 markdown 代码块中）
-        response = response.strip()
-        
-        # 移除可能的 markdown 代码块标记
-        if response.startswith("```json"):
-            response = response[7:]
-        elif response.startswith("```"):
-            response = response[3:]
-        
-        if response.endswith("```"):
-            response = response[:-3]
-        
-        response = response.strip()
+        started = time.perf_counter()
+        # 可重试错误按指数退避重试；开启 LLM_HEDGE 时超过 p95 未返回会发送对冲请求
+        with track_served_model() as served:
+            result = await resilient_call(
+                lambda p: _complete_analysis(messages, p, model), provider=provider, key="analysis"
+            )
+        latency = time.perf_counter() - started
+        response = json.dumps(result, ensure_ascii=False)
         
-        # 解析 JSON
-        result = json.loads(response)
+        # 验证和标准化结果（按实际响应的提供商和模型标记版本、写入缓存）
+        analysis_result = _normalize_analysis(result, max_keywords, max_topics)
+        served_provider, served_model = _served_by(served, provider, model)
+        stamp_analysis(analysis_result, served_provider, served_model, max_keywords, max_topics)
         
-        # 验证和标准化结果
-        analysis_result = {
-            "keywords": result.get("keywords", [])[:max_keywords],
-            "topics": result.get("topics", [])[:max_topics],
-            "summary": result.get("summary", ""),
-            "sentiment": result.get("sentiment", "neutral"),
-            "category": result.get("category", "其他"),
-            "entities": result.get("entities", []),
-            "analysis_success": True
-        }
+        if cache_key is not None:
+            _cache_put(
+                cache,
+                _analysis_cache_key(title, context, served_provider, served_model, max_keywords, max_topics),
+                analysis_result,
+                latency_s=latency,
+                tokens=estimate_messages_tokens(messages) + estimate_tokens(response),
+            )
         
         logger.info(f"文章分析成功: {title[:50]}...")
         return analysis_result
         
     except json.JSONDecodeError as e:
         logger.error(f"JSON 解析失败: {e}")
-        logger.error(f"响应内容: {response[:200]}...")
         return _get_default_analysis_result(False)
     
     except Exception as e:
@@ -127,6 +202,333 @@ async def analyze_article_keywords(
         return _get_default_analysis_result(False)
 
 
+async def stream_article_analysis(
+    title: str,
+    content: str,
+    provider: Optional[LLMProvider] = None,
+    max_keywords: int = 10,
+    max_topics: int = 5
+) -> AsyncIterator[Tuple[str, Any]]:
+    """
+    流式分析单篇文章（供页面按需分析时把模型输出实时推送给客户端）
+
+    与 analyze_article_keywords 使用相同的提示词、缓存键和版本标记；流式输出开始后无法重试，
+    请求失败时直接返回失败结果。长文（map-reduce）不逐字输出，只返回最终结果
+
+    Args:
+        title: 文章标题
+        content: 文章内容
+        provider: LLM 提供商（可选）
+        max_keywords: 最大关键词数量
+        max_topics: 最大主题数量
+
+    Yields:
+        ("delta", str): 模型输出的文本片段
+        ("cached", dict): 命中分析缓存的结果（之后不再有其他事件）
+        ("result", dict): 最终分析结果（见 analyze_article_keywords）
+    """
+    if ANALYSIS_MAP_REDUCE_ENABLED and is_long_article(content):
+        yield "result", await analyze_long_article(title, content, provider, max_keywords, max_topics)
+        return
+
+    context = build_analysis_context(title, content, ANALYSIS_CONTEXT_TOKENS)
+    messages = build_analysis_messages(title, context, max_keywords, max_topics)
+    model = os.getenv("DEFAULT_LLM_MODEL")
+    cache = get_analysis_cache()
+    cache_key = None
+    if cache is not None:
+        cache_key, *alternatives = _analysis_cache_keys(title, context, provider, model, max_keywords, max_topics)
+        cached = _cache_get(cache, cache_key, *alternatives)
+        if cached is not None:
+            yield "cached", cached
+            return
+
+    output = []
+    started = time.perf_counter()
+    try:
+        with track_served_model() as served:
+            async for chunk in chat_completion_stream(
+                messages=messages,
+                provider=provider,
+                model=model,
+                temperature=0.3,
+                max_tokens=1000
+            ):
+                output.append(chunk)
+                yield "delta", chunk
+        response = "".join(output)
+        analysis_result = parse_analysis_response(response, max_keywords, max_topics)
+    except Exception as e:
+        logger.error(f"流式分析失败: {e}")
+        yield "result", _get_default_analysis_result(False)
+        return
+
+    served_provider, served_model = _served_by(served, provider, model)
+    stamp_analysis(analysis_result, served_provider, served_model, max_keywords, max_topics)
+    if cache_key is not None:
+        _cache_put(
+            cache,
+            _analysis_cache_key(title, context, served_provider, served_model, max_keywords, max_topics),
+            analysis_result,
+            latency_s=time.perf_counter() - started,
+            tokens=estimate_messages_tokens(messages) + estimate_tokens(response),
+        )
+    yield "result", analysis_result
+
+
+async def _complete_analysis(
+    messages: List[Dict[str, str]],
+    provider: Optional[LLMProvider],
+    model: Optional[str],
+    schema: Dict[str, Any] = CONTENT_ANALYSIS_SCHEMA,
+    required: Tuple[str, ...] = ANALYSIS_REQUIRED_FIELDS,
+    max_tokens: int = 1000
+) -> Dict[str, Any]:
+    """
+    调用 LLM 获取单篇（或单个分块）的分析结果 JSON
+
+    启用结构化输出时流式校验并在偏离时修复或重试，否则等完整响应返回后解析
+    """
+    if ANALYSIS_STRUCTURED_OUTPUT:
+        return await structured_completion(
+            messages,
+            schema,
+            provider=provider,
+            model=model,
+            temperature=0.3,
+            max_tokens=max_tokens,
+            required=required,
+        )
+
+    response = await chat_completion(
+        messages=messages,
+        provider=provider,
+        model=model,
+        temperature=0.3,  # 较低温度，更确定性
+        max_tokens=max_tokens
+    )
+    # 解析 JSON 响应（可能包含在 markdown 代码块中）
+    return json.loads(_strip_code_fence(response))
+
+
+def _strip_code_fence(response: str) -> str:
+    """去掉 LLM 响应外层可能包裹的 markdown 代码块标记"""
+    response = response.strip()
+    
+    if response.startswith("```json"):
+        response = response[7:]
+    elif response.startswith("```"):
+        response = response[3:]
+    
+    if response.endswith("```"):
+        response = response[:-3]
+    
+    return response.strip()
+
+
+def parse_analysis_response(response: str, max_keywords: int = 10, max_topics: int = 5) -> Dict[str, Any]:
+    """
+    解析模型返回的单篇分析 JSON（可能包在 markdown 代码块中）并标准化
+
+    Args:
+        response: 模型输出文本
+        max_keywords: 最大关键词数量
+        max_topics: 最大主题数量
+
+    Returns:
+        dict: 标准化后的分析结果（analysis_tier 为 "full"，不含版本标记）
+
+    Raises:
+        ValueError: 不是合法的 JSON 对象（json.JSONDecodeError 是 ValueError 的子类）
+    """
+    parsed = json.loads(_strip_code_fence(response))
+    if not isinstance(parsed, dict):
+        raise ValueError("分析结果不是 JSON 对象")
+    return _normalize_analysis(parsed, max_keywords, max_topics)
+
+
+def _normalize_analysis(result: Dict[str, Any], max_keywords: int, max_topics: int) -> Dict[str, Any]:
+    """验证和标准化 LLM 返回的分析结果"""
+    return {
+        "keywords": result.get("keywords", [])[:max_keywords],
+        "topics": result.get("topics", [])[:max_topics],
+        "summary": result.get("summary", ""),
+        "sentiment": result.get("sentiment", "neutral"),
+        "category": result.get("category", "其他"),
+        "entities": [e for e in result.get("entities", []) if isinstance(e, dict) and e.get("name")],
+        "analysis_success": True,
+        "analysis_tier": "full"
+    }
+
+
+def _analysis_cache_key(
+    title: str,
+    context: str,
+    provider: Optional[LLMProvider],
+    model: Optional[str],
+    max_keywords: int,
+    max_topics: int
+) -> str:
+    """分析缓存键（单篇和打包分析共用，两种方式的结果可以互相命中）"""
+    return make_cache_key(
+        title,
+        context,
+        prompt_version=analysis_version(provider, model, max_keywords, max_topics),
+        model=analysis_model_label(provider, model),
+    )
+
+
+def analysis_model_label(provider: Optional[LLMProvider], model: Optional[str]) -> str:
+    """产生分析结果的 提供商/模型（未指定提供商时为默认提供商）"""
+    provider_name = LLMProvider(provider).value if provider else LLMFactory.default_provider_type().value
+    return f"{provider_name}/{model or ''}"
+
+
+def _served_by(
+    served: ServedModel,
+    provider: Optional[LLMProvider],
+    model: Optional[str]
+) -> Tuple[Optional[LLMProvider], Optional[str]]:
+    """
+    产生结果的提供商和模型：经过路由或故障转移时以实际响应请求的为准，否则为调用方指定的值
+
+    实际响应的模型为 None（提供商自身的默认模型）时返回空字符串，不再回退到 DEFAULT_LLM_MODEL
+    """
+    if served.provider is None:
+        return provider, model
+    return served.provider, served.model or ""
+
+
+def _candidate_models(
+    provider: Optional[LLMProvider],
+    model: Optional[str]
+) -> List[Tuple[Optional[LLMProvider], Optional[str]]]:
+    """
+    可能产生结果的提供商和模型（用于查找缓存）：未指定提供商且配置了路由时为路由中的各提供商
+    （按权重从高到低，模型与 _served_by 的记录方式一致），否则只有调用方指定的值
+    """
+    router = get_router() if provider is None else None
+    if router is None:
+        return [(provider, model)]
+    ranked = sorted(router.weights, key=router.weights.get, reverse=True)
+    return [(candidate, routed_model(candidate, model) or "") for candidate in ranked]
+
+
+def _analysis_cache_keys(
+    title: str,
+    context: str,
+    provider: Optional[LLMProvider],
+    model: Optional[str],
+    max_keywords: int,
+    max_topics: int
+) -> List[str]:
+    """查找分析缓存时依次尝试的缓存键（见 _candidate_models）"""
+    return [
+        _analysis_cache_key(title, context, candidate, candidate_model, max_keywords, max_topics)
+        for candidate, candidate_model in _candidate_models(provider, model)
+    ]
+
+
+@functools.lru_cache(maxsize=64)
+def _version_hash(*parts: str) -> str:
+    return hashlib.sha256("\x1f".join(parts).encode("utf-8")).hexdigest()[:12]
+
+
+def analysis_version(
+    provider: Optional[LLMProvider] = None,
+    model: Optional[str] = None,
+    max_keywords: int = 10,
+    max_topics: int = 5
+) -> str:
+    """
+    完整分析的版本哈希：提示词模板（单篇和打包）、ANALYSIS_PROMPT_VERSION、提供商和模型任一变化都会改变
+
+    Args:
+        provider: LLM 提供商（默认提供商）
+        model: 模型名称（默认读取 DEFAULT_LLM_MODEL）
+        max_keywords: 最大关键词数量
+        max_topics: 最大主题数量
+
+    Returns:
+        str: 12 位十六进制哈希
+    """
+    if model is None:
+        model = os.getenv("DEFAULT_LLM_MODEL")
+    templates = build_analysis_messages("{title}", "{context}", max_keywords, max_topics) + \
+        _build_packed_messages([("{title}", "{context}")], max_keywords, max_topics)
+    return _version_hash(
+        ANALYSIS_PROMPT_VERSION,
+        analysis_model_label(provider, model),
+        json.dumps(templates, ensure_ascii=False),
+    )
+
+
+def current_analysis_versions(max_keywords: int = 10, max_topics: int = 5) -> List[str]:
+    """
+    当前配置下有效的完整分析版本
+
+    未配置路由时只有 analysis_version()；配置了 LLM_ROUTER_WEIGHTS 时，路由中任一提供商（及其模型）产生的结果都是当前版本
+
+    Returns:
+        List[str]: 版本哈希，第一个为优先的提供商
+    """
+    model = os.getenv("DEFAULT_LLM_MODEL")
+    return [
+        analysis_version(candidate, candidate_model, max_keywords, max_topics)
+        for candidate, candidate_model in _candidate_models(None, model)
+    ]
+
+
+def classifier_version(provider: Optional[LLMProvider] = None, model: Optional[str] = None) -> str:
+    """分类模型结果的版本哈希（提示词模板、CLASSIFIER_PROMPT_VERSION、提供商和模型，模型默认为 LLM_CLASSIFIER_MODEL）"""
+    templates = build_classification_messages("{title}", "{context}")
+    return _version_hash(
+        f"classifier:{CLASSIFIER_PROMPT_VERSION}",
+        analysis_model_label(provider, ANALYSIS_CLASSIFIER_MODEL if model is None else model),
+        json.dumps(templates, ensure_ascii=False),
+    )
+
+
+def _classifier_cache_key(title: str, context: str, provider: Optional[LLMProvider], model: Optional[str]) -> str:
+    """分类结果的缓存键"""
+    return make_cache_key(
+        title,
+        context,
+        prompt_version=f"classifier:{classifier_version(provider, model)}",
+        model=analysis_model_label(provider, model),
+    )
+
+
+def stamp_analysis(
+    result: Dict[str, Any],
+    provider: Optional[LLMProvider] = None,
+    model: Optional[str] = None,
+    max_keywords: int = 10,
+    max_topics: int = 5
+) -> Dict[str, Any]:
+    """给完整分析结果写入 analysis_version 和 analysis_model（原地修改并返回）"""
+    if model is None:
+        model = os.getenv("DEFAULT_LLM_MODEL")
+    result["analysis_version"] = analysis_version(provider, model, max_keywords, max_topics)
+    result["analysis_model"] = analysis_model_label(provider, model)
+    return result
+
+
+def _cache_get(cache, key: str, *alternatives: str) -> Optional[Dict[str, Any]]:
+    try:
+        return cache.get(key, *alternatives)
+    except sqlite3.Error as e:
+        logger.warning(f"读取分析缓存失败: {e}")
+        return None
+
+
+def _cache_put(cache, key: str, result: Dict[str, Any], latency_s: float, tokens: int) -> None:
+    try:
+        cache.put(key, result, latency_s=latency_s, tokens=tokens)
+    except sqlite3.Error as e:
+        logger.warning(f"写入分析缓存失败: {e}")
+
+
 def _get_default_analysis_result(success: bool = False) -> Dict[str, Any]:
     """获取默认的分析结果"""
     return {
@@ -140,10 +542,493 @@ def _get_default_analysis_result(success: bool = False) -> Dict[str, Any]:
     }
 
 
+def build_classification_messages(title: str, context: str) -> List[Dict[str, str]]:
+    """构建分类模型（级联分析第一级）的消息"""
+    prompt = f"""请快速判断以下文章的分类、情感倾向和相关度。
+
+标题：{title}
+
+内容：
+{context}
+
+请以 JSON 格式返回，包含以下字段：
+1. category: 文章所属类别（如：科技、财经、社会、娱乐等）
+2. sentiment: 情感倾向（positive/neutral/negative）
+3. relevance: 0 到 1 之间的数值，表示文章对关注科技与前沿技术的读者的价值（信息量越大、越相关越高）
+
+只返回 JSON，不要其他说明文字。"""
+    return [
+        {"role": "system", "content": ANALYSIS_SYSTEM_PROMPT},
+        {"role": "user", "content": prompt},
+    ]
+
+
+async def classify_article(
+    title: str,
+    content: str,
+    provider: Optional[LLMProvider] = None,
+    model: Optional[str] = None
+) -> Optional[Dict[str, Any]]:
+    """
+    级联分析第一级：用分类模型判断文章的分类、情感和相关度
+
+    Args:
+        title: 文章标题
+        content: 文章内容
+        provider: 分类模型的提供商（默认读取 LLM_CLASSIFIER_PROVIDER，未设置时使用默认提供商）
+        model: 分类模型（默认读取 LLM_CLASSIFIER_MODEL）
+
+    Returns:
+        Optional[dict]: analysis_tier 为 "classifier" 的分析结果（keywords / topics / summary / entities 为空，
+        额外包含 relevance），失败时为 None
+    """
+    provider = provider or ANALYSIS_CLASSIFIER_PROVIDER
+    provider = LLMProvider(provider) if provider else None
+    model = model or ANALYSIS_CLASSIFIER_MODEL
+    context = build_analysis_context(title, content, ANALYSIS_CLASSIFIER_CONTEXT_TOKENS)
+    messages = build_classification_messages(title, context)
+
+    cache = get_analysis_cache()
+    cache_key = None
+    if cache is not None:
+        cache_key, *alternatives = [
+            _classifier_cache_key(title, context, candidate, candidate_model)
+            for candidate, candidate_model in _candidate_models(provider, model)
+        ]
+        cached = _cache_get(cache, cache_key, *alternatives)
+        if cached is not None:
+            return cached
+
+    try:
+        started = time.perf_counter()
+        with track_served_model() as served:
+            result = await resilient_call(
+                lambda p: _complete_analysis(
+                    messages, p, model, schema=CLASSIFICATION_SCHEMA, required=("relevance",), max_tokens=100
+                ),
+                provider=provider,
+                key="classifier"
+            )
+        served_provider, served_model = _served_by(served, provider, model)
+        classification = _get_default_analysis_result(True)
+        classification.update(
+            category=result.get("category") or "其他",
+            sentiment=result.get("sentiment") or "neutral",
+            relevance=min(max(float(result["relevance"]), 0.0), 1.0),
+            analysis_tier="classifier",
+            analysis_version=classifier_version(served_provider, served_model),
+            analysis_model=analysis_model_label(served_provider, served_model),
+        )
+    except Exception as e:
+        logger.warning(f"分类模型分析失败: {e}")
+        return None
+
+    if cache_key is not None:
+        _cache_put(
+            cache,
+            _classifier_cache_key(title, context, served_provider, served_model),
+            classification,
+            latency_s=time.perf_counter() - started,
+            tokens=estimate_messages_tokens(messages) + estimate_tokens(json.dumps(result, ensure_ascii=False)),
+        )
+    return classification
+
+
+async def _cascade_filter(
+    articles: List[Dict[str, Any]],
+    max_concurrent: Optional[int]
+) -> Tuple[List[Dict[str, Any]], Dict[int, float]]:
+    """
+    级联分析：先用分类模型分析整批文章，相关度低于阈值的文章直接使用分类结果
+
+    Returns:
+        Tuple[List[Dict], Dict[int, float]]: (需要完整分析的文章, id(文章) → 分类模型给出的相关度)；
+        分类失败的文章按需要完整分析处理
+    """
+    semaphore = asyncio.Semaphore(max_concurrent) if max_concurrent else contextlib.nullcontext()
+
+    async def classify(article: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        title = article.get("title", "")
+        content = article.get("content", "")
+        if not title or not content:
+            return None
+        async with semaphore:
+            return await classify_article(title, content)
+
+    classifications = await asyncio.gather(*[classify(article) for article in articles])
+    to_analyze = []
+    relevances = {}
+    for article, classification in zip(articles, classifications):
+        if classification is None:
+            to_analyze.append(article)
+        elif classification["relevance"] >= ANALYSIS_RELEVANCE_THRESHOLD:
+            to_analyze.append(article)
+            relevances[id(article)] = classification["relevance"]
+        else:
+            article["content_analysis"] = classification
+    logger.info(f"级联分析: {len(articles)} 篇中 {len(to_analyze)} 篇交给完整分析模型"
+                f"（相关度阈值 {ANALYSIS_RELEVANCE_THRESHOLD}）")
+    return to_analyze, relevances
+
+
+def is_long_article(content: str) -> bool:
+    """正文是否超出单次调用预算（需要 map-reduce 分析）"""
+    return estimate_tokens(content or "") > ANALYSIS_SINGLE_CALL_TOKENS
+
+
+def plan_article_chunks(title: str, content: str) -> List[str]:
+    """
+    长文分块：按句子边界切分为不超过 ANALYSIS_CHUNK_TOKENS 的块，块数不超过 ANALYSIS_MAX_CHUNKS
+
+    超出块数上限时先按上限均分，每块再抽取最有信息量的句子压缩到 ANALYSIS_CHUNK_TOKENS 以内
+    """
+    total = estimate_tokens(content)
+    chunk_tokens = max(ANALYSIS_CHUNK_TOKENS, -(-total // ANALYSIS_MAX_CHUNKS))
+    chunks = split_into_chunks(content, chunk_tokens)
+    while len(chunks) > ANALYSIS_MAX_CHUNKS:
+        # 按句子边界切分会留下未填满的块，逐步放大块大小直到满足块数上限
+        chunk_tokens = int(chunk_tokens * 1.1) + 1
+        chunks = split_into_chunks(content, chunk_tokens)
+    if chunk_tokens > ANALYSIS_CHUNK_TOKENS:
+        chunks = [build_analysis_context(title, chunk, ANALYSIS_CHUNK_TOKENS) for chunk in chunks]
+    return chunks
+
+
+def _rank_by_votes(lists: List[List[str]], limit: int) -> List[str]:
+    """合并多个有序列表：按出现次数和在各列表中的排名加权，大小写不同的同一个词只保留第一次出现的写法"""
+    scores: Dict[str, float] = {}
+    display: Dict[str, str] = {}
+    first_seen: Dict[str, int] = {}
+    for items in lists:
+        for rank, item in enumerate(items):
+            if not isinstance(item, str) or not item.strip():
+                continue
+            key = item.strip().lower()
+            display.setdefault(key, item.strip())
+            first_seen.setdefault(key, len(first_seen))
+            scores[key] = scores.get(key, 0.0) + 1.0 / (1 + rank)
+    ordered = sorted(scores, key=lambda k: (-scores[k], first_seen[k]))
+    return [display[k] for k in ordered[:limit]]
+
+
+def _majority(values: List[str], default: str) -> str:
+    """多数投票（平票时取最先出现的值）"""
+    counts: Dict[str, int] = {}
+    for value in values:
+        if value:
+            counts[value] = counts.get(value, 0) + 1
+    if not counts:
+        return default
+    return max(counts, key=lambda v: counts[v])
+
+
+def merge_chunk_analyses(
+    results: List[Dict[str, Any]],
+    max_keywords: int,
+    max_topics: int
+) -> Dict[str, Any]:
+    """
+    在本地合并各分块的分析结果（不含摘要）
+
+    Args:
+        results: 各分块标准化后的分析结果（按原文顺序）
+        max_keywords: 最大关键词数量
+        max_topics: 最大主题数量
+
+    Returns:
+        dict: 合并后的分析结果，summary 为各分块摘要按顺序拼接（reduce 调用失败时的兜底）
+    """
+    entities = []
+    seen_entities = set()
+    for result in results:
+        for entity in result.get("entities", []):
+            name = entity.get("name", "").strip() if isinstance(entity, dict) else ""
+            if name and name.lower() not in seen_entities:
+                seen_entities.add(name.lower())
+                entities.append(entity)
+
+    return {
+        "keywords": _rank_by_votes([r.get("keywords", []) for r in results], max_keywords),
+        "topics": _rank_by_votes([r.get("topics", []) for r in results], max_topics),
+        "summary": " ".join(r["summary"] for r in results if r.get("summary")),
+        "sentiment": _majority([r.get("sentiment") for r in results], "neutral"),
+        "category": _majority([r.get("category") for r in results], "其他"),
+        "entities": entities,
+        "analysis_success": True,
+        "analysis_tier": "full"
+    }
+
+
+async def _analyze_chunk(
+    title: str,
+    chunk: str,
+    index: int,
+    total: int,
+    provider: Optional[LLMProvider],
+    model: Optional[str],
+    max_keywords: int,
+    max_topics: int
+) -> Dict[str, Any]:
+    """map 阶段：分析长文的一个分块"""
+    prompt = f"""以下是文章《{title}》的第 {index + 1}/{total} 部分，请分析这部分内容，提取关键信息。
+
+内容：
+{chunk}
+
+请以 JSON 格式返回分析结果，包含以下字段：
+{_analysis_fields_prompt(max_keywords, max_topics)}
+
+只返回 JSON，不要其他说明文字。"""
+    messages = [
+        {"role": "system", "content": ANALYSIS_SYSTEM_PROMPT},
+        {"role": "user", "content": prompt},
+    ]
+    result = await resilient_call(lambda p: _complete_analysis(messages, p, model), provider=provider, key="analysis")
+    return _normalize_analysis(result, max_keywords, max_topics)
+
+
+async def _reduce_summary(
+    title: str,
+    summaries: List[str],
+    provider: Optional[LLMProvider],
+    model: Optional[str]
+) -> str:
+    """reduce 阶段：根据各分块摘要生成全文摘要"""
+    parts = "\n".join(f"{i + 1}. {summary}" for i, summary in enumerate(summaries))
+    prompt = f"""以下是文章《{title}》各部分的摘要（按原文顺序）：
+
+{parts}
+
+请用 1-2 句话总结全文核心内容，只返回摘要文本。"""
+    response = await resilient_call(
+        lambda p: chat_completion(
+            messages=[{"role": "user", "content": prompt}],
+            provider=p,
+            model=model,
+            temperature=0.3,
+            max_tokens=300
+        ),
+        provider=provider,
+        key="analysis_reduce"
+    )
+    return response.strip()
+
+
+async def analyze_long_article(
+    title: str,
+    content: str,
+    provider: Optional[LLMProvider] = None,
+    max_keywords: int = 10,
+    max_topics: int = 5
+) -> Dict[str, Any]:
+    """
+    长文 map-reduce 分析：分块并发分析，本地合并关键词、主题和实体，再用一次小请求生成全文摘要
+
+    Args:
+        title: 文章标题
+        content: 文章内容
+        provider: LLM 提供商（可选）
+        max_keywords: 最大关键词数量
+        max_topics: 最大主题数量
+
+    Returns:
+        dict: 与 analyze_article_keywords 相同格式的分析结果；部分分块失败时只合并成功的分块
+    """
+    model = os.getenv("DEFAULT_LLM_MODEL")
+    cache = get_analysis_cache()
+    cache_key = None
+    if cache is not None:
+        cache_key, *alternatives = _analysis_cache_keys(title, content, provider, model, max_keywords, max_topics)
+        cached = _cache_get(cache, cache_key, *alternatives)
+        if cached is not None:
+            logger.info(f"命中分析缓存: {title[:50]}...")
+            return cached
+
+    chunks = plan_article_chunks(title, content)
+    logger.info(f"长文分块分析: {title[:50]}... ({len(chunks)} 块)")
+    started = time.perf_counter()
+    with track_served_model() as served:
+        outcomes = await asyncio.gather(
+            *[
+                _analyze_chunk(title, chunk, i, len(chunks), provider, model, max_keywords, max_topics)
+                for i, chunk in enumerate(chunks)
+            ],
+            return_exceptions=True
+        )
+    results = [r for r in outcomes if not isinstance(r, BaseException)]
+    for error in (r for r in outcomes if isinstance(r, BaseException)):
+        logger.warning(f"长文分块分析失败: {error}")
+    if not results:
+        logger.error(f"文章分析失败: 全部 {len(chunks)} 个分块失败")
+        return _get_default_analysis_result(False)
+
+    analysis_result = merge_chunk_analyses(results, max_keywords, max_topics)
+    # 分块可能由不同提供商响应，以最后一个成功的分块为准
+    served_provider, served_model = _served_by(served, provider, model)
+    stamp_analysis(analysis_result, served_provider, served_model, max_keywords, max_topics)
+    summaries = [r["summary"] for r in results if r.get("summary")]
+    if len(summaries) > 1:
+        try:
+            analysis_result["summary"] = await _reduce_summary(title, summaries, provider, model) or analysis_result["summary"]
+        except Exception as e:
+            logger.warning(f"长文摘要合并失败，使用分块摘要拼接: {e}")
+
+    # 只缓存所有分块都成功的结果
+    if cache_key is not None and len(results) == len(chunks):
+        _cache_put(
+            cache,
+            _analysis_cache_key(title, content, served_provider, served_model, max_keywords, max_topics),
+            analysis_result,
+            latency_s=time.perf_counter() - started,
+            tokens=sum(estimate_tokens(chunk) for chunk in chunks)
+            + sum(estimate_tokens(json.dumps(r, ensure_ascii=False)) for r in results),
+        )
+
+    logger.info(f"文章分析成功: {title[:50]}...")
+    return analysis_result
+
+
+def _build_packed_messages(
+    items: List[Tuple[str, str]],
+    max_keywords: int,
+    max_topics: int
+) -> List[Dict[str, str]]:
+    """构建多篇文章打包分析的消息（items 为 (标题, 截断后的内容)）"""
+    articles_text = "\n\n".join(
+        f"[{index}] 标题：{title}\n内容：\n{content}"
+        for index, (title, content) in enumerate(items)
+    )
+    prompt = f"""请分别分析以下 {len(items)} 篇文章，提取关键信息。
+
+{articles_text}
+
+请返回一个 JSON 数组，每篇文章对应一个对象，包含 index 字段（文章编号，即方括号中的数字）以及以下字段：
+{_analysis_fields_prompt(max_keywords, max_topics)}
+
+只返回 JSON 数组，不要其他说明文字。"""
+    return [
+        {"role": "system", "content": ANALYSIS_SYSTEM_PROMPT},
+        {"role": "user", "content": prompt},
+    ]
+
+
+def plan_packed_batches(
+    article_tokens: List[int],
+    overhead_tokens: int,
+    context_tokens: int = None,
+    max_articles: int = None,
+    max_output_tokens: int = None
+) -> List[List[int]]:
+    """
+    按模型上下文限制把文章分组（保持原有顺序，贪心装箱）
+
+    Args:
+        article_tokens: 每篇文章（标题 + 内容）的估算 token 数
+        overhead_tokens: 提示词固定部分的估算 token 数
+        context_tokens: 上下文窗口大小（默认 LLM_CONTEXT_TOKENS）
+        max_articles: 每批最多文章数（默认 ANALYSIS_PACK_MAX_ARTICLES）
+        max_output_tokens: 单次最大输出 token 数（默认 LLM_MAX_OUTPUT_TOKENS）
+
+    Returns:
+        List[List[int]]: 每批文章在输入列表中的下标
+    """
+    context_tokens = context_tokens or LLM_CONTEXT_TOKENS
+    max_articles = max_articles or ANALYSIS_PACK_MAX_ARTICLES
+    max_output_tokens = max_output_tokens or LLM_MAX_OUTPUT_TOKENS
+    # 输出上限决定的每批最多文章数
+    max_articles = max(1, min(max_articles, max_output_tokens // PACK_OUTPUT_TOKENS_PER_ARTICLE))
+
+    batches: List[List[int]] = []
+    current: List[int] = []
+    current_tokens = 0
+    for index, tokens in enumerate(article_tokens):
+        size = len(current) + 1
+        needed = overhead_tokens + current_tokens + tokens + size * PACK_OUTPUT_TOKENS_PER_ARTICLE
+        if current and (size > max_articles or needed > context_tokens):
+            batches.append(current)
+            current, current_tokens = [], 0
+        current.append(index)
+        current_tokens += tokens
+    if current:
+        batches.append(current)
+    return batches
+
+
+async def analyze_articles_packed(
+    items: List[Tuple[str, str]],
+    provider: Optional[LLMProvider] = None,
+    max_keywords: int = 10,
+    max_topics: int = 5
+) -> List[Optional[Dict[str, Any]]]:
+    """
+    一次请求分析多篇文章
+
+    Args:
+        items: [(标题, 截断后的内容)]
+        provider: LLM 提供商
+        max_keywords: 最大关键词数量
+        max_topics: 最大主题数量
+
+    Returns:
+        List[Optional[Dict]]: 与 items 一一对应的分析结果，响应中缺失的文章为 None
+
+    Raises:
+        Exception: 请求失败或响应不是合法的 JSON 数组
+    """
+    messages = _build_packed_messages(items, max_keywords, max_topics)
+    model = os.getenv("DEFAULT_LLM_MODEL")
+    started = time.perf_counter()
+    with track_served_model() as served:
+        response = await resilient_call(
+            lambda p: chat_completion(
+                messages=messages,
+                provider=p,
+                model=model,
+                temperature=0.3,
+                max_tokens=min(LLM_MAX_OUTPUT_TOKENS, PACK_OUTPUT_TOKENS_PER_ARTICLE * len(items) + 200)
+            ),
+            provider=provider,
+            key=f"analysis_packed_{len(items)}"
+        )
+    latency = time.perf_counter() - started
+    served_provider, served_model = _served_by(served, provider, model)
+
+    response = _strip_code_fence(response)
+    parsed = json.loads(response)
+    if not isinstance(parsed, list):
+        raise ValueError("打包分析响应不是 JSON 数组")
+
+    results: List[Optional[Dict[str, Any]]] = [None] * len(items)
+    for entry in parsed:
+        if not isinstance(entry, dict):
+            continue
+        try:
+            index = int(entry.get("index"))
+        except (TypeError, ValueError):
+            continue
+        if 0 <= index < len(items) and results[index] is None:
+            results[index] = stamp_analysis(
+                _normalize_analysis(entry, max_keywords, max_topics),
+                served_provider, served_model, max_keywords, max_topics
+            )
+
+    # 按篇分摊耗时和 token，写入缓存
+    cache = get_analysis_cache()
+    if cache is not None:
+        share_tokens = (estimate_messages_tokens(messages) + estimate_tokens(response)) // len(items)
+        for (title, content), result in zip(items, results):
+            if result is not None:
+                key = _analysis_cache_key(title, content, served_provider, served_model, max_keywords, max_topics)
+                _cache_put(cache, key, result, latency_s=latency / len(items), tokens=share_tokens)
+    return results
+
+
 async def batch_analyze_articles(
     articles: List[Dict[str, Any]],
     provider: Optional[LLMProvider] = None,
-    max_concurrent: int = 3
+    max_concurrent: Optional[int] = None,
+    pack: Optional[bool] = None,
+    cascade: Optional[bool] = None
 ) -> List[Dict[str, Any]]:
     """
     批量分析文章
@@ -151,14 +1036,32 @@ async def batch_analyze_articles(
     Args:
         articles: 文章列表，每篇文章需包含 title 和 content
         provider: LLM 提供商
-        max_concurrent: 最大并发数
+        max_concurrent: 本批次的最大并发请求数（可选，打包请求算一个）。
+            默认不额外限制，由提供商的自适应并发限流器（backend.llm.concurrency）决定
+        pack: 是否把多篇短文章打包为一次请求（默认读取 ANALYSIS_PACK_ARTICLES，默认开启）。
+            打包请求失败时自动二分拆小，直到退化为单篇分析
+        cascade: 是否先用分类模型筛选（默认在配置了 LLM_CLASSIFIER_MODEL 时开启）。
+            相关度低于 ANALYSIS_RELEVANCE_THRESHOLD 的文章只保留分类结果，不调用完整分析模型
     
     Returns:
-        List[Dict]: 添加了分析结果的文章列表
+        List[Dict]: 添加了分析结果的文章列表，content_analysis.analysis_tier 记录产生结果的层级
     """
-    semaphore = asyncio.Semaphore(max_concurrent)
+    if pack is None:
+        pack = ANALYSIS_PACK_ENABLED
+    if cascade is None:
+        cascade = ANALYSIS_CLASSIFIER_MODEL is not None
+    semaphore = asyncio.Semaphore(max_concurrent) if max_concurrent else contextlib.nullcontext()
+    request_count = 0
+    for article in articles:
+        article.pop("content_analysis", None)
+    
+    to_analyze = articles
+    relevances: Dict[int, float] = {}
+    if cascade:
+        to_analyze, relevances = await _cascade_filter(articles, max_concurrent)
     
     async def analyze_with_semaphore(article: Dict[str, Any]) -> Dict[str, Any]:
+        nonlocal request_count
         async with semaphore:
             title = article.get("title", "")
             content = article.get("content", "")
@@ -168,6 +1071,7 @@ async def batch_analyze_articles(
                 return article
             
             # 分析文章
+            request_count += 1
             analysis = await analyze_article_keywords(
                 title=title,
                 content=content,
@@ -179,21 +1083,87 @@ async def batch_analyze_articles(
             
             return article
     
+    async def analyze_packed_group(group: List[Tuple[Dict[str, Any], str]]) -> None:
+        """group: (文章, 已抽取的正文) 列表"""
+        nonlocal request_count
+        if len(group) == 1:
+            await analyze_with_semaphore(group[0][0])
+            return
+        
+        items = [(article["title"], context) for article, context in group]
+        try:
+            async with semaphore:
+                request_count += 1
+                results = await analyze_articles_packed(items, provider=provider)
+        except Exception as e:
+            # 整批失败：二分拆小重试
+            logger.warning(f"打包分析 {len(group)} 篇失败，拆分重试: {e}")
+            middle = len(group) // 2
+            await asyncio.gather(analyze_packed_group(group[:middle]), analyze_packed_group(group[middle:]))
+            return
+        
+        # 响应中缺失的文章单独重试
+        missing = []
+        for (article, _), result in zip(group, results):
+            if result is None:
+                missing.append(article)
+            else:
+                article["content_analysis"] = result
+        if missing:
+            logger.warning(f"打包分析响应缺少 {len(missing)} 篇，单独分析")
+            await asyncio.gather(*[analyze_with_semaphore(article) for article in missing])
+    
+    tasks = []
+    if pack:
+        # 短文章先查缓存，命中的不参与打包
+        cache = get_analysis_cache()
+        model = os.getenv("DEFAULT_LLM_MODEL")
+        packable = []
+        for article in to_analyze:
+            title = article.get("title", "")
+            content = article.get("content", "")
+            if not title or not content or (ANALYSIS_MAP_REDUCE_ENABLED and is_long_article(content)):
+                # 长文走 map-reduce，不参与打包
+                tasks.append(analyze_with_semaphore(article))
+                continue
+            context = build_analysis_context(title, content, ANALYSIS_CONTEXT_TOKENS)
+            tokens = estimate_tokens(title) + estimate_tokens(context)
+            if tokens > ANALYSIS_PACK_MAX_ARTICLE_TOKENS:
+                # 长文章单独分析（analyze_article_keywords 自己会查缓存）
+                tasks.append(analyze_with_semaphore(article))
+                continue
+            if cache is not None:
+                keys = _analysis_cache_keys(title, context, provider, model, max_keywords=10, max_topics=5)
+                cached = _cache_get(cache, *keys)
+                if cached is not None:
+                    article["content_analysis"] = cached
+                    continue
+            packable.append((article, context, tokens))
+        
+        if packable:
+            overhead = estimate_messages_tokens(_build_packed_messages([], max_keywords=10, max_topics=5))
+            groups = plan_packed_batches([tokens for _, _, tokens in packable], overhead_tokens=overhead)
+            for group in groups:
+                tasks.append(analyze_packed_group([packable[i][:2] for i in group]))
+    else:
+        tasks = [analyze_with_semaphore(article) for article in to_analyze]
+    
     # 并发分析
-    tasks = [analyze_with_semaphore(article) for article in articles]
     results = await asyncio.gather(*tasks, return_exceptions=True)
-    
-    # 处理异常
-    analyzed_articles = []
-    for i, result in enumerate(results):
+    for result in results:
         if isinstance(result, Exception):
-            logger.error(f"文章 {i} 分析失败: {result}")
-            articles[i]["content_analysis"] = _get_default_analysis_result(False)
-            analyzed_articles.append(articles[i])
-        else:
-            analyzed_articles.append(result)
+            logger.error(f"文章分析失败: {result}")
     
-    return analyzed_articles
+    # 处理异常：没有拿到结果的文章使用默认结果
+    for article in articles:
+        if "content_analysis" not in article:
+            article["content_analysis"] = _get_default_analysis_result(False)
+        elif id(article) in relevances and article["content_analysis"].get("analysis_success"):
+            article["content_analysis"] = {**article["content_analysis"], "relevance": relevances[id(article)]}
+    
+    if pack:
+        logger.info(f"批量分析 {len(to_analyze)} 篇文章，发出 {request_count} 次 LLM 请求")
+    return articles
 
 
 def extract_keywords_from_analysis(article: Dict[str, Any]) -> List[str]:
@@ -312,4 +1282,11 @@ def analyze_article_keywords_sync(
     Returns:
         dict: 分析结果
     """
-    return asyncio.run(analyze_article_keywords(title, content, provider))
+    async def _run():
+        try:
+            return await analyze_article_keywords(title, content, provider)
+        finally:
+            # asyncio.run 结束后事件循环即关闭，连接池需在循环内释放
+            await close_providers()
+
+    return asyncio.run(_run())
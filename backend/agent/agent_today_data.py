@@ -10,13 +10,33 @@ from playwright.sync_api import sync_playwright
 import logging
 import uuid
 import asyncio
+import atexit
+from contextlib import nullcontext
 from curl_cffi import requests as cffi_requests # [修复] 添加缺失的导入
 
+# 技术内容检测不依赖爬虫组件，单独成模块供 LLM 分析复用
+from backend.agent.tech_detection import TECH_KEYWORDS, detect_tech_content
+
 # [保留你的后端引用]
 try:
     from backend.utils.url_to_markdown import Crawler, ReadabilityExtractor
     from backend.db import ElasticsearchClient, ArticleRepository
-    from backend.agent.agent_content_keyword_analysis import analyze_article_keywords, batch_analyze_articles
+    from backend.agent.agent_content_keyword_analysis import analyze_article_keywords
+    from backend.agent.analysis_cache import diff_stats, get_analysis_cache
+    from backend.agent.triage import diff_triage_stats, save_keyword_corpus, triage_stats
+    from backend.agent.analysis_queue import AnalysisWorker, get_analysis_queue, mark_analysis_pending
+    from backend.llm import (
+        concurrency_stats,
+        diff_concurrency_stats,
+        diff_llm_metrics,
+        diff_resilience_stats,
+        diff_structured_output_stats,
+        llm_metrics,
+        resilience_stats,
+        structured_output_stats,
+    )
+    from backend.agent.crawl_fixtures import FixtureRecorder
+    from backend.utils.jsonl_sink import JsonlSink
 except ImportError as e:
     print(f"警告：后端模块导入失败，请确保 backend 目录在路径中。错误: {e}")
     # 为了防止代码直接崩溃，这里可以定义一些占位类，或者直接报错停止
@@ -30,7 +50,12 @@ logging.basicConfig(
 logger = logging.getLogger(__name__)
 
 # --- 配置区域 ---
-OUTPUT_FILE = "tophub_articles.jsonl"  # 结果保存文件 (json lines 格式)
+# JSONL 输出目录（按爬取日期分区 dt=YYYY-MM-DD，按大小轮转）
+OUTPUT_DIR = os.getenv("CRAWL_OUTPUT_DIR", "crawl_output")
+OUTPUT_COMPRESSION = os.getenv("CRAWL_OUTPUT_COMPRESSION") or None  # gzip / zstd
+OUTPUT_ROTATE_MB = int(os.getenv("CRAWL_OUTPUT_ROTATE_MB", "256"))
+# 设置后，爬取时把榜单快照和原始 HTML 录制到该夹具归档，供离线回放基准使用
+RECORD_FIXTURES_PATH = os.getenv("CRAWL_RECORD_FIXTURES")
 MIN_SLEEP = 3  # 最短等待时间
 MAX_SLEEP = 8  # 最长等待时间
 
@@ -61,40 +86,6 @@ try:
 except NameError:
     crawler = None
 
-# --- 技术关键词配置 ---
-# [修复] 修复了字典键值的乱码和引号
-TECH_KEYWORDS = {
-    "开源项目": [
-        "开源", "open source", "github", "gitlab", "开源项目", "开源库",
-        "新项目", "项目发布", "release", "开源工具"
-    ],
-    "大模型": [
-        "大模型", "LLM", "GPT", "Claude", "Gemini", "ChatGPT", "语言模型",
-        "大语言模型", "生成式AI", "Generative AI", "Foundation Model",
-        "Transformer", "BERT", "预训练模型"
-    ],
-    "RAG技术": [
-        "RAG", "检索增强", "Retrieval Augmented", "向量数据库", "Vector Database",
-        "Embedding", "知识库", "文档检索", "语义搜索", "Semantic Search"
-    ],
-    "Agent技术": [
-        "Agent", "智能体", "AI Agent", "自主代理", "Multi-Agent", "多智能体",
-        "ReAct", "Chain of Thought", "CoT", "Tool Use", "Function Calling"
-    ],
-    "AI框架": [
-        "LangChain", "LlamaIndex", "AutoGPT", "BabyAGI", "Semantic Kernel",
-        "Haystack", "Transformers", "PyTorch", "TensorFlow", "JAX"
-    ],
-    "模型训练": [
-        "微调", "Fine-tuning", "RLHF", "LoRA", "QLoRA", "PEFT", "量化",
-        "Quantization", "蒸馏", "Distillation", "预训练", "Pre-training"
-    ],
-    "推理优化": [
-        "推理加速", "Inference", "vLLM", "TensorRT", "ONNX", "模型压缩",
-        "模型部署", "边缘计算", "Edge AI"
-    ]
-}
-
 def get_random_headers():
     """
     随机生成请求头，伪装成不同浏览器
@@ -117,13 +108,38 @@ def get_random_headers():
         "Accept-Language": "zh-CN,zh;q=0.9,en;q=0.8"
     }
 
+def open_output_sink(prefix: str = "tophub_articles"):
+    """创建按日期分区的 JSONL 输出器（配置来自 CRAWL_OUTPUT_* 环境变量）"""
+    return JsonlSink(
+        OUTPUT_DIR,
+        prefix=prefix,
+        compression=OUTPUT_COMPRESSION,
+        rotate_bytes=OUTPUT_ROTATE_MB * 1024 * 1024,
+    )
+
+
+_output_sink = None
+
+
 def save_to_file(data):
     """
-    增量保存：爬一条存一条，防止程序中断丢失数据
-    使用 JSONL 格式 (每行一个 JSON)，方便后续处理
+    增量保存：使用 JSONL 格式 (每行一个 JSON)，方便后续处理
+    写入长生命周期的缓冲输出器，缓冲区每隔 flush_interval（默认 1 秒）写入文件；
+    可调用 close_output_file() 立即落盘，进程正常退出时也会自动关闭
     """
-    with open(OUTPUT_FILE, 'a', encoding='utf-8') as f:
-        f.write(json.dumps(data, ensure_ascii=False) + "\n")
+    global _output_sink
+    if _output_sink is None:
+        _output_sink = open_output_sink()
+        atexit.register(close_output_file)
+    _output_sink.write(data)
+
+
+def close_output_file():
+    """关闭 save_to_file 使用的输出器"""
+    global _output_sink
+    if _output_sink is not None:
+        _output_sink.close()
+        _output_sink = None
         
 
 def scrape_tophub_dynamic_link():
@@ -296,22 +312,52 @@ def get_html_stealth(url):
         print(f"   [浏览器也失败] {e}")
         return None
 
-def gentle_scrape_content(article_info):
+def gentle_scrape_content(article_info, fixture_recorder=None):
     """
     对单篇文章进行温和爬取
+
+    Args:
+        article_info: 榜单条目 {"category", "title", "tophub_url"}
+        fixture_recorder: 夹具录制器（可选），传入时把下载到的原始 HTML 写入夹具归档
     """
     url = article_info['tophub_url']
     # 1. 使用抗拦截方式下载 HTML
     html = get_html_stealth(url)
-    
+
     if not html:
         return {"title": article_info['title'], "status": "failed_download"}
-    
+
+    if fixture_recorder is not None:
+        fixture_recorder.record_page(url, html, article_info)
+
+    return build_article_from_html(article_info, html)
+
+
+def build_article_from_html(article_info, html, extractor=None, stage_timings=None):
+    """
+    从已下载的 HTML 组装文章数据（readability 正文 -> newspaper 元数据 -> markdown）
+
+    Args:
+        article_info: 榜单条目 {"category", "title", "tophub_url"}
+        html: 原始 HTML
+        extractor: 正文提取器（可选，默认 ReadabilityExtractor）
+        stage_timings: 阶段耗时字典（可选），传入时累加各阶段耗时（秒），
+            键为 readability / newspaper / markdown，供离线回放基准使用
+    """
+    url = article_info['tophub_url']
+
+    def _mark(stage, started):
+        if stage_timings is not None:
+            stage_timings[stage] = stage_timings.get(stage, 0.0) + time.perf_counter() - started
+
     # 提取正文内容
     try:
-        extractor = ReadabilityExtractor()
+        started = time.perf_counter()
+        if extractor is None:
+            extractor = ReadabilityExtractor()
         extract_content = extractor.extract_article(html)
         extract_content.url = url
+        _mark("readability", started)
         # print("markdown:", extract_content.to_markdown()) # 调试用
     except NameError:
          # 如果 ReadabilityExtractor 没有导入成功
@@ -321,10 +367,16 @@ def gentle_scrape_content(article_info):
     try:
         # newspaper3k 配置
         # browser_user_agent 属性非常重要，newspaper 默认 UA 很容易被封
+        started = time.perf_counter()
         article = Article(url, language='zh')
         article.download(input_html=html) # 直接传入已下载的HTML
         article.parse()
-        
+        _mark("newspaper", started)
+
+        started = time.perf_counter()
+        content = extract_content.to_markdown()
+        _mark("markdown", started)
+
         # 组装数据
         result = {
             "uuid": str(uuid.uuid4()),
@@ -332,7 +384,7 @@ def gentle_scrape_content(article_info):
             "category": article_info['category'],
             "original_url": article.url, # 跳转后的真实地址
             "publish_date": str(article.publish_date) if article.publish_date else None,
-            "content": extract_content.to_markdown(),
+            "content": content,
             "images": list(article.images), # 获取图片列表
             "scraped_at": time.strftime("%Y-%m-%d %H:%M:%S")
         }
@@ -348,74 +400,15 @@ def gentle_scrape_content(article_info):
         }
 
 
-def detect_tech_content(text: str, title: str = "") -> dict:
-    """
-    检测文本中是否包含新开源项目、大模型前沿技术
-    """
-    if not text:
-        return {
-            "is_tech_related": False,
-            "categories": [],
-            "keywords": [],
-            "confidence": 0.0,
-            "summary": "内容为空"
-        }
-
-    
-    # 合并标题和正文进行检测（标题权重更高）
-    full_text = (title + " " + title + " " + text).lower()  # 标题重复2次增加权重
-    
-    matched_categories = []
-    matched_keywords = []
-    keyword_count = 0
-    
-    # 遍历所有技术分类和关键词
-    for category, keywords in TECH_KEYWORDS.items():
-        category_matched = False
-        for keyword in keywords:
-            # 不区分大小写匹配
-            if keyword.lower() in full_text:
-                if keyword not in matched_keywords:
-                    matched_keywords.append(keyword)
-                    keyword_count += 1
-                category_matched = True
-        
-        if category_matched:
-            matched_categories.append(category)
-    
-    # 计算置信度
-    # 基础分：匹配到的分类数量
-    confidence = min(len(matched_categories) * 0.2, 0.6)
-    
-    # 加分：匹配到的关键词数量
-    confidence += min(keyword_count * 0.05, 0.3)
-    
-    # 额外加分：标题中包含关键词
-    title_lower = title.lower()
-    title_match_count = sum(1 for kw in matched_keywords if kw.lower() in title_lower)
-    confidence += min(title_match_count * 0.05, 0.1)
-    
-    # 确保置信度在 0-1 之间
-    confidence = min(confidence, 1.0)
-    
-    # 判断是否相关（至少匹配1个分类，且置信度 >= 0.2）
-    is_tech_related = len(matched_categories) > 0 and confidence >= 0.2
-    
-    # 生成摘要
-    if is_tech_related:
-        summary = f"检测到 {len(matched_categories)} 个技术领域：{', '.join(matched_categories[:3])}"
-        if len(matched_categories) > 3:
-            summary += f" 等"
-    else:
-        summary = "未检测到相关技术内容"
-    
-    return {
-        "is_tech_related": is_tech_related,
-        "categories": matched_categories,
-        "keywords": matched_keywords[:10],  # 最多返回10个关键词
-        "confidence": round(confidence, 2),
-        "summary": summary
-    }
+def _open_fixture_recorder(path, articles):
+    """按需创建夹具录制器，并先记录本次榜单快照"""
+    path = path or RECORD_FIXTURES_PATH
+    if not path:
+        return None
+    recorder = FixtureRecorder(path)
+    recorder.record_listing(articles)
+    print(f"🎞️  夹具录制: 已启用 ({path})")
+    return recorder
 
 
 def filter_tech_articles(articles: list) -> list:
@@ -447,10 +440,15 @@ def scrape_and_filter_tech_articles(
     save_to_jsonl: bool = True,
     es_index_name: str = "tophub_articles",
     check_duplicate: bool = True,
-    skip_duplicate: bool = True
+    skip_duplicate: bool = True,
+    record_fixtures: str = None
 ):
     """
     完整流程：爬取文章并筛选技术相关内容，保存到 Elasticsearch 和 JSONL
+
+    Args:
+        record_fixtures: 夹具归档路径（可选，默认读取 CRAWL_RECORD_FIXTURES），
+            设置后录制榜单快照和原始 HTML
     """
     print("=" * 60)
     print("开始爬取并筛选技术文章...")
@@ -486,53 +484,62 @@ def scrape_and_filter_tech_articles(
         return []
     
     print(f"\n📊 共获取 {len(articles)} 篇文章，开始爬取内容...\n")
-    
+
     # 2. 爬取每篇文章的详细内容
     detailed_articles = []
     duplicate_count = 0
     
-    for i, article_info in enumerate(articles[:10], 1):
-        print(f"[{i}/{len(articles)}] 正在爬取: {article_info['title']}")
+    # 所有文章边爬边写入 JSONL（缓冲写入，按日期分区）；中途出错时也会关闭输出器和夹具录制器，
+    # 已缓冲的文章不丢失，夹具归档带有清单、可以回放
+    with _open_fixture_recorder(record_fixtures, articles) or nullcontext() as fixture_recorder, \
+            (open_output_sink("tophub_articles") if save_to_jsonl else nullcontext()) as article_sink:
+        for i, article_info in enumerate(articles[:10], 1):
+            print(f"[{i}/{len(articles)}] 正在爬取: {article_info['title']}")
         
-        article_content = gentle_scrape_content(article_info)
+            article_content = gentle_scrape_content(article_info, fixture_recorder=fixture_recorder)
         
-        if article_content.get('status') != 'failed':
-            # 检查重复
-            is_duplicate = False
-            if save_to_es and repo and check_duplicate:
-                dup_result = repo.check_duplicate(
-                    article_content,
-                    check_url=True,
-                    check_title=True,
-                    check_similarity=False  # 可选：启用相似度检测
-                )
+            if article_content.get('status') != 'failed':
+                # 检查重复
+                is_duplicate = False
+                if save_to_es and repo and check_duplicate:
+                    dup_result = repo.check_duplicate(
+                        article_content,
+                        check_url=True,
+                        check_title=True,
+                        check_similarity=False  # 可选：启用相似度检测
+                    )
                 
-                if dup_result['is_duplicate']:
-                    duplicate_count += 1
-                    dup_type = dup_result['duplicate_type']
-                    logger.info(f"⚠️  发现重复文档 ({dup_type}): {article_content['title']}")
+                    if dup_result['is_duplicate']:
+                        duplicate_count += 1
+                        dup_type = dup_result['duplicate_type']
+                        logger.info(f"⚠️  发现重复文档 ({dup_type}): {article_content['title']}")
                     
-                    if skip_duplicate:
-                        print(f"   ⏭️  跳过重复文档 (类型: {dup_type})")
-                        is_duplicate = True
-                    else:
-                        print(f"   🔄 覆盖重复文档 (类型: {dup_type})")
+                        if skip_duplicate:
+                            print(f"   ⏭️  跳过重复文档 (类型: {dup_type})")
+                            is_duplicate = True
+                        else:
+                            print(f"   🔄 覆盖重复文档 (类型: {dup_type})")
             
-            if not is_duplicate:
-                detailed_articles.append(article_content)
+                if not is_duplicate:
+                    detailed_articles.append(article_content)
+                    if article_sink:
+                        article_sink.write(article_content)
                 
-                # 实时保存到 ES（逐条插入）
-                if save_to_es and repo:
-                    try:
-                        doc_id = article_content.get('original_url') or article_content.get('tophub_url')
-                        repo.create_document(article_content, doc_id=doc_id)
-                        logger.info(f"已保存到 ES: {article_content['title']}")
-                    except Exception as e:
-                        logger.error(f"保存到 ES 失败: {e}")
+                    # 实时保存到 ES（逐条插入）
+                    if save_to_es and repo:
+                        try:
+                            doc_id = article_content.get('original_url') or article_content.get('tophub_url')
+                            repo.create_document(article_content, doc_id=doc_id)
+                            logger.info(f"已保存到 ES: {article_content['title']}")
+                        except Exception as e:
+                            logger.error(f"保存到 ES 失败: {e}")
         
-        # 礼貌等待
-        time.sleep(random.uniform(MIN_SLEEP, MAX_SLEEP))
-    
+            # 礼貌等待
+            time.sleep(random.uniform(MIN_SLEEP, MAX_SLEEP))
+
+    if fixture_recorder:
+        print(f"\n🎞️  夹具已录制到 {fixture_recorder.path}")
+
     print(f"\n成功爬取 {len(detailed_articles)} 篇文章")
     if check_duplicate:
         print(f"⏭️  跳过 {duplicate_count} 篇重复文章")
@@ -550,18 +557,13 @@ def scrape_and_filter_tech_articles(
     
     # 4. 保存技术文章到单独的文件和索引
     if save_to_jsonl and tech_articles:
-        tech_output_file = "tech_articles.jsonl"
-        with open(tech_output_file, 'w', encoding='utf-8') as f:
-            for article in tech_articles:
-                f.write(json.dumps(article, ensure_ascii=False) + "\n")
-        print(f"\n💾 技术文章已保存到 {tech_output_file}")
+        with open_output_sink("tech_articles") as tech_sink:
+            tech_sink.write_many(tech_articles)
+        print(f"\n💾 技术文章已保存到 {', '.join(tech_sink.files)}")
     
-    # 5. 保存所有文章到 JSONL（如果需要）
-    if save_to_jsonl and detailed_articles:
-        with open(OUTPUT_FILE, 'w', encoding='utf-8') as f:
-            for article in detailed_articles:
-                f.write(json.dumps(article, ensure_ascii=False) + "\n")
-        print(f"💾 所有文章已保存到 {OUTPUT_FILE}")
+    # 5. 所有文章的 JSONL 输出（爬取结束时已关闭）
+    if article_sink and article_sink.files:
+        print(f"💾 所有文章已保存到 {', '.join(article_sink.files)}")
     
     # 6. 显示统计信息
     if save_to_es and repo:
@@ -589,13 +591,19 @@ def scrape_all_articles_to_es(
     check_duplicate: bool = True,
     skip_duplicate: bool = True,
     enable_analysis: bool = True,
-    progress_callback=None
+    progress_callback=None,
+    record_fixtures: str = None,
+    wait_for_analysis: bool = True
 ):
     """
     爬取所有文章并直接保存到 Elasticsearch（批量模式）
     
     Args:
         progress_callback: 进度回调函数，接受 (total, success, failed, current_title) 参数
+        record_fixtures: 夹具归档路径（可选，默认读取 CRAWL_RECORD_FIXTURES），
+            设置后录制榜单快照和原始 HTML
+        wait_for_analysis: 爬取结束后是否等待分析队列处理完（False 时剩余文章留在持久化队列中，
+            由下次运行或 run_analysis_worker.py 继续分析）
     """
     print("=" * 60)
     print("开始爬取文章并保存到 Elasticsearch")
@@ -626,152 +634,123 @@ def scrape_all_articles_to_es(
         return {"success": 0, "failed": 0, "duplicate": 0, "analyzed": 0, "error": "未获取到文章列表"}
     
     print(f"\n共获取 {len(articles)} 篇文章，开始爬取内容...\n")
+    fixture_recorder = _open_fixture_recorder(record_fixtures, articles)
     if check_duplicate:
         print(f"🔍 重复检测: 已启用 (跳过模式: {'是' if skip_duplicate else '否'})")
     if enable_analysis:
         print(f"🤖 内容分析: 已启用")
+    analysis_cache = get_analysis_cache() if enable_analysis else None
+    cache_stats_before = analysis_cache.stats() if analysis_cache else None
+    # 统计都是进程级累计值（API 进程中会跨多次爬取），报告取本次爬取前后快照的差
+    llm_metrics_before = llm_metrics() if enable_analysis else None
+    triage_before = triage_stats()
+    concurrency_before = concurrency_stats()
+    structured_before = structured_output_stats()
+    resilience_before = resilience_stats()
     print()
     
-    # 3. 爬取并批量保存
+    # 3. 爬取并批量保存：文章提取后立即写入 ES（analysis_status 为 pending），
+    #    分析由后台线程从持久化队列中取出，完成后局部更新 content_analysis
     batch = []
     success_count = 0
     failed_count = 0
     duplicate_count = 0
     analyzed_count = 0
     
-    # 用于批量分析的文章列表
-    articles_to_analyze = []
+    analysis_worker = None
+    if enable_analysis:
+        analysis_worker = AnalysisWorker(repo, get_analysis_queue()).start()
     
-    for i, article_info in enumerate(articles[:5], 1):
-        print(f"[{i}/{len(articles)}] 正在爬取: {article_info['title']}")
+    def save_batch(documents):
+        nonlocal success_count, failed_count
+        try:
+            result = repo.bulk_create_documents(documents)
+        except Exception as e:
+            logger.error(f"批量保存失败: {e}")
+            failed_count += len(documents)
+            return
+        success_count += result['success']
+        failed_count += result['failed']
+        print(f"   💾 批量保存: 成功 {result['success']} 篇")
+        if analysis_worker:
+            failed_ids = {(item.get('index') or {}).get('_id') for item in result.get('failed_items', [])}
+            queued = [
+                (doc_id, doc) for doc_id, doc in ((repo.document_id(d), d) for d in documents)
+                if doc_id and doc_id not in failed_ids
+            ]
+            get_analysis_queue().enqueue(queued)
+            analysis_worker.notify()
+            print(f"   🤖 {len(queued)} 篇已加入分析队列")
+    
+    # 中途出错时也会关闭夹具录制器（写入清单），已录制的页面可以回放
+    with fixture_recorder or nullcontext():
+        for i, article_info in enumerate(articles[:5], 1):
+            print(f"[{i}/{len(articles)}] 正在爬取: {article_info['title']}")
         
-        # 调用进度回调
-        if progress_callback:
-            progress_callback(
-                total=success_count + failed_count + duplicate_count,
-                success=success_count,
-                failed=failed_count,
-                current=article_info['title']
-            )
+            # 调用进度回调
+            if progress_callback:
+                progress_callback(
+                    total=success_count + failed_count + duplicate_count,
+                    success=success_count,
+                    failed=failed_count,
+                    current=article_info['title']
+                )
         
-        article_content = gentle_scrape_content(article_info)
+            article_content = gentle_scrape_content(article_info, fixture_recorder=fixture_recorder)
         
-        if article_content.get('status') != 'failed':
-            # 检查重复
-            is_duplicate = False
-            if check_duplicate:
-                dup_result = repo.check_duplicate(
-                    article_content,
-                    check_url=True,
-                    check_title=True,
-                    check_similarity=False  # 可选：启用相似度检测
-                )
+            if article_content.get('status') != 'failed':
+                # 检查重复
+                is_duplicate = False
+                if check_duplicate:
+                    dup_result = repo.check_duplicate(
+                        article_content,
+                        check_url=True,
+                        check_title=True,
+                        check_similarity=False  # 可选：启用相似度检测
+                    )
                 
-                if dup_result['is_duplicate']:
-                    duplicate_count += 1
-                    dup_type = dup_result['duplicate_type']
+                    if dup_result['is_duplicate']:
+                        duplicate_count += 1
+                        dup_type = dup_result['duplicate_type']
                     
-                    if skip_duplicate:
-                        print(f"   ⏭️  跳过重复文档 (类型: {dup_type})")
-                        is_duplicate = True
-                    else:
-                        print(f"   🔄 将覆盖重复文档 (类型: {dup_type})")
+                        if skip_duplicate:
+                            print(f"   ⏭️  跳过重复文档 (类型: {dup_type})")
+                            is_duplicate = True
+                        else:
+                            print(f"   🔄 将覆盖重复文档 (类型: {dup_type})")
             
-            if not is_duplicate:
-                # 添加到待分析列表
-                if enable_analysis:
-                    articles_to_analyze.append(article_content)
-                else:
+                if not is_duplicate:
+                    if enable_analysis:
+                        mark_analysis_pending(article_content)
                     batch.append(article_content)
                 
-                # 达到批量大小时，进行分析和插入
-                if len(articles_to_analyze) >= batch_size or len(batch) >= batch_size:
-                    if enable_analysis and articles_to_analyze:
-                        print(f"\n   🤖 正在批量分析 {len(articles_to_analyze)} 篇文章...")
-                        
-                        # 使用 asyncio 运行批量分析
-                        try:
-                            # 修复：检查是否已有运行中的 loop
-                            try:
-                                loop = asyncio.get_event_loop()
-                            except RuntimeError:
-                                loop = asyncio.new_event_loop()
-                                asyncio.set_event_loop(loop)
-                                
-                            analyzed_articles = loop.run_until_complete(
-                                batch_analyze_articles(articles_to_analyze, max_concurrent=3)
-                            )
-                            
-                            # 统计成功分析的数量
-                            for article in analyzed_articles:
-                                if article.get('content_analysis', {}).get('analysis_success'):
-                                    analyzed_count += 1
-                            
-                            batch.extend(analyzed_articles)
-                            articles_to_analyze = []
-                            
-                            print(f"   分析完成，成功 {analyzed_count} 篇")
-                            
-                        except Exception as e:
-                            logger.error(f"   批量分析失败: {e}")
-                            # 即使分析失败，也保存原始数据
-                            batch.extend(articles_to_analyze)
-                            articles_to_analyze = []
-                    
-                    # 批量插入
-                    if batch:
-                        try:
-                            result = repo.bulk_create_documents(batch)
-                            success_count += result['success']
-                            failed_count += result['failed']
-                            print(f"   💾 批量保存: 成功 {result['success']} 篇")
-                            batch = []
-                        except Exception as e:
-                            logger.error(f"批量保存失败: {e}")
-                            failed_count += len(batch)
-                            batch = []
-        else:
-            failed_count += 1
+                    # 达到批量大小时立即写入，不等待分析
+                    if len(batch) >= batch_size:
+                        save_batch(batch)
+                        batch = []
+            else:
+                failed_count += 1
         
-        # 礼貌等待
-        time.sleep(random.uniform(MIN_SLEEP, MAX_SLEEP))
-    
-    # 4. 处理剩余的文章
-    if articles_to_analyze:
-        print(f"\n🤖 正在分析剩余 {len(articles_to_analyze)} 篇文章...")
-        try:
-            try:
-                loop = asyncio.get_event_loop()
-            except RuntimeError:
-                loop = asyncio.new_event_loop()
-                asyncio.set_event_loop(loop)
-                
-            analyzed_articles = loop.run_until_complete(
-                batch_analyze_articles(articles_to_analyze, max_concurrent=3)
-            )
-            
-            for article in analyzed_articles:
-                if article.get('content_analysis', {}).get('analysis_success'):
-                    analyzed_count += 1
-            
-            batch.extend(analyzed_articles)
-            print(f"分析完成")
-            
-        except Exception as e:
-            logger.error(f"批量分析失败: {e}")
-            batch.extend(articles_to_analyze)
-    
-    # 保存剩余的文章
+            # 礼貌等待
+            time.sleep(random.uniform(MIN_SLEEP, MAX_SLEEP))
+
+    if fixture_recorder:
+        print(f"\n🎞️  夹具已录制到 {fixture_recorder.path}")
+
+    # 4. 保存剩余的文章，等待分析队列处理完本次入队的文章
     if batch:
-        try:
-            result = repo.bulk_create_documents(batch)
-            success_count += result['success']
-            failed_count += result['failed']
-            print(f"   💾 批量保存: 成功 {result['success']} 篇")
-        except Exception as e:
-            logger.error(f"批量保存失败: {e}")
-            failed_count += len(batch)
-    
+        save_batch(batch)
+    
+    if analysis_worker:
+        if wait_for_analysis:
+            print(f"\n🤖 等待分析队列处理完成...")
+        analysis_report = analysis_worker.stop(drain=wait_for_analysis)
+        analyzed_count = analysis_report.get('analyzed', 0)
+        queue_report = {**analysis_report, **get_analysis_queue().stats()}
+        save_keyword_corpus()
+    else:
+        queue_report = None
+
     # 5. 显示统计信息
     print("\n" + "=" * 60)
     print("爬取完成")
@@ -782,6 +761,41 @@ def scrape_all_articles_to_es(
         print(f"⏭️  重复: {duplicate_count} 篇")
     if enable_analysis:
         print(f"🤖 已分析: {analyzed_count} 篇")
+    if queue_report:
+        print(f"📥 分析队列: 本次处理 {queue_report.get('processed', 0)} 篇，写回 {queue_report.get('updated', 0)} 篇，"
+              f"剩余 {queue_report['pending'] + queue_report['leased']} 篇，失败 {queue_report['failed']} 篇")
+    cache_report = None
+    if analysis_cache:
+        cache_report = diff_stats(cache_stats_before, analysis_cache.stats())
+        print(f"🗃️  分析缓存: 命中 {cache_report['hits']} / 未命中 {cache_report['misses']} "
+              f"(命中率 {cache_report['hit_rate'] * 100:.1f}%)，"
+              f"节省 LLM 耗时 {cache_report['saved_latency_s']}s，约 {cache_report['saved_tokens']} tokens")
+    triage_report = None
+    llm_report = None
+    if enable_analysis:
+        triage_report = diff_triage_stats(triage_before, triage_stats())
+        if triage_report["llm_calls_avoided"]:
+            print(f"🧹 本地分流: LLM 分析 {triage_report['llm']} 篇 / 仅本地分析 {triage_report['local']} 篇 / "
+                  f"跳过 {triage_report['skip']} 篇，避免 {triage_report['llm_calls_avoided']} 次 LLM 分析")
+        for name, limiter in diff_concurrency_stats(concurrency_before, concurrency_stats()).items():
+            print(f"🚦 LLM 并发 [{name}]: 当前上限 {limiter['limit']}，"
+                  f"上调 {limiter['increases']} 次 / 退避 {limiter['decreases']} 次，"
+                  f"延迟基线 {limiter['latency_baseline_ms']}ms")
+        structured = diff_structured_output_stats(structured_before, structured_output_stats())
+        if structured["requests"]:
+            print(f"🧩 结构化输出: 校验通过 {structured['completed']} / 本地修复 {structured['repaired']} / "
+                  f"偏离中止 {structured['violations']} / 重试 {structured['retries']} / 失败 {structured['failed']}，"
+                  f"失败尝试浪费约 {structured['wasted_tokens']} tokens")
+        resilience = diff_resilience_stats(resilience_before, resilience_stats())
+        if resilience["retries"] or resilience["hedges_sent"]:
+            print(f"🔁 LLM 重试 {resilience['retries']} 次，放弃 {resilience['gave_up']} 次；"
+                  f"对冲请求 {resilience['hedges_sent']} 次，其中 {resilience['hedges_won']} 次先返回")
+        llm_report = diff_llm_metrics(llm_metrics_before, llm_metrics())
+        for name, metrics in llm_report.items():
+            cost = f"，估算费用 {metrics['cost']:.4f}" if metrics["cost"] is not None else ""
+            print(f"📈 LLM 调用 [{name}]: {metrics['calls']} 次（失败 {metrics['errors']} / 重试 {metrics['retries']}），"
+                  f"首 token p95 {metrics['ttft_ms']['p95']}ms / 总耗时 p95 {metrics['latency_ms']['p95']}ms，"
+                  f"输入 {metrics['prompt_tokens']} / 输出 {metrics['completion_tokens']} tokens{cost}")
     
     try:
         total_count = repo.count()
@@ -831,7 +845,11 @@ def scrape_all_articles_to_es(
         "failed": failed_count,
         "duplicate": duplicate_count,
         "analyzed": analyzed_count,
-        "total": success_count + failed_count + duplicate_count
+        "total": success_count + failed_count + duplicate_count,
+        "analysis_cache": cache_report,
+        "triage": triage_report,
+        "analysis_queue": queue_report,
+        "llm_metrics": llm_report
     }
 
 if __name__ == "__main__":
@@ -0,0 +1,253 @@
+"""
+文章分析结果的持久化缓存（SQLite）
+同一篇文章出现在多个榜单、或重新爬取覆盖文档时，直接复用之前的 LLM 分析结果。
+
+缓存键 = sha256(规范化标题, 截断后的内容, 提示词版本, 模型)，提示词或模型变化时自动失效。
+支持 TTL 过期和按条目数的 LRU 淘汰，并统计命中率、节省的 LLM 耗时和 token。
+"""
+import hashlib
+import json
+import logging
+import os
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+from typing import Any, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS analysis_cache (
+    key TEXT PRIMARY KEY,
+    result TEXT NOT NULL,
+    created_at REAL NOT NULL,
+    last_access REAL NOT NULL,
+    latency_s REAL NOT NULL DEFAULT 0,
+    tokens INTEGER NOT NULL DEFAULT 0
+)
+"""
+
+
+def _normalize(text: str) -> str:
+    """全角转半角、合并空白、转小写，使排版差异不影响缓存键"""
+    text = unicodedata.normalize("NFKC", text or "")
+    return re.sub(r"\s+", " ", text).strip().lower()
+
+
+def make_cache_key(title: str, content: str, prompt_version: str, model: Optional[str]) -> str:
+    """
+    生成缓存键
+
+    Args:
+        title: 文章标题
+        content: 发送给 LLM 的（已截断的）文章内容
+        prompt_version: 提示词版本
+        model: 模型名称
+
+    Returns:
+        str: sha256 十六进制摘要
+    """
+    payload = "\x1f".join([_normalize(title), _normalize(content), prompt_version, model or ""])
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class AnalysisCache:
+    """SQLite 分析结果缓存（线程安全）"""
+
+    def __init__(
+        self,
+        path: str,
+        ttl_seconds: Optional[float] = 30 * 24 * 3600,
+        max_entries: Optional[int] = 50000,
+        evict_interval: int = 100,
+    ):
+        """
+        Args:
+            path: SQLite 文件路径（":memory:" 表示仅内存）
+            ttl_seconds: 条目有效期（秒），None 表示永不过期
+            max_entries: 最大条目数，超过后按最近访问时间淘汰，None 表示不限制
+            evict_interval: 每写入多少条执行一次淘汰
+        """
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.path = path
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.evict_interval = evict_interval
+
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(_SCHEMA)
+        self._conn.commit()
+
+        self._writes_since_evict = 0
+        self.hits = 0
+        self.misses = 0
+        self.saved_latency_s = 0.0
+        self.saved_tokens = 0
+
+    def get(self, key: str, *alternatives: str) -> Optional[Dict[str, Any]]:
+        """
+        读取缓存
+
+        Args:
+            key: 缓存键
+            *alternatives: 备选缓存键（如路由中其他提供商产生的结果），按顺序查找；整次查找只计一次命中或未命中
+
+        Returns:
+            dict: 缓存的分析结果，未命中或已过期时返回 None
+        """
+        keys = (key,) + alternatives
+        now = time.time()
+        with self._lock:
+            rows = {
+                row[0]: row for row in self._conn.execute(
+                    "SELECT key, result, created_at, latency_s, tokens FROM analysis_cache "
+                    f"WHERE key IN ({','.join('?' * len(keys))})",
+                    keys,
+                )
+            }
+            row = next((
+                rows[k] for k in keys
+                if k in rows and (self.ttl_seconds is None or now - rows[k][2] <= self.ttl_seconds)
+            ), None)
+            if row is None:
+                self.misses += 1
+                return None
+
+            self._conn.execute("UPDATE analysis_cache SET last_access = ? WHERE key = ?", (now, row[0]))
+            self._conn.commit()
+            self.hits += 1
+            self.saved_latency_s += row[3]
+            self.saved_tokens += row[4]
+        return json.loads(row[1])
+
+    def put(self, key: str, result: Dict[str, Any], latency_s: float = 0.0, tokens: int = 0) -> None:
+        """
+        写入缓存
+
+        Args:
+            key: 缓存键
+            result: 分析结果
+            latency_s: 本次 LLM 调用耗时（秒），命中时计入节省的耗时
+            tokens: 本次 LLM 调用消耗的 token 数，命中时计入节省的 token
+        """
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO analysis_cache (key, result, created_at, last_access, latency_s, tokens) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (key, json.dumps(result, ensure_ascii=False), now, now, latency_s, tokens),
+            )
+            self._writes_since_evict += 1
+            if self._writes_since_evict >= self.evict_interval:
+                self._evict(now)
+            self._conn.commit()
+
+    def evict(self) -> int:
+        """
+        立即删除过期条目并按容量淘汰
+
+        Returns:
+            int: 删除的条目数
+        """
+        with self._lock:
+            removed = self._evict(time.time())
+            self._conn.commit()
+        return removed
+
+    def _evict(self, now: float) -> int:
+        self._writes_since_evict = 0
+        removed = 0
+        if self.ttl_seconds is not None:
+            removed += self._conn.execute(
+                "DELETE FROM analysis_cache WHERE created_at < ?", (now - self.ttl_seconds,)
+            ).rowcount
+        if self.max_entries is not None:
+            removed += self._conn.execute(
+                "DELETE FROM analysis_cache WHERE key IN ("
+                "SELECT key FROM analysis_cache ORDER BY last_access DESC LIMIT -1 OFFSET ?)",
+                (self.max_entries,),
+            ).rowcount
+        if removed:
+            logger.info(f"分析缓存淘汰 {removed} 条")
+        return removed
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM analysis_cache").fetchone()[0]
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        缓存统计
+
+        Returns:
+            dict: hits / misses / hit_rate / saved_latency_s / saved_tokens
+        """
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "saved_latency_s": round(self.saved_latency_s, 2),
+            "saved_tokens": self.saved_tokens,
+        }
+
+    def close(self) -> None:
+        """关闭数据库连接"""
+        with self._lock:
+            self._conn.close()
+
+
+def diff_stats(before: Dict[str, Any], after: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    计算两次统计快照之间的增量（用于单次爬取报告）
+
+    Args:
+        before: 开始时的 stats()
+        after: 结束时的 stats()
+
+    Returns:
+        dict: 与 stats() 相同的字段
+    """
+    hits = after["hits"] - before["hits"]
+    misses = after["misses"] - before["misses"]
+    lookups = hits + misses
+    return {
+        "hits": hits,
+        "misses": misses,
+        "hit_rate": round(hits / lookups, 4) if lookups else 0.0,
+        "saved_latency_s": round(after["saved_latency_s"] - before["saved_latency_s"], 2),
+        "saved_tokens": after["saved_tokens"] - before["saved_tokens"],
+    }
+
+
+_cache: Optional[AnalysisCache] = None
+_cache_lock = threading.Lock()
+
+
+def get_analysis_cache() -> Optional[AnalysisCache]:
+    """
+    获取进程级共享的分析缓存
+
+    配置读取环境变量：ANALYSIS_CACHE（默认开启）、ANALYSIS_CACHE_PATH（默认 .cache/analysis_cache.sqlite3）、
+    ANALYSIS_CACHE_TTL_DAYS（默认 30）、ANALYSIS_CACHE_MAX_ENTRIES（默认 50000）
+
+    Returns:
+        AnalysisCache: 缓存实例，禁用时返回 None
+    """
+    global _cache
+    if os.getenv("ANALYSIS_CACHE", "1").lower() in ("0", "false", "no"):
+        return None
+    with _cache_lock:
+        if _cache is None:
+            _cache = AnalysisCache(
+                path=os.getenv("ANALYSIS_CACHE_PATH", os.path.join(".cache", "analysis_cache.sqlite3")),
+                ttl_seconds=float(os.getenv("ANALYSIS_CACHE_TTL_DAYS", "30")) * 24 * 3600,
+                max_entries=int(os.getenv("ANALYSIS_CACHE_MAX_ENTRIES", "50000")),
+            )
+        return _cache
@@ -0,0 +1,437 @@
+"""
+持久化分析队列
+爬虫提取出正文后立即写入 Elasticsearch（analysis_status 为 pending），同时把文章放入 SQLite 队列；
+后台分析线程从队列取出文章，经过本地分流和 LLM 分析后用批量局部更新写回 content_analysis。
+文章的可检索时间只取决于爬取速度，不再等待最慢的一次 LLM 调用。
+
+队列条目带租约：取出后 lease_s 秒内未确认的条目（进程崩溃、线程被中止）会被重新取出，
+分析失败的条目按指数退避延后重试（提供商故障期间不会在几秒内耗尽重试次数），
+重试 max_attempts 次后标记为 failed。
+"""
+import asyncio
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+from backend.agent.agent_content_keyword_analysis import _get_default_analysis_result, batch_analyze_articles
+from backend.agent.triage import DECISION_SKIP, triage_articles
+from backend.llm import close_providers
+
+logger = logging.getLogger(__name__)
+
+# 写入 Elasticsearch 的 analysis_status
+STATUS_PENDING = "pending"
+STATUS_DONE = "done"
+STATUS_SKIPPED = "skipped"
+STATUS_FAILED = "failed"
+
+# 随文章入队、分析时需要的字段
+QUEUED_FIELDS = ("title", "content", "category", "tech_detection")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS analysis_queue (
+    doc_id TEXT PRIMARY KEY,
+    payload TEXT NOT NULL,
+    status TEXT NOT NULL DEFAULT 'pending',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    enqueued_at REAL NOT NULL,
+    leased_until REAL NOT NULL DEFAULT 0,
+    last_error TEXT
+)
+"""
+
+
+class AnalysisQueue:
+    """SQLite 持久化分析队列（线程安全）"""
+
+    def __init__(self, path: str, max_attempts: int = 3, retry_base_s: float = 30.0, retry_max_s: float = 900.0):
+        """
+        Args:
+            path: SQLite 文件路径（":memory:" 表示仅内存）
+            max_attempts: 每篇文章最多分析次数，超过后标记为 failed
+            retry_base_s: 第一次失败后的重试等待（秒），之后每次失败翻倍
+            retry_max_s: 重试等待的上限（秒）
+        """
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.path = path
+        self.max_attempts = max_attempts
+        self.retry_base_s = retry_base_s
+        self.retry_max_s = retry_max_s
+
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(_SCHEMA)
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_analysis_queue_status ON analysis_queue (status, enqueued_at)")
+        self._conn.commit()
+
+    def enqueue(self, items: List[Tuple[str, Dict[str, Any]]]) -> int:
+        """
+        入队（同一文档重复入队时覆盖内容并重置为待分析）
+
+        Args:
+            items: (文档 ID, 文章) 列表，只保存 QUEUED_FIELDS 中的字段
+
+        Returns:
+            int: 入队条数
+        """
+        now = time.time()
+        rows = [
+            (doc_id, json.dumps({k: article[k] for k in QUEUED_FIELDS if k in article}, ensure_ascii=False), now)
+            for doc_id, article in items
+        ]
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO analysis_queue (doc_id, payload, status, attempts, enqueued_at) "
+                "VALUES (?, ?, 'pending', 0, ?)",
+                rows,
+            )
+            self._conn.commit()
+        return len(rows)
+
+    def claim(self, limit: int, lease_s: float = 600.0) -> List[Tuple[str, Dict[str, Any]]]:
+        """
+        按入队顺序取出待分析的文章，并在 lease_s 秒内不再分配给其他消费者（退避等待中的条目不取出）
+
+        租约到期未确认的条目（如分析时进程崩溃）会被重新取出，但取出次数达到 max_attempts 后不再取出，
+        由 fail_exhausted_leases() 标记为失败
+
+        Args:
+            limit: 最多取出的条数
+            lease_s: 租约时长（秒），到期未确认的条目可以被重新取出
+
+        Returns:
+            List[Tuple[str, Dict]]: (文档 ID, 文章) 列表
+        """
+        now = time.time()
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT doc_id, payload FROM analysis_queue "
+                "WHERE (status = 'pending' AND leased_until <= ?) "
+                "OR (status = 'leased' AND leased_until < ? AND attempts < ?) "
+                "ORDER BY enqueued_at LIMIT ?",
+                (now, now, self.max_attempts, limit),
+            ).fetchall()
+            self._conn.executemany(
+                "UPDATE analysis_queue SET status = 'leased', leased_until = ?, attempts = attempts + 1 WHERE doc_id = ?",
+                [(now + lease_s, doc_id) for doc_id, _ in rows],
+            )
+            self._conn.commit()
+        return [(doc_id, json.loads(payload)) for doc_id, payload in rows]
+
+    def fail_exhausted_leases(self) -> List[str]:
+        """
+        把租约到期且取出次数已达到 max_attempts 的条目标记为失败（每次分析都导致进程崩溃或卡死的文章）
+
+        Returns:
+            List[str]: 新标记为失败的文档 ID
+        """
+        now = time.time()
+        with self._lock:
+            doc_ids = [row[0] for row in self._conn.execute(
+                "SELECT doc_id FROM analysis_queue WHERE status = 'leased' AND leased_until < ? AND attempts >= ?",
+                (now, self.max_attempts),
+            )]
+            self._conn.executemany(
+                "UPDATE analysis_queue SET status = 'failed', leased_until = 0, last_error = ? WHERE doc_id = ?",
+                [(f"租约到期未确认 {self.max_attempts} 次", doc_id) for doc_id in doc_ids],
+            )
+            self._conn.commit()
+        if doc_ids:
+            logger.warning(f"{len(doc_ids)} 篇文章多次分析未完成（租约到期），标记为失败: {doc_ids[:10]}")
+        return doc_ids
+
+    def complete(self, doc_ids: List[str]) -> None:
+        """确认已完成（从队列删除）"""
+        with self._lock:
+            self._conn.executemany("DELETE FROM analysis_queue WHERE doc_id = ?", [(d,) for d in doc_ids])
+            self._conn.commit()
+
+    def fail(self, doc_id: str, error: str) -> bool:
+        """
+        记录一次失败，未用尽次数时按指数退避延后重试（pending 条目的 leased_until 为最早重试时间）
+
+        Args:
+            doc_id: 文档 ID
+            error: 错误信息
+
+        Returns:
+            bool: 是否已达到最多分析次数（标记为 failed，不再重试）
+        """
+        with self._lock:
+            row = self._conn.execute("SELECT attempts FROM analysis_queue WHERE doc_id = ?", (doc_id,)).fetchone()
+            attempts = row[0] if row is not None else 0
+            exhausted = row is not None and attempts >= self.max_attempts
+            retry_at = 0 if exhausted else time.time() + self.retry_delay(attempts)
+            self._conn.execute(
+                "UPDATE analysis_queue SET status = ?, leased_until = ?, last_error = ? WHERE doc_id = ?",
+                ("failed" if exhausted else "pending", retry_at, error, doc_id),
+            )
+            self._conn.commit()
+        return exhausted
+
+    def retry_delay(self, attempts: int) -> float:
+        """第 attempts 次失败后的重试等待（秒）：retry_base_s × 2^(attempts-1)，不超过 retry_max_s"""
+        return min(self.retry_base_s * (2 ** max(attempts - 1, 0)), self.retry_max_s)
+
+    def stats(self) -> Dict[str, int]:
+        """
+        队列统计
+
+        Returns:
+            dict: pending（含退避等待中的条目）/ leased / failed 条数
+        """
+        with self._lock:
+            rows = self._conn.execute("SELECT status, COUNT(*) FROM analysis_queue GROUP BY status").fetchall()
+        counts = {"pending": 0, "leased": 0, "failed": 0}
+        counts.update(dict(rows))
+        return counts
+
+    def __len__(self) -> int:
+        """未完成（待分析和已取出）的条数"""
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM analysis_queue WHERE status != 'failed'").fetchone()[0]
+
+    def close(self) -> None:
+        """关闭数据库连接"""
+        with self._lock:
+            self._conn.close()
+
+
+_queue: Optional[AnalysisQueue] = None
+_queue_lock = threading.Lock()
+
+
+def get_analysis_queue() -> AnalysisQueue:
+    """
+    获取进程级共享的分析队列
+
+    配置读取环境变量：ANALYSIS_QUEUE_PATH（默认 .cache/analysis_queue.sqlite3）、
+    ANALYSIS_QUEUE_MAX_ATTEMPTS（默认 3）、ANALYSIS_QUEUE_RETRY_BASE（秒，默认 30）、
+    ANALYSIS_QUEUE_RETRY_MAX（秒，默认 900）
+    """
+    global _queue
+    with _queue_lock:
+        if _queue is None:
+            _queue = AnalysisQueue(
+                path=os.getenv("ANALYSIS_QUEUE_PATH", os.path.join(".cache", "analysis_queue.sqlite3")),
+                max_attempts=int(os.getenv("ANALYSIS_QUEUE_MAX_ATTEMPTS", "3")),
+                retry_base_s=float(os.getenv("ANALYSIS_QUEUE_RETRY_BASE", "30")),
+                retry_max_s=float(os.getenv("ANALYSIS_QUEUE_RETRY_MAX", "900")),
+            )
+        return _queue
+
+
+def mark_analysis_pending(article: Dict[str, Any]) -> Dict[str, Any]:
+    """写入 ES 前标记为待分析：带上默认（analysis_success 为 False）的分析结果"""
+    article.setdefault("content_analysis", _get_default_analysis_result())
+    article["analysis_status"] = STATUS_PENDING
+    return article
+
+
+async def triage_and_analyze(
+    articles: List[Dict[str, Any]],
+    max_concurrent: Optional[int] = None
+) -> List[Dict[str, Any]]:
+    """
+    本地分流后只把需要完整分析的文章交给 LLM，其余文章已带上本地分析结果（或被跳过）
+
+    Args:
+        articles: 文章列表
+        max_concurrent: 本批次的最大并发请求数（见 batch_analyze_articles）
+
+    Returns:
+        List[Dict]: 原文章列表（已写入 content_analysis 和 triage）
+    """
+    llm_articles = triage_articles(articles)
+    if llm_articles:
+        await batch_analyze_articles(llm_articles, max_concurrent=max_concurrent)
+    return articles
+
+
+async def process_queue_batch(repository, queue: AnalysisQueue, batch_size: int = 8, lease_s: float = 600.0) -> Dict[str, int]:
+    """
+    从队列取出一批文章，分析后批量局部更新回 Elasticsearch
+
+    Args:
+        repository: ArticleRepository
+        queue: 分析队列
+        batch_size: 每批条数
+        lease_s: 租约时长（秒）
+
+    Returns:
+        dict: processed（取出）/ analyzed（分析成功）/ skipped（分流跳过）/ retried（失败待重试）/
+        failed（重试次数用尽）/ updated（写回成功）
+    """
+    report = {"processed": 0, "analyzed": 0, "skipped": 0, "retried": 0, "failed": 0, "updated": 0}
+    abandoned = queue.fail_exhausted_leases()
+    if abandoned:
+        report["failed"] += len(abandoned)
+        result = repository.bulk_update_documents({doc_id: {"analysis_status": STATUS_FAILED} for doc_id in abandoned})
+        report["updated"] += result["success"]
+    items = queue.claim(batch_size, lease_s=lease_s)
+    if not items:
+        return report
+    report["processed"] = len(items)
+
+    articles = [article for _, article in items]
+    await triage_and_analyze(articles)
+
+    updates: Dict[str, Dict[str, Any]] = {}
+    done: List[str] = []
+    for (doc_id, _), article in zip(items, articles):
+        analysis = article.get("content_analysis") or {}
+        skipped = article.get("triage", {}).get("decision") == DECISION_SKIP
+        if analysis.get("analysis_success") or skipped:
+            status = STATUS_SKIPPED if skipped else STATUS_DONE
+            report["skipped" if skipped else "analyzed"] += 1
+        elif queue.fail(doc_id, "分析失败"):
+            status = STATUS_FAILED
+            report["failed"] += 1
+        else:
+            report["retried"] += 1
+            continue
+        updates[doc_id] = {
+            "content_analysis": analysis,
+            "analysis_status": status,
+            **{k: article[k] for k in ("triage", "tech_detection") if k in article},
+        }
+        if status != STATUS_FAILED:
+            done.append(doc_id)
+
+    if updates:
+        result = repository.bulk_update_documents(updates)
+        report["updated"] += result["success"]
+        failed_ids = {
+            (item.get("update") or {}).get("_id") for item in result.get("failed_items", [])
+        }
+        # 写回失败的文章留在队列中，租约到期后重新分析
+        done = [doc_id for doc_id in done if doc_id not in failed_ids]
+    queue.complete(done)
+    return report
+
+
+def _merge_reports(total: Dict[str, int], report: Dict[str, int]) -> None:
+    for key, value in report.items():
+        total[key] = total.get(key, 0) + value
+
+
+async def drain_analysis_queue(
+    repository,
+    queue: Optional[AnalysisQueue] = None,
+    batch_size: int = 8,
+    max_batches: Optional[int] = None
+) -> Dict[str, int]:
+    """
+    处理队列直到没有可取出的文章
+
+    Args:
+        repository: ArticleRepository
+        queue: 分析队列（默认进程级共享队列）
+        batch_size: 每批条数
+        max_batches: 最多处理的批数
+
+    Returns:
+        dict: 各批统计之和（见 process_queue_batch）
+    """
+    queue = queue if queue is not None else get_analysis_queue()
+    total: Dict[str, int] = {}
+    batches = 0
+    while max_batches is None or batches < max_batches:
+        report = await process_queue_batch(repository, queue, batch_size=batch_size)
+        if not report["processed"]:
+            break
+        _merge_reports(total, report)
+        batches += 1
+    return total
+
+
+class AnalysisWorker:
+    """后台分析线程：在独立事件循环中持续处理队列，爬虫入队后调用 notify() 唤醒"""
+
+    def __init__(
+        self,
+        repository,
+        queue: Optional[AnalysisQueue] = None,
+        batch_size: int = 8,
+        poll_interval: float = 2.0
+    ):
+        """
+        Args:
+            repository: ArticleRepository
+            queue: 分析队列（默认进程级共享队列）
+            batch_size: 每批条数
+            poll_interval: 队列为空时的等待时间（秒）
+        """
+        self.repository = repository
+        self.queue = queue if queue is not None else get_analysis_queue()
+        self.batch_size = batch_size
+        self.poll_interval = poll_interval
+        self.report: Dict[str, int] = {}
+        self._wakeup = threading.Event()
+        self._stopping = threading.Event()
+        self._abort = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> "AnalysisWorker":
+        """启动后台线程"""
+        self._thread = threading.Thread(target=self._run, name="analysis-worker", daemon=True)
+        self._thread.start()
+        return self
+
+    def notify(self) -> None:
+        """有新文章入队"""
+        self._wakeup.set()
+
+    def stop(self, drain: bool = True, timeout: Optional[float] = None) -> Dict[str, int]:
+        """
+        停止后台线程
+
+        Args:
+            drain: 是否先处理完队列中剩余的文章（False 时处理完当前批次即停止，剩余文章留在队列中）
+            timeout: 最长等待时间（秒）
+
+        Returns:
+            dict: 本线程处理的统计（见 process_queue_batch）
+        """
+        if not drain:
+            self._abort.set()
+        self._stopping.set()
+        self._wakeup.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+        return dict(self.report)
+
+    def _run(self) -> None:
+        loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(loop)
+        try:
+            loop.run_until_complete(self._main())
+        finally:
+            try:
+                loop.run_until_complete(close_providers())
+            finally:
+                loop.close()
+
+    async def _main(self) -> None:
+        while not self._abort.is_set():
+            self._wakeup.clear()
+            # 先读取停止标志再取队列：停止前入队的文章一定会在退出前被处理
+            stopping = self._stopping.is_set()
+            try:
+                report = await process_queue_batch(self.repository, self.queue, batch_size=self.batch_size)
+            except Exception as e:
+                logger.error(f"分析队列处理失败: {e}")
+                report = {"processed": 0}
+            if report["processed"]:
+                _merge_reports(self.report, report)
+                continue
+            if stopping:
+                break
+            await asyncio.get_running_loop().run_in_executor(None, self._wakeup.wait, self.poll_interval)
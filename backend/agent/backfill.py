@@ -0,0 +1,236 @@
+"""
+分析结果回填
+content_analysis.analysis_success 为 false 或没有分析结果的文章不会再被自动分析。回填任务用切片滚动（sliced scroll）
+并行遍历这些文章，经过与爬虫相同的分流和 LLM 分析路径重新分析，再批量局部更新回 Elasticsearch。
+
+断点续跑：
+- 每篇处理过的文章写入 analysis_backfill（本次运行 ID），重新查询时排除，因此中断后重跑不会重复分析
+- 检查点文件记录运行 ID、切片数、已完成的切片和累计统计，每页处理完即写入
+"""
+import asyncio
+import json
+import logging
+import os
+import time
+import uuid
+from typing import Any, Dict, List, Optional, Tuple
+
+from backend.agent.analysis_queue import (
+    QUEUED_FIELDS,
+    STATUS_DONE,
+    STATUS_FAILED,
+    STATUS_PENDING,
+    STATUS_SKIPPED,
+    triage_and_analyze,
+)
+from backend.agent.triage import DECISION_SKIP
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CHECKPOINT_PATH = os.path.join("batch_jobs", "backfill.checkpoint.json")
+
+
+def backfill_query(run_id: Optional[str] = None, include_pending: bool = False) -> Dict[str, Any]:
+    """
+    需要回填的文章：分析未成功（或没有分析结果），且未被分流跳过
+
+    Args:
+        run_id: 排除本次运行已经处理过的文章
+        include_pending: 是否包含分析队列中尚未处理的文章（analysis_status 为 pending）
+
+    Returns:
+        dict: ES 查询条件
+    """
+    excluded_status = [STATUS_SKIPPED] if include_pending else [STATUS_SKIPPED, STATUS_PENDING]
+    must_not: List[Dict[str, Any]] = [
+        {"term": {"content_analysis.analysis_success": True}},
+        {"terms": {"analysis_status": excluded_status}},
+    ]
+    if run_id:
+        must_not.append({"term": {"analysis_backfill": run_id}})
+    return {"bool": {"must_not": must_not}}
+
+
+class BackfillCheckpoint:
+    """回填检查点（JSON 文件）"""
+
+    def __init__(self, path: str, slices: int):
+        """
+        Args:
+            path: 检查点文件路径，存在且未完成时继续上次运行，否则开始新的运行
+            slices: 切片数（继续运行时必须与上次相同）
+        """
+        self.path = path
+        data = None
+        if os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            if len(data["completed_slices"]) >= data["slices"]:
+                data = None
+            elif data["slices"] != slices:
+                raise ValueError(f"检查点 {path} 使用 {data['slices']} 个切片，与本次的 {slices} 个不一致")
+        if data is None:
+            data = {
+                "run_id": uuid.uuid4().hex[:12],
+                "slices": slices,
+                "completed_slices": [],
+                "report": {},
+                "started_at": time.time(),
+            }
+        self.data = data
+
+    @property
+    def run_id(self) -> str:
+        return self.data["run_id"]
+
+    @property
+    def finished(self) -> bool:
+        return len(self.data["completed_slices"]) >= self.data["slices"]
+
+    def is_completed(self, slice_id: int) -> bool:
+        return slice_id in self.data["completed_slices"]
+
+    def record_page(self, report: Dict[str, int]) -> None:
+        """累计一页的统计并写入"""
+        total = self.data["report"]
+        for key, value in report.items():
+            total[key] = total.get(key, 0) + value
+        self.save()
+
+    def complete_slice(self, slice_id: int) -> None:
+        """标记切片完成并写入"""
+        if slice_id not in self.data["completed_slices"]:
+            self.data["completed_slices"].append(slice_id)
+        self.save()
+
+    def save(self) -> None:
+        """原子写入（先写临时文件再替换）"""
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        self.data["updated_at"] = time.time()
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self.data, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, self.path)
+
+
+async def backfill_page(
+    repository,
+    items: List[Tuple[str, Dict[str, Any]]],
+    run_id: str,
+    max_concurrent: Optional[int] = None
+) -> Dict[str, int]:
+    """
+    重新分析一页文章并批量局部更新回 ES
+
+    Args:
+        repository: ArticleRepository
+        items: (文档 ID, 文档) 列表
+        run_id: 回填运行 ID（写入 analysis_backfill）
+        max_concurrent: 本页的最大并发请求数
+
+    Returns:
+        dict: scanned / analyzed / skipped / failed / updated
+    """
+    articles = [{k: doc[k] for k in QUEUED_FIELDS if k in doc} for _, doc in items]
+    await triage_and_analyze(articles, max_concurrent=max_concurrent)
+
+    report = {"scanned": len(items), "analyzed": 0, "skipped": 0, "failed": 0, "updated": 0}
+    updates: Dict[str, Dict[str, Any]] = {}
+    for (doc_id, _), article in zip(items, articles):
+        analysis = article.get("content_analysis") or {}
+        if article.get("triage", {}).get("decision") == DECISION_SKIP:
+            status = STATUS_SKIPPED
+            report["skipped"] += 1
+        elif analysis.get("analysis_success"):
+            status = STATUS_DONE
+            report["analyzed"] += 1
+        else:
+            status = STATUS_FAILED
+            report["failed"] += 1
+        updates[doc_id] = {
+            "content_analysis": analysis,
+            "analysis_status": status,
+            "analysis_backfill": run_id,
+            **{k: article[k] for k in ("triage", "tech_detection") if k in article},
+        }
+
+    loop = asyncio.get_running_loop()
+    result = await loop.run_in_executor(None, repository.bulk_update_documents, updates)
+    report["updated"] = result["success"]
+    return report
+
+
+async def _run_slice(
+    repository,
+    checkpoint: BackfillCheckpoint,
+    slice_id: int,
+    query: Dict[str, Any],
+    page_size: int,
+    max_concurrent: Optional[int]
+) -> None:
+    loop = asyncio.get_running_loop()
+    pages = repository.scroll_documents(
+        query=query,
+        size=page_size,
+        slice_id=slice_id,
+        max_slices=checkpoint.data["slices"],
+        source=list(QUEUED_FIELDS),
+    )
+    try:
+        while True:
+            # 滚动查询是同步调用，放到线程池中避免阻塞其他切片
+            items = await loop.run_in_executor(None, next, pages, None)
+            if items is None:
+                break
+            report = await backfill_page(repository, items, checkpoint.run_id, max_concurrent=max_concurrent)
+            checkpoint.record_page(report)
+            logger.info(
+                f"回填切片 {slice_id}: 本页 {report['scanned']} 篇，成功 {report['analyzed']}，"
+                f"失败 {report['failed']}，写回 {report['updated']}"
+            )
+    finally:
+        await loop.run_in_executor(None, pages.close)
+    checkpoint.complete_slice(slice_id)
+
+
+async def run_backfill(
+    repository,
+    checkpoint_path: str = DEFAULT_CHECKPOINT_PATH,
+    slices: int = 4,
+    page_size: int = 50,
+    max_concurrent: Optional[int] = None,
+    include_pending: bool = False
+) -> Dict[str, Any]:
+    """
+    回填分析结果（检查点存在时从中断处继续）
+
+    Args:
+        repository: ArticleRepository
+        checkpoint_path: 检查点文件路径
+        slices: 并行切片数
+        page_size: 每页篇数（每页分析后写回一次）
+        max_concurrent: 每个切片的最大并发 LLM 请求数（总并发不超过 slices × max_concurrent，
+            同时受提供商自适应并发限流器约束）
+        include_pending: 是否包含分析队列中尚未处理的文章
+
+    Returns:
+        dict: run_id / completed（是否全部切片完成）/ scanned / analyzed / skipped / failed / updated
+    """
+    checkpoint = BackfillCheckpoint(checkpoint_path, slices)
+    checkpoint.save()
+    query = backfill_query(checkpoint.run_id, include_pending=include_pending)
+
+    pending_slices = [s for s in range(slices) if not checkpoint.is_completed(s)]
+    if len(pending_slices) < slices:
+        logger.info(f"从检查点继续回填 {checkpoint.run_id}：剩余切片 {pending_slices}")
+    results = await asyncio.gather(
+        *(_run_slice(repository, checkpoint, s, query, page_size, max_concurrent) for s in pending_slices),
+        return_exceptions=True,
+    )
+    for slice_id, result in zip(pending_slices, results):
+        if isinstance(result, Exception):
+            logger.error(f"回填切片 {slice_id} 中断: {result}")
+
+    report = {"scanned": 0, "analyzed": 0, "skipped": 0, "failed": 0, "updated": 0}
+    report.update(checkpoint.data["report"])
+    return {"run_id": checkpoint.run_id, "completed": checkpoint.finished, **report}
@@ -0,0 +1,268 @@
+"""
+离线批处理分析
+大批量回填不走在线分析路径，而是按批处理价格和吞吐运行：
+1. 从 Elasticsearch 取出尚未成功分析的文章，写成 Batch API 格式的 JSONL 请求文件（custom_id 为文档 ID）
+2. 提交批处理任务并轮询
+3. 解析结果文件，批量局部更新回 Elasticsearch（写 content_analysis，analysis_status 置为 done），
+   并从分析队列中移除这些文章，后台分析线程不会再重复分析
+
+提交后在请求文件旁写入任务清单（<请求文件>.job.json），进程中断后可以用 resume_batch_analysis() 继续等待和导入。
+"""
+import asyncio
+import json
+import logging
+import os
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+from backend.agent.agent_content_keyword_analysis import (
+    ANALYSIS_CONTEXT_TOKENS,
+    build_analysis_messages,
+    parse_analysis_response,
+    stamp_analysis,
+)
+from backend.agent.analysis_queue import STATUS_DONE, get_analysis_queue
+from backend.agent.backfill import backfill_query
+from backend.agent.context_builder import build_analysis_context
+from backend.llm.batch import BatchClient, make_batch_request, parse_batch_output, wait_for_batch, write_batch_file
+
+logger = logging.getLogger(__name__)
+
+# 尚未成功分析的文章（包括没有 content_analysis 字段的文档），与回填相同：排除分流跳过的文章和
+# 分析队列中尚未处理的文章（analysis_status 为 skipped / pending）
+PENDING_ANALYSIS_QUERY = backfill_query()
+
+
+def fetch_pending_articles(repository, limit: int = 1000) -> List[Tuple[str, Dict[str, Any]]]:
+    """
+    取出尚未成功分析的文章
+
+    Args:
+        repository: ArticleRepository
+        limit: 最多取出的篇数
+
+    Returns:
+        List[Tuple[str, Dict]]: (文档 ID, 文档) 列表
+    """
+    result = repository.search(query=PENDING_ANALYSIS_QUERY, size=limit)
+    return [(hit["_id"], hit["_source"]) for hit in result.get("hits", {}).get("hits", [])]
+
+
+def build_analysis_requests(
+    articles: List[Tuple[str, Dict[str, Any]]],
+    model: str,
+    max_keywords: int = 10,
+    max_topics: int = 5
+) -> List[Dict[str, Any]]:
+    """
+    为文章构建批处理请求（与在线单篇分析使用相同的提示词和正文预算）
+
+    Args:
+        articles: (文档 ID, 文档) 列表，缺少标题或正文的文章跳过
+        model: 模型名称（批处理接口要求显式指定）
+        max_keywords: 最大关键词数量
+        max_topics: 最大主题数量
+
+    Returns:
+        List[Dict]: 请求行
+    """
+    requests = []
+    for doc_id, doc in articles:
+        title = doc.get("title") or ""
+        content = doc.get("content") or ""
+        if not title or not content:
+            continue
+        context = build_analysis_context(title, content, ANALYSIS_CONTEXT_TOKENS)
+        requests.append(make_batch_request(doc_id, {
+            "model": model,
+            "messages": build_analysis_messages(title, context, max_keywords, max_topics),
+            "temperature": 0.3,
+            "max_tokens": 1000,
+        }))
+    return requests
+
+
+def parse_analysis_results(
+    output_text: str,
+    max_keywords: int = 10,
+    max_topics: int = 5,
+    provider: Optional[str] = None,
+    model: Optional[str] = None
+) -> Tuple[Dict[str, Dict[str, Any]], Dict[str, str]]:
+    """
+    解析结果文件中的分析结果
+
+    Args:
+        output_text: 结果文件内容
+        max_keywords: 最大关键词数量
+        max_topics: 最大主题数量
+        provider: 执行任务的提供商（与 model 一起写入 analysis_version / analysis_model）
+        model: 请求中的模型名称（不指定时不写入版本）
+
+    Returns:
+        Tuple[Dict[str, Dict], Dict[str, str]]: (文档 ID → 标准化后的分析结果, 文档 ID → 错误信息)
+    """
+    outputs, errors = parse_batch_output(output_text)
+    results = {}
+    for doc_id, content in outputs.items():
+        try:
+            results[doc_id] = parse_analysis_response(content, max_keywords, max_topics)
+        except ValueError as e:
+            errors[doc_id] = f"JSON 解析失败: {e}"
+            continue
+        if model:
+            stamp_analysis(results[doc_id], provider, model, max_keywords, max_topics)
+    return results, errors
+
+
+def ingest_analysis_results(repository, results: Dict[str, Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    把分析结果批量局部更新回 Elasticsearch（analysis_status 置为 done），写回成功的文章从分析队列中移除
+
+    Args:
+        repository: ArticleRepository
+        results: 文档 ID → 分析结果
+
+    Returns:
+        dict: bulk_update_documents 的结果统计
+    """
+    result = repository.bulk_update_documents({
+        doc_id: {"content_analysis": analysis, "analysis_status": STATUS_DONE}
+        for doc_id, analysis in results.items()
+    })
+    failed_ids = {(item.get("update") or {}).get("_id") for item in result.get("failed_items", [])}
+    get_analysis_queue().complete([doc_id for doc_id in results if doc_id not in failed_ids])
+    return result
+
+
+def job_manifest_path(request_file: str) -> str:
+    """请求文件对应的任务清单路径"""
+    return f"{request_file}.job.json"
+
+
+def _save_manifest(request_file: str, manifest: Dict[str, Any]) -> None:
+    with open(job_manifest_path(request_file), "w", encoding="utf-8") as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2)
+
+
+def load_manifest(request_file: str) -> Dict[str, Any]:
+    """读取任务清单"""
+    with open(job_manifest_path(request_file), "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def prepare_batch_analysis(
+    repository,
+    request_file: str,
+    model: str,
+    limit: int = 1000
+) -> int:
+    """
+    把待分析文章写成请求文件
+
+    Args:
+        repository: ArticleRepository
+        request_file: 请求文件路径
+        model: 模型名称
+        limit: 最多包含的篇数
+
+    Returns:
+        int: 请求数
+    """
+    articles = fetch_pending_articles(repository, limit=limit)
+    count = write_batch_file(request_file, build_analysis_requests(articles, model))
+    logger.info(f"批处理请求文件已写入: {request_file}（{count} 篇）")
+    return count
+
+
+async def resume_batch_analysis(
+    repository,
+    client: BatchClient,
+    request_file: str,
+    poll_interval: float = 30.0,
+    timeout: Optional[float] = None
+) -> Dict[str, Any]:
+    """
+    等待已提交的任务完成并导入结果
+
+    Args:
+        repository: ArticleRepository
+        client: 批处理客户端（需要能查询到清单中的任务）
+        request_file: 请求文件路径（任务清单在其旁边）
+        poll_interval: 轮询间隔（秒）
+        timeout: 最长等待时间（秒）
+
+    Returns:
+        dict: batch_id / status / requests / succeeded / failed（生成失败或无法解析）/ updated（写回 ES 成功的篇数）
+    """
+    manifest = load_manifest(request_file)
+    batch_id = manifest["batch_id"]
+    batch = await wait_for_batch(client, batch_id, poll_interval=poll_interval, timeout=timeout)
+    report = {
+        "batch_id": batch_id,
+        "status": batch.get("status"),
+        "requests": manifest.get("requests", 0),
+        "succeeded": 0,
+        "failed": 0,
+        "updated": 0,
+    }
+    if batch.get("status") != "completed":
+        logger.error(f"批处理任务 {batch_id} 未完成: {batch.get('status')}")
+        report["failed"] = report["requests"]
+    else:
+        results, errors = parse_analysis_results(
+            await client.download(batch_id), provider=manifest.get("provider"), model=manifest.get("model")
+        )
+        for doc_id, error in list(errors.items())[:10]:
+            logger.warning(f"批处理分析失败 [{doc_id}]: {error}")
+        # 同步的 ES 批量写入和队列更新放到线程池，不阻塞事件循环
+        loop = asyncio.get_running_loop()
+        ingest = await loop.run_in_executor(None, ingest_analysis_results, repository, results)
+        report.update(succeeded=len(results), failed=len(errors), updated=ingest["success"])
+
+    manifest.update(status=report["status"], finished_at=time.time(), report=report)
+    _save_manifest(request_file, manifest)
+    return report
+
+
+async def run_batch_analysis(
+    repository,
+    client: BatchClient,
+    request_file: str,
+    model: str,
+    limit: int = 1000,
+    poll_interval: float = 30.0,
+    timeout: Optional[float] = None,
+    provider: Optional[str] = None
+) -> Dict[str, Any]:
+    """
+    完整流程：写请求文件 → 提交 → 轮询 → 导入结果
+
+    Args:
+        repository: ArticleRepository
+        client: 批处理客户端
+        request_file: 请求文件路径
+        model: 模型名称
+        provider: 执行任务的提供商（记录在任务清单中，用于写入分析版本；默认为默认提供商）
+        limit: 最多包含的篇数
+        poll_interval: 轮询间隔（秒）
+        timeout: 最长等待时间（秒），超时后任务继续在服务端运行，可用 resume_batch_analysis() 继续
+
+    Returns:
+        dict: 同 resume_batch_analysis()；没有待分析文章时 requests 为 0
+    """
+    count = prepare_batch_analysis(repository, request_file, model, limit=limit)
+    if not count:
+        return {"batch_id": None, "status": None, "requests": 0, "succeeded": 0, "failed": 0, "updated": 0}
+
+    batch_id = await client.submit(request_file)
+    _save_manifest(request_file, {
+        "batch_id": batch_id,
+        "request_file": os.path.abspath(request_file),
+        "model": model,
+        "provider": provider,
+        "requests": count,
+        "submitted_at": time.time(),
+        "status": "submitted",
+    })
+    return await resume_batch_analysis(repository, client, request_file, poll_interval=poll_interval, timeout=timeout)
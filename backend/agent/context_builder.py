@@ -0,0 +1,216 @@
+"""
+LLM 分析上下文构建
+正文超出 token 预算时不再简单截取前 N 个字符，而是按句子打分后抽取最有信息量的句子：
+- 位置：开头的句子和段落首句通常概括全文
+- 关键词密度：命中 detect_tech_content 识别出的技术关键词、标题中的词
+- 模板文本（版权声明、关注引导等）不保留
+选中的句子按原文顺序拼接，保持可读性。
+"""
+import re
+from typing import List, Set, Tuple
+
+from backend.agent.tech_detection import detect_tech_content
+from backend.llm.token_estimator import estimate_tokens
+
+# 句子切分：中文句末标点之后，或英文句末标点后跟空白
+_SENTENCE_END = re.compile(r"(?<=[。！？!?；;])|(?<=[.!?])(?=\s)")
+_WORD_PATTERN = re.compile(r"[a-zA-Z][a-zA-Z0-9+#.\-]+")
+_CJK_RUN_PATTERN = re.compile(r"[\u4e00-\u9fff]{2,}")
+# 中日韩文字和全角标点（相邻句子直接拼接，不加空格）
+_CJK_CHAR_PATTERN = re.compile(r"[\u3000-\u303f\u4e00-\u9fff\uff00-\uffef]")
+
+# 模板文本特征（正文超出预算时丢弃）
+BOILERPLATE_PATTERNS = re.compile(
+    r"版权|转载|免责声明|扫码|二维码|关注我们|点击关注|公众号|阅读原文|点赞|在看|广告|"
+    r"责任编辑|原标题|来源[:：]|copyright|all rights reserved|subscribe|cookie",
+    re.IGNORECASE,
+)
+
+# 片段之间省略内容的标记
+GAP_MARKER = "……"
+
+
+def split_sentences(content: str) -> List[Tuple[int, str]]:
+    """
+    把正文切分为句子
+
+    Args:
+        content: 正文
+
+    Returns:
+        List[Tuple[int, str]]: (段落序号, 句子) 列表，保持原文顺序
+    """
+    sentences = []
+    for paragraph_index, paragraph in enumerate(p for p in content.split("\n") if p.strip()):
+        for sentence in _SENTENCE_END.split(paragraph):
+            sentence = sentence.strip()
+            if sentence:
+                sentences.append((paragraph_index, sentence))
+    return sentences
+
+
+def _sentence_separator(previous: str, sentence: str) -> str:
+    """同一段落内相邻句子之间的分隔：中文句子直接拼接，英文等其他句子用一个空格"""
+    if _CJK_CHAR_PATTERN.match(previous[-1]) or _CJK_CHAR_PATTERN.match(sentence[0]):
+        return ""
+    return " "
+
+
+def _title_terms(title: str) -> Set[str]:
+    """标题中的词：英文单词和中文双字组合"""
+    terms = {w.lower() for w in _WORD_PATTERN.findall(title)}
+    for run in _CJK_RUN_PATTERN.findall(title):
+        terms.update(run[i:i + 2] for i in range(len(run) - 1))
+    return terms
+
+
+def score_sentence(
+    sentence: str,
+    index: int,
+    first_in_paragraph: bool,
+    tech_keywords: List[str],
+    title_terms: Set[str],
+) -> float:
+    """
+    句子得分
+
+    Args:
+        sentence: 句子
+        index: 句子在全文中的序号
+        first_in_paragraph: 是否为段落首句
+        tech_keywords: detect_tech_content 在全文中识别出的技术关键词
+        title_terms: 标题中的词
+
+    Returns:
+        float: 得分，越高越应该保留；模板文本为 0
+    """
+    if BOILERPLATE_PATTERNS.search(sentence):
+        return 0.0
+
+    tokens = max(estimate_tokens(sentence), 1)
+    lowered = sentence.lower()
+
+    position = 1.0 / (1.0 + 0.15 * index)
+    if first_in_paragraph:
+        position += 0.3
+
+    tech_hits = sum(lowered.count(k.lower()) for k in tech_keywords)
+    title_hits = sum(1 for term in title_terms if term in lowered)
+    # 按句子长度的平方根归一，避免长句只因字多而占优
+    density = (tech_hits + 0.5 * title_hits) / tokens ** 0.5
+
+    score = position + density
+    if tokens < 6:
+        score *= 0.5
+    return score
+
+
+def build_analysis_context(title: str, content: str, max_tokens: int) -> str:
+    """
+    在 token 预算内构建发送给 LLM 的正文
+
+    Args:
+        title: 文章标题
+        content: 文章正文
+        max_tokens: 正文的 token 预算（按 estimate_tokens 估算）
+
+    Returns:
+        str: 未超出预算时为原文，否则为按原文顺序拼接的高分句子（段落之间换行，省略处用 "……" 标记）
+    """
+    content = (content or "").strip()
+    if estimate_tokens(content) <= max_tokens:
+        return content
+
+    sentences = split_sentences(content)
+    tech_keywords = detect_tech_content(content, title)["keywords"]
+    title_terms = _title_terms(title or "")
+
+    scored = []
+    previous_paragraph = -1
+    for index, (paragraph, sentence) in enumerate(sentences):
+        score = score_sentence(sentence, index, paragraph != previous_paragraph, tech_keywords, title_terms)
+        scored.append((score, index))
+        previous_paragraph = paragraph
+
+    selected = set()
+    used = 0
+    for score, index in sorted(scored, key=lambda item: (-item[0], item[1])):
+        tokens = estimate_tokens(sentences[index][1])
+        if score <= 0 or used + tokens > max_tokens:
+            continue
+        selected.add(index)
+        used += tokens
+
+    if not selected:
+        # 单个句子就超出预算：退化为按预算截取开头
+        return _truncate_to_tokens(content, max_tokens)
+
+    parts = []
+    last_index = last_paragraph = None
+    for index in sorted(selected):
+        paragraph, sentence = sentences[index]
+        if last_index is not None:
+            if index != last_index + 1:
+                parts.append(GAP_MARKER if paragraph == last_paragraph else f"\n{GAP_MARKER}\n")
+            elif paragraph != last_paragraph:
+                parts.append("\n")
+            else:
+                parts.append(_sentence_separator(parts[-1], sentence))
+        parts.append(sentence)
+        last_index, last_paragraph = index, paragraph
+    return "".join(parts)
+
+
+def split_into_chunks(content: str, max_tokens: int) -> List[str]:
+    """
+    按句子边界把正文切分为不超过 max_tokens 的块（用于长文 map-reduce 分析）
+
+    Args:
+        content: 正文
+        max_tokens: 每块的 token 上限
+
+    Returns:
+        List[str]: 按原文顺序的文本块，块内保留段落换行；超长的单个句子按 token 硬切
+    """
+    max_tokens = max(1, max_tokens)
+    chunks: List[str] = []
+    parts: List[str] = []
+    used = 0
+    last_paragraph = None
+
+    def flush():
+        nonlocal parts, used, last_paragraph
+        if parts:
+            chunks.append("".join(parts))
+        parts, used, last_paragraph = [], 0, None
+
+    for paragraph, sentence in split_sentences(content or ""):
+        while estimate_tokens(sentence) > max_tokens:
+            flush()
+            head = _truncate_to_tokens(sentence, max_tokens)
+            chunks.append(head)
+            sentence = sentence[len(head):]
+        tokens = estimate_tokens(sentence)
+        if not tokens:
+            continue
+        if used + tokens > max_tokens:
+            flush()
+        if last_paragraph is not None:
+            parts.append("\n" if paragraph != last_paragraph else _sentence_separator(parts[-1], sentence))
+        parts.append(sentence)
+        used += tokens
+        last_paragraph = paragraph
+    flush()
+    return chunks
+
+
+def _truncate_to_tokens(text: str, max_tokens: int) -> str:
+    """截取不超过 max_tokens 的前缀"""
+    low, high = 0, len(text)
+    while low < high:
+        middle = (low + high + 1) // 2
+        if estimate_tokens(text[:middle]) <= max_tokens:
+            low = middle
+        else:
+            high = middle - 1
+    return text[:low]
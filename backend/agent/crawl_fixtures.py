@@ -0,0 +1,476 @@
+"""
+爬虫 HTML 夹具录制与离线回放
+录制模式：把榜单快照和原始 HTML 写入压缩归档（zip）
+回放模式：不访问网络，把夹具按最快速度送入完整提取流水线，报告各阶段吞吐和延迟分位数
+
+用法:
+    python -m backend.agent.crawl_fixtures record fixtures/tophub.zip --limit 20
+    python -m backend.agent.crawl_fixtures replay fixtures/tophub.zip --repeat 3
+    python -m backend.agent.crawl_fixtures pretrim fixtures/tophub.zip
+    python -m backend.agent.crawl_fixtures engines fixtures/tophub.zip --engines node python node-spawn
+"""
+import argparse
+import hashlib
+import json
+import logging
+import os
+import time
+import zipfile
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+FIXTURE_FORMAT_VERSION = 1
+
+# 回放报告中的阶段顺序（与真实爬取流水线一致）
+REPLAY_STAGES = ["fetch", "readability", "newspaper", "markdown", "tech_detection"]
+
+
+def _page_key(url: str) -> str:
+    """根据 URL 生成归档内的文件名"""
+    return hashlib.sha1(url.encode("utf-8")).hexdigest()
+
+
+class FixtureRecorder:
+    """夹具录制器 - 把榜单快照和原始 HTML 写入压缩归档"""
+
+    def __init__(self, path: str, compression: int = zipfile.ZIP_DEFLATED):
+        """
+        初始化录制器
+
+        Args:
+            path: 归档文件路径（.zip）
+            compression: zip 压缩算法，默认 DEFLATE，也可使用 zipfile.ZIP_LZMA
+        """
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        self.path = path
+        self._zip = zipfile.ZipFile(path, "w", compression=compression)
+        self._pages: List[Dict[str, Any]] = []
+        self._listing_count = 0
+        self._recorded_keys = set()
+
+    def record_listing(self, articles: List[Dict[str, Any]], source: str = "tophub") -> None:
+        """
+        记录一次榜单快照
+
+        Args:
+            articles: 榜单条目列表
+            source: 快照来源
+        """
+        self._listing_count += 1
+        snapshot = {
+            "source": source,
+            "captured_at": time.strftime("%Y-%m-%d %H:%M:%S"),
+            "articles": articles,
+        }
+        name = f"listings/{self._listing_count:04d}.json"
+        self._zip.writestr(name, json.dumps(snapshot, ensure_ascii=False))
+
+    def record_page(self, url: str, html: str, article_info: Optional[Dict[str, Any]] = None) -> None:
+        """
+        记录一个页面的原始 HTML（同一 URL 只保留第一次）
+
+        Args:
+            url: 页面 URL
+            html: 原始 HTML
+            article_info: 对应的榜单条目
+        """
+        key = _page_key(url)
+        if key in self._recorded_keys:
+            return
+        self._recorded_keys.add(key)
+
+        self._zip.writestr(f"pages/{key}.html", html)
+        self._pages.append({
+            "key": key,
+            "url": url,
+            "article_info": article_info or {},
+            "html_bytes": len(html.encode("utf-8")),
+            "recorded_at": time.strftime("%Y-%m-%d %H:%M:%S"),
+        })
+
+    def close(self) -> None:
+        """写入清单并关闭归档"""
+        if self._zip is None:
+            return
+        manifest = {
+            "format_version": FIXTURE_FORMAT_VERSION,
+            "listings": self._listing_count,
+            "pages": self._pages,
+        }
+        self._zip.writestr("manifest.json", json.dumps(manifest, ensure_ascii=False, indent=2))
+        self._zip.close()
+        self._zip = None
+        logger.info(f"夹具已保存: {self.path} ({len(self._pages)} 个页面)")
+
+    @property
+    def page_count(self) -> int:
+        return len(self._pages)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+
+class FixtureArchive:
+    """夹具归档读取器"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._zip = zipfile.ZipFile(path, "r")
+        self.manifest = json.loads(self._zip.read("manifest.json"))
+
+    def listings(self) -> List[Dict[str, Any]]:
+        """读取所有榜单快照"""
+        names = sorted(n for n in self._zip.namelist() if n.startswith("listings/"))
+        return [json.loads(self._zip.read(name)) for name in names]
+
+    def page_count(self) -> int:
+        return len(self.manifest.get("pages", []))
+
+    def iter_pages(self) -> Iterator[Tuple[Dict[str, Any], str]]:
+        """
+        按录制顺序迭代页面
+
+        Yields:
+            (页面元信息, 原始 HTML)
+        """
+        for page in self.manifest.get("pages", []):
+            html = self._zip.read(f"pages/{page['key']}.html").decode("utf-8")
+            yield page, html
+
+    def close(self) -> None:
+        self._zip.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+
+def _percentile(values: List[float], percent: float) -> float:
+    """线性插值计算分位数"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    position = (len(ordered) - 1) * percent / 100.0
+    lower = int(position)
+    upper = min(lower + 1, len(ordered) - 1)
+    return ordered[lower] + (ordered[upper] - ordered[lower]) * (position - lower)
+
+
+def summarize_latencies(samples: List[float]) -> Dict[str, float]:
+    """
+    汇总一组耗时样本（秒）
+
+    Returns:
+        dict: count / total_s / throughput_per_s / p50_ms / p90_ms / p99_ms / max_ms
+    """
+    total = sum(samples)
+    return {
+        "count": len(samples),
+        "total_s": round(total, 4),
+        "throughput_per_s": round(len(samples) / total, 2) if total > 0 else 0.0,
+        "p50_ms": round(_percentile(samples, 50) * 1000, 2),
+        "p90_ms": round(_percentile(samples, 90) * 1000, 2),
+        "p99_ms": round(_percentile(samples, 99) * 1000, 2),
+        "max_ms": round(max(samples) * 1000, 2) if samples else 0.0,
+    }
+
+
+def replay_fixtures(path: str, repeat: int = 1, extractor=None) -> Dict[str, Any]:
+    """
+    离线回放夹具：HTML -> readability -> newspaper -> markdown 过滤 -> 技术检测
+
+    Args:
+        path: 夹具归档路径
+        repeat: 重复回放轮数（用于稳定测量）
+        extractor: 正文提取器（可选，默认 ReadabilityExtractor）
+
+    Returns:
+        dict: {
+            "pages": int,             # 回放页面数（含重复轮次）
+            "failed": int,            # 流水线失败数
+            "input_bytes": int,       # 输入 HTML 总字节数
+            "wall_time_s": float,     # 总耗时
+            "pages_per_s": float,     # 端到端吞吐
+            "stages": {stage: summarize_latencies(...)},
+            "end_to_end": summarize_latencies(...)
+        }
+    """
+    from backend.agent.agent_today_data import build_article_from_html, detect_tech_content
+
+    stage_samples: Dict[str, List[float]] = {stage: [] for stage in REPLAY_STAGES}
+    end_to_end: List[float] = []
+    failed = 0
+    pages = 0
+    input_bytes = 0
+
+    wall_started = time.perf_counter()
+    with FixtureArchive(path) as archive:
+        for _ in range(max(repeat, 1)):
+            for page, html in _timed_pages(archive, stage_samples["fetch"]):
+                pages += 1
+                input_bytes += page.get("html_bytes", 0)
+                article_info = dict(page.get("article_info") or {})
+                article_info.setdefault("tophub_url", page["url"])
+                article_info.setdefault("title", "")
+                article_info.setdefault("category", "")
+
+                timings: Dict[str, float] = {}
+                started = time.perf_counter()
+                try:
+                    result = build_article_from_html(
+                        article_info, html, extractor=extractor, stage_timings=timings
+                    )
+                except Exception as e:
+                    logger.warning(f"回放失败 {page['url']}: {e}")
+                    result = {"status": "failed", "error": str(e)}
+
+                if result.get("status") == "failed":
+                    failed += 1
+                else:
+                    tech_started = time.perf_counter()
+                    detect_tech_content(result.get("content", ""), result.get("title", ""))
+                    timings["tech_detection"] = time.perf_counter() - tech_started
+
+                end_to_end.append(time.perf_counter() - started + stage_samples["fetch"][-1])
+                for stage, elapsed in timings.items():
+                    stage_samples[stage].append(elapsed)
+    wall_time = time.perf_counter() - wall_started
+
+    return {
+        "pages": pages,
+        "failed": failed,
+        "input_bytes": input_bytes,
+        "wall_time_s": round(wall_time, 4),
+        "pages_per_s": round(pages / wall_time, 2) if wall_time > 0 else 0.0,
+        "stages": {stage: summarize_latencies(samples) for stage, samples in stage_samples.items()},
+        "end_to_end": summarize_latencies(end_to_end),
+    }
+
+
+def _timed_pages(archive: FixtureArchive, samples: List[float]) -> Iterator[Tuple[Dict[str, Any], str]]:
+    """迭代归档页面，并把解压读取耗时记为 fetch 阶段"""
+    iterator = archive.iter_pages()
+    while True:
+        started = time.perf_counter()
+        try:
+            page, html = next(iterator)
+        except StopIteration:
+            return
+        samples.append(time.perf_counter() - started)
+        yield page, html
+
+
+def compare_pretrim(path: str, extractor_class=None) -> Dict[str, Any]:
+    """
+    对比 HTML 预裁剪前后的正文提取耗时，逐页报告删除的字节数和节省的时间
+
+    Args:
+        path: 夹具归档路径
+        extractor_class: 提取器类（可选，默认 ReadabilityExtractor），需支持 pretrim 参数
+
+    Returns:
+        dict: {
+            "pages": [{"url", "original_bytes", "removed_bytes", "removed_pct",
+                       "untrimmed_ms", "trimmed_ms", "saved_ms"}],
+            "total_removed_bytes": int,
+            "total_saved_ms": float
+        }
+    """
+    if extractor_class is None:
+        from backend.utils.url_to_markdown import ReadabilityExtractor
+        extractor_class = ReadabilityExtractor
+
+    plain = extractor_class(pretrim=False)
+    trimmed = extractor_class(pretrim=True)
+
+    pages = []
+    with FixtureArchive(path) as archive:
+        for page, html in archive.iter_pages():
+            started = time.perf_counter()
+            plain.extract_article(html)
+            untrimmed_ms = (time.perf_counter() - started) * 1000
+
+            started = time.perf_counter()
+            trimmed.extract_article(html)
+            trimmed_ms = (time.perf_counter() - started) * 1000
+
+            stats = trimmed.last_pretrim_stats or {}
+            original_bytes = stats.get("original_bytes", page.get("html_bytes", 0))
+            removed_bytes = stats.get("removed_bytes", 0)
+            pages.append({
+                "url": page["url"],
+                "original_bytes": original_bytes,
+                "removed_bytes": removed_bytes,
+                "removed_pct": round(removed_bytes / original_bytes * 100, 1) if original_bytes else 0.0,
+                "untrimmed_ms": round(untrimmed_ms, 2),
+                "trimmed_ms": round(trimmed_ms, 2),
+                "saved_ms": round(untrimmed_ms - trimmed_ms, 2),
+            })
+
+    return {
+        "pages": pages,
+        "total_removed_bytes": sum(p["removed_bytes"] for p in pages),
+        "total_saved_ms": round(sum(p["saved_ms"] for p in pages), 2),
+    }
+
+
+def print_pretrim_report(report: Dict[str, Any]) -> None:
+    """打印预裁剪对比报告"""
+    print("=" * 80)
+    print(f"{'删除(KB)':>10}{'删除比例':>10}{'裁剪前(ms)':>12}{'裁剪后(ms)':>12}{'节省(ms)':>10}  URL")
+    for page in report["pages"]:
+        print(f"{page['removed_bytes'] / 1024:>10.1f}{page['removed_pct']:>9.1f}%"
+              f"{page['untrimmed_ms']:>12}{page['trimmed_ms']:>12}{page['saved_ms']:>10}  {page['url']}")
+    print("-" * 80)
+    print(f"共删除 {report['total_removed_bytes'] / 1024:.1f} KB，节省提取时间 {report['total_saved_ms']} ms")
+    print("=" * 80)
+
+
+def compare_engines(path: str, engines: Optional[List[str]] = None, repeat: int = 1) -> Dict[str, Any]:
+    """
+    对比不同正文提取引擎的耗时（预裁剪设置保持一致）
+
+    Args:
+        path: 夹具归档路径
+        engines: 参与对比的引擎（默认 node / python / node-spawn），不可用的引擎标记为跳过
+        repeat: 重复轮数
+
+    Returns:
+        dict: {"engines": {engine: {"first_call_ms", "count", "p50_ms", ... } 或 {"skipped": 原因}}}
+    """
+    from backend.utils.readability_worker import node_readability_available
+    from backend.utils.url_to_markdown import ReadabilityExtractor
+
+    if engines is None:
+        engines = ["node", "python", "node-spawn"]
+
+    results: Dict[str, Any] = {}
+    for engine in engines:
+        if engine != "python" and not node_readability_available():
+            results[engine] = {"skipped": "Node.js 或 Readability.js 依赖不可用"}
+            continue
+
+        extractor = ReadabilityExtractor(engine=engine)
+        samples: List[float] = []
+        first_call_ms = None
+        for _ in range(repeat):
+            with FixtureArchive(path) as archive:
+                for _page, html in archive.iter_pages():
+                    started = time.perf_counter()
+                    extractor.extract_article(html)
+                    elapsed = time.perf_counter() - started
+                    if first_call_ms is None:
+                        # 首次调用包含常驻进程启动，单独报告，不计入分位数
+                        first_call_ms = round(elapsed * 1000, 2)
+                        continue
+                    samples.append(elapsed)
+
+        results[engine] = {"first_call_ms": first_call_ms, **summarize_latencies(samples)}
+
+    return {"engines": results}
+
+
+def print_engines_report(report: Dict[str, Any]) -> None:
+    """打印提取引擎对比报告"""
+    print("=" * 80)
+    print(f"{'引擎':<14}{'首次(ms)':>10}{'次数':>8}{'页/秒':>10}{'p50(ms)':>10}{'p90(ms)':>10}{'p99(ms)':>10}")
+    for engine, stats in report["engines"].items():
+        if "skipped" in stats:
+            print(f"{engine:<14}跳过: {stats['skipped']}")
+            continue
+        print(f"{engine:<14}{stats['first_call_ms']!s:>10}{stats['count']:>8}{stats['throughput_per_s']:>10}"
+              f"{stats['p50_ms']:>10}{stats['p90_ms']:>10}{stats['p99_ms']:>10}")
+    print("=" * 80)
+
+
+def record_fixtures(path: str, limit: Optional[int] = None) -> int:
+    """
+    在线录制夹具：抓取榜单，下载每篇文章的原始 HTML（不做提取、不写 ES）
+
+    Args:
+        path: 夹具归档路径
+        limit: 最多录制的文章数
+
+    Returns:
+        int: 录制的页面数
+    """
+    from backend.agent.agent_today_data import get_html_stealth, scrape_tophub_dynamic_link
+
+    articles = scrape_tophub_dynamic_link()
+    if limit is not None:
+        articles = articles[:limit]
+
+    with FixtureRecorder(path) as recorder:
+        recorder.record_listing(articles)
+        for i, article_info in enumerate(articles, 1):
+            print(f"[{i}/{len(articles)}] 录制: {article_info['title']}")
+            html = get_html_stealth(article_info["tophub_url"])
+            if html:
+                recorder.record_page(article_info["tophub_url"], html, article_info)
+        return recorder.page_count
+
+
+def print_replay_report(report: Dict[str, Any]) -> None:
+    """打印回放报告"""
+    print("=" * 80)
+    print(f"回放页面: {report['pages']}  失败: {report['failed']}  "
+          f"输入: {report['input_bytes'] / 1024:.1f} KB  "
+          f"耗时: {report['wall_time_s']}s  吞吐: {report['pages_per_s']} 页/秒")
+    print("-" * 80)
+    print(f"{'阶段':<16}{'次数':>8}{'页/秒':>10}{'p50(ms)':>10}{'p90(ms)':>10}{'p99(ms)':>10}{'max(ms)':>10}")
+    rows = list(report["stages"].items()) + [("end_to_end", report["end_to_end"])]
+    for stage, stats in rows:
+        print(f"{stage:<16}{stats['count']:>8}{stats['throughput_per_s']:>10}"
+              f"{stats['p50_ms']:>10}{stats['p90_ms']:>10}{stats['p99_ms']:>10}{stats['max_ms']:>10}")
+    print("=" * 80)
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="爬虫 HTML 夹具录制 / 离线回放")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    record_parser = subparsers.add_parser("record", help="在线录制夹具")
+    record_parser.add_argument("path", help="夹具归档路径 (.zip)")
+    record_parser.add_argument("--limit", type=int, default=None, help="最多录制的文章数")
+
+    replay_parser = subparsers.add_parser("replay", help="离线回放夹具并输出基准报告")
+    replay_parser.add_argument("path", help="夹具归档路径 (.zip)")
+    replay_parser.add_argument("--repeat", type=int, default=1, help="重复回放轮数")
+    replay_parser.add_argument("--json", action="store_true", help="以 JSON 输出报告")
+
+    pretrim_parser = subparsers.add_parser("pretrim", help="对比 HTML 预裁剪前后的提取耗时")
+    pretrim_parser.add_argument("path", help="夹具归档路径 (.zip)")
+
+    engines_parser = subparsers.add_parser("engines", help="对比正文提取引擎的耗时")
+    engines_parser.add_argument("path", help="夹具归档路径 (.zip)")
+    engines_parser.add_argument("--engines", nargs="+", default=None, help="参与对比的引擎")
+    engines_parser.add_argument("--repeat", type=int, default=1, help="重复轮数")
+
+    args = parser.parse_args(argv)
+
+    if args.command == "record":
+        count = record_fixtures(args.path, limit=args.limit)
+        print(f"\n💾 已录制 {count} 个页面到 {args.path}")
+    elif args.command == "pretrim":
+        print_pretrim_report(compare_pretrim(args.path))
+    elif args.command == "engines":
+        print_engines_report(compare_engines(args.path, engines=args.engines, repeat=args.repeat))
+    else:
+        report = replay_fixtures(args.path, repeat=args.repeat)
+        if args.json:
+            print(json.dumps(report, ensure_ascii=False, indent=2))
+        else:
+            print_replay_report(report)
+
+
+if __name__ == "__main__":
+    main()
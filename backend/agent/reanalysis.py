@@ -0,0 +1,188 @@
+"""
+按版本选择性重新分析
+完整分析结果带有 analysis_version（提示词模板、提供商和模型的哈希）。修改提示词或更换模型后，
+只有版本与当前不一致（或没有版本）的文章需要重新分析。规划器按优先级（越新、越相关越靠前）
+在 token 预算内选出要重新分析的文章，分析成功的结果局部更新回 Elasticsearch，失败的保留原结果。
+"""
+import asyncio
+import logging
+from typing import Any, Dict, List, Optional, Tuple
+
+from backend.agent.agent_content_keyword_analysis import (
+    ANALYSIS_CONTEXT_TOKENS,
+    ANALYSIS_MAP_REDUCE_ENABLED,
+    PACK_OUTPUT_TOKENS_PER_ARTICLE,
+    UPGRADABLE_TIERS,
+    batch_analyze_articles,
+    build_analysis_messages,
+    current_analysis_versions,
+    is_long_article,
+    plan_article_chunks,
+)
+from backend.agent.context_builder import build_analysis_context
+from backend.llm.token_estimator import estimate_messages_tokens
+
+logger = logging.getLogger(__name__)
+
+# 重新分析时读取的字段
+REANALYSIS_FIELDS = ["title", "content", "category", "scraped_at"]
+
+
+def stale_analysis_query(version: Optional[str] = None) -> Dict[str, Any]:
+    """
+    版本过期的完整分析结果（本地分析和分类模型结果不在其中，它们在查看详情时升级）
+
+    Args:
+        version: 当前版本（默认为 current_analysis_versions()，配置了路由时包含各提供商的版本）
+
+    Returns:
+        dict: ES 查询条件
+    """
+    versions = [version] if version else current_analysis_versions()
+    return {
+        "bool": {
+            "filter": [{"term": {"content_analysis.analysis_success": True}}],
+            "must_not": [
+                {"terms": {"content_analysis.analysis_tier": list(UPGRADABLE_TIERS)}},
+                {"terms": {"content_analysis.analysis_version": versions}},
+            ],
+        }
+    }
+
+
+def prioritized_query(query: Dict[str, Any], recency_scale: str = "7d") -> Dict[str, Any]:
+    """
+    按优先级打分：抓取时间越新、分类模型相关度越高、技术文章越靠前
+
+    Args:
+        query: 过滤条件
+        recency_scale: 时间衰减尺度（距今该时长的文章得分减半）
+
+    Returns:
+        dict: function_score 查询（按 _score 降序即为优先级顺序）
+    """
+    return {
+        "function_score": {
+            "query": query,
+            "functions": [
+                {"gauss": {"scraped_at": {"origin": "now", "scale": recency_scale, "decay": 0.5}}},
+                {"field_value_factor": {"field": "content_analysis.relevance", "missing": 0.5}},
+                {"filter": {"term": {"tech_detection.is_tech_related": True}}, "weight": 2},
+            ],
+            "score_mode": "multiply",
+            "boost_mode": "replace",
+        }
+    }
+
+
+def estimate_reanalysis_tokens(title: str, content: str) -> int:
+    """
+    估算重新分析一篇文章消耗的 token 数（输入 + 预留输出）
+
+    长文按 map-reduce 分块估算，每块各算一次请求
+    """
+    if ANALYSIS_MAP_REDUCE_ENABLED and is_long_article(content):
+        chunks = plan_article_chunks(title, content)
+        return sum(
+            estimate_messages_tokens(build_analysis_messages(title, chunk)) + PACK_OUTPUT_TOKENS_PER_ARTICLE
+            for chunk in chunks
+        )
+    context = build_analysis_context(title, content, ANALYSIS_CONTEXT_TOKENS)
+    return estimate_messages_tokens(build_analysis_messages(title, context)) + PACK_OUTPUT_TOKENS_PER_ARTICLE
+
+
+def plan_reanalysis(
+    repository,
+    token_budget: int,
+    limit: Optional[int] = None,
+    version: Optional[str] = None,
+    recency_scale: str = "7d",
+    page_size: int = 200
+) -> Dict[str, Any]:
+    """
+    按优先级在 token 预算内选出需要重新分析的文章
+
+    严格按优先级顺序选取：下一篇超出剩余预算时停止，不用低优先级的小文章填补
+
+    Args:
+        repository: ArticleRepository
+        token_budget: token 预算
+        limit: 最多选取的篇数
+        version: 当前版本（默认为 current_analysis_versions()）
+        recency_scale: 时间衰减尺度
+        page_size: 滚动查询每页篇数
+
+    Returns:
+        dict: version（优先提供商的当前版本）/ versions（所有当前版本）/ stale（版本过期的总篇数）/ items（(文档 ID, 文档, 估算 token) 列表，按优先级排序）/
+        tokens（选中文章的估算 token 总数）/ budget
+    """
+    versions = [version] if version else current_analysis_versions()
+    query = stale_analysis_query(version)
+    plan: Dict[str, Any] = {
+        "version": versions[0],
+        "versions": versions,
+        "stale": repository.count(query=query),
+        "items": [],
+        "tokens": 0,
+        "budget": token_budget,
+    }
+    pages = repository.scroll_documents(
+        query=prioritized_query(query, recency_scale),
+        size=page_size,
+        source=REANALYSIS_FIELDS,
+        sort=[{"_score": "desc"}],
+    )
+    try:
+        for page in pages:
+            for doc_id, doc in page:
+                tokens = estimate_reanalysis_tokens(doc.get("title") or "", doc.get("content") or "")
+                if plan["tokens"] + tokens > token_budget or (limit is not None and len(plan["items"]) >= limit):
+                    return plan
+                plan["items"].append((doc_id, doc, tokens))
+                plan["tokens"] += tokens
+    finally:
+        pages.close()
+    return plan
+
+
+async def run_reanalysis(
+    repository,
+    plan: Dict[str, Any],
+    batch_size: int = 16,
+    max_concurrent: Optional[int] = None
+) -> Dict[str, int]:
+    """
+    执行重新分析计划（不经过本地分流和级联分析，直接完整分析）
+
+    Args:
+        repository: ArticleRepository
+        plan: plan_reanalysis() 的结果
+        batch_size: 每批篇数（每批分析后写回一次）
+        max_concurrent: 每批的最大并发请求数
+
+    Returns:
+        dict: selected / reanalyzed / failed（保留原结果）/ updated
+    """
+    items: List[Tuple[str, Dict[str, Any], int]] = plan["items"]
+    report = {"selected": len(items), "reanalyzed": 0, "failed": 0, "updated": 0}
+    loop = asyncio.get_running_loop()
+    for start in range(0, len(items), batch_size):
+        batch = items[start:start + batch_size]
+        articles = [
+            {k: doc[k] for k in ("title", "content", "category") if k in doc} for _, doc, _ in batch
+        ]
+        await batch_analyze_articles(articles, max_concurrent=max_concurrent, cascade=False)
+
+        updates = {}
+        for (doc_id, _, _), article in zip(batch, articles):
+            analysis = article["content_analysis"]
+            if analysis.get("analysis_success") and analysis.get("analysis_version") in plan["versions"]:
+                updates[doc_id] = {"content_analysis": analysis}
+                report["reanalyzed"] += 1
+            else:
+                report["failed"] += 1
+        if updates:
+            result = await loop.run_in_executor(None, repository.bulk_update_documents, updates)
+            report["updated"] += result["success"]
+        logger.info(f"重新分析进度: {start + len(batch)}/{len(items)}，写回 {report['updated']} 篇")
+    return report
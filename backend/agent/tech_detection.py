@@ -0,0 +1,107 @@
+"""
+技术内容检测
+按关键词表判断文本是否涉及开源项目、大模型等前沿技术
+"""
+
+# 技术关键词配置
+TECH_KEYWORDS = {
+    "开源项目": [
+        "开源", "open source", "github", "gitlab", "开源项目", "开源库",
+        "新项目", "项目发布", "release", "开源工具"
+    ],
+    "大模型": [
+        "大模型", "LLM", "GPT", "Claude", "Gemini", "ChatGPT", "语言模型",
+        "大语言模型", "生成式AI", "Generative AI", "Foundation Model",
+        "Transformer", "BERT", "预训练模型"
+    ],
+    "RAG技术": [
+        "RAG", "检索增强", "Retrieval Augmented", "向量数据库", "Vector Database",
+        "Embedding", "知识库", "文档检索", "语义搜索", "Semantic Search"
+    ],
+    "Agent技术": [
+        "Agent", "智能体", "AI Agent", "自主代理", "Multi-Agent", "多智能体",
+        "ReAct", "Chain of Thought", "CoT", "Tool Use", "Function Calling"
+    ],
+    "AI框架": [
+        "LangChain", "LlamaIndex", "AutoGPT", "BabyAGI", "Semantic Kernel",
+        "Haystack", "Transformers", "PyTorch", "TensorFlow", "JAX"
+    ],
+    "模型训练": [
+        "微调", "Fine-tuning", "RLHF", "LoRA", "QLoRA", "PEFT", "量化",
+        "Quantization", "蒸馏", "Distillation", "预训练", "Pre-training"
+    ],
+    "推理优化": [
+        "推理加速", "Inference", "vLLM", "TensorRT", "ONNX", "模型压缩",
+        "模型部署", "边缘计算", "Edge AI"
+    ]
+}
+
+
+def detect_tech_content(text: str, title: str = "") -> dict:
+    """
+    检测文本中是否包含新开源项目、大模型前沿技术
+    """
+    if not text:
+        return {
+            "is_tech_related": False,
+            "categories": [],
+            "keywords": [],
+            "confidence": 0.0,
+            "summary": "内容为空"
+        }
+
+    
+    # 合并标题和正文进行检测（标题权重更高）
+    full_text = (title + " " + title + " " + text).lower()  # 标题重复2次增加权重
+    
+    matched_categories = []
+    matched_keywords = []
+    keyword_count = 0
+    
+    # 遍历所有技术分类和关键词
+    for category, keywords in TECH_KEYWORDS.items():
+        category_matched = False
+        for keyword in keywords:
+            # 不区分大小写匹配
+            if keyword.lower() in full_text:
+                if keyword not in matched_keywords:
+                    matched_keywords.append(keyword)
+                    keyword_count += 1
+                category_matched = True
+        
+        if category_matched:
+            matched_categories.append(category)
+    
+    # 计算置信度
+    # 基础分：匹配到的分类数量
+    confidence = min(len(matched_categories) * 0.2, 0.6)
+    
+    # 加分：匹配到的关键词数量
+    confidence += min(keyword_count * 0.05, 0.3)
+    
+    # 额外加分：标题中包含关键词
+    title_lower = title.lower()
+    title_match_count = sum(1 for kw in matched_keywords if kw.lower() in title_lower)
+    confidence += min(title_match_count * 0.05, 0.1)
+    
+    # 确保置信度在 0-1 之间
+    confidence = min(confidence, 1.0)
+    
+    # 判断是否相关（至少匹配1个分类，且置信度 >= 0.2）
+    is_tech_related = len(matched_categories) > 0 and confidence >= 0.2
+    
+    # 生成摘要
+    if is_tech_related:
+        summary = f"检测到 {len(matched_categories)} 个技术领域：{', '.join(matched_categories[:3])}"
+        if len(matched_categories) > 3:
+            summary += f" 等"
+    else:
+        summary = "未检测到相关技术内容"
+    
+    return {
+        "is_tech_related": is_tech_related,
+        "categories": matched_categories,
+        "keywords": matched_keywords[:10],  # 最多返回10个关键词
+        "confidence": round(confidence, 2),
+        "summary": summary
+    }
@@ -0,0 +1,447 @@
+"""
+分析前的本地分流（triage）
+调用 LLM 之前先用本地信号判断每篇文章值不值得完整分析：
+- detect_tech_content 的技术检测结果
+- 正文长度
+- 所属榜单（文章的 category 字段，如 知乎、虎扑社区、GitHub）
+- 本地关键词抽取（TF-IDF，文档频率来自历次爬取累积的语料）
+
+决策为三种之一：
+- llm：完整 LLM 分析
+- local：只做本地分析（TF-IDF 关键词 + 技术分类 + 首句摘要），不调用 LLM
+- skip：不分析
+
+按榜单配置分流模式，见 TriagePolicy / get_triage_policy。
+"""
+import json
+import logging
+import math
+import os
+import re
+import threading
+from collections import Counter
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from backend.agent.agent_content_keyword_analysis import _get_default_analysis_result
+from backend.agent.context_builder import BOILERPLATE_PATTERNS, split_sentences
+from backend.agent.tech_detection import detect_tech_content
+
+try:
+    import jieba
+    jieba.setLogLevel(logging.WARNING)
+except ImportError:  # 未安装 jieba 时退化为中文双字切分
+    jieba = None
+
+logger = logging.getLogger(__name__)
+
+DECISION_LLM = "llm"
+DECISION_LOCAL = "local"
+DECISION_SKIP = "skip"
+
+# 榜单分流模式：
+# llm（默认）：技术文章和足够长的文章走 LLM，过短的只做本地分析
+# tech：只有技术文章走 LLM，其余只做本地分析
+# local：全部只做本地分析
+# skip：全部跳过
+TRIAGE_MODES = ("llm", "tech", "local", "skip")
+
+# 内置的榜单模式，ANALYSIS_TRIAGE_POLICY 中的配置会覆盖这里
+DEFAULT_BOARD_MODES = {
+    "虎扑社区": "tech",
+}
+
+# 本地分析的摘要长度上限（字符）
+LOCAL_SUMMARY_MAX_CHARS = 120
+
+_WORD_PATTERN = re.compile(r"[a-zA-Z][a-zA-Z0-9+#.\-]*[a-zA-Z0-9+#]|[a-zA-Z]")
+_CJK_RUN_PATTERN = re.compile(r"[\u4e00-\u9fff]+")
+_TOKEN_PATTERN = re.compile(r"^(?:[\u4e00-\u9fff]{2,}|[a-z][a-z0-9+#.\-]+)$")
+
+STOPWORDS = {
+    "我们", "你们", "他们", "她们", "这个", "那个", "这些", "那些", "一个", "没有", "什么", "怎么",
+    "因为", "所以", "但是", "而且", "如果", "可以", "已经", "就是", "还是", "不是", "自己", "现在",
+    "进行", "通过", "以及", "其中", "对于", "之后", "之前", "时候", "表示", "认为", "目前", "今天",
+    "the", "and", "for", "with", "that", "this", "from", "are", "was", "were", "you", "your",
+    "have", "has", "not", "but", "all", "can", "will", "into", "about", "more", "its", "our",
+}
+
+
+def tokenize(text: str) -> List[str]:
+    """
+    把文本切分为候选关键词
+
+    安装了 jieba 时使用分词结果，否则英文按单词、中文按相邻双字切分。
+    只保留两个字以上的中文词和英文单词（统一小写），去掉停用词。
+
+    Args:
+        text: 文本
+
+    Returns:
+        List[str]: 词列表（保留重复，供统计词频）
+    """
+    if not text:
+        return []
+    if jieba is not None:
+        candidates = (w.strip().lower() for w in jieba.cut(text))
+    else:
+        candidates = [w.lower() for w in _WORD_PATTERN.findall(text)]
+        for run in _CJK_RUN_PATTERN.findall(text):
+            candidates.extend(run[i:i + 2] for i in range(len(run) - 1))
+    return [w for w in candidates if _TOKEN_PATTERN.match(w) and w not in STOPWORDS]
+
+
+class KeywordExtractor:
+    """基于语料文档频率的 TF-IDF 关键词抽取（线程安全）"""
+
+    def __init__(self, max_terms: int = 50000):
+        """
+        Args:
+            max_terms: 保存时最多保留的词数（按文档频率），防止语料文件无限增长
+        """
+        self.max_terms = max_terms
+        self.documents = 0
+        self.document_frequency: Counter = Counter()
+        self._lock = threading.Lock()
+
+    def add_documents(self, texts: Iterable[str]) -> None:
+        """把文本加入语料，更新文档频率"""
+        with self._lock:
+            for text in texts:
+                self.documents += 1
+                self.document_frequency.update(set(tokenize(text)))
+
+    def idf(self, term: str) -> float:
+        """平滑的逆文档频率，语料中没有出现过的词最高"""
+        with self._lock:
+            return math.log((1 + self.documents) / (1 + self.document_frequency.get(term, 0))) + 1.0
+
+    def extract(self, text: str, title: str = "", top_k: int = 10) -> List[str]:
+        """
+        抽取关键词
+
+        Args:
+            text: 正文
+            title: 标题（词频按 2 倍计入）
+            top_k: 最多返回的关键词数
+
+        Returns:
+            List[str]: 按 TF-IDF 得分从高到低排列的关键词
+        """
+        counts = Counter(tokenize(text))
+        for term in tokenize(title):
+            counts[term] += 2
+        if not counts:
+            return []
+        total = sum(counts.values())
+        scores = {term: count / total * self.idf(term) for term, count in counts.items()}
+        return [term for term, _ in sorted(scores.items(), key=lambda item: (-item[1], item[0]))[:top_k]]
+
+    def save(self, path: str) -> None:
+        """把语料统计保存为 JSON（只保留文档频率最高的 max_terms 个词）"""
+        with self._lock:
+            data = {
+                "documents": self.documents,
+                "document_frequency": dict(self.document_frequency.most_common(self.max_terms)),
+            }
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        temp_path = f"{path}.tmp"
+        with open(temp_path, "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False)
+        os.replace(temp_path, path)
+
+    @classmethod
+    def load(cls, path: str, max_terms: int = 50000) -> "KeywordExtractor":
+        """从 JSON 加载语料统计，文件不存在或损坏时返回空语料"""
+        extractor = cls(max_terms=max_terms)
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            extractor.documents = int(data.get("documents", 0))
+            extractor.document_frequency.update(data.get("document_frequency", {}))
+        except FileNotFoundError:
+            pass
+        except (ValueError, TypeError, OSError) as e:
+            logger.warning(f"关键词语料加载失败，重新累积: {e}")
+        return extractor
+
+
+def parse_board_modes(spec: str) -> Dict[str, str]:
+    """
+    解析榜单分流模式配置
+
+    Args:
+        spec: 形如 "虎扑社区=skip,知乎=tech,*=llm" 的字符串，"*" 表示其他榜单的默认模式
+
+    Returns:
+        Dict[str, str]: 榜单 → 模式（忽略未知模式）
+    """
+    modes = {}
+    for item in spec.split(","):
+        item = item.strip()
+        if not item:
+            continue
+        board, _, mode = item.partition("=")
+        mode = mode.strip().lower()
+        if mode not in TRIAGE_MODES:
+            logger.warning(f"忽略无效的分流配置: {item}")
+            continue
+        modes[board.strip()] = mode
+    return modes
+
+
+class TriagePolicy:
+    """分流策略"""
+
+    def __init__(
+        self,
+        board_modes: Optional[Dict[str, str]] = None,
+        default_mode: str = "llm",
+        min_chars: int = 50,
+        llm_min_chars: int = 200,
+    ):
+        """
+        Args:
+            board_modes: 榜单 → 模式（llm / tech / local / skip）
+            default_mode: 未配置的榜单使用的模式
+            min_chars: 正文少于该字符数的文章直接跳过
+            llm_min_chars: llm 模式下非技术文章正文少于该字符数时只做本地分析
+        """
+        self.board_modes = dict(board_modes or {})
+        self.default_mode = default_mode
+        self.min_chars = min_chars
+        self.llm_min_chars = llm_min_chars
+
+    def mode_for(self, board: Optional[str]) -> str:
+        """榜单对应的分流模式"""
+        return self.board_modes.get(board or "", self.default_mode)
+
+    def decide(self, article: Dict[str, Any], detection: Dict[str, Any]) -> Tuple[str, str]:
+        """
+        决定一篇文章的分析方式
+
+        Args:
+            article: 文章（需包含 title、content，可选 category）
+            detection: detect_tech_content 的结果
+
+        Returns:
+            Tuple[str, str]: (决策 llm / local / skip, 原因)
+        """
+        mode = self.mode_for(article.get("category"))
+        length = len((article.get("content") or "").strip())
+        is_tech = detection.get("is_tech_related", False)
+
+        if mode == "skip":
+            return DECISION_SKIP, "榜单配置为跳过"
+        if not article.get("title") or length < self.min_chars:
+            return DECISION_SKIP, f"正文过短（{length} 字）"
+        if mode == "local":
+            return DECISION_LOCAL, "榜单配置为本地分析"
+        if is_tech:
+            return DECISION_LLM, "技术文章"
+        if mode == "tech":
+            return DECISION_LOCAL, "非技术文章"
+        if length < self.llm_min_chars:
+            return DECISION_LOCAL, f"非技术短文（{length} 字）"
+        return DECISION_LLM, "正文充足"
+
+
+class _Stats:
+    """分流统计（进程级）"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.counters = {DECISION_LLM: 0, DECISION_LOCAL: 0, DECISION_SKIP: 0}
+        self.boards: Dict[str, Counter] = {}
+
+    def add(self, board: str, decision: str) -> None:
+        with self._lock:
+            self.counters[decision] += 1
+            self.boards.setdefault(board, Counter())[decision] += 1
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                **self.counters,
+                "llm_calls_avoided": self.counters[DECISION_LOCAL] + self.counters[DECISION_SKIP],
+                "boards": {board: dict(counts) for board, counts in self.boards.items()},
+            }
+
+
+_stats = _Stats()
+
+
+def triage_stats() -> Dict[str, Any]:
+    """
+    分流统计
+
+    Returns:
+        dict: llm / local / skip 篇数、llm_calls_avoided（local + skip，即少发的单篇分析请求数）、
+        boards（按榜单的决策篇数）
+    """
+    return _stats.snapshot()
+
+
+def diff_triage_stats(before: Dict[str, Any], after: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    两次 triage_stats() 快照之间的增量（用于单次爬取报告）
+
+    Returns:
+        dict: 与 triage_stats() 相同的字段，boards 只包含期间有决策的榜单
+    """
+    result = {
+        name: after[name] - before.get(name, 0)
+        for name in (DECISION_LLM, DECISION_LOCAL, DECISION_SKIP, "llm_calls_avoided")
+    }
+    boards = {}
+    for board, counts in after["boards"].items():
+        previous = before.get("boards", {}).get(board, {})
+        delta = {decision: count - previous.get(decision, 0) for decision, count in counts.items()}
+        delta = {decision: count for decision, count in delta.items() if count}
+        if delta:
+            boards[board] = delta
+    result["boards"] = boards
+    return result
+
+
+def local_analysis(
+    article: Dict[str, Any],
+    keywords: List[str],
+    detection: Dict[str, Any],
+) -> Dict[str, Any]:
+    """
+    不调用 LLM 的分析结果（字段与 LLM 分析结果一致）
+
+    Args:
+        article: 文章
+        keywords: 本地抽取的关键词
+        detection: detect_tech_content 的结果
+
+    Returns:
+        dict: content_analysis，analysis_tier 为 "local"
+    """
+    summary = ""
+    for _, sentence in split_sentences(article.get("content") or ""):
+        if not BOILERPLATE_PATTERNS.search(sentence):
+            summary = sentence[:LOCAL_SUMMARY_MAX_CHARS]
+            break
+    return {
+        "keywords": keywords,
+        "topics": list(detection.get("categories", [])),
+        "summary": summary,
+        "sentiment": "neutral",
+        "category": "科技" if detection.get("is_tech_related") else "未分类",
+        "entities": [],
+        "analysis_success": True,
+        "analysis_tier": "local",
+    }
+
+
+def triage_articles(
+    articles: List[Dict[str, Any]],
+    policy: Optional[TriagePolicy] = None,
+    extractor: Optional[KeywordExtractor] = None,
+    max_keywords: int = 10,
+) -> List[Dict[str, Any]]:
+    """
+    对一批文章分流
+
+    不需要 LLM 的文章直接写入 content_analysis（本地分析结果，或跳过时的默认结果），
+    每篇文章都记录 triage（决策、原因、本地关键词），没有 tech_detection 的补上检测结果。
+
+    Args:
+        articles: 文章列表
+        policy: 分流策略（默认 get_triage_policy()，禁用时全部走 LLM）
+        extractor: 关键词抽取器（默认进程级共享语料）
+        max_keywords: 本地抽取的关键词数
+
+    Returns:
+        List[Dict]: 需要 LLM 完整分析的文章
+    """
+    policy = policy or get_triage_policy()
+    if policy is None:
+        return list(articles)
+    extractor = extractor or get_keyword_extractor()
+    # 当前批次先计入语料，本批内反复出现的词不会被当作关键词
+    extractor.add_documents(f"{a.get('title', '')}\n{a.get('content', '')}" for a in articles)
+
+    to_llm = []
+    for article in articles:
+        title = article.get("title") or ""
+        content = article.get("content") or ""
+        detection = article.get("tech_detection") or detect_tech_content(content, title)
+        article.setdefault("tech_detection", detection)
+
+        decision, reason = policy.decide(article, detection)
+        keywords = extractor.extract(content, title, top_k=max_keywords) if decision != DECISION_SKIP else []
+        article["triage"] = {"decision": decision, "reason": reason, "keywords": keywords}
+        _stats.add(article.get("category") or "", decision)
+
+        if decision == DECISION_LLM:
+            to_llm.append(article)
+        elif decision == DECISION_LOCAL:
+            article["content_analysis"] = local_analysis(article, keywords, detection)
+        else:
+            article["content_analysis"] = _get_default_analysis_result(False)
+
+    if len(to_llm) < len(articles):
+        logger.info(f"本地分流: {len(articles)} 篇中 {len(to_llm)} 篇交给 LLM，"
+                    f"避免 {len(articles) - len(to_llm)} 次 LLM 分析")
+    return to_llm
+
+
+def get_triage_policy() -> Optional[TriagePolicy]:
+    """
+    从环境变量创建分流策略
+
+    读取 ANALYSIS_TRIAGE（默认开启）、ANALYSIS_TRIAGE_POLICY（如 "虎扑社区=skip,知乎=tech,*=llm"，
+    覆盖内置的 DEFAULT_BOARD_MODES）、ANALYSIS_TRIAGE_MIN_CHARS（默认 50）、
+    ANALYSIS_TRIAGE_LLM_MIN_CHARS（默认 200）
+
+    Returns:
+        Optional[TriagePolicy]: 禁用时为 None
+    """
+    if os.getenv("ANALYSIS_TRIAGE", "1").lower() in ("0", "false", "no"):
+        return None
+    board_modes = {**DEFAULT_BOARD_MODES, **parse_board_modes(os.getenv("ANALYSIS_TRIAGE_POLICY", ""))}
+    default_mode = board_modes.pop("*", "llm")
+    return TriagePolicy(
+        board_modes=board_modes,
+        default_mode=default_mode,
+        min_chars=int(os.getenv("ANALYSIS_TRIAGE_MIN_CHARS", "50")),
+        llm_min_chars=int(os.getenv("ANALYSIS_TRIAGE_LLM_MIN_CHARS", "200")),
+    )
+
+
+_extractor: Optional[KeywordExtractor] = None
+_extractor_lock = threading.Lock()
+
+
+def _corpus_path() -> str:
+    return os.getenv("ANALYSIS_TRIAGE_CORPUS_PATH", os.path.join(".cache", "triage_corpus.json"))
+
+
+def get_keyword_extractor() -> KeywordExtractor:
+    """
+    获取进程级共享的关键词抽取器
+
+    首次调用时从 ANALYSIS_TRIAGE_CORPUS_PATH（默认 .cache/triage_corpus.json）加载累积的语料统计
+    """
+    global _extractor
+    with _extractor_lock:
+        if _extractor is None:
+            _extractor = KeywordExtractor.load(_corpus_path())
+        return _extractor
+
+
+def save_keyword_corpus() -> None:
+    """把本进程累积的语料统计写回 ANALYSIS_TRIAGE_CORPUS_PATH（爬取结束时调用）"""
+    with _extractor_lock:
+        extractor = _extractor
+    if extractor is None:
+        return
+    try:
+        extractor.save(_corpus_path())
+    except OSError as e:
+        logger.warning(f"关键词语料保存失败: {e}")
@@ -1,5 +1,5 @@
 """FastAPI routers and endpoints."""
 
-from backend.api import articles, crawler, statistics, health
+from backend.api import articles, crawler, statistics, health, llm
 
-__all__ = ["articles", "crawler", "statistics", "health"]
+__all__ = ["articles", "crawler", "statistics", "health", "llm"]
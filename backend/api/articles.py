@@ -3,7 +3,7 @@
 import logging
 from typing import Optional
 from fastapi import APIRouter, Query, HTTPException, Depends
-from fastapi.responses import Response
+from fastapi.responses import Response, StreamingResponse
 
 from backend.schemas.article import (
     ArticleListResponse,
@@ -11,18 +11,18 @@ from backend.schemas.article import (
     SearchRequest,
     SearchResponse,
 )
+from backend.service.analysis_service import AnalysisService, sse_stream
 from backend.service.article_service import ArticleService
-from backend.db.elasticsearch_client import ElasticsearchClient, ArticleRepository
+from backend.api.dependencies import get_article_repository
+from backend.db.elasticsearch_client import ArticleRepository
 
 logger = logging.getLogger(__name__)
 
 router = APIRouter()
 
 
-def get_article_service() -> ArticleService:
-    """依赖注入：获取文章服务实例"""
-    es_client = ElasticsearchClient()
-    repository = ArticleRepository(es_client, index_name="tophub_articles")
+def get_article_service(repository: ArticleRepository = Depends(get_article_repository)) -> ArticleService:
+    """依赖注入：获取文章服务实例（使用共享的 Elasticsearch 客户端）"""
     return ArticleService(repository)
 
 
@@ -58,12 +58,16 @@ async def get_article_by_id(
     """
     获取文章详情
 
+    只有本地分析或分类模型结果的文章，查看详情时在后台调用完整分析模型升级分析结果（本次返回现有结果，
+    升级完成后写回，再次打开即为完整分析）
+
     - **article_id**: 文章 ID
     """
     try:
         article = service.get_article_by_id(article_id)
         if not article:
             raise HTTPException(status_code=404, detail=f"文章不存在: {article_id}")
+        service.schedule_full_analysis(article)
         return article
     except HTTPException:
         raise
@@ -72,6 +76,40 @@ async def get_article_by_id(
         raise HTTPException(status_code=500, detail="获取文章详情失败")
 
 
+@router.post("/{article_id}/analyze")
+async def analyze_article(
+    article_id: str,
+    force: bool = Query(False, description="已有当前版本的分析结果时也重新分析"),
+    service: ArticleService = Depends(get_article_service),
+):
+    """
+    按需分析文章（Server-Sent Events）
+
+    用于跳过分析或分析失败的文章。模型输出以 delta 事件实时推送，最后一个事件为 result（分析结果，
+    成功时已写回 Elasticsearch）或 error。同一篇文章的并发请求合并为一次 LLM 调用；
+    已有当前版本的分析结果或命中分析缓存时直接返回 result
+
+    - **article_id**: 文章 ID
+    - **force**: 强制重新分析
+    """
+    try:
+        article = service.get_article_by_id(article_id)
+    except Exception as e:
+        logger.error("获取文章详情失败: %s", e, exc_info=True)
+        raise HTTPException(status_code=500, detail="获取文章详情失败")
+    if not article:
+        raise HTTPException(status_code=404, detail=f"文章不存在: {article_id}")
+    if not article.content:
+        raise HTTPException(status_code=422, detail="文章没有正文，无法分析")
+
+    events = AnalysisService().stream_analysis(article, service.repository, force=force)
+    return StreamingResponse(
+        sse_stream(events),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
 @router.post("/search", response_model=SearchResponse)
 async def search_articles(
     request: SearchRequest,
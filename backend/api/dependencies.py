@@ -0,0 +1,15 @@
+"""Shared API dependencies."""
+
+from fastapi import Depends
+
+from backend.db.elasticsearch_client import ElasticsearchClient, ArticleRepository, get_shared_es_client
+
+
+def get_es_client() -> ElasticsearchClient:
+    """依赖注入：获取共享的 Elasticsearch 客户端（应用启动时创建，请求之间复用连接池）"""
+    return get_shared_es_client()
+
+
+def get_article_repository(es_client: ElasticsearchClient = Depends(get_es_client)) -> ArticleRepository:
+    """依赖注入：获取文章数据仓库（基于共享客户端，不建立新连接）"""
+    return ArticleRepository(es_client, index_name="tophub_articles")
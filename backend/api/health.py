@@ -1,15 +1,22 @@
 """Health check API router."""
 
 import logging
-from fastapi import APIRouter, HTTPException
+import os
+from typing import Optional
+from fastapi import APIRouter, HTTPException, Depends
+from fastapi.concurrency import run_in_threadpool
 from pydantic import BaseModel
 
+from backend.api.dependencies import get_es_client
 from backend.db.elasticsearch_client import ElasticsearchClient
 
 logger = logging.getLogger(__name__)
 
 router = APIRouter()
 
+# 健康检查结果的缓存时间（秒），期间的 /health 请求不再 ping Elasticsearch
+ELASTICSEARCH_HEALTH_TTL = float(os.getenv("ELASTICSEARCH_HEALTH_TTL", "5"))
+
 
 class HealthResponse(BaseModel):
     """健康检查响应模型"""
@@ -17,6 +24,9 @@ class HealthResponse(BaseModel):
     status: str
     elasticsearch: str
     message: str
+    latency_ms: Optional[float] = None
+    consecutive_failures: int = 0
+    pool_size: Optional[int] = None
 
 
 class VersionResponse(BaseModel):
@@ -28,21 +38,25 @@ class VersionResponse(BaseModel):
 
 
 @router.get("/health", response_model=HealthResponse)
-async def health_check():
+async def health_check(es_client: ElasticsearchClient = Depends(get_es_client)):
     """
     健康检查接口
 
-    检查服务状态和依赖项（Elasticsearch）的连接状态
+    检查服务状态和依赖项（Elasticsearch）的连接状态，使用共享客户端，
+    ELASTICSEARCH_HEALTH_TTL 秒内复用上次的检查结果
 
     返回：
     - status: 服务状态 (healthy/unhealthy)
     - elasticsearch: Elasticsearch 连接状态 (connected/disconnected)
     - message: 状态描述信息
+    - latency_ms: 最近一次 ping 的耗时
+    - consecutive_failures: 连续失败次数
+    - pool_size: 每个节点的连接池大小
     """
     try:
         # 检查 Elasticsearch 连接
-        es_client = ElasticsearchClient()
-        es_status = "connected" if es_client.ping() else "disconnected"
+        health = await run_in_threadpool(es_client.check_health, ELASTICSEARCH_HEALTH_TTL)
+        es_status = "connected" if health["healthy"] else "disconnected"
 
         # 判断整体健康状态
         if es_status == "connected":
@@ -53,7 +67,12 @@ async def health_check():
             message = "Elasticsearch connection failed"
 
         return HealthResponse(
-            status=status, elasticsearch=es_status, message=message
+            status=status,
+            elasticsearch=es_status,
+            message=message,
+            latency_ms=health["latency_ms"],
+            consecutive_failures=health["consecutive_failures"],
+            pool_size=health["pool_size"],
         )
 
     except Exception as e:
@@ -0,0 +1,53 @@
+"""LLM runtime metrics API router."""
+
+import logging
+from fastapi import APIRouter
+
+from backend.llm import concurrency_stats, get_router, get_telemetry, rate_limit_stats
+from backend.schemas.llm import ConcurrencyResponse, LLMMetricsResponse, RateLimitResponse, RouterResponse
+
+logger = logging.getLogger(__name__)
+
+router = APIRouter()
+
+
+@router.get("/concurrency", response_model=ConcurrencyResponse)
+async def get_concurrency():
+    """
+    获取各 LLM 提供商的自适应并发状态
+
+    返回当前并发上限、进行中/排队的请求数、延迟基线以及上调/退避次数
+    """
+    return ConcurrencyResponse(providers=concurrency_stats())
+
+
+@router.get("/rate-limits", response_model=RateLimitResponse)
+async def get_rate_limits():
+    """
+    获取各 LLM 提供商的 RPM / TPM 限流状态
+
+    只返回配置了 {PROVIDER}_RPM 或 {PROVIDER}_TPM 的提供商
+    """
+    return RateLimitResponse(providers=rate_limit_stats())
+
+
+@router.get("/router", response_model=RouterResponse)
+async def get_router_stats():
+    """
+    获取多提供商路由状态（权重、p95 延迟、错误率、熔断）
+    """
+    llm_router = get_router()
+    if llm_router is None:
+        return RouterResponse(enabled=False)
+    return RouterResponse(enabled=True, providers=llm_router.stats())
+
+
+@router.get("/metrics", response_model=LLMMetricsResponse)
+async def get_llm_metrics():
+    """
+    获取按 提供商/模型 的调用遥测
+
+    返回累计调用数、错误、重试、token 用量和估算费用，以及首 token 延迟和总耗时的滚动直方图
+    """
+    telemetry = get_telemetry()
+    return LLMMetricsResponse(window_s=telemetry.window_s, models=telemetry.snapshot())
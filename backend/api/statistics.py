@@ -13,17 +13,16 @@ from backend.schemas.statistics import (
     TrendStats,
 )
 from backend.service.stats_service import StatsService
-from backend.db.elasticsearch_client import ElasticsearchClient, ArticleRepository
+from backend.api.dependencies import get_article_repository
+from backend.db.elasticsearch_client import ArticleRepository
 
 logger = logging.getLogger(__name__)
 
 router = APIRouter()
 
 
-def get_stats_service() -> StatsService:
-    """依赖注入：获取统计服务实例"""
-    es_client = ElasticsearchClient()
-    repository = ArticleRepository(es_client, index_name="tophub_articles")
+def get_stats_service(repository: ArticleRepository = Depends(get_article_repository)) -> StatsService:
+    """依赖注入：获取统计服务实例（使用共享的 Elasticsearch 客户端）"""
     return StatsService(repository)
 
 
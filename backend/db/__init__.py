@@ -1,6 +1,11 @@
 """
 数据库模块
 """
-from .elasticsearch_client import ElasticsearchClient, ArticleRepository
+from .elasticsearch_client import (
+    ElasticsearchClient,
+    ArticleRepository,
+    get_shared_es_client,
+    close_shared_es_client,
+)
 
-__all__ = ["ElasticsearchClient", "ArticleRepository"]
+__all__ = ["ElasticsearchClient", "ArticleRepository", "get_shared_es_client", "close_shared_es_client"]
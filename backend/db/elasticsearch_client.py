@@ -3,6 +3,8 @@ Elasticsearch 客户端封装
 支持 Elasticsearch 9.2.1
 """
 import os
+import threading
+import time
 from typing import List, Dict, Any, Optional
 from datetime import datetime
 import logging
@@ -26,7 +28,10 @@ class ElasticsearchClient:
         username: Optional[str] = None,
         password: Optional[str] = None,
         verify_certs: bool = True,
-        ca_certs: Optional[str] = None
+        ca_certs: Optional[str] = None,
+        pool_size: Optional[int] = None,
+        request_timeout: Optional[float] = None,
+        verify_connection: bool = True
     ):
         """
         初始化 Elasticsearch 客户端
@@ -38,6 +43,9 @@ class ElasticsearchClient:
             password: 密码（基础认证）
             verify_certs: 是否验证 SSL 证书
             ca_certs: CA 证书路径
+            pool_size: 每个节点的 HTTP 连接池大小，默认读取 ELASTICSEARCH_POOL_SIZE（默认 10）
+            request_timeout: 请求超时（秒），默认读取 ELASTICSEARCH_REQUEST_TIMEOUT（未设置时使用客户端默认值）
+            verify_connection: 创建时调用 info() 验证连接；共享客户端不验证，不可用时不阻止服务启动
         """
         # 从环境变量读取配置
         if hosts is None:
@@ -68,15 +76,78 @@ class ElasticsearchClient:
         if ca_certs:
             connection_params["ca_certs"] = ca_certs
         
+        if pool_size is None:
+            pool_size = int(os.getenv("ELASTICSEARCH_POOL_SIZE", "10"))
+        connection_params["connections_per_node"] = pool_size
+        self.pool_size = pool_size
+        
+        if request_timeout is None and os.getenv("ELASTICSEARCH_REQUEST_TIMEOUT"):
+            request_timeout = float(os.getenv("ELASTICSEARCH_REQUEST_TIMEOUT"))
+        if request_timeout is not None:
+            connection_params["request_timeout"] = request_timeout
+        
+        self._health_lock = threading.Lock()
+        self._health = {
+            "healthy": None,
+            "checked_at": None,
+            "latency_ms": None,
+            "consecutive_failures": 0,
+            "checks": 0,
+            "failures": 0,
+            "last_error": None,
+        }
+        
         try:
             self.client = Elasticsearch(**connection_params)
-            # 测试连接
-            info = self.client.info()
-            logger.info(f"✅ 成功连接到 Elasticsearch {info['version']['number']}")
+            if verify_connection:
+                # 测试连接
+                info = self.client.info()
+                logger.info(f"✅ 成功连接到 Elasticsearch {info['version']['number']}")
         except Exception as e:
             logger.error(f"❌ 连接 Elasticsearch 失败: {e}")
             raise
     
+    def check_health(self, max_age: float = 0.0) -> Dict[str, Any]:
+        """
+        检查连接健康状态（ping），记录延迟和连续失败次数
+        
+        Args:
+            max_age: 上次检查在 max_age 秒内时直接返回上次结果，不再 ping
+        
+        Returns:
+            dict: healthy / checked_at（time.time()）/ latency_ms / consecutive_failures /
+            checks / failures / last_error / pool_size
+        """
+        with self._health_lock:
+            checked_at = self._health["checked_at"]
+            if max_age > 0 and checked_at is not None and time.time() - checked_at < max_age:
+                return {**self._health, "pool_size": self.pool_size}
+        
+        started = time.perf_counter()
+        error = None
+        try:
+            healthy = bool(self.client.ping())
+            if not healthy:
+                error = "ping failed"
+        except Exception as e:
+            healthy, error = False, str(e)
+        latency_ms = round((time.perf_counter() - started) * 1000, 1)
+        
+        with self._health_lock:
+            health = self._health
+            health["healthy"] = healthy
+            health["checked_at"] = time.time()
+            health["latency_ms"] = latency_ms
+            health["checks"] += 1
+            if healthy:
+                health["consecutive_failures"] = 0
+            else:
+                health["consecutive_failures"] += 1
+                health["failures"] += 1
+                health["last_error"] = error
+                logger.warning(f"Elasticsearch 健康检查失败（连续 {health['consecutive_failures']} 次）: {error}")
+            return {**health, "pool_size": self.pool_size}
+    
     def ping(self) -> bool:
         """测试连接是否正常"""
         try:
@@ -96,6 +167,60 @@ class ElasticsearchClient:
             logger.info("Elasticsearch 连接已关闭")
 
 
+# 分析流程写入的字段：新建索引时随完整映射创建；已有索引由 ensure_analysis_mappings() 补齐，
+# 否则这些字段会被动态映射为 text，term 过滤（精确匹配 analysis_model 等）和聚合都会失效
+ANALYSIS_FIELD_MAPPINGS = {
+    "content_analysis": {
+        "properties": {
+            "analysis_tier": {"type": "keyword"},
+            "analysis_version": {"type": "keyword"},
+            "analysis_model": {"type": "keyword"},
+            "relevance": {"type": "float"}
+        }
+    },
+    "triage": {
+        "properties": {
+            "decision": {"type": "keyword"},
+            "reason": {"type": "keyword"},
+            "keywords": {"type": "keyword"}
+        }
+    },
+    "analysis_status": {
+        "type": "keyword"
+    },
+    "analysis_backfill": {
+        "type": "keyword"
+    },
+}
+
+
+_shared_client: Optional[ElasticsearchClient] = None
+_shared_client_lock = threading.Lock()
+
+
+def get_shared_es_client() -> ElasticsearchClient:
+    """
+    获取进程级共享的 Elasticsearch 客户端（API 请求共用同一个连接池）
+
+    由应用启动时（lifespan）创建，未启动时首次调用创建；创建时不验证连接，
+    连接状态通过 check_health() 获取。连接池大小读取 ELASTICSEARCH_POOL_SIZE
+    """
+    global _shared_client
+    with _shared_client_lock:
+        if _shared_client is None:
+            _shared_client = ElasticsearchClient(verify_connection=False)
+        return _shared_client
+
+
+def close_shared_es_client() -> None:
+    """关闭共享客户端（应用关闭时调用），之后再获取会重新创建"""
+    global _shared_client
+    with _shared_client_lock:
+        client, _shared_client = _shared_client, None
+    if client is not None:
+        client.close()
+
+
 class ArticleRepository:
     """文章数据仓库 - 封装 CRUD 操作"""
     
@@ -128,7 +253,7 @@ class ArticleRepository:
                     self.es.indices.delete(index=self.index_name)
                 else:
                     logger.info(f"索引 {self.index_name} 已存在")
-                    return True
+                    return self.ensure_analysis_mappings()
             
             # 定义索引映射
             mappings = {
@@ -192,9 +317,13 @@ class ArticleRepository:
                                     "type": {"type": "keyword"}
                                 }
                             },
-                            "analysis_success": {"type": "boolean"}
+                            "analysis_success": {"type": "boolean"},
+                            **ANALYSIS_FIELD_MAPPINGS["content_analysis"]["properties"]
                         }
                     },
+                    "triage": ANALYSIS_FIELD_MAPPINGS["triage"],
+                    "analysis_status": ANALYSIS_FIELD_MAPPINGS["analysis_status"],
+                    "analysis_backfill": ANALYSIS_FIELD_MAPPINGS["analysis_backfill"],
                     "status": {
                         "type": "keyword"
                     },
@@ -221,6 +350,22 @@ class ArticleRepository:
             logger.error(f"❌ 创建索引失败: {e}")
             return False
     
+    def ensure_analysis_mappings(self) -> bool:
+        """
+        在已有索引上补齐分析字段的映射（ANALYSIS_FIELD_MAPPINGS，可重复调用）
+        
+        Returns:
+            bool: 是否成功（索引不存在，或字段已被动态映射为其他类型时为 False，后者需要重建索引）
+        """
+        try:
+            if not self.es.indices.exists(index=self.index_name):
+                return False
+            self.es.indices.put_mapping(index=self.index_name, properties=ANALYSIS_FIELD_MAPPINGS)
+            return True
+        except Exception as e:
+            logger.error(f"❌ 更新索引 {self.index_name} 的分析字段映射失败（字段类型冲突时需要重建索引）: {e}")
+            return False
+    
     def index_exists(self) -> bool:
         """检查索引是否存在"""
         return self.es.indices.exists(index=self.index_name)
@@ -248,6 +393,23 @@ class ArticleRepository:
             logger.error(f"❌ 创建文档失败: {e}")
             raise
     
+    @staticmethod
+    def document_id(doc: Dict[str, Any]) -> Optional[str]:
+        """
+        文档 ID：优先使用原文 URL，其次使用榜单 URL
+        
+        Args:
+            doc: 文档
+        
+        Returns:
+            文档 ID（没有 URL 时为 None，由 ES 自动生成）
+        """
+        if "original_url" in doc:
+            return doc["original_url"]
+        if "tophub_url" in doc:
+            return doc["tophub_url"]
+        return None
+    
     def bulk_create_documents(self, documents: List[Dict[str, Any]]) -> Dict[str, Any]:
         """
         批量创建文档
@@ -267,10 +429,9 @@ class ArticleRepository:
                     "_source": doc
                 }
                 # 如果文档有 URL，使用 URL 作为 ID（避免重复）
-                if "original_url" in doc:
-                    action["_id"] = doc["original_url"]
-                elif "tophub_url" in doc:
-                    action["_id"] = doc["tophub_url"]
+                doc_id = self.document_id(doc)
+                if doc_id:
+                    action["_id"] = doc_id
                 
                 actions.append(action)
             
@@ -289,6 +450,43 @@ class ArticleRepository:
             logger.error(f"❌ 批量创建失败: {e}")
             raise
     
+    def bulk_update_documents(self, updates: Dict[str, Dict[str, Any]]) -> Dict[str, Any]:
+        """
+        批量局部更新文档（只写入给定字段，其余字段保持不变）
+        
+        Args:
+            updates: 文档 ID → 要更新的字段
+        
+        Returns:
+            批量操作结果统计
+        """
+        try:
+            actions = [
+                {
+                    "_op_type": "update",
+                    "_index": self.index_name,
+                    "_id": doc_id,
+                    "doc": fields
+                }
+                for doc_id, fields in updates.items()
+            ]
+            if not actions:
+                return {"success": 0, "failed": 0, "failed_items": []}
+            
+            success, failed = bulk(self.es, actions, raise_on_error=False)
+            
+            logger.info(f"✅ 批量更新完成: 成功 {success} 条, 失败 {len(failed)} 条")
+            
+            return {
+                "success": success,
+                "failed": len(failed),
+                "failed_items": failed
+            }
+            
+        except Exception as e:
+            logger.error(f"❌ 批量更新失败: {e}")
+            raise
+    
     def get_document(self, doc_id: str) -> Optional[Dict[str, Any]]:
         """
         获取单个文档
@@ -612,6 +810,61 @@ class ArticleRepository:
             logger.error(f"❌ 搜索失败: {e}")
             raise
     
+    def scroll_documents(
+        self,
+        query: Optional[Dict[str, Any]] = None,
+        size: int = 500,
+        slice_id: Optional[int] = None,
+        max_slices: Optional[int] = None,
+        source: Optional[List[str]] = None,
+        scroll: str = "5m",
+        sort: Optional[List[Any]] = None
+    ):
+        """
+        滚动遍历匹配的文档，可按切片并行（每个切片单独调用一次）
+
+        Args:
+            query: 查询条件（ES DSL）
+            size: 每页数量
+            slice_id: 切片编号（0 ~ max_slices-1）
+            max_slices: 切片总数（大于 1 时启用 sliced scroll）
+            source: 只返回的字段
+            scroll: 滚动上下文保留时间
+            sort: 排序规则（默认按 _doc，遍历最快）
+
+        Yields:
+            每页的 (文档 ID, 文档) 列表
+        """
+        kwargs: Dict[str, Any] = {}
+        if max_slices and max_slices > 1:
+            kwargs["slice"] = {"id": slice_id or 0, "max": max_slices}
+        if source is not None:
+            kwargs["source"] = source
+
+        result = self.es.search(
+            index=self.index_name,
+            query=query or {"match_all": {}},
+            size=size,
+            scroll=scroll,
+            sort=sort or ["_doc"],
+            **kwargs
+        )
+        scroll_id = result.get("_scroll_id")
+        try:
+            while True:
+                hits = result["hits"]["hits"]
+                if not hits:
+                    break
+                yield [(hit["_id"], hit["_source"]) for hit in hits]
+                result = self.es.scroll(scroll_id=scroll_id, scroll=scroll)
+                scroll_id = result.get("_scroll_id", scroll_id)
+        finally:
+            if scroll_id:
+                try:
+                    self.es.clear_scroll(scroll_id=scroll_id)
+                except Exception as e:
+                    logger.warning(f"清理滚动上下文失败: {e}")
+
     def search_by_keyword(
         self,
         keyword: str,
@@ -12,6 +12,51 @@ from .llm_provider import (
     chat_completion,
     chat_completion_stream,
 )
+from .concurrency import (
+    AdaptiveConcurrencyLimiter,
+    get_concurrency_limiter,
+    concurrency_stats,
+    diff_concurrency_stats,
+    latency_class,
+)
+from .rate_limiter import (
+    RateLimiter,
+    get_rate_limiter,
+    rate_limit_stats,
+)
+from .router import (
+    LLMRouter,
+    get_router,
+)
+from .structured import (
+    StructuredOutputError,
+    structured_completion,
+    structured_output_stats,
+    diff_structured_output_stats,
+)
+from .resilience import (
+    RetryPolicy,
+    resilient_call,
+    resilience_stats,
+    diff_resilience_stats,
+)
+from .telemetry import (
+    LLMTelemetry,
+    get_telemetry,
+    llm_metrics,
+    diff_llm_metrics,
+)
+from .batch import (
+    BatchClient,
+    OpenAIBatchClient,
+    LocalBatchClient,
+    create_batch_client,
+)
+from .provider_registry import (
+    ProviderRegistry,
+    get_provider,
+    close_providers,
+)
 
 __all__ = [
     "LLMProvider",
@@ -23,4 +68,33 @@ __all__ = [
     "LLMFactory",
     "chat_completion",
     "chat_completion_stream",
+    "AdaptiveConcurrencyLimiter",
+    "get_concurrency_limiter",
+    "concurrency_stats",
+    "diff_concurrency_stats",
+    "latency_class",
+    "RateLimiter",
+    "get_rate_limiter",
+    "rate_limit_stats",
+    "LLMRouter",
+    "get_router",
+    "StructuredOutputError",
+    "structured_completion",
+    "structured_output_stats",
+    "diff_structured_output_stats",
+    "RetryPolicy",
+    "resilient_call",
+    "resilience_stats",
+    "diff_resilience_stats",
+    "LLMTelemetry",
+    "get_telemetry",
+    "llm_metrics",
+    "diff_llm_metrics",
+    "BatchClient",
+    "OpenAIBatchClient",
+    "LocalBatchClient",
+    "create_batch_client",
+    "ProviderRegistry",
+    "get_provider",
+    "close_providers",
 ]
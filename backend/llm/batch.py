@@ -0,0 +1,360 @@
+"""
+离线批处理任务（OpenAI Batch API 格式）
+把大量请求写成 JSONL 请求文件一次提交，由服务端在完成窗口内异步处理，价格和吞吐都优于在线调用。
+
+请求文件每行一个请求：
+    {"custom_id": "...", "method": "POST", "url": "/v1/chat/completions", "body": {...}}
+结果文件每行一个结果：
+    {"custom_id": "...", "response": {"status_code": 200, "body": {...}}, "error": null}
+
+- OpenAIBatchClient：OpenAI 兼容的 /files + /batches 接口（OpenAI、SiliconFlow、支持批处理的本地部署）
+- LocalBatchClient：本地替身，在进程内逐条调用 chat_completion() 生成同格式的结果文件，用于测试和不支持批处理的提供商
+"""
+import asyncio
+import contextlib
+import json
+import logging
+import os
+import time
+import uuid
+from abc import ABC, abstractmethod
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import httpx
+
+from .llm_provider import LLMProvider, chat_completion
+
+logger = logging.getLogger(__name__)
+
+CHAT_COMPLETIONS_URL = "/v1/chat/completions"
+
+# 批处理任务的终态
+TERMINAL_STATUSES = ("completed", "failed", "expired", "cancelled")
+
+# 支持批处理的提供商：(API Key 环境变量, Base URL 环境变量, 默认 Base URL)
+_BATCH_ENDPOINTS = {
+    LLMProvider.OPENAI: ("OPENAI_API_KEY", "OPENAI_BASE_URL", "https://api.openai.com/v1"),
+    LLMProvider.SILICONFLOW: ("SILICONFLOW_API_KEY", "SILICONFLOW_BASE_URL", "https://api.siliconflow.cn/v1"),
+    LLMProvider.LOCAL: ("LOCAL_LLM_API_KEY", "LOCAL_LLM_BASE_URL", "http://localhost:8000/v1"),
+}
+
+
+def make_batch_request(custom_id: str, body: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    构建请求文件中的一行
+
+    Args:
+        custom_id: 请求标识（结果按它对应回来）
+        body: /v1/chat/completions 的请求体（需包含 model 和 messages）
+
+    Returns:
+        dict: 请求行
+    """
+    return {"custom_id": custom_id, "method": "POST", "url": CHAT_COMPLETIONS_URL, "body": body}
+
+
+def write_batch_file(path: str, requests: Iterable[Dict[str, Any]]) -> int:
+    """
+    写入 JSONL 请求文件
+
+    Args:
+        path: 文件路径
+        requests: 请求行
+
+    Returns:
+        int: 写入的请求数
+    """
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    count = 0
+    with open(path, "w", encoding="utf-8") as f:
+        for request in requests:
+            f.write(json.dumps(request, ensure_ascii=False) + "\n")
+            count += 1
+    return count
+
+
+def read_batch_file(path: str) -> List[Dict[str, Any]]:
+    """读取 JSONL 请求文件（跳过空行）"""
+    with open(path, "r", encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def parse_batch_output(text: str) -> Tuple[Dict[str, str], Dict[str, str]]:
+    """
+    解析结果文件
+
+    Args:
+        text: 结果文件内容（JSONL）
+
+    Returns:
+        Tuple[Dict[str, str], Dict[str, str]]: (custom_id → 生成文本, custom_id → 错误信息)
+    """
+    outputs: Dict[str, str] = {}
+    errors: Dict[str, str] = {}
+    for line in text.splitlines():
+        if not line.strip():
+            continue
+        try:
+            entry = json.loads(line)
+        except ValueError:
+            logger.warning(f"忽略无法解析的批处理结果行: {line[:100]}")
+            continue
+        custom_id = entry.get("custom_id")
+        if custom_id is None:
+            continue
+        response = entry.get("response") or {}
+        if entry.get("error") or response.get("status_code") != 200:
+            error = entry.get("error") or response.get("body", {}).get("error") or f"HTTP {response.get('status_code')}"
+            errors[custom_id] = error.get("message", str(error)) if isinstance(error, dict) else str(error)
+            continue
+        try:
+            outputs[custom_id] = response["body"]["choices"][0]["message"]["content"]
+        except (KeyError, IndexError, TypeError):
+            errors[custom_id] = "结果中缺少生成内容"
+    return outputs, errors
+
+
+class BatchClient(ABC):
+    """批处理任务客户端"""
+
+    @abstractmethod
+    async def submit(self, path: str) -> str:
+        """
+        提交请求文件
+
+        Args:
+            path: JSONL 请求文件路径
+
+        Returns:
+            str: 批处理任务 ID
+        """
+
+    @abstractmethod
+    async def status(self, batch_id: str) -> Dict[str, Any]:
+        """
+        查询任务状态
+
+        Returns:
+            dict: status（validating / in_progress / finalizing / completed / failed / expired / cancelled）、
+            request_counts 等
+        """
+
+    @abstractmethod
+    async def download(self, batch_id: str) -> str:
+        """下载已完成任务的结果文件内容（JSONL）"""
+
+    async def close(self) -> None:
+        """释放连接"""
+
+
+class OpenAIBatchClient(BatchClient):
+    """OpenAI 兼容的批处理接口：上传文件（purpose=batch）→ 创建任务 → 轮询 → 下载结果文件"""
+
+    def __init__(
+        self,
+        api_key: str,
+        base_url: str,
+        completion_window: str = "24h",
+        timeout: float = 120.0,
+        http_client: Optional[httpx.AsyncClient] = None,
+    ):
+        """
+        Args:
+            api_key: API 密钥
+            base_url: API 基础 URL（如 https://api.openai.com/v1）
+            completion_window: 完成窗口
+            timeout: 单次 HTTP 请求超时（秒）
+            http_client: HTTP 客户端（可选，测试用）
+        """
+        self.base_url = base_url.rstrip("/")
+        self.completion_window = completion_window
+        self._owns_client = http_client is None
+        self.client = http_client or httpx.AsyncClient(timeout=timeout)
+        self.headers = {"Authorization": f"Bearer {api_key}"}
+
+    async def submit(self, path: str) -> str:
+        with open(path, "rb") as f:
+            response = await self.client.post(
+                f"{self.base_url}/files",
+                headers=self.headers,
+                data={"purpose": "batch"},
+                files={"file": (os.path.basename(path), f, "application/jsonl")},
+            )
+        response.raise_for_status()
+        file_id = response.json()["id"]
+
+        response = await self.client.post(
+            f"{self.base_url}/batches",
+            headers=self.headers,
+            json={
+                "input_file_id": file_id,
+                "endpoint": CHAT_COMPLETIONS_URL,
+                "completion_window": self.completion_window,
+            },
+        )
+        response.raise_for_status()
+        batch_id = response.json()["id"]
+        logger.info(f"批处理任务已提交: {batch_id}（输入文件 {file_id}）")
+        return batch_id
+
+    async def status(self, batch_id: str) -> Dict[str, Any]:
+        response = await self.client.get(f"{self.base_url}/batches/{batch_id}", headers=self.headers)
+        response.raise_for_status()
+        return response.json()
+
+    async def download(self, batch_id: str) -> str:
+        batch = await self.status(batch_id)
+        parts = []
+        # 失败的请求写在 error_file_id 中，一并下载以便统计
+        for key in ("output_file_id", "error_file_id"):
+            file_id = batch.get(key)
+            if not file_id:
+                continue
+            response = await self.client.get(f"{self.base_url}/files/{file_id}/content", headers=self.headers)
+            response.raise_for_status()
+            parts.append(response.text.strip())
+        return "\n".join(p for p in parts if p)
+
+    async def close(self) -> None:
+        if self._owns_client:
+            await self.client.aclose()
+
+
+class LocalBatchClient(BatchClient):
+    """批处理接口的本地替身：提交后在后台逐条调用 chat_completion()，生成与 Batch API 相同格式的结果"""
+
+    def __init__(self, provider: Optional[LLMProvider] = None, max_concurrent: int = 4):
+        """
+        Args:
+            provider: 执行请求的提供商（默认使用默认提供商）
+            max_concurrent: 同时执行的请求数
+        """
+        self.provider = provider
+        self.max_concurrent = max_concurrent
+        self._jobs: Dict[str, Dict[str, Any]] = {}
+
+    async def submit(self, path: str) -> str:
+        requests = read_batch_file(path)
+        batch_id = f"batch_local_{uuid.uuid4().hex[:12]}"
+        job = {
+            "id": batch_id,
+            "status": "in_progress",
+            "request_counts": {"total": len(requests), "completed": 0, "failed": 0},
+            "results": [],
+        }
+        job["task"] = asyncio.ensure_future(self._run(job, requests))
+        self._jobs[batch_id] = job
+        return batch_id
+
+    async def _run(self, job: Dict[str, Any], requests: List[Dict[str, Any]]) -> None:
+        semaphore = asyncio.Semaphore(self.max_concurrent) if self.max_concurrent else contextlib.nullcontext()
+
+        async def run_one(request: Dict[str, Any]) -> Dict[str, Any]:
+            body = dict(request.get("body") or {})
+            messages = body.pop("messages", [])
+            model = body.pop("model", None)
+            async with semaphore:
+                try:
+                    content = await chat_completion(messages, provider=self.provider, model=model, **body)
+                except Exception as e:
+                    job["request_counts"]["failed"] += 1
+                    return {
+                        "id": f"req_{uuid.uuid4().hex[:12]}",
+                        "custom_id": request.get("custom_id"),
+                        "response": None,
+                        "error": {"code": type(e).__name__, "message": str(e)},
+                    }
+            job["request_counts"]["completed"] += 1
+            return {
+                "id": f"req_{uuid.uuid4().hex[:12]}",
+                "custom_id": request.get("custom_id"),
+                "response": {
+                    "status_code": 200,
+                    "body": {
+                        "object": "chat.completion",
+                        "model": model,
+                        "choices": [{"index": 0, "message": {"role": "assistant", "content": content}, "finish_reason": "stop"}],
+                    },
+                },
+                "error": None,
+            }
+
+        job["results"] = await asyncio.gather(*[run_one(request) for request in requests])
+        job["status"] = "completed"
+
+    async def status(self, batch_id: str) -> Dict[str, Any]:
+        job = self._jobs.get(batch_id)
+        if job is None:
+            raise KeyError(f"批处理任务不存在: {batch_id}")
+        return {k: v for k, v in job.items() if k not in ("task", "results")}
+
+    async def download(self, batch_id: str) -> str:
+        job = self._jobs[batch_id]
+        await job["task"]
+        return "\n".join(json.dumps(result, ensure_ascii=False) for result in job["results"])
+
+    async def close(self) -> None:
+        for job in self._jobs.values():
+            job["task"].cancel()
+
+
+def create_batch_client(provider: Optional[LLMProvider] = None, local: bool = False) -> BatchClient:
+    """
+    创建批处理客户端
+
+    Args:
+        provider: 提供商（默认读取 DEFAULT_LLM_PROVIDER）
+        local: 使用本地替身（不调用批处理接口，逐条在线请求）
+
+    Returns:
+        BatchClient: 客户端
+
+    Raises:
+        ValueError: 提供商不支持批处理接口，或未配置 API Key
+    """
+    from .llm_provider import LLMFactory
+
+    provider = LLMProvider(provider) if provider else LLMFactory.default_provider_type()
+    if local:
+        return LocalBatchClient(provider=provider)
+    if provider not in _BATCH_ENDPOINTS:
+        raise ValueError(f"提供商 {provider.value} 不支持批处理接口，可使用本地替身")
+    key_env, url_env, default_url = _BATCH_ENDPOINTS[provider]
+    api_key = os.getenv(key_env) or ("dummy" if provider == LLMProvider.LOCAL else None)
+    if not api_key:
+        raise ValueError(f"{key_env} 未配置")
+    return OpenAIBatchClient(api_key=api_key, base_url=os.getenv(url_env, default_url))
+
+
+async def wait_for_batch(
+    client: BatchClient,
+    batch_id: str,
+    poll_interval: float = 30.0,
+    timeout: Optional[float] = None,
+) -> Dict[str, Any]:
+    """
+    轮询直到任务进入终态
+
+    Args:
+        client: 批处理客户端
+        batch_id: 任务 ID
+        poll_interval: 轮询间隔（秒）
+        timeout: 最长等待时间（秒），None 表示不限
+
+    Returns:
+        dict: 任务的最终状态
+
+    Raises:
+        TimeoutError: 超过等待时间仍未结束（任务继续在服务端运行，之后可以用任务 ID 继续等待）
+    """
+    started = time.monotonic()
+    while True:
+        batch = await client.status(batch_id)
+        if batch.get("status") in TERMINAL_STATUSES:
+            return batch
+        if timeout is not None and time.monotonic() - started > timeout:
+            raise TimeoutError(f"批处理任务 {batch_id} 在 {timeout:.0f}s 内未完成（状态 {batch.get('status')}）")
+        logger.info(f"批处理任务 {batch_id}: {batch.get('status')} {batch.get('request_counts', {})}")
+        await asyncio.sleep(poll_interval)
@@ -0,0 +1,322 @@
+"""
+按提供商的自适应并发控制（AIMD）
+- 延迟正常时加性增加：每完成 limit 个请求，并发上限 +1
+- 遇到 429 / 503 / 超时或延迟突增时乘性减少：上限乘以 backoff_ratio
+- 同一次拥塞只退避一次（冷却时间内不重复减少）
+
+限流器可被多个事件循环（FastAPI 主循环、爬虫线程中的循环）同时使用，
+等待者通过 call_soon_threadsafe 唤醒。
+"""
+import asyncio
+import logging
+import os
+import threading
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Deque, Dict, Optional, Tuple
+
+import httpx
+
+logger = logging.getLogger(__name__)
+
+# 视为过载的 HTTP 状态码
+OVERLOAD_STATUS_CODES = (429, 503)
+
+
+def is_overload_error(error: BaseException) -> bool:
+    """
+    判断异常是否表示服务端过载（限流、超时）
+
+    兼容 httpx 异常和 OpenAI SDK 异常（RateLimitError、APITimeoutError 等带 status_code / response 的异常）
+    """
+    if isinstance(error, (asyncio.TimeoutError, httpx.TimeoutException)):
+        return True
+    if type(error).__name__ in ("RateLimitError", "APITimeoutError"):
+        return True
+    status_code = getattr(error, "status_code", None)
+    if status_code is None:
+        response = getattr(error, "response", None)
+        status_code = getattr(response, "status_code", None)
+    return status_code in OVERLOAD_STATUS_CODES
+
+
+# 未区分类别的请求使用的调用类别
+DEFAULT_CALL_CLASS = "default"
+
+
+def latency_class(max_tokens: Optional[int]) -> str:
+    """
+    按输出 token 上限划分调用类别（向上取到 2 的幂），用于分别计算延迟基线
+
+    分类请求（max_tokens=100）、单篇分析、多篇打包分析的输出预算不同，耗时也不同
+
+    Args:
+        max_tokens: 请求的最大输出 token 数，None 表示未指定
+
+    Returns:
+        str: 调用类别，如 "out<=128"
+    """
+    if not max_tokens:
+        return DEFAULT_CALL_CLASS
+    bucket = 1
+    while bucket < max_tokens:
+        bucket *= 2
+    return f"out<={bucket}"
+
+
+class AdaptiveConcurrencyLimiter:
+    """AIMD 自适应并发限流器"""
+
+    def __init__(
+        self,
+        name: str,
+        initial_limit: int = 4,
+        min_limit: int = 1,
+        max_limit: int = 32,
+        backoff_ratio: float = 0.5,
+        latency_tolerance: float = 2.0,
+        baseline_window: int = 50,
+    ):
+        """
+        Args:
+            name: 限流器名称（提供商）
+            initial_limit: 初始并发上限
+            min_limit: 最小并发上限
+            max_limit: 最大并发上限
+            backoff_ratio: 退避时的乘数
+            latency_tolerance: 延迟超过基线的倍数时视为延迟突增
+            baseline_window: 计算延迟基线（窗口内最小值）的样本数，每个调用类别单独计算
+        """
+        self.name = name
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.backoff_ratio = backoff_ratio
+        self.latency_tolerance = latency_tolerance
+        self.baseline_window = baseline_window
+
+        self._limit = float(min(max(initial_limit, min_limit), max_limit))
+        self._in_flight = 0
+        self._waiters: Deque[Tuple[asyncio.AbstractEventLoop, asyncio.Future]] = deque()
+        self._lock = threading.Lock()
+        self._samples: Dict[str, Deque[float]] = {}
+        self._latency_ewma: Optional[float] = None
+        self._last_decrease = 0.0
+
+        self.completed = 0
+        self.increases = 0
+        self.decreases = 0
+        self.overload_errors = 0
+
+    @property
+    def limit(self) -> int:
+        """当前并发上限"""
+        return int(self._limit)
+
+    @property
+    def in_flight(self) -> int:
+        """当前进行中的请求数"""
+        return self._in_flight
+
+    async def acquire(self) -> None:
+        """获取一个并发名额（超过上限时排队等待）"""
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            if not self._waiters and self._in_flight < self.limit:
+                self._in_flight += 1
+                return
+            future = loop.create_future()
+            self._waiters.append((loop, future))
+        try:
+            await future
+        except asyncio.CancelledError:
+            with self._lock:
+                try:
+                    self._waiters.remove((loop, future))
+                except ValueError:
+                    # 名额已经分配给了被取消的等待者，归还
+                    self._in_flight -= 1
+                    self._wake_waiters()
+            raise
+
+    def release(self) -> None:
+        """归还并发名额"""
+        with self._lock:
+            self._in_flight -= 1
+            self._wake_waiters()
+
+    def _wake_waiters(self) -> None:
+        """在上限内唤醒排队的等待者（调用方持有锁）"""
+        while self._waiters and self._in_flight < self.limit:
+            loop, future = self._waiters.popleft()
+            if loop.is_closed():
+                continue
+            self._in_flight += 1
+            loop.call_soon_threadsafe(_resolve, future)
+
+    def record_success(self, latency_s: float, call_class: str = DEFAULT_CALL_CLASS) -> None:
+        """
+        记录一次成功请求
+
+        延迟基线按调用类别分别计算：100 token 的分类请求和多篇打包、长文分片请求耗时相差一个数量级，
+        共用一个基线会把正常的长请求误判为延迟突增
+
+        Args:
+            latency_s: 请求耗时（秒）
+            call_class: 调用类别（见 latency_class()）
+        """
+        with self._lock:
+            self.completed += 1
+            self._latency_ewma = latency_s if self._latency_ewma is None else 0.8 * self._latency_ewma + 0.2 * latency_s
+            samples = self._samples.setdefault(call_class, deque(maxlen=self.baseline_window))
+            baseline = min(samples) if samples else None
+            samples.append(latency_s)
+
+            if baseline is not None and latency_s > baseline * self.latency_tolerance and len(samples) >= 5:
+                self._decrease(f"延迟突增 {latency_s * 1000:.0f}ms (基线 {baseline * 1000:.0f}ms，{call_class})")
+                return
+
+            if self._limit < self.max_limit:
+                # 加性增加：每完成约 limit 个请求上限 +1
+                previous = self.limit
+                self._limit = min(self.max_limit, self._limit + 1.0 / self._limit)
+                if self.limit > previous:
+                    self.increases += 1
+                self._wake_waiters()
+
+    def record_error(self, error: BaseException) -> None:
+        """
+        记录一次失败请求（只有过载类错误会触发退避）
+
+        Args:
+            error: 请求抛出的异常
+        """
+        if not is_overload_error(error):
+            return
+        with self._lock:
+            self.overload_errors += 1
+            self._decrease(f"{type(error).__name__}: {error}")
+
+    def _decrease(self, reason: str) -> None:
+        """乘性减少（调用方持有锁）。冷却时间为当前延迟均值，避免同一批失败连续退避"""
+        now = time.monotonic()
+        cooldown = self._latency_ewma or 1.0
+        if now - self._last_decrease < cooldown:
+            return
+        self._last_decrease = now
+        previous = self.limit
+        self._limit = max(float(self.min_limit), self._limit * self.backoff_ratio)
+        self.decreases += 1
+        logger.warning(f"LLM 并发退避 [{self.name}]: {previous} -> {self.limit}，原因: {reason}")
+
+    @asynccontextmanager
+    async def slot(self, record_latency: bool = True, call_class: str = DEFAULT_CALL_CLASS) -> AsyncIterator[None]:
+        """
+        占用一个并发名额，并根据请求结果自动调整上限
+
+        Args:
+            record_latency: 是否用本次耗时调整上限（输出长度不受限的流式请求耗时不可比，不宜参与）
+            call_class: 调用类别，延迟只和同类别请求的基线比较
+        """
+        await self.acquire()
+        started = time.perf_counter()
+        try:
+            yield
+        except GeneratorExit:
+            # 流式调用方读到需要的内容后提前停止（如结构化输出的 JSON 已完整），请求本身是成功的
+            if record_latency:
+                self.record_success(time.perf_counter() - started, call_class)
+            raise
+        except Exception as e:
+            self.record_error(e)
+            raise
+        else:
+            if record_latency:
+                self.record_success(time.perf_counter() - started, call_class)
+        finally:
+            self.release()
+
+    def stats(self) -> Dict[str, Any]:
+        """限流器状态"""
+        with self._lock:
+            samples = [s for s in self._samples.values() if s]
+            return {
+                "name": self.name,
+                "limit": self.limit,
+                "in_flight": self._in_flight,
+                "waiting": len(self._waiters),
+                "min_limit": self.min_limit,
+                "max_limit": self.max_limit,
+                "latency_baseline_ms": round(min(min(s) for s in samples) * 1000, 1) if samples else None,
+                "latency_baselines_ms": {name: round(min(s) * 1000, 1) for name, s in self._samples.items() if s},
+                "latency_ewma_ms": round(self._latency_ewma * 1000, 1) if self._latency_ewma is not None else None,
+                "completed": self.completed,
+                "increases": self.increases,
+                "decreases": self.decreases,
+                "overload_errors": self.overload_errors,
+            }
+
+
+def _resolve(future: asyncio.Future) -> None:
+    if not future.done():
+        future.set_result(None)
+
+
+_limiters: Dict[str, AdaptiveConcurrencyLimiter] = {}
+_limiters_lock = threading.Lock()
+
+
+def get_concurrency_limiter(provider: str) -> AdaptiveConcurrencyLimiter:
+    """
+    获取提供商的共享并发限流器
+
+    上下限读取环境变量 {PROVIDER}_MAX_CONCURRENCY / {PROVIDER}_MIN_CONCURRENCY（如 LOCAL_MAX_CONCURRENCY），
+    未设置时使用 LLM_MAX_CONCURRENCY（默认 32）/ LLM_MIN_CONCURRENCY（默认 1），
+    初始值读取 LLM_INITIAL_CONCURRENCY（默认 4）
+
+    Args:
+        provider: 提供商名称（LLMProvider 的值）
+
+    Returns:
+        AdaptiveConcurrencyLimiter: 限流器
+    """
+    with _limiters_lock:
+        limiter = _limiters.get(provider)
+        if limiter is None:
+            prefix = provider.upper()
+            limiter = AdaptiveConcurrencyLimiter(
+                name=provider,
+                initial_limit=int(os.getenv("LLM_INITIAL_CONCURRENCY", "4")),
+                min_limit=int(os.getenv(f"{prefix}_MIN_CONCURRENCY", os.getenv("LLM_MIN_CONCURRENCY", "1"))),
+                max_limit=int(os.getenv(f"{prefix}_MAX_CONCURRENCY", os.getenv("LLM_MAX_CONCURRENCY", "32"))),
+            )
+            _limiters[provider] = limiter
+        return limiter
+
+
+def concurrency_stats() -> Dict[str, Dict[str, Any]]:
+    """所有提供商限流器的当前状态"""
+    with _limiters_lock:
+        limiters = list(_limiters.values())
+    return {limiter.name: limiter.stats() for limiter in limiters}
+
+
+def diff_concurrency_stats(
+    before: Dict[str, Dict[str, Any]],
+    after: Dict[str, Dict[str, Any]]
+) -> Dict[str, Dict[str, Any]]:
+    """
+    两次 concurrency_stats() 快照之间的增量（用于单次爬取报告）
+
+    Returns:
+        dict: 只包含期间有请求的提供商；completed / increases / decreases / overload_errors 为增量，
+        limit、延迟基线等状态取 after 中的当前值
+    """
+    counters = ("completed", "increases", "decreases", "overload_errors")
+    result = {}
+    for name, current in after.items():
+        previous = before.get(name, {})
+        delta = {counter: current[counter] - previous.get(counter, 0) for counter in counters}
+        if delta["completed"] or delta["overload_errors"]:
+            result[name] = {**current, **delta}
+    return result
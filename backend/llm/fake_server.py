@@ -0,0 +1,407 @@
+"""
+确定性的 OpenAI 兼容假 LLM 服务（离线压测用）
+实现 /v1/chat/completions（流式和非流式）和 /v1/models，通过 LocalProvider 的 LOCAL_LLM_BASE_URL 接入，
+不需要 API key 即可测量分析流水线的吞吐：
+
+- 延迟：首 token 延迟按配置的分布采样（constant:ms / uniform:min,max / lognormal:中位数ms,sigma）
+- 输出速度：按每秒 token 数逐块输出（流式）或整体等待（非流式）
+- 故障注入：按比例返回 500 和 429（带 Retry-After），超过最大并发时返回 429
+- 响应：识别本项目的分析提示词（单篇、打包、分块、分类、摘要合并），返回由文章内容决定的 JSON，
+  同一篇文章无论单篇还是打包分析结果都相同；延迟和故障按种子确定（相同请求顺序得到相同结果）
+
+用法:
+    python -m backend.llm.fake_server --port 8009 --latency lognormal:300,0.5 --tokens-per-s 80 --rate-limit-rate 0.02
+    LOCAL_LLM_BASE_URL=http://127.0.0.1:8009/v1 DEFAULT_LLM_PROVIDER=local python run_crawler.py
+
+配置也可以读取环境变量：FAKE_LLM_LATENCY、FAKE_LLM_TOKENS_PER_S、FAKE_LLM_ERROR_RATE、FAKE_LLM_RATE_LIMIT_RATE、
+FAKE_LLM_RETRY_AFTER、FAKE_LLM_MAX_CONCURRENT、FAKE_LLM_SEED
+"""
+import argparse
+import asyncio
+import hashlib
+import json
+import logging
+import math
+import os
+import random
+import re
+import threading
+import time
+import uuid
+from collections import Counter
+from typing import Any, Dict, List, Optional
+
+from .token_estimator import estimate_messages_tokens, estimate_tokens
+
+logger = logging.getLogger(__name__)
+
+FAKE_CATEGORIES = ["科技", "财经", "社会", "娱乐", "体育"]
+FAKE_SENTIMENTS = ["positive", "neutral", "negative"]
+
+# 英文术语或连续汉字
+_TERM_PATTERN = re.compile(r"[A-Za-z][A-Za-z0-9+#.\-]*[A-Za-z0-9+#]|[一-鿿]+")
+_SENTENCE_END = re.compile(r"(?<=[。！？!?])")
+_PACKED_ARTICLE = re.compile(r"\[(\d+)\] 标题：(.*?)\n内容：\n(.*?)(?=\n\n\[\d+\] 标题：|\n\n请返回一个 JSON 数组)", re.S)
+_SINGLE_ARTICLE = re.compile(r"标题：(.*?)\n\n内容：\n(.*?)\n\n请以 JSON 格式返回", re.S)
+_CHUNK_ARTICLE = re.compile(r"以下是文章《(.*?)》的第 \d+/\d+ 部分.*?\n\n内容：\n(.*?)\n\n请以 JSON 格式返回", re.S)
+
+
+class LatencyDistribution:
+    """首 token 延迟分布"""
+
+    KINDS = ("constant", "uniform", "lognormal")
+
+    def __init__(self, kind: str = "constant", params: Optional[List[float]] = None):
+        """
+        Args:
+            kind: constant（params=[毫秒]）/ uniform（[最小, 最大]）/ lognormal（[中位数毫秒, sigma]）
+            params: 分布参数（毫秒）
+        """
+        if kind not in self.KINDS:
+            raise ValueError(f"未知的延迟分布: {kind}")
+        self.kind = kind
+        self.params = params or [0.0]
+
+    @classmethod
+    def parse(cls, spec: Optional[str]) -> "LatencyDistribution":
+        """解析 "constant:200" / "uniform:100,400" / "lognormal:300,0.5"，只写数字时为常量"""
+        spec = (spec or "0").strip()
+        kind, _, params = spec.rpartition(":")
+        return cls(kind or "constant", [float(p) for p in params.split(",") if p.strip()])
+
+    def sample(self, rng: random.Random) -> float:
+        """采样一次延迟（秒）"""
+        if self.kind == "uniform":
+            value = rng.uniform(self.params[0], self.params[-1])
+        elif self.kind == "lognormal":
+            sigma = self.params[1] if len(self.params) > 1 else 0.5
+            value = self.params[0] * math.exp(rng.gauss(0.0, sigma))
+        else:
+            value = self.params[0]
+        return max(0.0, value) / 1000
+
+
+class FakeLLMConfig:
+    """假 LLM 服务配置"""
+
+    def __init__(
+        self,
+        latency: Optional[LatencyDistribution] = None,
+        tokens_per_s: float = 0.0,
+        error_rate: float = 0.0,
+        rate_limit_rate: float = 0.0,
+        retry_after: float = 1.0,
+        max_concurrent: int = 0,
+        seed: int = 0
+    ):
+        """
+        Args:
+            latency: 首 token 延迟分布（默认无延迟）
+            tokens_per_s: 输出速度（token/秒，0 为立即输出）
+            error_rate: 返回 500 的比例
+            rate_limit_rate: 返回 429 的比例
+            retry_after: 429 响应的 Retry-After（秒）
+            max_concurrent: 最大并发请求数，超出时返回 429（0 为不限制）
+            seed: 随机种子
+        """
+        self.latency = latency or LatencyDistribution()
+        self.tokens_per_s = tokens_per_s
+        self.error_rate = error_rate
+        self.rate_limit_rate = rate_limit_rate
+        self.retry_after = retry_after
+        self.max_concurrent = max_concurrent
+        self.seed = seed
+
+    @classmethod
+    def from_env(cls) -> "FakeLLMConfig":
+        """从环境变量创建配置"""
+        return cls(
+            latency=LatencyDistribution.parse(os.getenv("FAKE_LLM_LATENCY", "0")),
+            tokens_per_s=float(os.getenv("FAKE_LLM_TOKENS_PER_S", "0")),
+            error_rate=float(os.getenv("FAKE_LLM_ERROR_RATE", "0")),
+            rate_limit_rate=float(os.getenv("FAKE_LLM_RATE_LIMIT_RATE", "0")),
+            retry_after=float(os.getenv("FAKE_LLM_RETRY_AFTER", "1")),
+            max_concurrent=int(os.getenv("FAKE_LLM_MAX_CONCURRENT", "0")),
+            seed=int(os.getenv("FAKE_LLM_SEED", "0")),
+        )
+
+
+def _digest(text: str) -> int:
+    return int.from_bytes(hashlib.sha256(text.encode("utf-8")).digest()[:8], "big")
+
+
+def _terms(text: str) -> List[str]:
+    """切出英文术语和汉字二元组"""
+    terms = []
+    for match in _TERM_PATTERN.finditer(text):
+        term = match.group()
+        if term[0] < "一":
+            terms.append(term)
+        else:
+            terms.extend(term[i:i + 2] for i in range(0, len(term) - 1, 2))
+    return terms
+
+
+def fake_analysis(title: str, content: str, max_keywords: int = 10, max_topics: int = 5) -> Dict[str, Any]:
+    """
+    由标题和正文确定的分析结果（字段与 ContentAnalysis 一致）
+
+    关键词按词频（标题权重 3）排序，类别和情感由标题哈希决定
+    """
+    counts = Counter(_terms(title) * 3 + _terms(content))
+    keywords = [term for term, _ in counts.most_common(max_keywords)]
+    sentences = [s.strip() for s in _SENTENCE_END.split(content) if s.strip()]
+    digest = _digest(title)
+    return {
+        "keywords": keywords,
+        "topics": keywords[:max_topics],
+        "summary": (sentences[0][:80] if sentences else f"关于{title}的文章"),
+        "sentiment": FAKE_SENTIMENTS[digest % len(FAKE_SENTIMENTS)],
+        "category": FAKE_CATEGORIES[(digest >> 8) % len(FAKE_CATEGORIES)],
+        "entities": [{"name": term, "type": "技术"} for term in keywords if term[0] < "一"][:3],
+    }
+
+
+def fake_completion(messages: List[Dict[str, str]]) -> str:
+    """
+    按本项目的提示词格式生成确定的回复
+
+    Returns:
+        str: 分析 JSON、打包分析 JSON 数组、分类 JSON 或纯文本
+    """
+    prompt = next((m.get("content") or "" for m in reversed(messages) if m.get("role") == "user"), "")
+    max_keywords = int((re.search(r"最多 (\d+) 个核心关键词", prompt) or [0, 10])[1])
+    max_topics = int((re.search(r"最多 (\d+) 个主要主题", prompt) or [0, 5])[1])
+
+    if prompt.startswith("请分别分析以下"):
+        return json.dumps([
+            {"index": int(index), **fake_analysis(title, content, max_keywords, max_topics)}
+            for index, title, content in _PACKED_ARTICLE.findall(prompt)
+        ], ensure_ascii=False)
+    if prompt.startswith("请快速判断"):
+        match = _SINGLE_ARTICLE.search(prompt)
+        title = match.group(1) if match else prompt
+        analysis = fake_analysis(title, match.group(2) if match else "")
+        relevance = round((_digest(title) >> 16) % 101 / 100, 2)
+        return json.dumps(
+            {"category": analysis["category"], "sentiment": analysis["sentiment"], "relevance": relevance},
+            ensure_ascii=False,
+        )
+    if "各部分的摘要" in prompt:
+        parts = re.findall(r"^\d+\. (.+)$", prompt, re.M)
+        return parts[0] if parts else "全文摘要"
+    match = _CHUNK_ARTICLE.search(prompt) or _SINGLE_ARTICLE.search(prompt)
+    if match:
+        return json.dumps(fake_analysis(match.group(1), match.group(2), max_keywords, max_topics), ensure_ascii=False)
+    return f"这是确定性的测试回复（{_digest(prompt):016x}）"
+
+
+def _split_chunks(text: str, size: int = 8) -> List[str]:
+    return [text[i:i + size] for i in range(0, len(text), size)] or [""]
+
+
+def create_fake_llm_app(config: Optional[FakeLLMConfig] = None):
+    """
+    创建假 LLM 服务的 FastAPI 应用
+
+    Args:
+        config: 服务配置（默认从环境变量读取）
+
+    Returns:
+        FastAPI: 应用（app.state.stats 为请求统计）
+    """
+    from fastapi import FastAPI, Request
+    from fastapi.responses import JSONResponse, StreamingResponse
+
+    config = config or FakeLLMConfig.from_env()
+    app = FastAPI(title="Fake LLM")
+    rng = random.Random(config.seed)
+    app.state.config = config
+    app.state.stats = {"requests": 0, "completed": 0, "errors": 0, "rate_limited": 0, "completion_tokens": 0, "in_flight": 0}
+    stats = app.state.stats
+
+    def error(status_code: int, message: str, error_type: str, headers=None):
+        return JSONResponse(
+            {"error": {"message": message, "type": error_type, "code": status_code}},
+            status_code=status_code,
+            headers=headers,
+        )
+
+    @app.get("/v1/models")
+    async def list_models():
+        return {"object": "list", "data": [{"id": "fake-model", "object": "model", "owned_by": "fake"}]}
+
+    @app.get("/stats")
+    async def get_stats():
+        return stats
+
+    @app.post("/v1/chat/completions")
+    async def chat_completions(request: Request):
+        body = await request.json()
+        stats["requests"] += 1
+        rate_limited = config.max_concurrent and stats["in_flight"] >= config.max_concurrent
+        draw = rng.random()
+        if rate_limited or draw < config.rate_limit_rate:
+            stats["rate_limited"] += 1
+            return error(429, "Rate limit exceeded", "rate_limit_error", {"Retry-After": f"{config.retry_after:g}"})
+        if draw < config.rate_limit_rate + config.error_rate:
+            stats["errors"] += 1
+            return error(500, "Injected server error", "server_error")
+
+        messages = body.get("messages") or []
+        model = body.get("model") or "fake-model"
+        ttft = config.latency.sample(rng)
+        content = fake_completion(messages)
+        usage = {"prompt_tokens": estimate_messages_tokens(messages), "completion_tokens": estimate_tokens(content)}
+        usage["total_tokens"] = usage["prompt_tokens"] + usage["completion_tokens"]
+        completion_id = f"chatcmpl-{uuid.uuid4().hex[:12]}"
+        created = int(time.time())
+
+        def token_delay(text: str) -> float:
+            return estimate_tokens(text) / config.tokens_per_s if config.tokens_per_s > 0 else 0.0
+
+        stats["in_flight"] += 1
+        if not body.get("stream"):
+            try:
+                await asyncio.sleep(ttft + token_delay(content))
+            finally:
+                stats["in_flight"] -= 1
+            stats["completed"] += 1
+            stats["completion_tokens"] += usage["completion_tokens"]
+            return {
+                "id": completion_id,
+                "object": "chat.completion",
+                "created": created,
+                "model": model,
+                "choices": [{"index": 0, "message": {"role": "assistant", "content": content}, "finish_reason": "stop"}],
+                "usage": usage,
+            }
+
+        include_usage = (body.get("stream_options") or {}).get("include_usage", False)
+
+        def event(choices, **extra) -> str:
+            chunk = {"id": completion_id, "object": "chat.completion.chunk", "created": created, "model": model,
+                     "choices": choices, **extra}
+            return f"data: {json.dumps(chunk, ensure_ascii=False)}\n\n"
+
+        async def events():
+            try:
+                await asyncio.sleep(ttft)
+                for index, piece in enumerate(_split_chunks(content)):
+                    if index:
+                        await asyncio.sleep(token_delay(piece))
+                    delta = {"role": "assistant", "content": piece} if index == 0 else {"content": piece}
+                    yield event([{"index": 0, "delta": delta, "finish_reason": None}])
+                yield event([{"index": 0, "delta": {}, "finish_reason": "stop"}])
+                if include_usage:
+                    yield event([], usage=usage)
+                yield "data: [DONE]\n\n"
+                stats["completed"] += 1
+                stats["completion_tokens"] += usage["completion_tokens"]
+            finally:
+                stats["in_flight"] -= 1
+
+        return StreamingResponse(events(), media_type="text/event-stream")
+
+    return app
+
+
+class FakeLLMServer:
+    """在后台线程中运行假 LLM 服务（uvicorn）"""
+
+    def __init__(self, config: Optional[FakeLLMConfig] = None, host: str = "127.0.0.1", port: int = 0):
+        """
+        Args:
+            config: 服务配置（默认从环境变量读取）
+            host: 监听地址
+            port: 监听端口（0 为随机空闲端口）
+        """
+        self.app = create_fake_llm_app(config)
+        self.host = host
+        self.port = port
+        self._server = None
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def base_url(self) -> str:
+        """OpenAI 兼容的 base URL（用于 LOCAL_LLM_BASE_URL）"""
+        return f"http://{self.host}:{self.port}/v1"
+
+    def stats(self) -> Dict[str, int]:
+        """请求统计：requests / completed / errors / rate_limited / completion_tokens / in_flight"""
+        return dict(self.app.state.stats)
+
+    def start(self, timeout: float = 10.0) -> "FakeLLMServer":
+        """启动服务并等待端口就绪"""
+        import uvicorn
+
+        self._server = uvicorn.Server(uvicorn.Config(
+            self.app, host=self.host, port=self.port, log_level="warning", lifespan="off"
+        ))
+        self._thread = threading.Thread(target=self._server.run, name="fake-llm-server", daemon=True)
+        self._thread.start()
+        deadline = time.monotonic() + timeout
+        while not self._server.started:
+            if time.monotonic() > deadline or not self._thread.is_alive():
+                raise RuntimeError("假 LLM 服务启动失败")
+            time.sleep(0.01)
+        self.port = self._server.servers[0].sockets[0].getsockname()[1]
+        logger.info(f"假 LLM 服务已启动: {self.base_url}")
+        return self
+
+    def stop(self) -> None:
+        """停止服务"""
+        if self._server is not None:
+            self._server.should_exit = True
+        if self._thread is not None:
+            self._thread.join(10)
+        self._server = self._thread = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.stop()
+
+
+def add_config_arguments(parser: argparse.ArgumentParser) -> None:
+    """添加服务配置的命令行参数（默认值读取环境变量）"""
+    defaults = FakeLLMConfig.from_env()
+    parser.add_argument("--latency", default=os.getenv("FAKE_LLM_LATENCY", "0"),
+                        help="首 token 延迟分布：constant:ms / uniform:min,max / lognormal:中位数ms,sigma")
+    parser.add_argument("--tokens-per-s", type=float, default=defaults.tokens_per_s, help="输出速度（0 为立即输出）")
+    parser.add_argument("--error-rate", type=float, default=defaults.error_rate, help="返回 500 的比例")
+    parser.add_argument("--rate-limit-rate", type=float, default=defaults.rate_limit_rate, help="返回 429 的比例")
+    parser.add_argument("--retry-after", type=float, default=defaults.retry_after, help="429 响应的 Retry-After（秒）")
+    parser.add_argument("--server-concurrency", type=int, default=defaults.max_concurrent, help="服务端最大并发，超出返回 429（0 为不限制）")
+    parser.add_argument("--seed", type=int, default=defaults.seed, help="随机种子")
+
+
+def config_from_args(args: argparse.Namespace) -> FakeLLMConfig:
+    """由 add_config_arguments() 的参数创建配置"""
+    return FakeLLMConfig(
+        latency=LatencyDistribution.parse(args.latency),
+        tokens_per_s=args.tokens_per_s,
+        error_rate=args.error_rate,
+        rate_limit_rate=args.rate_limit_rate,
+        retry_after=args.retry_after,
+        max_concurrent=args.server_concurrency,
+        seed=args.seed,
+    )
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="确定性的 OpenAI 兼容假 LLM 服务")
+    parser.add_argument("--host", default="127.0.0.1", help="监听地址")
+    parser.add_argument("--port", type=int, default=8009, help="监听端口")
+    add_config_arguments(parser)
+    args = parser.parse_args(argv)
+
+    import uvicorn
+
+    print(f"假 LLM 服务: http://{args.host}:{args.port}/v1（LOCAL_LLM_BASE_URL）")
+    uvicorn.run(create_fake_llm_app(config_from_args(args)), host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,351 @@
+"""
+流式 JSON 增量校验
+逐块读取 LLM 的流式输出，边解析边按 JSON Schema 检查结构，输出一旦偏离（语法错误、字段类型不符）
+立即报错，调用方可以马上停止生成，而不是等完整响应返回后才发现 json.loads 失败。
+
+支持的 Schema 子集：type（object / array / string / number / integer / boolean / null）、
+properties、items、$ref（#/$defs/...）、anyOf。未在 properties 中声明的字段只检查语法。
+"""
+import json
+from typing import Any, Dict, List, Optional, Set
+
+_WHITESPACE = " \t\r\n"
+_NUMBER_CHARS = set("0123456789+-.eE")
+_LITERALS = {"t": "true", "f": "false", "n": "null"}
+_VALUE_TYPES = {'"': "string", "{": "object", "[": "array", "t": "boolean", "f": "boolean", "n": "null"}
+
+
+class JSONSchemaViolation(ValueError):
+    """流式输出偏离了 JSON 语法或 Schema"""
+
+    def __init__(self, message: str, position: int):
+        super().__init__(f"{message} (位置 {position})")
+        self.position = position
+
+
+def _resolve(schema: Optional[Dict[str, Any]], root: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """展开 $ref（只支持本文档内的 #/$defs/...）"""
+    while schema and "$ref" in schema:
+        node: Any = root
+        for part in schema["$ref"].lstrip("#/").split("/"):
+            node = node[part]
+        schema = node
+    return schema
+
+
+def _allowed_types(schema: Optional[Dict[str, Any]], root: Dict[str, Any]) -> Optional[Set[str]]:
+    """Schema 允许的 JSON 类型，None 表示不限"""
+    schema = _resolve(schema, root)
+    if not schema:
+        return None
+    if "anyOf" in schema:
+        types: Set[str] = set()
+        for option in schema["anyOf"]:
+            option_types = _allowed_types(option, root)
+            if option_types is None:
+                return None
+            types |= option_types
+        return types
+    declared = schema.get("type")
+    if declared is None:
+        return None
+    types = set(declared) if isinstance(declared, list) else {declared}
+    if "integer" in types:
+        types.add("number")
+    return types
+
+
+def _branch(schema: Optional[Dict[str, Any]], root: Dict[str, Any], json_type: str) -> Optional[Dict[str, Any]]:
+    """anyOf 中与实际类型匹配的分支"""
+    schema = _resolve(schema, root)
+    if schema and "anyOf" in schema:
+        for option in schema["anyOf"]:
+            types = _allowed_types(option, root)
+            if types is None or json_type in types:
+                return _resolve(option, root)
+        return None
+    return schema
+
+
+class IncrementalJSONValidator:
+    """按 Schema 增量校验流式 JSON 文本"""
+
+    def __init__(self, schema: Optional[Dict[str, Any]] = None):
+        """
+        Args:
+            schema: JSON Schema（如 ContentAnalysis.model_json_schema()），None 表示只检查语法
+        """
+        self.schema = schema or {}
+        self.complete = False
+        self.violation: Optional[JSONSchemaViolation] = None
+        self.position = 0
+
+        self._chars: List[str] = []
+        # 解析栈：每层为 {"kind": "object"/"array", "schema": ..., "state": ..., "key": ...}
+        self._stack: List[Dict[str, Any]] = []
+        self._started = False
+        self._fence = False
+        # 当前标量（字符串 / 数字 / 字面量）的解析状态
+        self._scalar: Optional[str] = None
+        self._scalar_buffer: List[str] = []
+        self._escape = False
+        self._is_key = False
+        self._literal = ""
+        # 最近一个完整值之后的位置，以及在该位置闭合所有容器所需的后缀
+        self._safe_length = 0
+        self._safe_closers = ""
+
+    @property
+    def text(self) -> str:
+        """已接收的 JSON 文本（不含代码块标记；完整后不含根值之后的内容）"""
+        return "".join(self._chars)
+
+    def feed(self, chunk: str) -> bool:
+        """
+        输入一段输出
+
+        Args:
+            chunk: 流式输出的文本片段
+
+        Returns:
+            bool: 根值是否已经完整（完整后调用方可以停止读取）
+
+        Raises:
+            JSONSchemaViolation: 输出偏离语法或 Schema
+        """
+        for char in chunk:
+            if self.complete:
+                break
+            self._step(char)
+            self.position += 1
+        return self.complete
+
+    def repair(self) -> Any:
+        """
+        本地修复不完整或偏离的输出（不需要再调用模型）
+
+        依次尝试：
+        1. 输出只是被截断时，补全未闭合的字符串和容器（保留写了一半的字符串）
+        2. 回退到最近一个完整值之后，丢弃其后的内容再闭合容器
+
+        Returns:
+            Any: 修复后解析出的值（可能缺少部分字段）
+
+        Raises:
+            JSONSchemaViolation: 无法修复
+        """
+        candidates = []
+        if self.violation is None:
+            try:
+                candidates.append(self.text + self._closing_suffix())
+            except JSONSchemaViolation:
+                pass
+        if self._safe_length:
+            candidates.append("".join(self._chars[:self._safe_length]) + self._safe_closers)
+
+        for candidate in candidates:
+            try:
+                return json.loads(candidate)
+            except ValueError:
+                continue
+        raise JSONSchemaViolation("输出无法修复", self.position)
+
+    def _closing_suffix(self) -> str:
+        """把当前不完整的文本补全为合法 JSON 所需的后缀，无法直接补全（如对象键之后）时抛出 JSONSchemaViolation"""
+        suffix = ""
+        if self._scalar == "string":
+            if self._is_key:
+                raise JSONSchemaViolation("输出在对象键处截断", self.position)
+            suffix += "\\" if self._escape else ""
+            suffix += '"'
+        elif self._scalar == "number":
+            if not self._scalar_buffer or self._scalar_buffer[-1] in "+-.eE":
+                raise JSONSchemaViolation("输出在数字中间截断", self.position)
+        elif self._scalar == "literal":
+            suffix += self._literal[len(self._scalar_buffer):]
+
+        if self._stack and self._scalar is None:
+            # 只有最内层容器可能停在"等待下一个值"的位置，外层容器都在等待内层值结束
+            innermost = self._stack[-1]
+            if innermost["state"] in ("colon", "value", "key"):
+                raise JSONSchemaViolation("输出在对象成员中间截断", self.position)
+
+        for frame in reversed(self._stack):
+            suffix += "}" if frame["kind"] == "object" else "]"
+        return suffix
+
+    def _fail(self, message: str) -> None:
+        self.violation = JSONSchemaViolation(message, self.position)
+        raise self.violation
+
+    def _mark_safe(self) -> None:
+        """记录当前位置可以安全截断"""
+        self._safe_length = len(self._chars)
+        self._safe_closers = "".join("}" if f["kind"] == "object" else "]" for f in reversed(self._stack))
+
+    def _step(self, char: str) -> None:
+        if not self._started:
+            self._prefix(char)
+            return
+
+        if self._scalar is not None:
+            self._chars.append(char)
+            self._scalar_step(char)
+            return
+
+        if char in _WHITESPACE:
+            self._chars.append(char)
+            return
+
+        frame = self._stack[-1]
+        self._chars.append(char)
+        if frame["kind"] == "object":
+            self._object_step(frame, char)
+        else:
+            self._array_step(frame, char)
+
+    def _prefix(self, char: str) -> None:
+        """根值之前：跳过空白和 ```json 代码块标记"""
+        if self._fence:
+            if char == "\n":
+                self._fence = False
+            return
+        if char in _WHITESPACE:
+            return
+        if char == "`":
+            self._fence = True
+            return
+        self._started = True
+        self._chars.append(char)
+        self._begin_value(char, self.schema)
+
+    def _begin_value(self, char: str, schema: Optional[Dict[str, Any]]) -> None:
+        """开始解析一个值，并检查类型是否符合 Schema"""
+        if char == "-" or char.isdigit():
+            json_type = "number"
+        elif char in _VALUE_TYPES:
+            json_type = _VALUE_TYPES[char]
+        else:
+            self._fail(f"非法字符 {char!r}")
+
+        allowed = _allowed_types(schema, self.schema)
+        if allowed is not None and json_type not in allowed:
+            self._fail(f"类型不符：期望 {'/'.join(sorted(allowed))}，实际为 {json_type}")
+
+        if json_type == "object":
+            self._stack.append({"kind": "object", "schema": _branch(schema, self.schema, "object"), "state": "key_or_end", "key": None})
+            self._mark_safe()
+        elif json_type == "array":
+            self._stack.append({"kind": "array", "schema": _branch(schema, self.schema, "array"), "state": "value_or_end"})
+            self._mark_safe()
+        elif json_type == "string":
+            self._start_scalar("string")
+        elif json_type == "number":
+            self._start_scalar("number")
+            self._scalar_buffer.append(char)
+        else:
+            self._start_scalar("literal")
+            self._literal = _LITERALS[char]
+            self._scalar_buffer.append(char)
+
+    def _start_scalar(self, kind: str, is_key: bool = False) -> None:
+        self._scalar = kind
+        self._scalar_buffer = []
+        self._escape = False
+        self._is_key = is_key
+
+    def _scalar_step(self, char: str) -> None:
+        if self._scalar == "string":
+            if self._escape:
+                self._escape = False
+                self._scalar_buffer.append(char)
+            elif char == "\\":
+                self._escape = True
+                self._scalar_buffer.append(char)
+            elif char == '"':
+                self._end_string()
+            elif char in "\r\n" or ord(char) < 0x20:
+                self._fail("字符串中包含未转义的控制字符")
+            else:
+                self._scalar_buffer.append(char)
+        elif self._scalar == "number":
+            if char in _NUMBER_CHARS:
+                self._scalar_buffer.append(char)
+                return
+            # 数字在分隔符处结束，分隔符交给外层处理
+            self._chars.pop()
+            self._end_number()
+            self._step(char)
+        else:
+            self._scalar_buffer.append(char)
+            literal = "".join(self._scalar_buffer)
+            if not self._literal.startswith(literal):
+                self._fail(f"非法字面量 {literal!r}")
+            if literal == self._literal:
+                self._scalar = None
+                self._end_value()
+
+    def _end_string(self) -> None:
+        is_key = self._is_key
+        raw = "".join(self._scalar_buffer)
+        self._scalar = None
+        if is_key:
+            frame = self._stack[-1]
+            frame["key"] = json.loads(f'"{raw}"')
+            frame["state"] = "colon"
+        else:
+            self._end_value()
+
+    def _end_number(self) -> None:
+        raw = "".join(self._scalar_buffer)
+        self._scalar = None
+        try:
+            json.loads(raw)
+        except ValueError:
+            self._fail(f"非法数字 {raw!r}")
+        self._end_value()
+
+    def _end_value(self) -> None:
+        """一个值解析完成：更新外层状态，根值完成时标记完整"""
+        if not self._stack:
+            self.complete = True
+            return
+        self._stack[-1]["state"] = "comma_or_end"
+        self._mark_safe()
+
+    def _object_step(self, frame: Dict[str, Any], char: str) -> None:
+        state = frame["state"]
+        if state in ("key_or_end", "key") and char == '"':
+            self._start_scalar("string", is_key=True)
+        elif state == "key_or_end" and char == "}":
+            self._close_container()
+        elif state == "colon" and char == ":":
+            frame["state"] = "value"
+        elif state == "value":
+            schema = frame["schema"] or {}
+            properties = schema.get("properties") or {}
+            self._begin_value(char, properties.get(frame["key"]))
+        elif state == "comma_or_end" and char == ",":
+            frame["state"] = "key"
+        elif state == "comma_or_end" and char == "}":
+            self._close_container()
+        else:
+            self._fail(f"对象中出现意外的字符 {char!r}")
+
+    def _array_step(self, frame: Dict[str, Any], char: str) -> None:
+        state = frame["state"]
+        if state == "value_or_end" and char == "]":
+            self._close_container()
+        elif state in ("value_or_end", "value"):
+            schema = frame["schema"] or {}
+            self._begin_value(char, schema.get("items"))
+        elif state == "comma_or_end" and char == ",":
+            frame["state"] = "value"
+        elif state == "comma_or_end" and char == "]":
+            self._close_container()
+        else:
+            self._fail(f"数组中出现意外的字符 {char!r}")
+
+    def _close_container(self) -> None:
+        self._stack.pop()
+        self._end_value()
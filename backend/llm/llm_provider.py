@@ -6,11 +6,18 @@ import os
 import logging
 from typing import AsyncIterator, Dict, Any, Optional, List
 from abc import ABC, abstractmethod
+from contextlib import aclosing, asynccontextmanager
 from enum import Enum
 
 import httpx
 from dotenv import load_dotenv
 
+from .concurrency import get_concurrency_limiter, latency_class
+from .rate_limiter import get_rate_limiter
+from .telemetry import instrument_completion
+from .token_estimator import estimate_messages_tokens, estimate_tokens
+from .usage import UsageRecord, record_served_model, record_usage_from, track_usage
+
 load_dotenv()
 
 logger = logging.getLogger(__name__)
@@ -26,13 +33,17 @@ class LLMProvider(str, Enum):
 
 class BaseLLMProvider(ABC):
     """LLM 提供商基类"""
+
+    # 提供商类型（遥测按它区分，子类设置）
+    provider_type: Optional[LLMProvider] = None
     
     def __init__(
         self,
         api_key: Optional[str] = None,
         base_url: Optional[str] = None,
         model: Optional[str] = None,
-        timeout: int = 60
+        timeout: int = 60,
+        http_client: Optional[httpx.AsyncClient] = None
     ):
         """
         初始化 LLM 提供商
@@ -42,12 +53,15 @@ class BaseLLMProvider(ABC):
             base_url: API 基础 URL
             model: 默认模型名称
             timeout: 请求超时时间（秒）
+            http_client: 共享的 HTTP 客户端（可选）。传入时由调用方负责关闭，
+                provider.close() 不会关闭它
         """
         self.api_key = api_key
         self.base_url = base_url
         self.model = model
         self.timeout = timeout
-        self.client = httpx.AsyncClient(timeout=timeout)
+        self._owns_client = http_client is None
+        self.client = http_client if http_client is not None else httpx.AsyncClient(timeout=timeout)
     
     @abstractmethod
     async def chat_completion(
@@ -76,8 +90,9 @@ class BaseLLMProvider(ABC):
         pass
     
     async def close(self):
-        """关闭客户端连接"""
-        await self.client.aclose()
+        """关闭客户端连接（共享的 HTTP 客户端不关闭）"""
+        if self._owns_client:
+            await self.client.aclose()
     
     async def __aenter__(self):
         return self
@@ -88,20 +103,23 @@ class BaseLLMProvider(ABC):
 
 class OpenAIProvider(BaseLLMProvider):
     """OpenAI 提供商（使用 OpenAI Python SDK）"""
+
+    provider_type = LLMProvider.OPENAI
     
     def __init__(
         self,
         api_key: Optional[str] = None,
         base_url: Optional[str] = None,
         model: str = "gpt-3.5-turbo",
-        timeout: int = 60
+        timeout: int = 60,
+        http_client: Optional[httpx.AsyncClient] = None
     ):
         if api_key is None:
             api_key = os.getenv("OPENAI_API_KEY")
         if base_url is None:
             base_url = os.getenv("OPENAI_BASE_URL", "https://api.openai.com/v1")
         
-        super().__init__(api_key, base_url, model, timeout)
+        super().__init__(api_key, base_url, model, timeout, http_client)
         
         if not self.api_key:
             raise ValueError("OpenAI API key is required")
@@ -112,13 +130,15 @@ class OpenAIProvider(BaseLLMProvider):
             self.openai_client = AsyncOpenAI(
                 api_key=self.api_key,
                 base_url=self.base_url,
-                timeout=timeout
+                timeout=timeout,
+                http_client=http_client
             )
             logger.info("OpenAI SDK 初始化成功")
         except ImportError:
             logger.warning("OpenAI SDK 未安装，将使用 httpx 客户端")
             self.openai_client = None
     
+    @instrument_completion
     async def chat_completion(
         self,
         messages: List[Dict[str, str]],
@@ -144,11 +164,14 @@ class OpenAIProvider(BaseLLMProvider):
                         **kwargs
                     )
                     
-                    async for chunk in stream_response:
-                        if chunk.choices:
-                            delta = chunk.choices[0].delta
-                            if delta.content:
-                                yield delta.content
+                    async with stream_response:
+                        async for chunk in stream_response:
+                            # 部分服务在最后一个分块中返回 usage
+                            record_usage_from(getattr(chunk, "usage", None))
+                            if chunk.choices:
+                                delta = chunk.choices[0].delta
+                                if delta.content:
+                                    yield delta.content
                 else:
                     response = await self.openai_client.chat.completions.create(
                         model=model,
@@ -159,6 +182,7 @@ class OpenAIProvider(BaseLLMProvider):
                         **kwargs
                     )
                     
+                    record_usage_from(response.usage)
                     if response.choices:
                         content = response.choices[0].message.content
                         if content:
@@ -222,6 +246,7 @@ class OpenAIProvider(BaseLLMProvider):
                 response = await self.client.post(url, headers=headers, json=payload)
                 response.raise_for_status()
                 result = response.json()
+                record_usage_from(result.get("usage"))
                 content = result.get("choices", [{}])[0].get("message", {}).get("content", "")
                 yield content
                 
@@ -232,26 +257,30 @@ class OpenAIProvider(BaseLLMProvider):
     async def close(self):
         """关闭客户端连接"""
         await super().close()
-        if self.openai_client:
+        # AsyncOpenAI.close() 会关闭底层 HTTP 客户端，共享客户端时跳过
+        if self.openai_client and self._owns_client:
             await self.openai_client.close()
 
 
 class SiliconFlowProvider(BaseLLMProvider):
     """SiliconFlow 提供商（使用 OpenAI Python SDK）"""
+
+    provider_type = LLMProvider.SILICONFLOW
     
     def __init__(
         self,
         api_key: Optional[str] = None,
         base_url: Optional[str] = None,
         model: str = "Qwen/Qwen2.5-7B-Instruct",
-        timeout: int = 60
+        timeout: int = 60,
+        http_client: Optional[httpx.AsyncClient] = None
     ):
         if api_key is None:
             api_key = os.getenv("SILICONFLOW_API_KEY")
         if base_url is None:
             base_url = os.getenv("SILICONFLOW_BASE_URL", "https://api.siliconflow.cn/v1")
         
-        super().__init__(api_key, base_url, model, timeout)
+        super().__init__(api_key, base_url, model, timeout, http_client)
         
         if not self.api_key:
             raise ValueError("SiliconFlow API key is required")
@@ -262,13 +291,15 @@ class SiliconFlowProvider(BaseLLMProvider):
             self.openai_client = AsyncOpenAI(
                 api_key=self.api_key,
                 base_url=self.base_url,
-                timeout=timeout
+                timeout=timeout,
+                http_client=http_client
             )
             logger.info("SiliconFlow 使用 OpenAI SDK 初始化成功")
         except ImportError:
             logger.warning("OpenAI SDK 未安装，将使用 httpx 客户端")
             self.openai_client = None
     
+    @instrument_completion
     async def chat_completion(
         self,
         messages: List[Dict[str, str]],
@@ -294,11 +325,14 @@ class SiliconFlowProvider(BaseLLMProvider):
                         **kwargs
                     )
                     
-                    async for chunk in stream_response:
-                        if chunk.choices:
-                            delta = chunk.choices[0].delta
-                            if delta.content:
-                                yield delta.content
+                    async with stream_response:
+                        async for chunk in stream_response:
+                            # 部分服务在最后一个分块中返回 usage
+                            record_usage_from(getattr(chunk, "usage", None))
+                            if chunk.choices:
+                                delta = chunk.choices[0].delta
+                                if delta.content:
+                                    yield delta.content
                 else:
                     response = await self.openai_client.chat.completions.create(
                         model=model,
@@ -309,6 +343,7 @@ class SiliconFlowProvider(BaseLLMProvider):
                         **kwargs
                     )
                     
+                    record_usage_from(response.usage)
                     if response.choices:
                         content = response.choices[0].message.content
                         if content:
@@ -372,6 +407,7 @@ class SiliconFlowProvider(BaseLLMProvider):
                 response = await self.client.post(url, headers=headers, json=payload)
                 response.raise_for_status()
                 result = response.json()
+                record_usage_from(result.get("usage"))
                 content = result.get("choices", [{}])[0].get("message", {}).get("content", "")
                 yield content
                 
@@ -382,30 +418,35 @@ class SiliconFlowProvider(BaseLLMProvider):
     async def close(self):
         """关闭客户端连接"""
         await super().close()
-        if self.openai_client:
+        # AsyncOpenAI.close() 会关闭底层 HTTP 客户端，共享客户端时跳过
+        if self.openai_client and self._owns_client:
             await self.openai_client.close()
 
 
 class AlibabaProvider(BaseLLMProvider):
     """阿里百炼提供商"""
+
+    provider_type = LLMProvider.ALIBABA
     
     def __init__(
         self,
         api_key: Optional[str] = None,
         base_url: Optional[str] = None,
         model: str = "qwen-turbo",
-        timeout: int = 60
+        timeout: int = 60,
+        http_client: Optional[httpx.AsyncClient] = None
     ):
         if api_key is None:
             api_key = os.getenv("ALIBABA_API_KEY")
         if base_url is None:
             base_url = os.getenv("ALIBABA_BASE_URL", "https://dashscope.aliyuncs.com/api/v1")
         
-        super().__init__(api_key, base_url, model, timeout)
+        super().__init__(api_key, base_url, model, timeout, http_client)
         
         if not self.api_key:
             raise ValueError("Alibaba API key is required")
     
+    @instrument_completion
     async def chat_completion(
         self,
         messages: List[Dict[str, str]],
@@ -461,6 +502,8 @@ class AlibabaProvider(BaseLLMProvider):
                             try:
                                 import json
                                 chunk = json.loads(data)
+                                # 每个事件的 usage 是截至当前的累计值，最后一个事件即为整次请求的用量
+                                record_usage_from(chunk.get("usage"))
                                 output = chunk.get("output", {})
                                 choices = output.get("choices", [])
                                 
@@ -476,6 +519,7 @@ class AlibabaProvider(BaseLLMProvider):
                 response = await self.client.post(url, headers=headers, json=payload)
                 response.raise_for_status()
                 result = response.json()
+                record_usage_from(result.get("usage"))
                 output = result.get("output", {})
                 choices = output.get("choices", [])
                 
@@ -490,20 +534,23 @@ class AlibabaProvider(BaseLLMProvider):
 
 class LocalProvider(BaseLLMProvider):
     """本地私有化部署提供商（使用 OpenAI Python SDK）"""
+
+    provider_type = LLMProvider.LOCAL
     
     def __init__(
         self,
         api_key: Optional[str] = None,
         base_url: Optional[str] = None,
         model: str = "local-model",
-        timeout: int = 60
+        timeout: int = 60,
+        http_client: Optional[httpx.AsyncClient] = None
     ):
         if base_url is None:
             base_url = os.getenv("LOCAL_LLM_BASE_URL", "http://localhost:8000/v1")
         if api_key is None:
             api_key = os.getenv("LOCAL_LLM_API_KEY", "dummy")  # 本地可能不需要 key
         
-        super().__init__(api_key, base_url, model, timeout)
+        super().__init__(api_key, base_url, model, timeout, http_client)
         
         # 初始化 OpenAI 客户端
         try:
@@ -511,13 +558,15 @@ class LocalProvider(BaseLLMProvider):
             self.openai_client = AsyncOpenAI(
                 api_key=self.api_key,
                 base_url=self.base_url,
-                timeout=timeout
+                timeout=timeout,
+                http_client=http_client
             )
             logger.info(f"LocalProvider 使用 OpenAI SDK 初始化成功: {self.base_url}")
         except ImportError:
             logger.warning("OpenAI SDK 未安装，将使用 httpx 客户端")
             self.openai_client = None
     
+    @instrument_completion
     async def chat_completion(
         self,
         messages: List[Dict[str, str]],
@@ -544,11 +593,14 @@ class LocalProvider(BaseLLMProvider):
                         **kwargs
                     )
                     
-                    async for chunk in stream_response:
-                        if chunk.choices:
-                            delta = chunk.choices[0].delta
-                            if delta.content:
-                                yield delta.content
+                    async with stream_response:
+                        async for chunk in stream_response:
+                            # 部分服务在最后一个分块中返回 usage
+                            record_usage_from(getattr(chunk, "usage", None))
+                            if chunk.choices:
+                                delta = chunk.choices[0].delta
+                                if delta.content:
+                                    yield delta.content
                 else:
                     # 非流式调用
                     response = await self.openai_client.chat.completions.create(
@@ -560,6 +612,7 @@ class LocalProvider(BaseLLMProvider):
                         **kwargs
                     )
                     
+                    record_usage_from(response.usage)
                     if response.choices:
                         content = response.choices[0].message.content
                         if content:
@@ -625,6 +678,7 @@ class LocalProvider(BaseLLMProvider):
                 response = await self.client.post(url, headers=headers, json=payload)
                 response.raise_for_status()
                 result = response.json()
+                record_usage_from(result.get("usage"))
                 content = result.get("choices", [{}])[0].get("message", {}).get("content", "")
                 yield content
                 
@@ -635,7 +689,8 @@ class LocalProvider(BaseLLMProvider):
     async def close(self):
         """关闭客户端连接"""
         await super().close()
-        if self.openai_client:
+        # AsyncOpenAI.close() 会关闭底层 HTTP 客户端，共享客户端时跳过
+        if self.openai_client and self._owns_client:
             await self.openai_client.close()
 
 
@@ -656,7 +711,8 @@ class LLMFactory:
         api_key: Optional[str] = None,
         base_url: Optional[str] = None,
         model: Optional[str] = None,
-        timeout: int = 60
+        timeout: int = 60,
+        http_client: Optional[httpx.AsyncClient] = None
     ) -> BaseLLMProvider:
         """
         创建 LLM 提供商实例
@@ -667,6 +723,7 @@ class LLMFactory:
             base_url: API 基础 URL
             model: 模型名称
             timeout: 超时时间
+            http_client: 共享的 HTTP 客户端（可选）
         
         Returns:
             BaseLLMProvider: 提供商实例
@@ -675,7 +732,7 @@ class LLMFactory:
             raise ValueError(f"Unsupported provider: {provider}")
         
         provider_class = cls._providers[provider]
-        kwargs = {"timeout": timeout}
+        kwargs = {"timeout": timeout, "http_client": http_client}
         
         if api_key:
             kwargs["api_key"] = api_key
@@ -687,21 +744,68 @@ class LLMFactory:
         return provider_class(**kwargs)
     
     @classmethod
-    def get_default_provider(cls) -> BaseLLMProvider:
+    def default_provider_type(cls) -> LLMProvider:
         """
-        获取默认提供商（从环境变量读取）
+        默认提供商类型（从环境变量 DEFAULT_LLM_PROVIDER 读取）
         
         Returns:
-            BaseLLMProvider: 默认提供商实例
+            LLMProvider: 提供商类型，未知时为 SiliconFlow
         """
         provider_name = os.getenv("DEFAULT_LLM_PROVIDER", "siliconflow").lower()
         
         try:
-            provider = LLMProvider(provider_name)
-            return cls.create(provider)
+            return LLMProvider(provider_name)
         except ValueError:
             logger.warning(f"Unknown provider: {provider_name}, using SiliconFlow")
-            return cls.create(LLMProvider.SILICONFLOW)
+            return LLMProvider.SILICONFLOW
+    
+    @classmethod
+    def get_default_provider(cls) -> BaseLLMProvider:
+        """
+        获取默认提供商（从环境变量读取）
+        
+        Returns:
+            BaseLLMProvider: 默认提供商实例
+        """
+        return cls.create(cls.default_provider_type())
+
+
+# 未指定 max_tokens 时为输出预留的 token 数
+DEFAULT_COMPLETION_RESERVE = 1024
+
+
+@asynccontextmanager
+async def _guarded_call(
+    provider: LLMProvider,
+    messages: List[Dict[str, str]],
+    max_tokens: Optional[int],
+    record_latency: bool = True
+) -> AsyncIterator[UsageRecord]:
+    """
+    一次 LLM 调用的流量控制：
+    1. RPM/TPM 限流：按估算的输入 + 输出 token 预留额度，不足时排队
+    2. 自适应并发：占用并发名额，根据耗时和过载错误调整上限
+    3. 结束后按实际用量对账（没有产生输出的失败请求退还 token，提前停止的流式请求按已生成部分计量）
+    """
+    rate_limiter = get_rate_limiter(provider.value)
+    reservation = await rate_limiter.reserve(
+        estimate_messages_tokens(messages) + (max_tokens or DEFAULT_COMPLETION_RESERVE)
+    )
+    with track_usage() as usage:
+        try:
+            async with get_concurrency_limiter(provider.value).slot(
+                record_latency=record_latency, call_class=latency_class(max_tokens)
+            ):
+                yield usage
+        finally:
+            rate_limiter.reconcile(reservation, usage.total_tokens)
+
+
+def _estimate_usage(usage: UsageRecord, messages: List[Dict[str, str]], output: List[str]) -> None:
+    """服务端没有返回 usage 时用估算值代替"""
+    if not usage.reported:
+        usage.prompt_tokens = estimate_messages_tokens(messages)
+        usage.completion_tokens = estimate_tokens("".join(output))
 
 
 # 便捷函数
@@ -718,7 +822,7 @@ async def chat_completion_stream(
     
     Args:
         messages: 消息列表
-        provider: 提供商类型（可选，使用默认）
+        provider: 提供商类型（可选，配置了路由时由路由器选择，否则使用默认）
         model: 模型名称
         temperature: 温度参数
         max_tokens: 最大 token 数
@@ -732,23 +836,44 @@ async def chat_completion_stream(
         async for chunk in chat_completion_stream(messages):
             print(chunk, end="", flush=True)
     """
-    if provider:
-        llm = LLMFactory.create(provider)
-    else:
-        llm = LLMFactory.get_default_provider()
-    
-    try:
-        async for chunk in llm.chat_completion(
-            messages=messages,
-            model=model,
-            temperature=temperature,
-            max_tokens=max_tokens,
-            stream=True,
-            **kwargs
+    # 复用进程级注册表中的长连接 provider，不在每次调用后关闭
+    from .provider_registry import get_provider
+    from .router import get_router
+
+    # 未指定提供商时，配置了 LLM_ROUTER_WEIGHTS 则由路由器选择提供商（模型按提供商映射）
+    router = get_router() if provider is None else None
+    if router is not None:
+        async for chunk in router.chat_completion_stream(
+            messages, model=model, temperature=temperature, max_tokens=max_tokens, **kwargs
         ):
             yield chunk
-    finally:
-        await llm.close()
+        return
+
+    provider = LLMProvider(provider) if provider else LLMFactory.default_provider_type()
+    llm = get_provider(provider)
+    # 流式耗时取决于输出长度：限定了 max_tokens 时按同类别请求的基线参与延迟调节，
+    # 否则只占用并发名额、响应过载错误
+    async with _guarded_call(provider, messages, max_tokens, record_latency=max_tokens is not None) as usage:
+        output = []
+        try:
+            # 调用方提前停止读取时立即关闭上游连接，不再继续生成
+            async with aclosing(llm.chat_completion(
+                messages=messages,
+                model=model,
+                temperature=temperature,
+                max_tokens=max_tokens,
+                stream=True,
+                **kwargs
+            )) as chunks:
+                async for chunk in chunks:
+                    if not output:
+                        # 开始输出后路由器不会再转移，这就是实际响应的提供商
+                        record_served_model(provider, model)
+                    output.append(chunk)
+                    yield chunk
+        finally:
+            if output:
+                _estimate_usage(usage, messages, output)
 
 
 async def chat_completion(
@@ -764,7 +889,7 @@ async def chat_completion(
     
     Args:
         messages: 消息列表
-        provider: 提供商类型（可选，使用默认）
+        provider: 提供商类型（可选，配置了路由时由路由器选择，否则使用默认）
         model: 模型名称
         temperature: 温度参数
         max_tokens: 最大 token 数
@@ -778,15 +903,30 @@ async def chat_completion(
         response = await chat_completion(messages)
         print(response)
     """
+    from .provider_registry import get_provider
+    from .router import get_router
+
+    router = get_router() if provider is None else None
+    if router is not None:
+        return await router.chat_completion(
+            messages, model=model, temperature=temperature, max_tokens=max_tokens, **kwargs
+        )
+
+    # 真正的非流式请求：一次返回完整结果，不需要逐块解析 SSE
+    provider = LLMProvider(provider) if provider else LLMFactory.default_provider_type()
+    llm = get_provider(provider)
     result = []
-    async for chunk in chat_completion_stream(
-        messages=messages,
-        provider=provider,
-        model=model,
-        temperature=temperature,
-        max_tokens=max_tokens,
-        **kwargs
-    ):
-        result.append(chunk)
+    async with _guarded_call(provider, messages, max_tokens) as usage:
+        async for chunk in llm.chat_completion(
+            messages=messages,
+            model=model,
+            temperature=temperature,
+            max_tokens=max_tokens,
+            stream=False,
+            **kwargs
+        ):
+            result.append(chunk)
+        _estimate_usage(usage, messages, result)
+    record_served_model(provider, model)
     
     return "".join(result)
@@ -0,0 +1,184 @@
+"""
+进程级 LLM provider 注册表
+按 (事件循环, 提供商, base_url) 缓存 provider，同一组合共享一个支持 keep-alive / HTTP/2 的
+httpx.AsyncClient 连接池，避免每次调用都重新进行 DNS、TCP 和 TLS 握手。
+
+httpx.AsyncClient 绑定创建它的事件循环：FastAPI 进程使用主循环，爬虫在线程池中使用自己的循环，
+因此注册表按事件循环隔离。生命周期：
+- FastAPI: lifespan 关闭时调用 close_providers()
+- 爬虫: 每次运行结束时在其事件循环内调用 close_providers()
+"""
+import asyncio
+import logging
+import os
+import socket
+import threading
+from typing import Callable, Dict, Optional, Tuple
+
+import httpx
+
+from .llm_provider import BaseLLMProvider, LLMFactory, LLMProvider
+
+try:
+    import h2  # noqa: F401  httpx 的 HTTP/2 支持依赖 h2
+    HTTP2_AVAILABLE = True
+except ImportError:  # 可选依赖
+    HTTP2_AVAILABLE = False
+
+logger = logging.getLogger(__name__)
+
+_Key = Tuple[asyncio.AbstractEventLoop, LLMProvider, str]
+
+
+def create_http_client(timeout: float = 60) -> httpx.AsyncClient:
+    """
+    创建带连接池的 HTTP 客户端
+
+    连接池参数读取环境变量：
+    LLM_MAX_CONNECTIONS（默认 100）、LLM_MAX_KEEPALIVE_CONNECTIONS（默认 20）、
+    LLM_KEEPALIVE_EXPIRY（秒，默认 60）、LLM_HTTP2（默认在安装 h2 时开启）
+
+    Args:
+        timeout: 请求超时时间（秒）
+
+    Returns:
+        httpx.AsyncClient: HTTP 客户端
+    """
+    limits = httpx.Limits(
+        max_connections=int(os.getenv("LLM_MAX_CONNECTIONS", "100")),
+        max_keepalive_connections=int(os.getenv("LLM_MAX_KEEPALIVE_CONNECTIONS", "20")),
+        keepalive_expiry=float(os.getenv("LLM_KEEPALIVE_EXPIRY", "60")),
+    )
+    http2 = HTTP2_AVAILABLE and os.getenv("LLM_HTTP2", "1").lower() not in ("0", "false", "no")
+    return httpx.AsyncClient(timeout=timeout, limits=limits, http2=http2)
+
+
+def _shutdown_orphaned_connections(client: httpx.AsyncClient) -> int:
+    """
+    同步断开已关闭事件循环遗留的 HTTP 客户端中的连接
+
+    连接的传输层绑定在已关闭的事件循环上，无法再 await aclose()；这里直接 shutdown 底层 socket，
+    文件描述符随客户端对象被回收时释放
+
+    Args:
+        client: 已关闭事件循环中创建的 HTTP 客户端
+
+    Returns:
+        int: 断开的连接数（非连接池传输，如测试用的 MockTransport，返回 0）
+    """
+    pool = getattr(getattr(client, "_transport", None), "_pool", None)
+    dropped = 0
+    for connection in list(getattr(pool, "connections", ())):
+        stream = getattr(getattr(connection, "_connection", None), "_network_stream", None)
+        sock = stream.get_extra_info("socket") if stream is not None else None
+        if sock is None:
+            continue
+        try:
+            sock.shutdown(socket.SHUT_RDWR)
+            dropped += 1
+        except OSError:
+            # 连接已被对端关闭
+            pass
+    return dropped
+
+
+class ProviderRegistry:
+    """按事件循环隔离的长连接 provider 注册表"""
+
+    def __init__(self, client_factory: Callable[[float], httpx.AsyncClient] = create_http_client):
+        """
+        Args:
+            client_factory: HTTP 客户端工厂，参数为超时时间（秒）
+        """
+        self.client_factory = client_factory
+        self._providers: Dict[_Key, BaseLLMProvider] = {}
+        self._clients: Dict[_Key, httpx.AsyncClient] = {}
+        self._lock = threading.Lock()
+
+    def get(
+        self,
+        provider: Optional[LLMProvider] = None,
+        base_url: Optional[str] = None,
+        timeout: int = 60,
+    ) -> BaseLLMProvider:
+        """
+        获取当前事件循环中的共享 provider（不存在时创建）
+
+        Args:
+            provider: 提供商类型（可选，默认读取 DEFAULT_LLM_PROVIDER）
+            base_url: API 基础 URL（可选，默认使用提供商的环境变量配置）
+            timeout: 请求超时时间（秒），只在首次创建时生效
+
+        Returns:
+            BaseLLMProvider: 共享的 provider，调用方不要关闭它
+        """
+        loop = asyncio.get_running_loop()
+        provider = LLMProvider(provider) if provider else LLMFactory.default_provider_type()
+        key = (loop, provider, base_url or "")
+
+        with self._lock:
+            self._purge_closed_loops()
+            llm = self._providers.get(key)
+            if llm is None:
+                client = self.client_factory(timeout)
+                try:
+                    llm = LLMFactory.create(provider, base_url=base_url, timeout=timeout, http_client=client)
+                except Exception:
+                    # provider 创建失败（如缺少 API key）时不能遗留未关闭的连接池
+                    loop.create_task(client.aclose())
+                    raise
+                self._clients[key] = client
+                self._providers[key] = llm
+                logger.info(f"创建共享 LLM 连接池: {provider.value} {llm.base_url}")
+            return llm
+
+    def _purge_closed_loops(self) -> None:
+        """
+        丢弃已关闭事件循环的条目（事件循环结束前没有调用 close_providers()）
+
+        其连接已无法在原循环中 aclose()，这里同步断开连接池中的 socket，避免服务端连接一直挂起
+        """
+        for key in [k for k in self._providers if k[0].is_closed()]:
+            self._providers.pop(key, None)
+            client = self._clients.pop(key, None)
+            dropped = _shutdown_orphaned_connections(client) if client is not None else 0
+            logger.warning(
+                f"事件循环已关闭但未调用 close_providers()，丢弃 LLM 连接池: {key[1].value} {key[2]}，"
+                f"断开 {dropped} 个连接"
+            )
+
+    def __len__(self) -> int:
+        return len(self._providers)
+
+    async def close(self) -> None:
+        """关闭当前事件循环中的所有 provider 和连接池"""
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            keys = [k for k in self._providers if k[0] is loop]
+            entries = [(self._providers.pop(k), self._clients.pop(k)) for k in keys]
+
+        for llm, client in entries:
+            try:
+                await llm.close()
+                await client.aclose()
+            except Exception as e:
+                logger.warning(f"关闭 LLM 连接池失败: {e}")
+        if entries:
+            logger.info(f"已关闭 {len(entries)} 个 LLM 连接池")
+
+
+# 进程级共享注册表
+_registry = ProviderRegistry()
+
+
+def get_provider(
+    provider: Optional[LLMProvider] = None,
+    base_url: Optional[str] = None,
+) -> BaseLLMProvider:
+    """获取当前事件循环中的共享 provider，见 ProviderRegistry.get"""
+    return _registry.get(provider, base_url=base_url)
+
+
+async def close_providers() -> None:
+    """关闭当前事件循环中的共享 provider 和连接池"""
+    await _registry.close()
@@ -0,0 +1,188 @@
+"""
+按提供商的请求数 / token 数限流（令牌桶，RPM + TPM）
+请求前按估算的输入 + 输出 token 预留额度，请求结束后按实际用量对账（多退少补）。
+额度不足时调用方排队等待而不是失败：先扣减（允许欠额），再等待欠额按速率补满，
+因此等待顺序与到达顺序一致，大请求不会被小请求饿死。
+"""
+import asyncio
+import logging
+import os
+import threading
+import time
+from typing import Any, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class _Bucket:
+    """令牌桶（每分钟补满 capacity）"""
+
+    def __init__(self, per_minute: float):
+        self.capacity = float(per_minute)
+        self.rate = per_minute / 60.0
+        self.level = self.capacity
+        self.updated = time.monotonic()
+
+    def refill(self, now: float) -> None:
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self) -> float:
+        """欠额补满所需的时间（秒）"""
+        return -self.level / self.rate if self.level < 0 else 0.0
+
+
+class Reservation:
+    """一次请求预留的额度"""
+
+    __slots__ = ("tokens", "wait_s")
+
+    def __init__(self, tokens: int, wait_s: float):
+        self.tokens = tokens
+        self.wait_s = wait_s
+
+
+class RateLimiter:
+    """RPM + TPM 限流器（线程安全，可跨事件循环共享）"""
+
+    def __init__(self, name: str, rpm: Optional[float] = None, tpm: Optional[float] = None):
+        """
+        Args:
+            name: 限流器名称（提供商）
+            rpm: 每分钟请求数上限（None 表示不限制）
+            tpm: 每分钟 token 数上限（None 表示不限制）
+        """
+        self.name = name
+        self.rpm = rpm
+        self.tpm = tpm
+        self._requests = _Bucket(rpm) if rpm else None
+        self._tokens = _Bucket(tpm) if tpm else None
+        self._lock = threading.Lock()
+
+        self.reserved_requests = 0
+        self.reserved_tokens = 0
+        self.reconciled_tokens = 0
+        self.waited_requests = 0
+        self.total_wait_s = 0.0
+
+    @property
+    def enabled(self) -> bool:
+        return self._requests is not None or self._tokens is not None
+
+    async def reserve(self, tokens: int) -> Reservation:
+        """
+        预留一次请求和 tokens 个 token 的额度，额度不足时等待
+
+        Args:
+            tokens: 估算的输入 + 输出 token 数
+
+        Returns:
+            Reservation: 预留记录，请求结束后传给 reconcile()
+        """
+        if not self.enabled:
+            return Reservation(tokens, 0.0)
+
+        with self._lock:
+            now = time.monotonic()
+            wait_s = 0.0
+            if self._requests is not None:
+                self._requests.refill(now)
+                self._requests.level -= 1
+                wait_s = max(wait_s, self._requests.wait_time())
+            if self._tokens is not None:
+                self._tokens.refill(now)
+                self._tokens.level -= tokens
+                wait_s = max(wait_s, self._tokens.wait_time())
+            self.reserved_requests += 1
+            self.reserved_tokens += tokens
+            if wait_s > 0:
+                self.waited_requests += 1
+                self.total_wait_s += wait_s
+
+        if wait_s > 0:
+            logger.debug(f"LLM 限流 [{self.name}]: 等待 {wait_s:.2f}s")
+            try:
+                await asyncio.sleep(wait_s)
+            except asyncio.CancelledError:
+                # 排队中被取消：退还预留的请求数和 token
+                with self._lock:
+                    if self._requests is not None:
+                        self._requests.level += 1
+                    if self._tokens is not None:
+                        self._tokens.level += tokens
+                raise
+        return Reservation(tokens, wait_s)
+
+    def reconcile(self, reservation: Reservation, actual_tokens: int) -> None:
+        """
+        按实际用量对账：实际用量少于预留时退还，多于预留时补扣
+
+        Args:
+            reservation: reserve() 返回的预留记录
+            actual_tokens: 实际消耗的 token 数
+        """
+        if self._tokens is None:
+            return
+        delta = reservation.tokens - actual_tokens
+        with self._lock:
+            self._tokens.refill(time.monotonic())
+            self._tokens.level = min(self._tokens.capacity, self._tokens.level + delta)
+            self.reconciled_tokens += actual_tokens
+
+    def stats(self) -> Dict[str, Any]:
+        """限流器状态"""
+        with self._lock:
+            now = time.monotonic()
+            for bucket in (self._requests, self._tokens):
+                if bucket is not None:
+                    bucket.refill(now)
+            return {
+                "name": self.name,
+                "rpm": self.rpm,
+                "tpm": self.tpm,
+                "available_requests": round(self._requests.level, 1) if self._requests else None,
+                "available_tokens": round(self._tokens.level) if self._tokens else None,
+                "reserved_requests": self.reserved_requests,
+                "reserved_tokens": self.reserved_tokens,
+                "reconciled_tokens": self.reconciled_tokens,
+                "waited_requests": self.waited_requests,
+                "total_wait_s": round(self.total_wait_s, 2),
+            }
+
+
+_limiters: Dict[str, RateLimiter] = {}
+_limiters_lock = threading.Lock()
+
+
+def _env_number(name: str) -> Optional[float]:
+    value = os.getenv(name)
+    return float(value) if value else None
+
+
+def get_rate_limiter(provider: str) -> RateLimiter:
+    """
+    获取提供商的共享限流器
+
+    额度读取环境变量 {PROVIDER}_RPM / {PROVIDER}_TPM（如 SILICONFLOW_RPM=1000、SILICONFLOW_TPM=50000），
+    未设置时不限制
+
+    Args:
+        provider: 提供商名称（LLMProvider 的值）
+
+    Returns:
+        RateLimiter: 限流器
+    """
+    with _limiters_lock:
+        limiter = _limiters.get(provider)
+        if limiter is None:
+            prefix = provider.upper()
+            limiter = RateLimiter(provider, rpm=_env_number(f"{prefix}_RPM"), tpm=_env_number(f"{prefix}_TPM"))
+            _limiters[provider] = limiter
+        return limiter
+
+
+def rate_limit_stats() -> Dict[str, Dict[str, Any]]:
+    """所有启用了限流的提供商的当前状态"""
+    with _limiters_lock:
+        limiters = list(_limiters.values())
+    return {limiter.name: limiter.stats() for limiter in limiters if limiter.enabled}
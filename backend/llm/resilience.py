@@ -0,0 +1,280 @@
+"""
+LLM 调用的重试与对冲请求
+- 可重试错误（限流、超时、5xx、连接错误）按指数退避 + 全抖动重试，服务端给出 Retry-After 时优先使用
+- 对冲（可选）：请求耗时超过该调用滚动 p95 仍未返回时，再发一个相同请求（可以发往其他提供商），
+  先返回的结果生效，另一个被取消
+
+配置读取环境变量：
+LLM_RETRY_MAX_ATTEMPTS（默认 3）、LLM_RETRY_BASE_DELAY（秒，默认 0.5）、LLM_RETRY_MAX_DELAY（秒，默认 8）、
+LLM_HEDGE（默认关闭）、LLM_HEDGE_PROVIDER（对冲请求的提供商，默认与原请求相同）、
+LLM_HEDGE_MIN_SAMPLES（计算 p95 所需的最少样本数，默认 20）
+"""
+import asyncio
+import logging
+import os
+import random
+import threading
+from collections import deque
+from typing import Awaitable, Callable, Deque, Dict, Optional, TypeVar
+
+import httpx
+
+from .concurrency import is_overload_error
+from .llm_provider import LLMProvider
+from .telemetry import call_attempt
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+# 可重试的 HTTP 状态码（429 / 503 由 is_overload_error 判断）
+RETRYABLE_STATUS_CODES = (408, 409, 500, 502, 504)
+
+
+def _status_code(error: BaseException) -> Optional[int]:
+    status_code = getattr(error, "status_code", None)
+    if status_code is None:
+        status_code = getattr(getattr(error, "response", None), "status_code", None)
+    return status_code
+
+
+def is_retryable_error(error: BaseException) -> bool:
+    """
+    判断异常是否值得重试
+
+    限流、超时、5xx 和连接错误可以重试；参数错误、鉴权失败、输出格式错误等重试也不会成功
+    """
+    if is_overload_error(error):
+        return True
+    if isinstance(error, httpx.TransportError):
+        return True
+    if type(error).__name__ in ("APIConnectionError", "InternalServerError"):
+        return True
+    return _status_code(error) in RETRYABLE_STATUS_CODES
+
+
+def _retry_after(error: BaseException) -> Optional[float]:
+    """服务端通过 Retry-After 头给出的等待时间（秒）"""
+    headers = getattr(getattr(error, "response", None), "headers", None)
+    if not headers:
+        return None
+    try:
+        value = float(headers.get("retry-after", ""))
+    except (TypeError, ValueError):
+        return None
+    return value if value >= 0 else None
+
+
+class RetryPolicy:
+    """指数退避 + 全抖动的重试策略"""
+
+    def __init__(
+        self,
+        max_attempts: int = 3,
+        base_delay: float = 0.5,
+        max_delay: float = 8.0,
+        multiplier: float = 2.0,
+        rng: Optional[random.Random] = None,
+    ):
+        """
+        Args:
+            max_attempts: 最多尝试次数（含第一次）
+            base_delay: 第一次重试前的最大等待时间（秒）
+            max_delay: 单次等待时间上限（秒）
+            multiplier: 每次重试等待上限的倍数
+            rng: 随机数生成器（测试用）
+        """
+        self.max_attempts = max(1, max_attempts)
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.multiplier = multiplier
+        self._rng = rng or random.Random()
+
+    @classmethod
+    def from_env(cls) -> "RetryPolicy":
+        """从环境变量创建重试策略"""
+        return cls(
+            max_attempts=int(os.getenv("LLM_RETRY_MAX_ATTEMPTS", "3")),
+            base_delay=float(os.getenv("LLM_RETRY_BASE_DELAY", "0.5")),
+            max_delay=float(os.getenv("LLM_RETRY_MAX_DELAY", "8")),
+        )
+
+    def delay(self, attempt: int, error: Optional[BaseException] = None) -> float:
+        """
+        第 attempt 次失败（从 0 开始）后的等待时间
+
+        全抖动：在 [0, min(max_delay, base_delay * multiplier^attempt)] 中均匀取值，避免大量请求同时重试。
+        服务端给出 Retry-After 时使用该值（不超过 max_delay）。
+        """
+        retry_after = _retry_after(error) if error is not None else None
+        if retry_after is not None:
+            return min(retry_after, self.max_delay)
+        ceiling = min(self.max_delay, self.base_delay * self.multiplier ** attempt)
+        return self._rng.uniform(0, ceiling)
+
+
+class LatencyTracker:
+    """按调用类型统计滚动延迟分位数"""
+
+    def __init__(self, window: int = 200):
+        self.window = window
+        self._samples: Dict[str, Deque[float]] = {}
+        self._lock = threading.Lock()
+
+    def record(self, key: str, latency_s: float) -> None:
+        with self._lock:
+            self._samples.setdefault(key, deque(maxlen=self.window)).append(latency_s)
+
+    def percentile(self, key: str, q: float, min_samples: int = 1) -> Optional[float]:
+        """
+        滚动分位数（秒）
+
+        Args:
+            key: 调用类型
+            q: 分位（0-1）
+            min_samples: 样本不足时返回 None
+        """
+        with self._lock:
+            samples = sorted(self._samples.get(key, ()))
+        if len(samples) < max(1, min_samples):
+            return None
+        return samples[min(len(samples) - 1, int(len(samples) * q))]
+
+
+class _Stats:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.counters = {"calls": 0, "retries": 0, "gave_up": 0, "hedges_sent": 0, "hedges_won": 0}
+
+    def add(self, **deltas: int) -> None:
+        with self._lock:
+            for name, value in deltas.items():
+                self.counters[name] += value
+
+    def snapshot(self) -> Dict[str, int]:
+        with self._lock:
+            return dict(self.counters)
+
+
+_latency = LatencyTracker()
+_stats = _Stats()
+
+
+def resilience_stats() -> Dict[str, int]:
+    """
+    重试与对冲统计
+
+    Returns:
+        dict: calls / retries / gave_up（重试耗尽或不可重试）/ hedges_sent / hedges_won（对冲请求先返回）
+    """
+    return _stats.snapshot()
+
+
+def diff_resilience_stats(before: Dict[str, int], after: Dict[str, int]) -> Dict[str, int]:
+    """两次 resilience_stats() 快照之间的增量（用于单次爬取报告）"""
+    return {name: value - before.get(name, 0) for name, value in after.items()}
+
+
+def _hedge_enabled() -> bool:
+    return os.getenv("LLM_HEDGE", "0").lower() in ("1", "true", "yes")
+
+
+async def hedged_call(
+    call: Callable[[Optional[LLMProvider]], Awaitable[T]],
+    hedge_after: float,
+    provider: Optional[LLMProvider] = None,
+    hedge_provider: Optional[LLMProvider] = None,
+) -> T:
+    """
+    对冲请求：hedge_after 秒后原请求仍未返回时再发一个，先成功的结果生效
+
+    Args:
+        call: 发起一次请求，参数为提供商
+        hedge_after: 发出对冲请求前等待的时间（秒）
+        provider: 原请求的提供商
+        hedge_provider: 对冲请求的提供商（默认与原请求相同）
+
+    Returns:
+        T: 先成功返回的结果；两个请求都失败时抛出原请求的异常
+    """
+    primary = asyncio.ensure_future(call(provider))
+    done, _ = await asyncio.wait({primary}, timeout=hedge_after)
+    if done:
+        return primary.result()
+
+    _stats.add(hedges_sent=1)
+    hedge_target = hedge_provider or provider
+    logger.info(f"LLM 请求超过 {hedge_after:.2f}s 未返回，发送对冲请求"
+                f"{f' [{hedge_target.value}]' if hedge_target else ''}")
+    hedge = asyncio.ensure_future(call(hedge_target))
+    pending = {primary, hedge}
+    try:
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception() is None:
+                    if task is hedge:
+                        _stats.add(hedges_won=1)
+                    return task.result()
+        # 都失败：抛出原请求的异常
+        return primary.result()
+    finally:
+        for task in pending:
+            task.cancel()
+
+
+async def resilient_call(
+    call: Callable[[Optional[LLMProvider]], Awaitable[T]],
+    provider: Optional[LLMProvider] = None,
+    key: Optional[str] = None,
+    policy: Optional[RetryPolicy] = None,
+    hedge: Optional[bool] = None,
+) -> T:
+    """
+    带重试（和可选对冲）的 LLM 调用
+
+    Args:
+        call: 发起一次请求，参数为提供商（对冲请求可能使用不同的提供商）
+        provider: 提供商（可选）
+        key: 延迟统计的调用类型（如 "analysis"），同类调用共享 p95；默认按提供商区分
+        policy: 重试策略（默认从环境变量读取）
+        hedge: 是否启用对冲（默认读取 LLM_HEDGE）
+
+    Returns:
+        T: 调用结果
+
+    Raises:
+        Exception: 不可重试的错误，或重试次数用尽后的最后一个错误
+    """
+    policy = policy or RetryPolicy.from_env()
+    hedge = _hedge_enabled() if hedge is None else hedge
+    key = f"{key or 'call'}:{LLMProvider(provider).value if provider else 'default'}"
+    hedge_provider = os.getenv("LLM_HEDGE_PROVIDER")
+    hedge_provider = LLMProvider(hedge_provider) if hedge_provider else None
+    min_samples = int(os.getenv("LLM_HEDGE_MIN_SAMPLES", "20"))
+    loop = asyncio.get_running_loop()
+    _stats.add(calls=1)
+
+    attempt = 0
+    while True:
+        started = loop.time()
+        try:
+            p95 = _latency.percentile(key, 0.95, min_samples=min_samples) if hedge else None
+            # 遥测把 attempt > 0 的请求计为所用提供商/模型的重试
+            with call_attempt(attempt):
+                if p95 is not None:
+                    result = await hedged_call(call, p95, provider=provider, hedge_provider=hedge_provider)
+                else:
+                    result = await call(provider)
+        except Exception as e:
+            attempt += 1
+            if not is_retryable_error(e) or attempt >= policy.max_attempts:
+                _stats.add(gave_up=1)
+                raise
+            delay = policy.delay(attempt - 1, e)
+            _stats.add(retries=1)
+            logger.warning(f"LLM 请求失败（第 {attempt} 次），{delay:.2f}s 后重试: {type(e).__name__}: {e}")
+            await asyncio.sleep(delay)
+            continue
+        _latency.record(key, loop.time() - started)
+        return result
@@ -0,0 +1,341 @@
+"""
+多提供商路由与故障转移
+按权重、滚动 p95 延迟和错误率把请求分配到多个提供商：
+- 得分 = 权重 × (最快 p95 / 自身 p95) × (1 - 错误率)²，按得分加权随机选择
+- 请求失败时在同一次调用内转移到下一个提供商（流式请求只在输出第一个片段前转移）
+- 连续失败达到阈值的提供商熔断一段时间，熔断期间只作为最后的备选
+
+通过环境变量 LLM_ROUTER_WEIGHTS 启用，如 "siliconflow=3,local=1"。
+未指定 provider 的 chat_completion() / chat_completion_stream() 调用会经过路由器，
+每个提供商使用自己的模型，见 routed_model()。
+"""
+import logging
+import os
+import random
+import threading
+import time
+from collections import deque
+from typing import Any, AsyncIterator, Deque, Dict, List, Optional
+
+from .llm_provider import LLMFactory, LLMProvider, chat_completion, chat_completion_stream
+
+logger = logging.getLogger(__name__)
+
+
+def parse_weights(spec: str) -> Dict[LLMProvider, float]:
+    """
+    解析权重配置
+
+    Args:
+        spec: 形如 "siliconflow=3,local=1" 的字符串（也接受 ":" 分隔）
+
+    Returns:
+        Dict[LLMProvider, float]: 提供商权重（忽略未知提供商和非正权重）
+    """
+    weights = {}
+    for item in spec.split(","):
+        item = item.strip()
+        if not item:
+            continue
+        name, _, value = item.replace(":", "=").partition("=")
+        try:
+            provider = LLMProvider(name.strip().lower())
+            weight = float(value) if value.strip() else 1.0
+        except ValueError:
+            logger.warning(f"忽略无效的路由权重配置: {item}")
+            continue
+        if weight > 0:
+            weights[provider] = weight
+    return weights
+
+
+def routed_model(provider: LLMProvider, model: Optional[str] = None) -> Optional[str]:
+    """
+    路由到某个提供商时使用的模型
+
+    调用方传入的模型（通常是 DEFAULT_LLM_MODEL）只对默认提供商有效，其他提供商不能使用同名模型
+
+    Args:
+        provider: 路由选中的提供商
+        model: 调用方指定的模型
+
+    Returns:
+        Optional[str]: 优先读取 {PROVIDER}_MODEL（如 SILICONFLOW_MODEL、LOCAL_MODEL）；
+        未设置时默认提供商使用调用方的模型，其他提供商为 None（使用提供商自身的默认模型）
+    """
+    configured = os.getenv(f"{provider.value.upper()}_MODEL")
+    if configured:
+        return configured
+    if provider == LLMFactory.default_provider_type():
+        return model
+    return None
+
+
+class ProviderHealth:
+    """单个提供商的滚动健康状态"""
+
+    def __init__(self, window: int = 100):
+        """
+        Args:
+            window: 统计延迟和错误率的最近请求数
+        """
+        self.latencies: Deque[float] = deque(maxlen=window)
+        self.outcomes: Deque[bool] = deque(maxlen=window)
+        self.consecutive_failures = 0
+        self.open_until = 0.0
+        self.requests = 0
+        self.failures = 0
+
+    def p95(self, min_samples: int = 5) -> Optional[float]:
+        """滚动 p95 延迟（秒），样本不足时为 None"""
+        if len(self.latencies) < min_samples:
+            return None
+        ordered = sorted(self.latencies)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))]
+
+    @property
+    def error_rate(self) -> float:
+        """最近请求的错误率"""
+        if not self.outcomes:
+            return 0.0
+        return self.outcomes.count(False) / len(self.outcomes)
+
+    def is_open(self, now: float) -> bool:
+        """是否处于熔断期"""
+        return now < self.open_until
+
+
+class LLMRouter:
+    """按延迟、错误率和权重在多个提供商之间路由请求"""
+
+    def __init__(
+        self,
+        weights: Dict[LLMProvider, float],
+        window: int = 100,
+        failure_threshold: int = 3,
+        cooldown_s: float = 30.0,
+        rng: Optional[random.Random] = None,
+    ):
+        """
+        Args:
+            weights: 提供商权重
+            window: 统计延迟和错误率的最近请求数
+            failure_threshold: 连续失败多少次后熔断
+            cooldown_s: 熔断时间（秒），熔断结束后放行请求试探
+            rng: 随机数生成器（测试用）
+        """
+        if not weights:
+            raise ValueError("LLMRouter requires at least one provider")
+        self.weights = dict(weights)
+        self.failure_threshold = failure_threshold
+        self.cooldown_s = cooldown_s
+        self._rng = rng or random.Random()
+        self._health = {provider: ProviderHealth(window) for provider in self.weights}
+        self._lock = threading.Lock()
+
+    @property
+    def providers(self) -> List[LLMProvider]:
+        """参与路由的提供商"""
+        return list(self.weights)
+
+    def _scores(self, now: float) -> Dict[LLMProvider, float]:
+        """各个未熔断提供商的得分（调用方持有锁）"""
+        healthy = [p for p in self.weights if not self._health[p].is_open(now)]
+        p95s = {p: self._health[p].p95() for p in healthy}
+        known = [v for v in p95s.values() if v]
+        fastest = min(known) if known else None
+
+        scores = {}
+        for provider in healthy:
+            health = self._health[provider]
+            # 还没有延迟样本的提供商按最快处理，保证能被探索到
+            speed = fastest / p95s[provider] if fastest and p95s[provider] else 1.0
+            reliability = (1.0 - health.error_rate) ** 2
+            scores[provider] = self.weights[provider] * max(speed * reliability, 0.01)
+        return scores
+
+    def order(self) -> List[LLMProvider]:
+        """
+        本次请求尝试提供商的顺序
+
+        Returns:
+            List[LLMProvider]: 未熔断的提供商按得分加权随机排序，熔断中的提供商按熔断结束时间排在最后
+        """
+        now = time.monotonic()
+        with self._lock:
+            scores = self._scores(now)
+            tripped = sorted(
+                (p for p in self.weights if p not in scores),
+                key=lambda p: self._health[p].open_until,
+            )
+
+            ordered = []
+            while scores:
+                pick = self._rng.uniform(0, sum(scores.values()))
+                for provider, score in scores.items():
+                    pick -= score
+                    if pick <= 0:
+                        break
+                ordered.append(provider)
+                del scores[provider]
+        return ordered + tripped
+
+    def record_success(self, provider: LLMProvider, latency_s: Optional[float] = None) -> None:
+        """
+        记录一次成功请求
+
+        Args:
+            provider: 提供商
+            latency_s: 请求耗时（秒），未知时不计入延迟统计
+        """
+        with self._lock:
+            health = self._health[provider]
+            health.requests += 1
+            health.outcomes.append(True)
+            health.consecutive_failures = 0
+            health.open_until = 0.0
+            if latency_s is not None:
+                health.latencies.append(latency_s)
+
+    def record_failure(self, provider: LLMProvider, error: BaseException) -> None:
+        """
+        记录一次失败请求，连续失败达到阈值时熔断
+
+        Args:
+            provider: 提供商
+            error: 请求抛出的异常
+        """
+        with self._lock:
+            health = self._health[provider]
+            health.requests += 1
+            health.failures += 1
+            health.outcomes.append(False)
+            health.consecutive_failures += 1
+            if health.consecutive_failures >= self.failure_threshold:
+                health.open_until = time.monotonic() + self.cooldown_s
+                logger.warning(
+                    f"LLM 提供商熔断 [{provider.value}] {self.cooldown_s:.0f}s，"
+                    f"连续失败 {health.consecutive_failures} 次: {type(error).__name__}: {error}"
+                )
+
+    async def chat_completion(
+        self, messages: List[Dict[str, str]], model: Optional[str] = None, **kwargs
+    ) -> str:
+        """
+        非流式聊天补全，失败时转移到下一个提供商
+
+        Args:
+            messages: 消息列表
+            model: 调用方指定的模型，按 routed_model() 映射到各提供商
+            **kwargs: 传给 chat_completion() 的其他参数（不含 provider）
+
+        Returns:
+            str: 完整的生成文本
+        """
+        last_error: Optional[BaseException] = None
+        for provider in self.order():
+            started = time.perf_counter()
+            try:
+                result = await chat_completion(
+                    messages, provider=provider, model=routed_model(provider, model), **kwargs
+                )
+            except Exception as e:
+                self.record_failure(provider, e)
+                logger.warning(f"LLM 请求失败 [{provider.value}]，尝试下一个提供商: {e}")
+                last_error = e
+                continue
+            self.record_success(provider, time.perf_counter() - started)
+            return result
+        raise last_error
+
+    async def chat_completion_stream(
+        self, messages: List[Dict[str, str]], model: Optional[str] = None, **kwargs
+    ) -> AsyncIterator[str]:
+        """
+        流式聊天补全，在输出第一个片段之前失败时转移到下一个提供商
+
+        Args:
+            messages: 消息列表
+            model: 调用方指定的模型，按 routed_model() 映射到各提供商
+            **kwargs: 传给 chat_completion_stream() 的其他参数（不含 provider）
+
+        Yields:
+            str: 生成的文本片段
+        """
+        last_error: Optional[BaseException] = None
+        for provider in self.order():
+            started = False
+            began = time.perf_counter()
+            try:
+                async for chunk in chat_completion_stream(
+                    messages, provider=provider, model=routed_model(provider, model), **kwargs
+                ):
+                    started = True
+                    yield chunk
+            except GeneratorExit:
+                # 调用方读到需要的内容后提前停止，按成功计
+                self.record_success(provider, time.perf_counter() - began)
+                raise
+            except Exception as e:
+                self.record_failure(provider, e)
+                if started:
+                    # 已经输出的内容无法撤回，不能再换提供商重来
+                    raise
+                logger.warning(f"LLM 流式请求失败 [{provider.value}]，尝试下一个提供商: {e}")
+                last_error = e
+                continue
+            self.record_success(provider, time.perf_counter() - began)
+            return
+        raise last_error
+
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        """各提供商的路由状态"""
+        now = time.monotonic()
+        with self._lock:
+            scores = self._scores(now)
+            result = {}
+            for provider, weight in self.weights.items():
+                health = self._health[provider]
+                p95 = health.p95()
+                result[provider.value] = {
+                    "weight": weight,
+                    "score": round(scores.get(provider, 0.0), 4),
+                    "p95_ms": round(p95 * 1000, 1) if p95 is not None else None,
+                    "error_rate": round(health.error_rate, 4),
+                    "requests": health.requests,
+                    "failures": health.failures,
+                    "circuit_open": health.is_open(now),
+                }
+            return result
+
+
+_router: Optional[LLMRouter] = None
+_router_spec: Optional[str] = None
+_router_lock = threading.Lock()
+
+
+def get_router() -> Optional[LLMRouter]:
+    """
+    获取进程级共享路由器
+
+    读取环境变量 LLM_ROUTER_WEIGHTS（如 "siliconflow=3,local=1"）、
+    LLM_ROUTER_FAILURE_THRESHOLD（默认 3）、LLM_ROUTER_COOLDOWN（秒，默认 30）。
+    配置变化时重新创建。
+
+    Returns:
+        Optional[LLMRouter]: 未配置 LLM_ROUTER_WEIGHTS 时为 None
+    """
+    global _router, _router_spec
+    spec = os.getenv("LLM_ROUTER_WEIGHTS", "").strip()
+    with _router_lock:
+        if spec != _router_spec:
+            weights = parse_weights(spec)
+            _router = LLMRouter(
+                weights,
+                failure_threshold=int(os.getenv("LLM_ROUTER_FAILURE_THRESHOLD", "3")),
+                cooldown_s=float(os.getenv("LLM_ROUTER_COOLDOWN", "30")),
+            ) if weights else None
+            _router_spec = spec
+            if _router is not None:
+                logger.info(f"LLM 路由已启用: {', '.join(f'{p.value}={w}' for p, w in weights.items())}")
+        return _router
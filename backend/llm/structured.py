@@ -0,0 +1,215 @@
+"""
+结构化输出
+- 提供商支持时使用 JSON 模式（response_format: json_object / json_schema）
+- 流式读取输出并按 Schema 增量校验，一旦偏离立即停止生成，根值完整后也不再等待多余输出
+- 偏离或截断时先在本地修复，修复结果缺少必需字段时带上错误信息重试
+
+提供商的 JSON 模式读取环境变量 {PROVIDER}_RESPONSE_FORMAT（json_schema / json_object / none），
+默认 OpenAI 和本地部署（vLLM 等）使用 json_schema，SiliconFlow 和阿里百炼使用 json_object。
+"""
+import json
+import logging
+import os
+import threading
+from contextlib import aclosing
+from typing import Any, Dict, List, Optional, Sequence
+
+from .json_stream import IncrementalJSONValidator, JSONSchemaViolation
+from .llm_provider import LLMFactory, LLMProvider, chat_completion_stream
+from .token_estimator import estimate_tokens
+
+logger = logging.getLogger(__name__)
+
+_DEFAULT_RESPONSE_FORMATS = {
+    LLMProvider.OPENAI: "json_schema",
+    LLMProvider.SILICONFLOW: "json_object",
+    LLMProvider.ALIBABA: "json_object",
+    LLMProvider.LOCAL: "json_schema",
+}
+
+
+class StructuredOutputError(Exception):
+    """重试后仍然无法得到符合 Schema 的输出"""
+
+
+class _Stats:
+    """结构化输出统计（进程级）"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.counters = {
+            "requests": 0,
+            "completed": 0,
+            "early_stops": 0,
+            "violations": 0,
+            "repaired": 0,
+            "retries": 0,
+            "failed": 0,
+            "wasted_tokens": 0,
+        }
+
+    def add(self, **deltas: int) -> None:
+        with self._lock:
+            for name, value in deltas.items():
+                self.counters[name] += value
+
+    def snapshot(self) -> Dict[str, int]:
+        with self._lock:
+            return dict(self.counters)
+
+
+_stats = _Stats()
+
+
+def structured_output_stats() -> Dict[str, int]:
+    """
+    结构化输出统计
+
+    Returns:
+        dict: requests / completed（校验通过）/ early_stops（根值完整后不再读取剩余输出）/
+        violations（中途偏离被中止）/ repaired（本地修复）/ retries / failed / wasted_tokens（失败尝试生成的估算 token 数）
+    """
+    return _stats.snapshot()
+
+
+def diff_structured_output_stats(before: Dict[str, int], after: Dict[str, int]) -> Dict[str, int]:
+    """两次 structured_output_stats() 快照之间的增量（用于单次爬取报告）"""
+    return {name: value - before.get(name, 0) for name, value in after.items()}
+
+
+def response_format_for(provider: Optional[LLMProvider], schema: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """
+    提供商对应的 response_format 参数
+
+    Args:
+        provider: 提供商（None 时使用默认提供商；启用多提供商路由时统一使用 json_object）
+        schema: JSON Schema
+
+    Returns:
+        Optional[dict]: response_format 参数，不支持或根类型不是对象时为 None
+    """
+    if schema.get("type") != "object":
+        # JSON 模式只保证输出一个 JSON 对象
+        return None
+
+    if provider is None:
+        from .router import get_router
+        if get_router() is not None:
+            return {"type": "json_object"}
+        provider = LLMFactory.default_provider_type()
+    provider = LLMProvider(provider)
+
+    mode = os.getenv(f"{provider.value.upper()}_RESPONSE_FORMAT", _DEFAULT_RESPONSE_FORMATS[provider]).lower()
+    if mode == "json_schema":
+        return {
+            "type": "json_schema",
+            "json_schema": {"name": schema.get("title", "response"), "schema": schema},
+        }
+    if mode == "json_object":
+        return {"type": "json_object"}
+    return None
+
+
+def _has_required(value: Any, required: Sequence[str]) -> bool:
+    return isinstance(value, dict) and all(key in value for key in required)
+
+
+def _status_code(error: BaseException) -> Optional[int]:
+    """兼容 OpenAI SDK 异常（status_code）和 httpx.HTTPStatusError（response.status_code）"""
+    status_code = getattr(error, "status_code", None)
+    if status_code is None:
+        status_code = getattr(getattr(error, "response", None), "status_code", None)
+    return status_code
+
+
+async def structured_completion(
+    messages: List[Dict[str, str]],
+    schema: Dict[str, Any],
+    provider: Optional[LLMProvider] = None,
+    model: Optional[str] = None,
+    temperature: float = 0.3,
+    max_tokens: Optional[int] = None,
+    required: Sequence[str] = (),
+    max_retries: int = 1,
+) -> Any:
+    """
+    获取符合 Schema 的 JSON 输出
+
+    Args:
+        messages: 消息列表（提示词中应包含 "JSON"，部分提供商的 JSON 模式要求如此）
+        schema: JSON Schema（如 ContentAnalysis.model_json_schema()）
+        provider: 提供商（可选）
+        model: 模型名称
+        temperature: 温度参数（重试时降为 0）
+        max_tokens: 最大 token 数
+        required: 本地修复结果必须包含的字段，缺少时重试
+        max_retries: 最多重试次数
+
+    Returns:
+        Any: 解析后的 JSON 值
+
+    Raises:
+        StructuredOutputError: 重试后仍然失败
+    """
+    response_format = response_format_for(provider, schema)
+    _stats.add(requests=1)
+    error: Optional[Exception] = None
+    attempt = 0
+
+    while attempt <= max_retries:
+        if attempt:
+            _stats.add(retries=1)
+            temperature = 0.0
+            messages = messages + [{
+                "role": "user",
+                "content": f"上一次输出不符合要求（{error}）。请严格按照要求只返回 JSON，不要其他说明文字。",
+            }]
+        attempt += 1
+
+        kwargs = {"response_format": response_format} if response_format else {}
+        validator = IncrementalJSONValidator(schema)
+        try:
+            async with aclosing(chat_completion_stream(
+                messages,
+                provider=provider,
+                model=model,
+                temperature=temperature,
+                max_tokens=max_tokens,
+                **kwargs
+            )) as chunks:
+                async for chunk in chunks:
+                    if validator.feed(chunk):
+                        # 根值已经完整，后面的内容（代码块结束标记、解释文字）不必再生成
+                        _stats.add(early_stops=1)
+                        break
+        except JSONSchemaViolation as e:
+            error = e
+            _stats.add(violations=1)
+            logger.warning(f"结构化输出偏离 Schema，已停止生成: {e}")
+        except Exception as e:
+            if response_format and _status_code(e) == 400:
+                # 提供商不支持该 JSON 模式：去掉 response_format 重新请求（不计入重试），只依赖增量校验
+                logger.warning(f"提供商不支持 response_format，改为仅校验输出: {e}")
+                response_format = None
+                attempt -= 1
+                continue
+            raise
+        else:
+            if validator.complete:
+                _stats.add(completed=1)
+                return json.loads(validator.text)
+            error = JSONSchemaViolation("输出不完整", validator.position)
+
+        try:
+            value = validator.repair()
+        except JSONSchemaViolation:
+            value = None
+        if value is not None and _has_required(value, required):
+            _stats.add(repaired=1)
+            logger.info(f"结构化输出已在本地修复: {error}")
+            return value
+
+        _stats.add(wasted_tokens=estimate_tokens(validator.text))
+
+    _stats.add(failed=1)
+    raise StructuredOutputError(f"结构化输出失败: {error}")
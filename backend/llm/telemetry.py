@@ -0,0 +1,356 @@
+"""
+LLM 调用遥测
+每次 provider.chat_completion() 调用（用 instrument_completion 装饰）记录首 token 延迟、总耗时、
+输入/输出 token、是否为重试以及估算费用，按 提供商/模型 聚合：
+
+- 计数和 token、费用为进程启动以来的累计值
+- 首 token 延迟和总耗时为滚动直方图（最近 LLM_METRICS_WINDOW_S 秒，默认 600）
+
+费用按 LLM_PRICES 配置的单价估算，格式为 模型=输入单价:输出单价（每百万 token），多个用逗号分隔，
+* 为未列出模型的默认单价，例如 LLM_PRICES=Qwen/Qwen2.5-7B-Instruct=0.5:1.0,gpt-4o-mini=0.15:0.6
+"""
+import asyncio
+import bisect
+import functools
+import logging
+import math
+import os
+import threading
+import time
+from contextlib import aclosing, contextmanager
+from contextvars import ContextVar
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from .token_estimator import estimate_messages_tokens, estimate_tokens
+from .usage import current_usage
+
+logger = logging.getLogger(__name__)
+
+# 直方图桶上限（毫秒），最后一个桶收集更慢的请求
+LATENCY_BUCKETS_MS = (50, 100, 250, 500, 1000, 2500, 5000, 10000, 30000, 60000)
+
+# 当前请求是第几次尝试（0 为首次），由 resilient_call 设置
+_attempt: ContextVar[int] = ContextVar("llm_attempt", default=0)
+
+
+@contextmanager
+def call_attempt(attempt: int) -> Iterator[None]:
+    """标记当前上下文中的请求是第几次尝试（大于 0 的记为重试）"""
+    token = _attempt.set(attempt)
+    try:
+        yield
+    finally:
+        _attempt.reset(token)
+
+
+def parse_prices(value: Optional[str]) -> Dict[str, Tuple[float, float]]:
+    """
+    解析 LLM_PRICES
+
+    Args:
+        value: 模型=输入单价:输出单价,...（每百万 token）
+
+    Returns:
+        dict: 模型 → (输入单价, 输出单价)；格式错误的项忽略
+    """
+    prices = {}
+    for item in (value or "").split(","):
+        model, sep, price = item.strip().rpartition("=")
+        if not sep or not model:
+            continue
+        try:
+            prompt_price, _, completion_price = price.partition(":")
+            prices[model.strip()] = (float(prompt_price), float(completion_price or prompt_price))
+        except ValueError:
+            logger.warning(f"忽略无法解析的 LLM_PRICES 项: {item}")
+    return prices
+
+
+def estimate_cost(
+    model: Optional[str],
+    prompt_tokens: int,
+    completion_tokens: int,
+    prices: Dict[str, Tuple[float, float]]
+) -> Optional[float]:
+    """按单价估算费用，没有配置单价时为 None"""
+    price = prices.get(model or "") or prices.get("*")
+    if price is None:
+        return None
+    return (prompt_tokens * price[0] + completion_tokens * price[1]) / 1_000_000
+
+
+class RollingHistogram:
+    """滚动窗口直方图：窗口分为若干时间片，过期的时间片整体丢弃"""
+
+    def __init__(self, buckets=LATENCY_BUCKETS_MS, window_s: float = 600.0, slots: int = 10):
+        """
+        Args:
+            buckets: 桶上限（升序）
+            window_s: 窗口长度（秒）
+            slots: 时间片数
+        """
+        self.buckets = tuple(buckets)
+        self.window_s = window_s
+        self.slot_s = window_s / slots
+        self._slots: List[Dict[str, Any]] = []
+
+    def _current_slot(self, now: float) -> Dict[str, Any]:
+        start = now - now % self.slot_s
+        if not self._slots or self._slots[-1]["start"] != start:
+            self._slots.append({
+                "start": start, "counts": [0] * (len(self.buckets) + 1), "count": 0, "sum": 0.0, "max": 0.0,
+            })
+        self._expire(now)
+        return self._slots[-1]
+
+    def _expire(self, now: float) -> None:
+        while self._slots and self._slots[0]["start"] + self.window_s <= now:
+            self._slots.pop(0)
+
+    def observe(self, value: float, now: Optional[float] = None) -> None:
+        """记录一个观测值"""
+        slot = self._current_slot(time.time() if now is None else now)
+        slot["counts"][bisect.bisect_left(self.buckets, value)] += 1
+        slot["count"] += 1
+        slot["sum"] += value
+        slot["max"] = max(slot["max"], value)
+
+    def snapshot(self, now: Optional[float] = None) -> Dict[str, Any]:
+        """
+        窗口内的统计
+
+        Returns:
+            dict: count / mean / p50 / p95 / p99（所在桶的上限，最后一个桶取窗口内最大值）/ max /
+            buckets（桶上限 → 个数，"+Inf" 为超出最后一个上限的个数）
+        """
+        self._expire(time.time() if now is None else now)
+        counts = [0] * (len(self.buckets) + 1)
+        total, value_sum, maximum = 0, 0.0, 0.0
+        for slot in self._slots:
+            counts = [a + b for a, b in zip(counts, slot["counts"])]
+            total += slot["count"]
+            value_sum += slot["sum"]
+            maximum = max(maximum, slot["max"])
+
+        def quantile(q: float) -> Optional[float]:
+            if not total:
+                return None
+            rank = math.ceil(q * total)
+            seen = 0
+            for index, count in enumerate(counts):
+                seen += count
+                if seen >= rank:
+                    return float(self.buckets[index]) if index < len(self.buckets) else maximum
+            return maximum
+
+        labels = [str(b) for b in self.buckets] + ["+Inf"]
+        return {
+            "count": total,
+            "mean": round(value_sum / total, 1) if total else None,
+            "p50": quantile(0.5),
+            "p95": quantile(0.95),
+            "p99": quantile(0.99),
+            "max": round(maximum, 1) if total else None,
+            "buckets": dict(zip(labels, counts)),
+        }
+
+
+class _ModelMetrics:
+    def __init__(self, window_s: float):
+        self.calls = 0
+        self.errors = 0
+        self.cancelled = 0
+        self.retries = 0
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+        self.estimated_usage = 0
+        self.cost: Optional[float] = None
+        self.ttft_ms = RollingHistogram(window_s=window_s)
+        self.latency_ms = RollingHistogram(window_s=window_s)
+
+
+class LLMTelemetry:
+    """按 提供商/模型 聚合的调用遥测（线程安全）"""
+
+    def __init__(self, window_s: float = 600.0, prices: Optional[Dict[str, Tuple[float, float]]] = None):
+        """
+        Args:
+            window_s: 直方图滚动窗口（秒）
+            prices: 模型 → (输入单价, 输出单价)，每百万 token
+        """
+        self.window_s = window_s
+        self.prices = prices or {}
+        self._lock = threading.Lock()
+        self._models: Dict[str, _ModelMetrics] = {}
+
+    def record(
+        self,
+        provider: str,
+        model: Optional[str],
+        latency_s: float,
+        ttft_s: Optional[float] = None,
+        prompt_tokens: int = 0,
+        completion_tokens: int = 0,
+        usage_reported: bool = True,
+        retry: bool = False,
+        outcome: str = "ok"
+    ) -> None:
+        """
+        记录一次调用
+
+        Args:
+            provider: 提供商
+            model: 模型
+            latency_s: 总耗时（秒）
+            ttft_s: 首 token 延迟（秒，没有输出时为 None）
+            prompt_tokens: 输入 token 数
+            completion_tokens: 输出 token 数
+            usage_reported: token 数是否来自服务端（否则为估算值）
+            retry: 是否为重试请求
+            outcome: ok / error / cancelled
+        """
+        cost = estimate_cost(model, prompt_tokens, completion_tokens, self.prices)
+        now = time.time()
+        with self._lock:
+            metrics = self._models.get(f"{provider}/{model or ''}")
+            if metrics is None:
+                metrics = self._models[f"{provider}/{model or ''}"] = _ModelMetrics(self.window_s)
+            metrics.calls += 1
+            metrics.errors += outcome == "error"
+            metrics.cancelled += outcome == "cancelled"
+            metrics.retries += retry
+            metrics.prompt_tokens += prompt_tokens
+            metrics.completion_tokens += completion_tokens
+            metrics.estimated_usage += not usage_reported
+            if cost is not None:
+                metrics.cost = (metrics.cost or 0.0) + cost
+            metrics.latency_ms.observe(latency_s * 1000, now)
+            if ttft_s is not None:
+                metrics.ttft_ms.observe(ttft_s * 1000, now)
+
+    def snapshot(self) -> Dict[str, Dict[str, Any]]:
+        """
+        按 提供商/模型 的统计
+
+        Returns:
+            dict: "提供商/模型" → calls / errors / cancelled / retries / prompt_tokens / completion_tokens /
+            estimated_usage（token 为估算值的调用数）/ cost（未配置单价时为 None）/ ttft_ms / latency_ms（滚动直方图）
+        """
+        with self._lock:
+            return {
+                key: {
+                    "calls": m.calls,
+                    "errors": m.errors,
+                    "cancelled": m.cancelled,
+                    "retries": m.retries,
+                    "prompt_tokens": m.prompt_tokens,
+                    "completion_tokens": m.completion_tokens,
+                    "estimated_usage": m.estimated_usage,
+                    "cost": round(m.cost, 6) if m.cost is not None else None,
+                    "ttft_ms": m.ttft_ms.snapshot(),
+                    "latency_ms": m.latency_ms.snapshot(),
+                }
+                for key, m in self._models.items()
+            }
+
+
+_telemetry: Optional[LLMTelemetry] = None
+_telemetry_lock = threading.Lock()
+
+
+def get_telemetry() -> LLMTelemetry:
+    """
+    获取进程级共享的遥测
+
+    配置读取环境变量：LLM_METRICS_WINDOW_S（默认 600）、LLM_PRICES
+    """
+    global _telemetry
+    with _telemetry_lock:
+        if _telemetry is None:
+            _telemetry = LLMTelemetry(
+                window_s=float(os.getenv("LLM_METRICS_WINDOW_S", "600")),
+                prices=parse_prices(os.getenv("LLM_PRICES")),
+            )
+        return _telemetry
+
+
+def llm_metrics() -> Dict[str, Dict[str, Any]]:
+    """按 提供商/模型 的调用遥测（见 LLMTelemetry.snapshot）"""
+    return get_telemetry().snapshot()
+
+
+def diff_llm_metrics(before: Dict[str, Dict[str, Any]], after: Dict[str, Dict[str, Any]]) -> Dict[str, Dict[str, Any]]:
+    """
+    两次快照之间的累计值变化（用于一次爬取的报告），直方图取 after 中的滚动值
+
+    Returns:
+        dict: 只包含期间有调用的 提供商/模型
+    """
+    counters = ("calls", "errors", "cancelled", "retries", "prompt_tokens", "completion_tokens", "estimated_usage")
+    result = {}
+    for key, current in after.items():
+        previous = before.get(key, {})
+        delta = {name: current[name] - previous.get(name, 0) for name in counters}
+        if not delta["calls"]:
+            continue
+        if current["cost"] is not None:
+            delta["cost"] = round(current["cost"] - (previous.get("cost") or 0.0), 6)
+        else:
+            delta["cost"] = None
+        delta["ttft_ms"] = current["ttft_ms"]
+        delta["latency_ms"] = current["latency_ms"]
+        result[key] = delta
+    return result
+
+
+def instrument_completion(method):
+    """
+    装饰 provider.chat_completion()：记录首 token 延迟、总耗时、token 用量、重试和费用
+
+    token 优先使用服务端返回的 usage（需要在 track_usage 范围内，便捷函数 chat_completion() 已包含），
+    否则按消息和输出估算
+    """
+    @functools.wraps(method)
+    async def wrapper(self, messages, *args, **kwargs):
+        model = kwargs.get("model") or (args[0] if args else None) or self.model
+        provider = self.provider_type.value if self.provider_type else type(self).__name__
+        retry = _attempt.get() > 0
+        usage = current_usage()
+        output: List[str] = []
+        started = time.perf_counter()
+        first_token: Optional[float] = None
+        outcome = "ok"
+        try:
+            async with aclosing(method(self, messages, *args, **kwargs)) as chunks:
+                async for chunk in chunks:
+                    if first_token is None:
+                        first_token = time.perf_counter() - started
+                    output.append(chunk)
+                    yield chunk
+        except (asyncio.CancelledError, GeneratorExit):
+            # 对冲落败被取消，或调用方提前停止读取
+            outcome = "cancelled"
+            raise
+        except Exception:
+            outcome = "error"
+            raise
+        finally:
+            reported = usage is not None and usage.reported
+            if reported:
+                prompt_tokens, completion_tokens = usage.prompt_tokens, usage.completion_tokens
+            else:
+                prompt_tokens = estimate_messages_tokens(messages) if outcome != "error" or output else 0
+                completion_tokens = estimate_tokens("".join(output))
+            get_telemetry().record(
+                provider,
+                model,
+                latency_s=time.perf_counter() - started,
+                ttft_s=first_token,
+                prompt_tokens=prompt_tokens,
+                completion_tokens=completion_tokens,
+                usage_reported=reported,
+                retry=retry,
+                outcome=outcome,
+            )
+
+    return wrapper
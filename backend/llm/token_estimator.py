@@ -0,0 +1,42 @@
+"""
+Token 数量估算
+不依赖具体模型的分词器：中日韩字符按 1 token/字，其余文本按约 4 字符/token 估算，
+用于缓存节省统计、上下文预算等不要求精确计数的场景
+"""
+import re
+from typing import Dict, List
+
+_CJK_PATTERN = re.compile(r"[\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uac00-\ud7af\uf900-\ufaff]")
+
+# 每条消息的角色、分隔符等固定开销
+MESSAGE_OVERHEAD_TOKENS = 4
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    估算文本的 token 数
+
+    Args:
+        text: 文本
+
+    Returns:
+        int: 估算的 token 数
+    """
+    if not text:
+        return 0
+    cjk = len(_CJK_PATTERN.findall(text))
+    other = len(text) - cjk
+    return cjk + (other + 3) // 4
+
+
+def estimate_messages_tokens(messages: List[Dict[str, str]]) -> int:
+    """
+    估算聊天消息列表的 token 数
+
+    Args:
+        messages: 消息列表 [{"role": "...", "content": "..."}]
+
+    Returns:
+        int: 估算的 token 数
+    """
+    return sum(estimate_tokens(m.get("content") or "") + MESSAGE_OVERHEAD_TOKENS for m in messages)
@@ -0,0 +1,119 @@
+"""
+LLM 调用的 token 用量采集
+provider 在拿到响应中的 usage 字段后调用 record_usage()，
+调用方用 track_usage() 包住一次请求即可读到实际用量（基于 ContextVar，并发请求互不干扰）
+
+同样地，track_served_model() 采集实际响应请求的提供商和模型（经过路由、故障转移后可能与调用方指定的不同）
+"""
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Iterator, Optional
+
+
+class UsageRecord:
+    """一次请求的 token 用量"""
+
+    __slots__ = ("prompt_tokens", "completion_tokens", "reported")
+
+    def __init__(self):
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+        # 是否拿到了服务端返回的实际用量（否则为估算值）
+        self.reported = False
+
+    @property
+    def total_tokens(self) -> int:
+        return self.prompt_tokens + self.completion_tokens
+
+
+_current_usage: ContextVar[Optional[UsageRecord]] = ContextVar("llm_usage", default=None)
+
+
+@contextmanager
+def track_usage() -> Iterator[UsageRecord]:
+    """在当前上下文中采集 token 用量"""
+    record = UsageRecord()
+    token = _current_usage.set(record)
+    try:
+        yield record
+    finally:
+        _current_usage.reset(token)
+
+
+def current_usage() -> Optional[UsageRecord]:
+    """当前上下文中正在采集的用量（不在 track_usage 范围内时为 None）"""
+    return _current_usage.get()
+
+
+def record_usage(prompt_tokens: Optional[int], completion_tokens: Optional[int]) -> None:
+    """
+    记录服务端返回的实际用量（不在 track_usage 范围内时忽略）
+
+    Args:
+        prompt_tokens: 输入 token 数
+        completion_tokens: 输出 token 数
+    """
+    record = _current_usage.get()
+    if record is None:
+        return
+    record.prompt_tokens = prompt_tokens or 0
+    record.completion_tokens = completion_tokens or 0
+    record.reported = True
+
+
+def record_usage_from(usage: Any) -> None:
+    """
+    从响应的 usage 字段记录用量，兼容 OpenAI SDK 对象、OpenAI 格式 dict 和阿里百炼格式 dict
+
+    Args:
+        usage: 响应中的 usage（可以为 None）
+    """
+    if not usage:
+        return
+    if isinstance(usage, dict):
+        prompt = usage.get("prompt_tokens", usage.get("input_tokens"))
+        completion = usage.get("completion_tokens", usage.get("output_tokens"))
+    else:
+        prompt = getattr(usage, "prompt_tokens", None)
+        completion = getattr(usage, "completion_tokens", None)
+    record_usage(prompt, completion)
+
+
+class ServedModel:
+    """实际响应请求的提供商和模型"""
+
+    __slots__ = ("provider", "model")
+
+    def __init__(self):
+        # 还没有成功的请求时为 None
+        self.provider: Optional[Any] = None
+        self.model: Optional[str] = None
+
+
+_served_model: ContextVar[Optional[ServedModel]] = ContextVar("llm_served_model", default=None)
+
+
+@contextmanager
+def track_served_model() -> Iterator[ServedModel]:
+    """在当前上下文中采集实际响应请求的提供商和模型（多次请求时为最后一次成功的请求）"""
+    record = ServedModel()
+    token = _served_model.set(record)
+    try:
+        yield record
+    finally:
+        _served_model.reset(token)
+
+
+def record_served_model(provider: Any, model: Optional[str]) -> None:
+    """
+    记录实际响应请求的提供商和模型（不在 track_served_model 范围内时忽略）
+
+    Args:
+        provider: 提供商（LLMProvider）
+        model: 发给提供商的模型名称，None 表示提供商自身的默认模型
+    """
+    record = _served_model.get()
+    if record is None:
+        return
+    record.provider = provider
+    record.model = model
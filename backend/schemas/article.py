@@ -19,6 +19,17 @@ class ContentAnalysis(BaseModel):
     sentiment: str = Field("neutral", description="情感倾向")
     category: str = Field("", description="分类")
     entities: List[Entity] = Field(default_factory=list, description="实体列表")
+    relevance: Optional[float] = Field(None, description="分类模型给出的相关度（0-1）")
+    analysis_tier: Optional[str] = Field(None, description="产生结果的分析层级：local / classifier / full")
+    analysis_version: Optional[str] = Field(None, description="产生结果的提示词/模型版本哈希")
+    analysis_model: Optional[str] = Field(None, description="产生结果的提供商/模型")
+
+
+class ArticleClassification(BaseModel):
+    """分类模型（级联分析的第一级）输出"""
+    category: str = Field("", description="分类")
+    sentiment: str = Field("neutral", description="情感倾向")
+    relevance: float = Field(0.0, description="对关注科技与前沿技术的读者的价值（0-1）")
 
 
 class TechDetection(BaseModel):
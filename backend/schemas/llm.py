@@ -0,0 +1,93 @@
+"""LLM runtime metrics Pydantic models."""
+
+from pydantic import BaseModel, Field
+from typing import Dict, Optional
+
+
+class ConcurrencyLimiterStats(BaseModel):
+    """单个提供商的自适应并发状态"""
+    name: str = Field(..., description="提供商")
+    limit: int = Field(..., description="当前并发上限")
+    in_flight: int = Field(..., description="进行中的请求数")
+    waiting: int = Field(..., description="排队等待的请求数")
+    min_limit: int = Field(..., description="并发下限")
+    max_limit: int = Field(..., description="并发上限的最大值")
+    latency_baseline_ms: Optional[float] = Field(None, description="延迟基线（各调用类别中最小的近期最小值，毫秒）")
+    latency_baselines_ms: Dict[str, float] = Field(default_factory=dict, description="按调用类别（输出 token 上限）的延迟基线（毫秒）")
+    latency_ewma_ms: Optional[float] = Field(None, description="延迟滑动平均（毫秒）")
+    completed: int = Field(0, description="已完成请求数")
+    increases: int = Field(0, description="上调次数")
+    decreases: int = Field(0, description="退避次数")
+    overload_errors: int = Field(0, description="过载错误次数（429/503/超时）")
+
+
+class ConcurrencyResponse(BaseModel):
+    """并发状态响应模型"""
+    providers: Dict[str, ConcurrencyLimiterStats] = Field(default_factory=dict, description="按提供商的并发状态")
+
+
+class RateLimiterStats(BaseModel):
+    """单个提供商的 RPM / TPM 限流状态"""
+    name: str = Field(..., description="提供商")
+    rpm: Optional[float] = Field(None, description="每分钟请求数上限")
+    tpm: Optional[float] = Field(None, description="每分钟 token 数上限")
+    available_requests: Optional[float] = Field(None, description="当前可用请求额度（负数表示排队中的欠额）")
+    available_tokens: Optional[float] = Field(None, description="当前可用 token 额度（负数表示排队中的欠额）")
+    reserved_requests: int = Field(0, description="累计预留请求数")
+    reserved_tokens: int = Field(0, description="累计预留 token 数")
+    reconciled_tokens: int = Field(0, description="累计实际消耗 token 数")
+    waited_requests: int = Field(0, description="需要排队的请求数")
+    total_wait_s: float = Field(0.0, description="累计排队时间（秒）")
+
+
+class RateLimitResponse(BaseModel):
+    """限流状态响应模型"""
+    providers: Dict[str, RateLimiterStats] = Field(default_factory=dict, description="按提供商的限流状态（只含已配置限额的提供商）")
+
+
+class RouterProviderStats(BaseModel):
+    """单个提供商的路由状态"""
+    weight: float = Field(..., description="配置权重")
+    score: float = Field(..., description="当前路由得分（熔断中为 0）")
+    p95_ms: Optional[float] = Field(None, description="滚动 p95 延迟（毫秒）")
+    error_rate: float = Field(0.0, description="最近请求的错误率")
+    requests: int = Field(0, description="累计请求数")
+    failures: int = Field(0, description="累计失败数")
+    circuit_open: bool = Field(False, description="是否处于熔断期")
+
+
+class RouterResponse(BaseModel):
+    """多提供商路由状态响应模型"""
+    enabled: bool = Field(..., description="是否配置了 LLM_ROUTER_WEIGHTS")
+    providers: Dict[str, RouterProviderStats] = Field(default_factory=dict, description="按提供商的路由状态")
+
+
+class LatencyHistogram(BaseModel):
+    """滚动窗口内的延迟直方图"""
+    count: int = Field(0, description="窗口内的样本数")
+    mean: Optional[float] = Field(None, description="平均值（毫秒）")
+    p50: Optional[float] = Field(None, description="p50（所在桶的上限，毫秒）")
+    p95: Optional[float] = Field(None, description="p95（所在桶的上限，毫秒）")
+    p99: Optional[float] = Field(None, description="p99（所在桶的上限，毫秒）")
+    max: Optional[float] = Field(None, description="最大值（毫秒）")
+    buckets: Dict[str, int] = Field(default_factory=dict, description="桶上限（毫秒）→ 样本数，+Inf 为超出最后一个上限")
+
+
+class ModelCallMetrics(BaseModel):
+    """单个提供商/模型的调用遥测"""
+    calls: int = Field(0, description="累计调用数")
+    errors: int = Field(0, description="失败的调用数")
+    cancelled: int = Field(0, description="被取消或提前停止读取的调用数")
+    retries: int = Field(0, description="其中属于重试的调用数")
+    prompt_tokens: int = Field(0, description="累计输入 token 数")
+    completion_tokens: int = Field(0, description="累计输出 token 数")
+    estimated_usage: int = Field(0, description="token 数为估算值（服务端未返回 usage）的调用数")
+    cost: Optional[float] = Field(None, description="按 LLM_PRICES 估算的累计费用（未配置单价时为空）")
+    ttft_ms: LatencyHistogram = Field(..., description="首 token 延迟")
+    latency_ms: LatencyHistogram = Field(..., description="总耗时")
+
+
+class LLMMetricsResponse(BaseModel):
+    """LLM 调用遥测响应模型"""
+    window_s: float = Field(..., description="直方图滚动窗口（秒）")
+    models: Dict[str, ModelCallMetrics] = Field(default_factory=dict, description="按 提供商/模型 的调用遥测")
@@ -0,0 +1,220 @@
+"""On-demand analysis service with SSE streaming and request coalescing."""
+
+import asyncio
+import json
+import logging
+from typing import Any, AsyncIterator, Dict, List, Optional
+
+from backend.agent.agent_content_keyword_analysis import current_analysis_versions, stream_article_analysis
+from backend.agent.analysis_queue import STATUS_DONE, get_analysis_queue
+from backend.db.elasticsearch_client import ArticleRepository
+from backend.schemas.article import ArticleDetail
+
+logger = logging.getLogger(__name__)
+
+
+def format_sse(event: str, data: Dict[str, Any]) -> str:
+    """格式化一条 Server-Sent Events 消息"""
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+class _AnalysisRun:
+    """一次进行中的分析：缓存已产生的事件，后加入的订阅者先重放再继续接收"""
+
+    def __init__(self):
+        self.events: List[Dict[str, Any]] = []
+        self.done = False
+        self._changed = asyncio.Condition()
+
+    async def publish(self, event: Dict[str, Any], done: bool = False) -> None:
+        async with self._changed:
+            self.events.append(event)
+            self.done = self.done or done
+            self._changed.notify_all()
+
+    async def finish(self) -> None:
+        async with self._changed:
+            self.done = True
+            self._changed.notify_all()
+
+    async def subscribe(self) -> AsyncIterator[Dict[str, Any]]:
+        index = 0
+        while True:
+            async with self._changed:
+                await self._changed.wait_for(lambda: index < len(self.events) or self.done)
+                pending = self.events[index:]
+                finished = self.done
+            index += len(pending)
+            for event in pending:
+                yield event
+            if finished and index >= len(self.events):
+                return
+
+
+class AnalysisService:
+    """按需分析服务 - 页面触发的单篇分析（单例模式）
+
+    - 同一篇文章的并发请求合并为一次上游 LLM 调用，后加入的请求先收到已产生的输出
+    - 文章已有当前版本的完整分析结果时直接返回，不调用 LLM；分析缓存命中时同样不调用
+    - 分析在后台任务中运行，客户端断开也会完成并写回 Elasticsearch
+    """
+
+    _instance = None
+
+    def __new__(cls):
+        """单例模式实现"""
+        if cls._instance is None:
+            cls._instance = super().__new__(cls)
+            cls._instance._initialized = False
+        return cls._instance
+
+    def __init__(self):
+        """初始化按需分析服务"""
+        if hasattr(self, '_initialized') and self._initialized:
+            return
+
+        self._inflight: Dict[str, _AnalysisRun] = {}
+        self._tasks: Dict[str, asyncio.Task] = {}
+        self._stats = {"requests": 0, "coalesced": 0, "cached": 0, "llm_runs": 0, "persisted": 0, "failed": 0}
+        self._initialized = True
+
+    def stats(self) -> Dict[str, int]:
+        """
+        累计统计
+
+        Returns:
+            dict: requests / coalesced（合并到进行中分析的请求）/ cached（直接返回已有结果）/
+            llm_runs / persisted（写回 ES 的次数）/ failed
+        """
+        return dict(self._stats)
+
+    async def stream_analysis(
+        self,
+        article: ArticleDetail,
+        repository: ArticleRepository,
+        force: bool = False
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """
+        分析文章并以事件流返回
+
+        Args:
+            article: 文章详情（需要有正文）
+            repository: 写回分析结果的数据仓库
+            force: 已有当前版本的完整分析结果时也重新分析
+
+        Yields:
+            dict: {"event": "delta", "data": {"text"}}（模型输出片段）/
+            {"event": "result", "data": {"article_id", "content_analysis", "cached", "coalesced", "persisted"}}
+        """
+        self._stats["requests"] += 1
+        analysis = article.content_analysis
+        # 只有成功的完整分析才带有版本（见 stamp_analysis），版本一致即为可直接返回的结果
+        if not force and analysis is not None and analysis.analysis_version in current_analysis_versions():
+            self._stats["cached"] += 1
+            yield {"event": "result", "data": {
+                "article_id": article.id,
+                "content_analysis": analysis.model_dump(),
+                "cached": True,
+                "coalesced": False,
+                "persisted": False,
+            }}
+            return
+
+        run = self._inflight.get(article.id)
+        coalesced = run is not None
+        if coalesced:
+            self._stats["coalesced"] += 1
+        else:
+            run = self._start(article, repository)
+
+        async for event in run.subscribe():
+            if event["event"] == "result":
+                event = {"event": "result", "data": {**event["data"], "coalesced": coalesced}}
+            yield event
+
+    def schedule_analysis(self, article: ArticleDetail, repository: ArticleRepository) -> bool:
+        """
+        在后台分析文章，不等待结果（如查看详情时升级分析层级）
+
+        同一篇文章已有进行中的分析时合并，不重复调用 LLM；成功时写回 Elasticsearch 并更新分析队列
+
+        Args:
+            article: 文章详情（需要有正文）
+            repository: 写回分析结果的数据仓库
+
+        Returns:
+            bool: 是否启动了新的分析（False 表示合并到了进行中的分析）
+        """
+        self._stats["requests"] += 1
+        if article.id in self._inflight:
+            self._stats["coalesced"] += 1
+            return False
+        self._start(article, repository)
+        return True
+
+    def _start(self, article: ArticleDetail, repository: ArticleRepository) -> _AnalysisRun:
+        """登记一次进行中的分析并启动后台任务"""
+        run = self._inflight[article.id] = _AnalysisRun()
+        self._tasks[article.id] = asyncio.create_task(self._run(run, article, repository))
+        return run
+
+    async def _run(self, run: _AnalysisRun, article: ArticleDetail, repository: ArticleRepository) -> None:
+        """后台执行一次分析，把事件发布给所有订阅者，成功时写回 Elasticsearch"""
+        try:
+            result, cached = None, False
+            async for kind, payload in stream_article_analysis(article.title, article.content or ""):
+                if kind == "delta":
+                    await run.publish({"event": "delta", "data": {"text": payload}})
+                else:
+                    result, cached = payload, kind == "cached"
+            if cached:
+                self._stats["cached"] += 1
+            else:
+                self._stats["llm_runs"] += 1
+
+            persisted = False
+            if result and result.get("analysis_success"):
+                previous = article.content_analysis
+                if previous is not None and previous.relevance is not None:
+                    result["relevance"] = previous.relevance
+                persisted = await self._persist(repository, article.id, result)
+            else:
+                self._stats["failed"] += 1
+            await run.publish({"event": "result", "data": {
+                "article_id": article.id,
+                "content_analysis": result,
+                "cached": cached,
+                "persisted": persisted,
+            }}, done=True)
+        except Exception as e:
+            logger.error(f"按需分析失败 {article.id}: {e}", exc_info=True)
+            self._stats["failed"] += 1
+            await run.publish({"event": "error", "data": {"article_id": article.id, "detail": "分析失败"}}, done=True)
+        finally:
+            await run.finish()
+            self._inflight.pop(article.id, None)
+            self._tasks.pop(article.id, None)
+
+    async def _persist(self, repository: ArticleRepository, article_id: str, result: Dict[str, Any]) -> bool:
+        """写回分析结果，并从分析队列中移除该文章（避免后台线程重复分析）"""
+        loop = asyncio.get_running_loop()
+        try:
+            await loop.run_in_executor(None, repository.update_document, article_id, {
+                "content_analysis": result,
+                "analysis_status": STATUS_DONE,
+            })
+        except Exception as e:
+            logger.warning(f"写回按需分析结果失败 {article_id}: {e}")
+            return False
+        self._stats["persisted"] += 1
+        try:
+            get_analysis_queue().complete([article_id])
+        except Exception as e:
+            logger.warning(f"更新分析队列失败 {article_id}: {e}")
+        return True
+
+
+async def sse_stream(events: AsyncIterator[Dict[str, Any]]) -> AsyncIterator[str]:
+    """把 AnalysisService.stream_analysis() 的事件转换为 SSE 文本"""
+    async for event in events:
+        yield format_sse(event["event"], event["data"])
@@ -1,10 +1,13 @@
 """Article service for business logic."""
 
 import logging
+import os
 from typing import List, Optional, Dict, Any
 from datetime import datetime
 
+from backend.agent.agent_content_keyword_analysis import UPGRADABLE_TIERS
 from backend.db.elasticsearch_client import ArticleRepository
+from backend.service.analysis_service import AnalysisService
 from backend.schemas.article import (
     ArticleListResponse,
     ArticleDetail,
@@ -15,6 +18,9 @@ from backend.schemas.article import (
 
 logger = logging.getLogger(__name__)
 
+# 查看详情时把本地分析 / 分类模型的结果升级为完整分析
+ANALYSIS_UPGRADE_ON_VIEW = os.getenv("ANALYSIS_UPGRADE_ON_VIEW", "1").lower() not in ("0", "false", "no")
+
 
 class ArticleService:
     """文章服务层 - 封装文章相关的业务逻辑"""
@@ -137,6 +143,32 @@ class ArticleService:
             logger.error(f"获取文章详情失败: {e}")
             raise
 
+    def schedule_full_analysis(self, article: ArticleDetail) -> bool:
+        """
+        查看详情时按需升级分析结果
+
+        分析层级为本地分析或分类模型（见 UPGRADABLE_TIERS）的文章交给 AnalysisService 在后台调用完整分析模型
+        （同一篇文章的并发查看合并为一次调用，结果写回 Elasticsearch 并更新分析队列），本次请求直接返回现有结果
+
+        Args:
+            article: 文章详情
+
+        Returns:
+            bool: 是否需要升级（已启动或合并到进行中的分析）
+        """
+        analysis = article.content_analysis
+        if (
+            not ANALYSIS_UPGRADE_ON_VIEW
+            or analysis is None
+            or analysis.analysis_tier not in UPGRADABLE_TIERS
+            or not article.content
+        ):
+            return False
+
+        if AnalysisService().schedule_analysis(article, self.repository):
+            logger.info(f"详情页升级分析: {article.id} ({analysis.analysis_tier} -> full)")
+        return True
+
     def search_articles(self, request: SearchRequest) -> SearchResponse:
         """
         搜索文章
@@ -0,0 +1,251 @@
+"""
+长生命周期的 JSONL 输出器
+- 缓冲写入：缓冲区攒满或距上次写入文件超过 flush_interval 时写入，按时间间隔 fsync
+- 按大小轮转文件，按爬取日期分区（dt=YYYY-MM-DD）
+- 可选 gzip / zstd 压缩（zstd 依赖 zstandard，未安装时回退到 gzip）
+
+目录布局:
+    {base_dir}/dt=2026-10-19/tophub_articles-081502-0001.jsonl.gz
+"""
+import gzip
+import io
+import json
+import logging
+import os
+import time
+from datetime import datetime
+from typing import Any, Dict, Iterable, Iterator, List, Optional
+
+try:
+    import zstandard
+except ImportError:  # 可选依赖
+    zstandard = None
+
+logger = logging.getLogger(__name__)
+
+_EXTENSIONS = {
+    None: ".jsonl",
+    "gzip": ".jsonl.gz",
+    "zstd": ".jsonl.zst",
+}
+
+
+class JsonlSink:
+    """按日期分区、自动轮转的 JSONL 写入器"""
+
+    def __init__(
+        self,
+        base_dir: str,
+        prefix: str = "tophub_articles",
+        compression: Optional[str] = None,
+        rotate_bytes: Optional[int] = 256 * 1024 * 1024,
+        buffer_size: int = 1024 * 1024,
+        fsync_interval: float = 5.0,
+        flush_interval: float = 1.0,
+    ):
+        """
+        初始化 JSONL 写入器
+
+        Args:
+            base_dir: 输出根目录
+            prefix: 文件名前缀
+            compression: 压缩方式 None / "gzip" / "zstd"
+            rotate_bytes: 单个文件写入的未压缩字节数上限，超过后轮转（None 表示只按日期轮转）
+            buffer_size: 内存缓冲区大小，攒满后写入文件
+            fsync_interval: 两次 fsync 的最小间隔（秒），0 表示每次刷新都 fsync
+            flush_interval: 缓冲区未攒满时，距上次写入文件超过该时间（秒）的 write() 也会写入文件，
+                限制进程崩溃时丢失的记录；0 表示每条记录都写入
+        """
+        if compression not in _EXTENSIONS:
+            raise ValueError(f"Unsupported compression: {compression}")
+        if compression == "zstd" and zstandard is None:
+            logger.warning("zstandard 未安装，JSONL 输出回退到 gzip 压缩")
+            compression = "gzip"
+
+        self.base_dir = base_dir
+        self.prefix = prefix
+        self.compression = compression
+        self.rotate_bytes = rotate_bytes
+        self.buffer_size = buffer_size
+        self.fsync_interval = fsync_interval
+        self.flush_interval = flush_interval
+
+        self.records_written = 0
+        self.files: List[str] = []
+
+        self._buffer: List[bytes] = []
+        self._buffered_bytes = 0
+        self._raw = None
+        self._stream = None
+        self._partition: Optional[str] = None
+        self._file_bytes = 0
+        self._sequence = 0
+        self._last_fsync = time.monotonic()
+        self._last_flush = time.monotonic()
+
+    @property
+    def current_path(self) -> Optional[str]:
+        """当前正在写入的文件路径"""
+        return self.files[-1] if self._stream is not None else None
+
+    def write(self, record: Dict[str, Any]) -> None:
+        """写入一条记录（进入缓冲区）"""
+        line = (json.dumps(record, ensure_ascii=False) + "\n").encode("utf-8")
+
+        partition = datetime.now().strftime("%Y-%m-%d")
+        if partition != self._partition:
+            # 跨天：先把旧分区的缓冲写完再切换
+            self.flush()
+            self._close_file()
+            self._partition = partition
+            self._sequence = 0
+        elif self.rotate_bytes and self._file_bytes + self._buffered_bytes + len(line) > self.rotate_bytes:
+            self.flush()
+            self._close_file()
+
+        self._buffer.append(line)
+        self._buffered_bytes += len(line)
+        self.records_written += 1
+
+        if self._buffered_bytes >= self.buffer_size or time.monotonic() - self._last_flush >= self.flush_interval:
+            self.flush()
+
+    def write_many(self, records: Iterable[Dict[str, Any]]) -> None:
+        """批量写入记录"""
+        for record in records:
+            self.write(record)
+
+    def flush(self, fsync: bool = False) -> None:
+        """
+        把缓冲区写入文件
+
+        Args:
+            fsync: 是否强制 fsync（否则按 fsync_interval 周期执行）
+        """
+        if self._buffer:
+            if self._stream is None:
+                self._open_file()
+            self._stream.write(b"".join(self._buffer))
+            self._file_bytes += self._buffered_bytes
+            self._buffer = []
+            self._buffered_bytes = 0
+        self._last_flush = time.monotonic()
+
+        if self._stream is None:
+            return
+
+        if fsync or time.monotonic() - self._last_fsync >= self.fsync_interval:
+            self._sync()
+        elif self._stream is self._raw:
+            # 未压缩时交给操作系统即可读到；压缩流在 _sync() 中按 fsync_interval 刷新压缩器
+            self._raw.flush()
+
+    def close(self) -> None:
+        """刷新缓冲区并关闭当前文件"""
+        self.flush()
+        self._close_file()
+
+    def _open_file(self) -> None:
+        partition_dir = os.path.join(self.base_dir, f"dt={self._partition}")
+        os.makedirs(partition_dir, exist_ok=True)
+
+        # 同一进程内轮转序号递增；进程重启时依靠时间戳避免覆盖已有文件
+        while True:
+            self._sequence += 1
+            name = f"{self.prefix}-{datetime.now().strftime('%H%M%S')}-{self._sequence:04d}{_EXTENSIONS[self.compression]}"
+            path = os.path.join(partition_dir, name)
+            if not os.path.exists(path):
+                break
+
+        self._raw = open(path, "wb")
+        if self.compression == "gzip":
+            self._stream = gzip.GzipFile(fileobj=self._raw, mode="wb")
+        elif self.compression == "zstd":
+            self._stream = zstandard.ZstdCompressor().stream_writer(self._raw, closefd=False)
+        else:
+            self._stream = self._raw
+        self._file_bytes = 0
+        self.files.append(path)
+        logger.info(f"JSONL 输出文件: {path}")
+
+    def _sync(self) -> None:
+        """把压缩器和操作系统缓冲落盘"""
+        if self.compression == "gzip":
+            self._stream.flush()
+        elif self.compression == "zstd":
+            self._stream.flush(zstandard.FLUSH_BLOCK)
+        self._raw.flush()
+        os.fsync(self._raw.fileno())
+        self._last_fsync = time.monotonic()
+
+    def _close_file(self) -> None:
+        if self._stream is None:
+            return
+        if self._stream is not self._raw:
+            self._stream.close()
+        self._raw.flush()
+        os.fsync(self._raw.fileno())
+        self._raw.close()
+        self._stream = None
+        self._raw = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+
+def _open_for_read(path: str):
+    if path.endswith(".gz"):
+        return gzip.open(path, "rt", encoding="utf-8")
+    if path.endswith(".zst"):
+        if zstandard is None:
+            raise ImportError("读取 .zst 文件需要安装 zstandard")
+        raw = open(path, "rb")
+        return io.TextIOWrapper(zstandard.ZstdDecompressor().stream_reader(raw, closefd=True), encoding="utf-8")
+    return open(path, "r", encoding="utf-8")
+
+
+def list_jsonl_files(path: str, prefix: Optional[str] = None) -> List[str]:
+    """
+    列出路径下的 JSONL 文件（支持单个文件、单个分区目录或输出根目录）
+
+    Args:
+        path: 文件、分区目录或输出根目录
+        prefix: 只匹配该文件名前缀（如 "tech_articles"），对单个文件无效
+
+    Returns:
+        List[str]: 按分区和文件名排序的文件列表
+    """
+    if os.path.isfile(path):
+        return [path]
+
+    files = []
+    for root, _, names in os.walk(path):
+        for name in names:
+            if prefix and not name.startswith(prefix + "-"):
+                continue
+            if name.endswith((".jsonl", ".jsonl.gz", ".jsonl.zst")):
+                files.append(os.path.join(root, name))
+    return sorted(files)
+
+
+def iter_jsonl_records(path: str, prefix: Optional[str] = None) -> Iterator[Dict[str, Any]]:
+    """
+    流式读取 JSONL 记录（自动识别压缩格式，跳过无法解析的行）
+
+    Args:
+        path: 文件、分区目录或输出根目录
+        prefix: 只读取该文件名前缀的文件
+    """
+    for file_path in list_jsonl_files(path, prefix=prefix):
+        with _open_for_read(file_path) as f:
+            for line_num, line in enumerate(f, 1):
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    yield json.loads(line)
+                except json.JSONDecodeError as e:
+                    logger.warning(f"{file_path} 第 {line_num} 行 JSON 解析失败: {e}")
@@ -0,0 +1,48 @@
+/*
+ * 常驻 Readability.js 提取进程
+ *
+ * 标准输入每行一个 JSON 请求:  {"id": 1, "html": "<html>..."}
+ * 标准输出每行一个 JSON 响应:  {"id": 1, "article": {...}} 或 {"id": 1, "error": "..."}
+ *
+ * 依赖 @mozilla/readability 和 jsdom（默认复用 readabilipy 安装的 node_modules，通过 NODE_PATH 指定）
+ */
+const readline = require('readline');
+const { Readability } = require('@mozilla/readability');
+const { JSDOM, VirtualConsole } = require('jsdom');
+
+// 页面自身的 console 输出和 CSS 解析错误不写入 stderr
+const virtualConsole = new VirtualConsole();
+
+function extract(html) {
+	const dom = new JSDOM(html, { virtualConsole });
+	try {
+		return new Readability(dom.window.document).parse();
+	} finally {
+		dom.window.close();
+	}
+}
+
+const rl = readline.createInterface({ input: process.stdin, terminal: false, crlfDelay: Infinity });
+
+rl.on('line', (line) => {
+	if (!line.trim()) {
+		return;
+	}
+	let request;
+	try {
+		request = JSON.parse(line);
+	} catch (e) {
+		process.stdout.write(JSON.stringify({ id: null, error: 'invalid request: ' + e.message }) + '\n');
+		return;
+	}
+	let response;
+	try {
+		const article = extract(request.html || '');
+		response = { id: request.id, article: article };
+	} catch (e) {
+		response = { id: request.id, error: String(e && e.message || e) };
+	}
+	process.stdout.write(JSON.stringify(response) + '\n');
+});
+
+rl.on('close', () => process.exit(0));
@@ -0,0 +1,210 @@
+"""
+常驻 Node.js Readability 提取进程池
+readabilipy 的 use_readability=True 每篇文章都要启动一次 node 进程并经由临时文件往返 JSON，
+这里改为启动常驻进程，通过 stdin/stdout 逐行传递 JSON，提取成本从进程启动降为一次管道调用。
+
+依赖与 readabilipy 相同（@mozilla/readability + jsdom），默认复用 readabilipy 安装的 node_modules，
+也可以通过 READABILITY_NODE_MODULES 指定其他目录。
+"""
+import atexit
+import json
+import logging
+import os
+import queue
+import shutil
+import subprocess
+import threading
+from typing import Any, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+WORKER_SCRIPT = os.path.join(os.path.dirname(__file__), "readability_worker.js")
+
+
+def _default_node_modules() -> Optional[str]:
+    try:
+        import readabilipy
+    except ImportError:
+        return None
+    return os.path.join(os.path.dirname(readabilipy.__file__), "javascript", "node_modules")
+
+
+def node_modules_path() -> Optional[str]:
+    """Readability.js 依赖所在的 node_modules 目录"""
+    return os.getenv("READABILITY_NODE_MODULES") or _default_node_modules()
+
+
+def node_readability_available() -> bool:
+    """
+    检查能否使用 Node.js 版 Readability（node 可执行文件和 node_modules 都存在）
+    与 readabilipy.have_node 不同，这里不会尝试 npm install
+    """
+    modules = node_modules_path()
+    return bool(shutil.which("node") and modules and os.path.isdir(modules))
+
+
+class NodeReadabilityWorker:
+    """单个常驻 node 进程，串行处理提取请求"""
+
+    def __init__(self, timeout: float = 30.0, max_tasks: int = 500):
+        """
+        Args:
+            timeout: 单篇提取超时时间（秒），超时后杀掉进程，下次调用时重启
+            max_tasks: 单个进程处理的最大文章数，达到后重启以回收 jsdom 内存
+        """
+        self.timeout = timeout
+        self.max_tasks = max_tasks
+        self.tasks_done = 0
+        self.restarts = 0
+        self._process: Optional[subprocess.Popen] = None
+        self._next_id = 0
+
+    def _start(self) -> None:
+        env = dict(os.environ)
+        modules = node_modules_path()
+        if modules:
+            env["NODE_PATH"] = os.pathsep.join(filter(None, [modules, env.get("NODE_PATH")]))
+        self._process = subprocess.Popen(
+            ["node", WORKER_SCRIPT],
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=None,
+            env=env,
+            encoding="utf-8",
+            bufsize=1,
+        )
+        self.tasks_done = 0
+        logger.debug(f"启动 Readability 常驻进程 pid={self._process.pid}")
+
+    def _alive(self) -> bool:
+        return self._process is not None and self._process.poll() is None
+
+    def parse(self, html: str) -> Dict[str, Any]:
+        """
+        提取正文
+
+        Args:
+            html: 原始 HTML
+
+        Returns:
+            dict: Readability.parse() 的结果（title / byline / content ...），无法识别正文时为空字典
+        """
+        if not self._alive() or self.tasks_done >= self.max_tasks:
+            if self._process is not None:
+                self.restarts += 1
+            self.close()
+            self._start()
+
+        self._next_id += 1
+        request_id = self._next_id
+        process = self._process
+        # readline 没有超时参数，用定时器在超时后杀掉进程使 readline 返回
+        timer = threading.Timer(self.timeout, process.kill)
+        timer.start()
+        try:
+            process.stdin.write(json.dumps({"id": request_id, "html": html}) + "\n")
+            process.stdin.flush()
+            line = process.stdout.readline()
+        except (BrokenPipeError, OSError) as e:
+            self.close()
+            raise RuntimeError(f"Readability 进程异常退出: {e}")
+        finally:
+            timer.cancel()
+
+        if not line:
+            self.close()
+            raise RuntimeError("Readability 进程无响应（超时或崩溃）")
+
+        self.tasks_done += 1
+        response = json.loads(line)
+        if response.get("id") != request_id:
+            # 请求和响应错位后进程状态不可信，直接重启
+            self.close()
+            raise RuntimeError("Readability 进程响应错位")
+        if response.get("error"):
+            raise RuntimeError(f"Readability 提取失败: {response['error']}")
+        return response.get("article") or {}
+
+    def close(self) -> None:
+        """关闭进程"""
+        process, self._process = self._process, None
+        if process is None:
+            return
+        try:
+            process.stdin.close()
+            process.wait(timeout=5)
+        except (OSError, subprocess.TimeoutExpired):
+            process.kill()
+            process.wait()
+        finally:
+            process.stdout.close()
+
+
+class NodeReadabilityPool:
+    """固定大小的常驻进程池，供多线程并发提取"""
+
+    def __init__(self, size: int = 2, timeout: float = 30.0, max_tasks: int = 500):
+        """
+        Args:
+            size: 进程数（进程按需懒启动）
+            timeout: 单篇提取超时时间（秒）
+            max_tasks: 单个进程处理的最大文章数
+        """
+        self.size = size
+        self._workers = [NodeReadabilityWorker(timeout=timeout, max_tasks=max_tasks) for _ in range(size)]
+        self._idle: "queue.Queue[NodeReadabilityWorker]" = queue.Queue()
+        for worker in self._workers:
+            self._idle.put(worker)
+
+    def parse(self, html: str) -> Dict[str, Any]:
+        """借用一个空闲进程提取正文"""
+        worker = self._idle.get()
+        try:
+            return worker.parse(html)
+        finally:
+            self._idle.put(worker)
+
+    def stats(self) -> Dict[str, int]:
+        """进程池统计"""
+        return {
+            "size": self.size,
+            "tasks_done": sum(w.tasks_done for w in self._workers),
+            "restarts": sum(w.restarts for w in self._workers),
+        }
+
+    def close(self) -> None:
+        """关闭所有进程"""
+        for worker in self._workers:
+            worker.close()
+
+
+_pool: Optional[NodeReadabilityPool] = None
+_pool_lock = threading.Lock()
+
+
+def get_readability_pool() -> NodeReadabilityPool:
+    """
+    获取进程级共享的 Readability 进程池
+    大小和超时读取 READABILITY_WORKERS / READABILITY_TIMEOUT / READABILITY_MAX_TASKS
+    """
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = NodeReadabilityPool(
+                size=int(os.getenv("READABILITY_WORKERS", "2")),
+                timeout=float(os.getenv("READABILITY_TIMEOUT", "30")),
+                max_tasks=int(os.getenv("READABILITY_MAX_TASKS", "500")),
+            )
+        return _pool
+
+
+def close_readability_pool() -> None:
+    """关闭共享进程池"""
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.close()
+            _pool = None
+
+
+atexit.register(close_readability_pool)
@@ -1,34 +1,169 @@
 import re
+import time
+from html import escape
+from typing import Any, Dict, Iterator, Optional, Tuple
 from urllib.parse import urljoin
 
+import lxml.etree
+import lxml.html
 from markdownify import markdownify as md
 from readabilipy import simple_json_from_html_string
+from readabilipy.extractors import extract_title
+from readabilipy.simple_tree import simple_tree_from_html_string
 
 import logging
 import os
 
 import requests
 
+from backend.utils.readability_worker import get_readability_pool, node_readability_available
+
 logger = logging.getLogger(__name__)
 
 from dotenv import load_dotenv
 load_dotenv()
 
 
+# 超过该长度（字符数）的 HTML 使用流式转换，避免一次性构建整棵 BeautifulSoup 树
+MARKDOWN_STREAM_THRESHOLD = int(os.getenv("MARKDOWN_STREAM_THRESHOLD", str(2 * 1024 * 1024)))
+
+# 流式转换时逐个输出的块级元素
+STREAM_BLOCK_TAGS = frozenset((
+    "p", "h1", "h2", "h3", "h4", "h5", "h6", "pre", "blockquote",
+    "ul", "ol", "dl", "table", "figure", "hr",
+))
+
+
 class Article:
+    """
+    正文文章
+    转换结果（原始 markdown、过滤后的 markdown、消息块）在对象生命周期内缓存，
+    修改 title / html_content 时自动失效
+    """
+
+    __slots__ = ("_title", "_html_content", "url", "_raw_markdown", "_filtered", "_message_parts")
+
     url: str
 
     def __init__(self, title: str, html_content: str):
-        self.title = title
-        self.html_content = html_content
+        self.url = ""
+        self._title = title
+        self._html_content = html_content
+        self._reset_cache()
+
+    def _reset_cache(self) -> None:
+        self._raw_markdown: Optional[str] = None
+        # (不含标题, 含标题) 两种过滤结果
+        self._filtered: list = [None, None]
+        # 消息块以 (是否图片, 内容) 元组保存，调用时再生成 dict
+        self._message_parts: Optional[Tuple[Tuple[bool, str], ...]] = None
+
+    @property
+    def title(self) -> str:
+        return self._title
+
+    @title.setter
+    def title(self, value: str) -> None:
+        self._title = value
+        self._filtered = [None, None]
+        self._message_parts = None
+
+    @property
+    def html_content(self) -> str:
+        return self._html_content
+
+    @html_content.setter
+    def html_content(self, value: str) -> None:
+        self._html_content = value
+        self._reset_cache()
+
+    def raw_markdown(self) -> str:
+        """未经过滤的正文 markdown（不含标题）"""
+        if self._raw_markdown is None:
+            html = self._html_content or ""
+            if len(html) > MARKDOWN_STREAM_THRESHOLD:
+                self._raw_markdown = "\n\n".join(self.iter_markdown())
+            else:
+                self._raw_markdown = md(html)
+        return self._raw_markdown
+
+    def iter_markdown(self, chunk_size: int = 64 * 1024) -> Iterator[str]:
+        """
+        流式转换：按块级元素逐段输出未过滤的 markdown
+        HTML 分块送入 lxml 增量解析器，已输出的元素立即释放，适合非常大的正文；
+        不在任何块级元素内的零散文字（div / section 中直接的文字、br 分隔的行）
+        在下一个块级元素之前、或解析结束时按原顺序输出
+
+        Args:
+            chunk_size: 每次送入解析器的字符数
+        """
+        html = self._html_content or ""
+        if not html.strip():
+            return
+        parser = lxml.etree.HTMLPullParser(events=("end",))
+        for offset in range(0, len(html), chunk_size):
+            parser.feed(html[offset:offset + chunk_size])
+            yield from self._drain_blocks(parser)
+        root = parser.close()
+        yield from self._drain_blocks(parser)
+        if root is not None:
+            # 最后一个块级元素之后的零散文字
+            text = md(lxml.etree.tostring(root, method="html", encoding="unicode", with_tail=False)).strip()
+            if text:
+                yield text
+
+    @staticmethod
+    def _drain_blocks(parser) -> Iterator[str]:
+        for _, element in parser.read_events():
+            if element.tag not in STREAM_BLOCK_TAGS:
+                continue
+            # 嵌套的块（如 blockquote 内的 p）随最外层块一起转换
+            if any(ancestor.tag in STREAM_BLOCK_TAGS for ancestor in element.iterancestors()):
+                continue
+            loose = Article._take_loose_content(element)
+            if loose:
+                yield loose
+            fragment = lxml.etree.tostring(element, method="html", encoding="unicode", with_tail=False)
+            text = md(fragment).strip()
+            # 释放已转换的元素（尾部文字保留，由后续的块或解析结束时输出）
+            element.clear(keep_tail=True)
+            if text:
+                yield text
+
+    @staticmethod
+    def _take_loose_content(element) -> str:
+        """
+        取出块级元素之前尚未输出的零散内容并从树中移除：
+        从根节点到 element 的路径上，每个祖先的直接文字以及位于路径之前的兄弟节点（含尾部文字），
+        不同层级之间按块分隔
+        """
+        path = list(element.iterancestors())[::-1] + [element]
+        texts = []
+        for ancestor, child in zip(path, path[1:]):
+            parts = []
+            if ancestor.text:
+                parts.append(escape(ancestor.text))
+                ancestor.text = None
+            for sibling in list(child.itersiblings(preceding=True))[::-1]:
+                parts.append(lxml.etree.tostring(sibling, method="html", encoding="unicode", with_tail=True))
+                ancestor.remove(sibling)
+            text = md("".join(parts)).strip() if parts else ""
+            if text:
+                texts.append(text)
+        return "\n\n".join(texts)
 
     def to_markdown(self, including_title: bool = True) -> str:
+        cached = self._filtered[including_title]
+        if cached is not None:
+            return cached
+
         markdown = ""
         if including_title:
             markdown += f"# {self.title}\n\n"
-        markdown += md(self.html_content)
+        markdown += self.raw_markdown()
         # 对 markdown 内容进行过滤清理
         markdown = self._filter_markdown(markdown)
+        self._filtered[including_title] = markdown
         return markdown
     
     def _filter_markdown(self, markdown: str) -> str:
@@ -129,17 +264,20 @@ class Article:
         return markdown
 
     def to_message(self) -> list[dict]:
-        image_pattern = r"!\[.*?\]\((.*?)\)"
+        if self._message_parts is None:
+            image_pattern = r"!\[.*?\]\((.*?)\)"
+            parts = re.split(image_pattern, self.to_markdown())
+            self._message_parts = tuple(
+                (i % 2 == 1, part.strip()) for i, part in enumerate(parts)
+            )
 
         content: list[dict[str, str]] = []
-        parts = re.split(image_pattern, self.to_markdown())
-
-        for i, part in enumerate(parts):
-            if i % 2 == 1:
-                image_url = urljoin(self.url, part.strip())
+        for is_image, part in self._message_parts:
+            if is_image:
+                image_url = urljoin(self.url, part)
                 content.append({"type": "image_url", "image_url": {"url": image_url}})
             else:
-                content.append({"type": "text", "text": part.strip()})
+                content.append({"type": "text", "text": part})
 
         return content
     
@@ -160,14 +298,144 @@ class JinaClient:
         response = requests.post("https://r.jina.ai/", headers=headers, json=data)
         return response.text
 
+# 预裁剪时整体删除的标签：脚本、样式、矢量图以及明显的页面框架
+# 只删除不会包含正文的节点；form / iframe 等容器不删除（ASP.NET、CMS 页面常用 <form> 包住整个页面）
+PRETRIM_TAGS = (
+    "script", "style", "svg", "noscript", "template", "canvas",
+    "nav", "footer", "button", "select", "textarea",
+)
+# 按 ARIA role 识别的页面框架
+PRETRIM_ROLES = ("navigation", "banner", "contentinfo", "search", "menu", "menubar", "dialog")
+
+
+def pretrim_html(html: str) -> Tuple[str, Dict[str, Any]]:
+    """
+    在 readability 之前快速裁剪 HTML（基于 lxml）
+    删除 script/style/svg/noscript 等节点、注释以及导航、页脚等页面框架，缩小提取输入
+
+    Args:
+        html: 原始 HTML
+
+    Returns:
+        (裁剪后的 HTML, 统计信息 {"original_bytes", "trimmed_bytes", "removed_bytes", "removed_nodes", "trim_ms"})
+    """
+    started = time.perf_counter()
+    original_bytes = len(html.encode("utf-8"))
+    stats = {
+        "original_bytes": original_bytes,
+        "trimmed_bytes": original_bytes,
+        "removed_bytes": 0,
+        "removed_nodes": 0,
+        "trim_ms": 0.0,
+    }
+
+    try:
+        try:
+            doc = lxml.html.document_fromstring(html)
+        except ValueError:
+            # 带 XML 编码声明的字符串不能直接解析，按 UTF-8 字节重新解析
+            parser = lxml.html.HTMLParser(encoding="utf-8")
+            doc = lxml.html.document_fromstring(html.encode("utf-8"), parser=parser)
+    except (lxml.etree.ParserError, ValueError) as e:
+        logger.debug(f"预裁剪解析失败，使用原始 HTML: {e}")
+        return html, stats
+
+    role_xpath = " or ".join(f"@role='{role}'" for role in PRETRIM_ROLES)
+    removable = list(doc.iter(lxml.etree.Comment, *PRETRIM_TAGS))
+    removable.extend(doc.xpath(f"//*[{role_xpath}]"))
+
+    removed_nodes = 0
+    for node in removable:
+        # 祖先已被删除的节点不再重复处理
+        if node.getparent() is None:
+            continue
+        node.drop_tree()
+        removed_nodes += 1
+
+    trimmed = lxml.html.tostring(doc, encoding="unicode")
+    trimmed_bytes = len(trimmed.encode("utf-8"))
+    stats.update({
+        "trimmed_bytes": trimmed_bytes,
+        "removed_bytes": max(original_bytes - trimmed_bytes, 0),
+        "removed_nodes": removed_nodes,
+        "trim_ms": round((time.perf_counter() - started) * 1000, 2),
+    })
+    return trimmed, stats
+
+
+# 正文提取引擎：
+# - node: 常驻 Node.js 进程运行 Readability.js（质量最好，每篇只是一次管道调用）
+# - python: readabilipy 纯 Python 实现（无外部运行时依赖）
+# - node-spawn: readabilipy 原始方式，每篇文章启动一次 node 进程（仅用于对比）
+# - auto: 有 node 和 node_modules 时用 node，否则用 python
+READABILITY_ENGINES = ("auto", "node", "python", "node-spawn")
+
+
 class ReadabilityExtractor:
+    def __init__(self, pretrim: bool = None, engine: str = None):
+        """
+        Args:
+            pretrim: 是否在 readability 之前预裁剪 HTML（默认读取 READABILITY_PRETRIM，默认开启）
+            engine: 提取引擎（默认读取 READABILITY_ENGINE，默认 auto），见 READABILITY_ENGINES
+        """
+        if pretrim is None:
+            pretrim = os.getenv("READABILITY_PRETRIM", "1").lower() not in ("0", "false", "no")
+        self.pretrim = pretrim
+        self.last_pretrim_stats = None
+        self.engine = resolve_readability_engine(engine)
+
     def extract_article(self, html: str) -> Article:
-        article = simple_json_from_html_string(html, use_readability=True)
+        if self.pretrim:
+            html, self.last_pretrim_stats = pretrim_html(html)
+            logger.debug(
+                "预裁剪 HTML: 删除 %d 字节 (%d 个节点), 耗时 %.2fms",
+                self.last_pretrim_stats["removed_bytes"],
+                self.last_pretrim_stats["removed_nodes"],
+                self.last_pretrim_stats["trim_ms"],
+            )
+        article = self._extract(html)
         return Article(
             title=article.get("title"),
             html_content=article.get("content"),
         )
 
+    def _extract(self, html: str) -> Dict[str, Any]:
+        if self.engine == "node":
+            try:
+                return get_readability_pool().parse(html)
+            except RuntimeError as e:
+                logger.warning(f"常驻 Readability 进程提取失败，回退到纯 Python: {e}")
+        elif self.engine == "node-spawn":
+            return simple_json_from_html_string(html, use_readability=True)
+
+        # 只取标题和正文，跳过 readabilipy 额外生成的 plain_content / plain_text
+        return {
+            "title": extract_title(html),
+            "content": str(simple_tree_from_html_string(html)),
+        }
+
+
+def resolve_readability_engine(engine: str = None) -> str:
+    """
+    解析提取引擎配置
+
+    Args:
+        engine: 引擎名（默认读取 READABILITY_ENGINE）
+
+    Returns:
+        str: 实际使用的引擎（node / python / node-spawn）
+    """
+    engine = (engine or os.getenv("READABILITY_ENGINE", "auto")).lower()
+    if engine not in READABILITY_ENGINES:
+        raise ValueError(f"Unsupported readability engine: {engine}")
+    if engine == "python":
+        return engine
+    if not node_readability_available():
+        if engine != "auto":
+            logger.warning(f"Node.js 或 Readability.js 依赖不可用，{engine} 引擎回退到纯 Python")
+        return "python"
+    return "node" if engine == "auto" else engine
+
 
 class Crawler:
     def crawl(self, url: str) -> Article:
@@ -209,12 +477,8 @@ def visit_webpage(url: str) -> str:
         # # Convert the HTML content to Markdown  是否可以采用jina来完成
         # markdown_content = markdownify(response.text).strip()
         result = crawler.crawl(url)
-        markdown_content = result.to_markdown()
-
-        # Remove multiple line breaks
-        markdown_content = re.sub(r"\n{3,}", "\n\n", markdown_content)
-
-        return markdown_content
+        # to_markdown 已合并多余空行
+        return result.to_markdown()
 
     except requests.RequestException as e:
         return f"Error fetching the webpage: {str(e)}"
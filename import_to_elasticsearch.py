@@ -1,11 +1,13 @@
 """
-将 tophub_articles.jsonl 数据导入到 Elasticsearch
+将爬虫 JSONL 输出导入到 Elasticsearch
+支持单个 JSONL 文件（可为 .gz/.zst 压缩）、单个日期分区目录或整个输出目录
 """
-import json
 import logging
+from itertools import islice
 from pathlib import Path
 
 from backend.db import ElasticsearchClient, ArticleRepository
+from backend.utils.jsonl_sink import iter_jsonl_records, list_jsonl_files
 
 # 配置日志
 logging.basicConfig(
@@ -15,12 +17,13 @@ logging.basicConfig(
 logger = logging.getLogger(__name__)
 
 
-def load_jsonl(file_path: str) -> list:
+def load_jsonl(file_path: str, prefix: str = None) -> list:
     """
-    从 JSONL 文件加载数据
+    从 JSONL 文件或分区目录加载数据
     
     Args:
-        file_path: JSONL 文件路径
+        file_path: JSONL 文件、日期分区目录或输出根目录
+        prefix: 目录模式下只读取该文件名前缀的文件
     
     Returns:
         文档列表
@@ -32,19 +35,7 @@ def load_jsonl(file_path: str) -> list:
         return documents
     
     try:
-        with open(file_path, 'r', encoding='utf-8') as f:
-            for line_num, line in enumerate(f, 1):
-                line = line.strip()
-                if not line:
-                    continue
-                
-                try:
-                    doc = json.loads(line)
-                    documents.append(doc)
-                except json.JSONDecodeError as e:
-                    logger.warning(f"第 {line_num} 行 JSON 解析失败: {e}")
-                    continue
-        
+        documents = list(iter_jsonl_records(file_path, prefix=prefix))
         logger.info(f"✅ 从 {file_path} 加载了 {len(documents)} 条数据")
         return documents
         
@@ -54,31 +45,38 @@ def load_jsonl(file_path: str) -> list:
 
 
 def import_articles_to_es(
-    jsonl_file: str = "tophub_articles.jsonl",
+    jsonl_file: str = "crawl_output",
     index_name: str = "tophub_articles",
-    recreate_index: bool = False
+    recreate_index: bool = False,
+    prefix: str = "tophub_articles",
+    chunk_size: int = 500
 ):
     """
-    将文章数据导入到 Elasticsearch
+    将文章数据导入到 Elasticsearch（流式读取，按块批量写入）
     
     Args:
-        jsonl_file: JSONL 文件路径
+        jsonl_file: JSONL 文件、日期分区目录（如 crawl_output/dt=2026-10-19）或输出根目录
         index_name: 索引名称
         recreate_index: 是否重新创建索引
+        prefix: 目录模式下只导入该文件名前缀的文件（tophub_articles / tech_articles）
+        chunk_size: 每次批量写入的文档数
     """
     print("=" * 80)
     print("开始导入数据到 Elasticsearch")
     print("=" * 80)
     
-    # 1. 加载数据
-    print(f"\n📂 正在加载数据: {jsonl_file}")
-    documents = load_jsonl(jsonl_file)
-    
-    if not documents:
+    # 1. 定位数据文件
+    print(f"\n📂 正在读取数据: {jsonl_file}")
+    if not Path(jsonl_file).exists():
+        print(f"❌ 路径不存在: {jsonl_file}")
+        return
+
+    files = list_jsonl_files(jsonl_file, prefix=prefix)
+    if not files:
         print("❌ 没有数据可导入")
         return
     
-    print(f"✅ 成功加载 {len(documents)} 条数据")
+    print(f"✅ 发现 {len(files)} 个数据文件")
     
     # 2. 连接 Elasticsearch
     print("\n🔌 正在连接 Elasticsearch...")
@@ -114,10 +112,19 @@ def import_articles_to_es(
     else:
         print(f"✅ 索引已存在")
     
-    # 5. 批量导入数据
-    print(f"\n📥 正在导入 {len(documents)} 条数据...")
+    # 5. 流式批量导入数据
+    print(f"\n📥 正在导入数据（每批 {chunk_size} 条）...")
     try:
-        result = repo.bulk_create_documents(documents)
+        result = {"success": 0, "failed": 0, "failed_items": []}
+        records = iter_jsonl_records(jsonl_file, prefix=prefix)
+        while True:
+            chunk = list(islice(records, chunk_size))
+            if not chunk:
+                break
+            chunk_result = repo.bulk_create_documents(chunk)
+            result["success"] += chunk_result["success"]
+            result["failed"] += chunk_result["failed"]
+            result["failed_items"].extend(chunk_result["failed_items"])
         
         print("\n" + "=" * 80)
         print("导入完成！")
@@ -193,8 +200,13 @@ if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="导入文章数据到 Elasticsearch")
     parser.add_argument(
         "--file",
-        default="tophub_articles.jsonl",
-        help="JSONL 文件路径 (默认: tophub_articles.jsonl)"
+        default="crawl_output",
+        help="JSONL 文件、日期分区目录或输出根目录 (默认: crawl_output)"
+    )
+    parser.add_argument(
+        "--prefix",
+        default="tophub_articles",
+        help="目录模式下导入的文件名前缀 (默认: tophub_articles，技术文章为 tech_articles)"
     )
     parser.add_argument(
         "--index",
@@ -218,7 +230,8 @@ if __name__ == "__main__":
     import_articles_to_es(
         jsonl_file=args.file,
         index_name=args.index,
-        recreate_index=args.recreate
+        recreate_index=args.recreate,
+        prefix=args.prefix
     )
     
     # 运行测试
@@ -16,8 +16,10 @@ from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import JSONResponse
 from starlette.middleware.base import BaseHTTPMiddleware
 
-from backend.api import articles, crawler, statistics, health
+from backend.api import articles, crawler, statistics, health, llm
 from backend.config.settings import settings
+from backend.db import ArticleRepository, close_shared_es_client, get_shared_es_client
+from backend.llm import close_providers
 
 # Configure logging
 logging.basicConfig(
@@ -84,9 +86,20 @@ async def lifespan(app: FastAPI):  # noqa: ARG001
     logger.info("Starting %s v%s", settings.API_TITLE, settings.API_VERSION)
     logger.info("Elasticsearch: %s:%s", settings.ELASTICSEARCH_HOST, settings.ELASTICSEARCH_PORT)
     logger.info("CORS Origins: %s", settings.CORS_ORIGINS)
+    # 所有请求共用一个 Elasticsearch 客户端（连接池），不可用时只记录日志，由 /health 反映状态
+    es_client = get_shared_es_client()
+    es_health = es_client.check_health()
+    if es_health["healthy"]:
+        logger.info("Elasticsearch connected (pool size %s)", es_health["pool_size"])
+        # 已有索引补齐分析字段的映射（analysis_status、analysis_model 等需要是 keyword）
+        ArticleRepository(es_client, index_name=settings.ELASTICSEARCH_INDEX).ensure_analysis_mappings()
+    else:
+        logger.warning("Elasticsearch unavailable at startup: %s", es_health["last_error"])
     yield
     # Shutdown
     logger.info("Shutting down %s", settings.API_TITLE)
+    await close_providers()
+    close_shared_es_client()
 
 
 # Initialize FastAPI application
@@ -179,6 +192,12 @@ app.include_router(
     tags=["statistics"],
 )
 
+app.include_router(
+    llm.router,
+    prefix="/api/llm",
+    tags=["llm"],
+)
+
 app.include_router(
     health.router,
     tags=["health"],
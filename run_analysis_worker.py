@@ -0,0 +1,67 @@
+"""
+独立分析进程：处理持久化分析队列中的文章并局部更新回 Elasticsearch
+
+用法：
+    python run_analysis_worker.py                 # 处理完队列后退出
+    python run_analysis_worker.py --follow        # 常驻，持续处理新入队的文章（Ctrl+C 退出）
+"""
+import argparse
+import asyncio
+import logging
+import time
+
+from backend.agent.analysis_queue import AnalysisWorker, drain_analysis_queue, get_analysis_queue
+from backend.agent.triage import save_keyword_corpus
+from backend.db import ElasticsearchClient, ArticleRepository
+from backend.llm import close_providers
+
+logging.basicConfig(level=logging.INFO)
+
+
+def _print_report(report, queue):
+    stats = queue.stats()
+    print("\n" + "=" * 60)
+    print(f"处理: {report.get('processed', 0)} 篇，分析成功 {report.get('analyzed', 0)} 篇，"
+          f"跳过 {report.get('skipped', 0)} 篇，写回 ES {report.get('updated', 0)} 篇")
+    print(f"队列剩余: 待分析 {stats['pending']} / 处理中 {stats['leased']} / 失败 {stats['failed']}")
+    print("=" * 60)
+
+
+async def _drain(repo, queue, batch_size):
+    try:
+        return await drain_analysis_queue(repo, queue, batch_size=batch_size)
+    finally:
+        await close_providers()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="处理持久化分析队列")
+    parser.add_argument("--index", default="tophub_articles", help="Elasticsearch 索引")
+    parser.add_argument("--batch-size", type=int, default=8, help="每批分析的文章数")
+    parser.add_argument("--follow", action="store_true", help="常驻运行，持续处理新入队的文章")
+    parser.add_argument("--poll-interval", type=float, default=5.0, help="常驻模式下队列为空时的轮询间隔（秒）")
+    args = parser.parse_args(argv)
+
+    es_client = ElasticsearchClient()
+    repo = ArticleRepository(es_client, index_name=args.index)
+    repo.ensure_analysis_mappings()
+    queue = get_analysis_queue()
+    try:
+        if not args.follow:
+            report = asyncio.run(_drain(repo, queue, args.batch_size))
+        else:
+            worker = AnalysisWorker(repo, queue, batch_size=args.batch_size, poll_interval=args.poll_interval).start()
+            try:
+                while True:
+                    time.sleep(1)
+            except KeyboardInterrupt:
+                print("\n正在停止，处理完当前批次后退出...")
+            report = worker.stop(drain=False)
+        save_keyword_corpus()
+        _print_report(report, queue)
+    finally:
+        es_client.close()
+
+
+if __name__ == "__main__":
+    main()
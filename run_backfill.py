@@ -0,0 +1,66 @@
+"""
+回填分析结果：重新分析 content_analysis 失败或缺失的文章，结果批量局部更新回 Elasticsearch
+
+用法：
+    python run_backfill.py                            # 4 个切片并行，检查点 batch_jobs/backfill.checkpoint.json
+    python run_backfill.py --slices 8 --max-concurrent 4
+    python run_backfill.py                            # 中断后再次运行即从检查点继续
+"""
+import argparse
+import asyncio
+import logging
+
+from backend.agent.backfill import DEFAULT_CHECKPOINT_PATH, run_backfill
+from backend.agent.triage import save_keyword_corpus
+from backend.db import ElasticsearchClient, ArticleRepository
+from backend.llm import close_providers
+
+logging.basicConfig(level=logging.INFO)
+
+
+def _print_report(report, checkpoint):
+    print("\n" + "=" * 60)
+    print(f"回填运行: {report['run_id']}  {'已完成' if report['completed'] else '未完成（再次运行即从检查点继续）'}")
+    print(f"扫描: {report['scanned']} 篇，分析成功 {report['analyzed']} 篇，跳过 {report['skipped']} 篇，"
+          f"失败 {report['failed']} 篇，写回 ES {report['updated']} 篇")
+    print(f"检查点: {checkpoint}")
+    print("=" * 60)
+
+
+async def _run(args, repo):
+    try:
+        return await run_backfill(
+            repo,
+            checkpoint_path=args.checkpoint,
+            slices=args.slices,
+            page_size=args.page_size,
+            max_concurrent=args.max_concurrent,
+            include_pending=args.include_pending,
+        )
+    finally:
+        await close_providers()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="回填失败或缺失的分析结果")
+    parser.add_argument("--index", default="tophub_articles", help="Elasticsearch 索引")
+    parser.add_argument("--checkpoint", default=DEFAULT_CHECKPOINT_PATH, help="检查点文件路径")
+    parser.add_argument("--slices", type=int, default=4, help="并行切片数（继续运行时必须与上次相同）")
+    parser.add_argument("--page-size", type=int, default=50, help="每页篇数")
+    parser.add_argument("--max-concurrent", type=int, default=None, help="每个切片的最大并发 LLM 请求数")
+    parser.add_argument("--include-pending", action="store_true", help="包含分析队列中尚未处理的文章")
+    args = parser.parse_args(argv)
+
+    es_client = ElasticsearchClient()
+    repo = ArticleRepository(es_client, index_name=args.index)
+    repo.ensure_analysis_mappings()
+    try:
+        report = asyncio.run(_run(args, repo))
+        save_keyword_corpus()
+        _print_report(report, args.checkpoint)
+    finally:
+        es_client.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+"""
+离线批处理分析：把尚未分析的文章写成 Batch API 请求文件提交，完成后批量写回 Elasticsearch
+
+用法：
+    python run_batch_analysis.py prepare --limit 5000            # 只写请求文件
+    python run_batch_analysis.py run --limit 5000                 # 写文件 → 提交 → 轮询 → 导入
+    python run_batch_analysis.py run --local                      # 使用本地替身（逐条在线请求）
+    python run_batch_analysis.py resume                           # 继续等待已提交的任务并导入
+"""
+import argparse
+import asyncio
+import logging
+import os
+
+from backend.agent.batch_analysis import prepare_batch_analysis, resume_batch_analysis, run_batch_analysis
+from backend.db import ElasticsearchClient, ArticleRepository
+from backend.llm import close_providers, create_batch_client
+
+logging.basicConfig(level=logging.INFO)
+
+DEFAULT_REQUEST_FILE = os.path.join("batch_jobs", "analysis_requests.jsonl")
+
+
+def _print_report(report):
+    print("\n" + "=" * 60)
+    print(f"批处理任务: {report['batch_id']}  状态: {report['status']}")
+    print(f"请求: {report['requests']} 篇")
+    print(f"成功: {report['succeeded']} 篇，失败: {report['failed']} 篇，写回 ES: {report['updated']} 篇")
+    print("=" * 60)
+
+
+async def _run(args, repo):
+    client = create_batch_client(args.provider, local=args.local)
+    try:
+        if args.command == "run":
+            return await run_batch_analysis(
+                repo, client, args.file, model=args.model, limit=args.limit,
+                poll_interval=args.poll_interval, timeout=args.timeout, provider=args.provider,
+            )
+        return await resume_batch_analysis(
+            repo, client, args.file, poll_interval=args.poll_interval, timeout=args.timeout,
+        )
+    finally:
+        await client.close()
+        await close_providers()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="离线批处理分析")
+    parser.add_argument("command", choices=["prepare", "run", "resume"], help="prepare / run / resume")
+    parser.add_argument("--file", default=DEFAULT_REQUEST_FILE, help="请求文件路径（任务清单写在 <文件>.job.json）")
+    parser.add_argument("--index", default="tophub_articles", help="Elasticsearch 索引")
+    parser.add_argument("--limit", type=int, default=1000, help="最多包含的文章数")
+    parser.add_argument("--model", default=os.getenv("DEFAULT_LLM_MODEL"), help="模型名称（默认 DEFAULT_LLM_MODEL）")
+    parser.add_argument("--provider", default=None, help="提供商（默认 DEFAULT_LLM_PROVIDER）")
+    parser.add_argument("--local", action="store_true", help="使用本地替身代替批处理接口")
+    parser.add_argument("--poll-interval", type=float, default=30.0, help="轮询间隔（秒）")
+    parser.add_argument("--timeout", type=float, default=None, help="最长等待时间（秒）")
+    args = parser.parse_args(argv)
+
+    if args.command != "resume" and not args.model:
+        parser.error("需要指定 --model 或设置 DEFAULT_LLM_MODEL")
+    if args.command == "resume" and args.local:
+        parser.error("本地替身的任务只存在于提交它的进程中，无法继续等待")
+
+    es_client = ElasticsearchClient()
+    repo = ArticleRepository(es_client, index_name=args.index)
+    repo.ensure_analysis_mappings()
+    try:
+        if args.command == "prepare":
+            count = prepare_batch_analysis(repo, args.file, args.model, limit=args.limit)
+            print(f"💾 已写入 {count} 条请求到 {args.file}")
+            return
+        _print_report(asyncio.run(_run(args, repo)))
+    finally:
+        es_client.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,236 @@
+"""
+分析流水线压测：在本地启动假 LLM 服务（backend/llm/fake_server.py），不需要 API key
+
+用法：
+    python run_llm_benchmark.py analyze --articles 500 --latency lognormal:400,0.5 --tokens-per-s 60
+    python run_llm_benchmark.py analyze --fixtures fixtures/tophub.zip --rate-limit-rate 0.05
+    python run_llm_benchmark.py pipeline fixtures/tophub.zip --repeat 3 --max-concurrent 16
+
+analyze 只测 batch_analyze_articles；pipeline 走完整路径：夹具回放（代替网络下载）→ 正文提取 →
+写入 Elasticsearch（analysis_status 为 pending）→ 分析队列 → 局部更新，需要 Elasticsearch，
+使用单独的索引（默认 benchmark_articles，结束后删除）和临时队列文件
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import random
+import tempfile
+import time
+
+from backend.llm.fake_server import FakeLLMServer, add_config_arguments, config_from_args
+
+logging.basicConfig(level=logging.WARNING)
+
+_TITLE_WORDS = ["大模型", "开源", "推理框架", "芯片", "机器人", "自动驾驶", "云计算", "数据库", "股市", "球赛", "电影", "新能源"]
+_SENTENCES = [
+    "团队发布了新版本，{w}的吞吐量显著提升。",
+    "业内人士认为，{w}将在未来一年快速普及。",
+    "这次更新主要围绕{w}的稳定性和成本展开。",
+    "开发者社区对{w}的讨论持续升温。",
+    "多家公司宣布在{w}方向加大投入。",
+    "专家提醒，{w}仍面临数据安全和合规挑战。",
+]
+
+
+def synthetic_articles(count, seed=0):
+    """确定的合成文章（标题和正文由种子决定）"""
+    rng = random.Random(seed)
+    articles = []
+    for i in range(count):
+        words = rng.sample(_TITLE_WORDS, 2)
+        sentences = [rng.choice(_SENTENCES).format(w=rng.choice(words)) for _ in range(rng.randint(8, 60))]
+        articles.append({
+            "title": f"{words[0]}与{words[1]}的最新进展 #{i}",
+            "content": "".join(sentences),
+            "category": rng.choice(["科技", "财经", "综合"]),
+        })
+    return articles
+
+
+def fixture_pages(path, repeat=1):
+    """
+    迭代夹具中的页面（代替网络下载）
+
+    Yields:
+        (榜单条目, 原始 HTML)；重复轮次改变标题和 URL，避免命中分析缓存或被当作同一文档
+    """
+    from backend.agent.crawl_fixtures import FixtureArchive
+
+    with FixtureArchive(path) as archive:
+        for round_index in range(max(repeat, 1)):
+            for page, html in archive.iter_pages():
+                info = dict(page.get("article_info") or {})
+                info.setdefault("tophub_url", page["url"])
+                info.setdefault("title", "")
+                info.setdefault("category", "")
+                if round_index:
+                    info["title"] = f"{info['title']} #{round_index}"
+                    info["tophub_url"] = f"{info['tophub_url']}#{round_index}"
+                yield info, html
+
+
+def fixture_articles(path, repeat=1):
+    """从夹具提取文章（与爬虫相同的正文提取流程）"""
+    from backend.agent.agent_today_data import build_article_from_html
+
+    articles = (build_article_from_html(info, html) for info, html in fixture_pages(path, repeat))
+    return [article for article in articles if article.get("status") != "failed"]
+
+
+def _use_fake_llm(base_url, keep_cache):
+    """让分析流水线只使用假 LLM 服务（需在导入分析模块之前调用）"""
+    os.environ["LOCAL_LLM_BASE_URL"] = base_url
+    os.environ["DEFAULT_LLM_PROVIDER"] = "local"
+    os.environ["DEFAULT_LLM_MODEL"] = "fake-model"
+    # 置空而不是删除：.env 中的配置不会被 load_dotenv 重新加载
+    for name in ("LLM_ROUTER_WEIGHTS", "LLM_CLASSIFIER_MODEL", "LLM_CLASSIFIER_PROVIDER", "LLM_HEDGE_PROVIDER"):
+        os.environ[name] = ""
+    if not keep_cache:
+        os.environ["ANALYSIS_CACHE"] = "0"
+
+
+async def _analyze(articles, max_concurrent):
+    from backend.agent.agent_content_keyword_analysis import batch_analyze_articles
+    from backend.llm import close_providers
+
+    try:
+        return await batch_analyze_articles(articles, max_concurrent=max_concurrent)
+    finally:
+        await close_providers()
+
+
+def run_analyze(args):
+    articles = fixture_articles(args.fixtures, args.repeat) if args.fixtures else synthetic_articles(args.articles, args.seed)
+    started = time.perf_counter()
+    asyncio.run(_analyze(articles, args.max_concurrent))
+    elapsed = time.perf_counter() - started
+    analyzed = sum(1 for a in articles if (a.get("content_analysis") or {}).get("analysis_success"))
+    return {"articles": len(articles), "analyzed": analyzed, "wall_time_s": round(elapsed, 3),
+            "articles_per_s": round(len(articles) / elapsed, 2) if elapsed > 0 else 0.0}
+
+
+def run_pipeline(args):
+    from backend.agent.agent_today_data import build_article_from_html
+    from backend.agent.analysis_queue import AnalysisQueue, AnalysisWorker, mark_analysis_pending
+    from backend.db import ElasticsearchClient, ArticleRepository
+
+    es_client = ElasticsearchClient()
+    repo = ArticleRepository(es_client, index_name=args.index)
+    repo.create_index(delete_if_exists=True)
+    queue_dir = tempfile.TemporaryDirectory()
+    queue = AnalysisQueue(os.path.join(queue_dir.name, "analysis_queue.sqlite3"))
+    worker = AnalysisWorker(repo, queue, batch_size=args.batch_size, poll_interval=0.2).start()
+    report = {"pages": 0, "extracted": 0, "indexed": 0}
+    timings = {"extract_s": 0.0, "index_s": 0.0}
+
+    def save(batch):
+        started = time.perf_counter()
+        result = repo.bulk_create_documents(batch)
+        timings["index_s"] += time.perf_counter() - started
+        report["indexed"] += result["success"]
+        failed_ids = {(item.get("index") or {}).get("_id") for item in result.get("failed_items", [])}
+        queue.enqueue([
+            (doc_id, doc) for doc_id, doc in ((repo.document_id(d), d) for d in batch)
+            if doc_id and doc_id not in failed_ids
+        ])
+        worker.notify()
+
+    started = time.perf_counter()
+    try:
+        batch = []
+        for info, html in fixture_pages(args.fixtures, args.repeat):
+            report["pages"] += 1
+            extract_started = time.perf_counter()
+            article = build_article_from_html(info, html)
+            timings["extract_s"] += time.perf_counter() - extract_started
+            if article.get("status") == "failed":
+                continue
+            report["extracted"] += 1
+            batch.append(mark_analysis_pending(article))
+            if len(batch) >= args.index_batch_size:
+                save(batch)
+                batch = []
+        if batch:
+            save(batch)
+        crawl_done = time.perf_counter()
+        analysis = worker.stop(drain=True)
+    finally:
+        queue.close()
+        queue_dir.cleanup()
+        if not args.keep_index:
+            repo.delete_index()
+        es_client.close()
+    elapsed = time.perf_counter() - started
+    report.update({
+        "analyzed": analysis.get("analyzed", 0),
+        "updated": analysis.get("updated", 0),
+        "extract_s": round(timings["extract_s"], 3),
+        "index_s": round(timings["index_s"], 3),
+        "analysis_tail_s": round(time.perf_counter() - crawl_done, 3),
+        "wall_time_s": round(elapsed, 3),
+        "articles_per_s": round(report["extracted"] / elapsed, 2) if elapsed > 0 else 0.0,
+    })
+    return report
+
+
+def _print_report(report, server_stats, metrics):
+    print("\n" + "=" * 70)
+    for key, value in report.items():
+        print(f"{key:<20}{value}")
+    print("-" * 70)
+    print(f"假 LLM 服务: 请求 {server_stats['requests']}，完成 {server_stats['completed']}，"
+          f"注入 429 {server_stats['rate_limited']} / 500 {server_stats['errors']}")
+    for name, m in metrics.items():
+        print(f"[{name}] 调用 {m['calls']}（失败 {m['errors']} / 重试 {m['retries']}），"
+              f"首 token p50/p95 {m['ttft_ms']['p50']}/{m['ttft_ms']['p95']}ms，"
+              f"总耗时 p50/p95 {m['latency_ms']['p50']}/{m['latency_ms']['p95']}ms，"
+              f"输入 {m['prompt_tokens']} / 输出 {m['completion_tokens']} tokens")
+    print("=" * 70)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="用假 LLM 服务压测分析流水线")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    analyze_parser = subparsers.add_parser("analyze", help="只测 batch_analyze_articles")
+    analyze_parser.add_argument("--articles", type=int, default=200, help="合成文章篇数")
+    analyze_parser.add_argument("--fixtures", default=None, help="使用夹具归档中的文章代替合成文章")
+
+    pipeline_parser = subparsers.add_parser("pipeline", help="夹具回放 → 提取 → 写入 ES → 分析队列 → 写回")
+    pipeline_parser.add_argument("fixtures", help="夹具归档路径 (.zip)")
+    pipeline_parser.add_argument("--index", default="benchmark_articles", help="压测使用的 Elasticsearch 索引（会被重建）")
+    pipeline_parser.add_argument("--keep-index", action="store_true", help="结束后保留索引")
+    pipeline_parser.add_argument("--index-batch-size", type=int, default=20, help="每次批量写入的篇数")
+    pipeline_parser.add_argument("--batch-size", type=int, default=8, help="分析队列每批篇数")
+
+    for sub in (analyze_parser, pipeline_parser):
+        sub.add_argument("--repeat", type=int, default=1, help="夹具重复轮数")
+        sub.add_argument("--max-concurrent", type=int, default=None, help="每批的最大并发 LLM 请求数")
+        sub.add_argument("--keep-cache", action="store_true", help="使用分析缓存（默认关闭，避免命中缓存）")
+        sub.add_argument("--base-url", default=None, help="使用已启动的假 LLM 服务，不在本进程中启动")
+        sub.add_argument("--json", action="store_true", help="以 JSON 输出报告")
+        add_config_arguments(sub)
+    args = parser.parse_args(argv)
+
+    server = None if args.base_url else FakeLLMServer(config_from_args(args)).start()
+    try:
+        _use_fake_llm(args.base_url or server.base_url, args.keep_cache)
+        from backend.llm import llm_metrics
+
+        report = run_analyze(args) if args.command == "analyze" else run_pipeline(args)
+        server_stats = server.stats() if server else {"requests": 0, "completed": 0, "rate_limited": 0, "errors": 0}
+        metrics = llm_metrics()
+    finally:
+        if server:
+            server.stop()
+
+    if args.json:
+        print(json.dumps({"report": report, "server": server_stats, "llm_metrics": metrics}, ensure_ascii=False, indent=2))
+    else:
+        _print_report(report, server_stats, metrics)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,62 @@
+"""
+按版本选择性重新分析：修改提示词或更换模型后，只重新分析版本过期的文章
+
+用法：
+    python run_reanalysis.py plan --budget 2000000                # 只查看计划
+    python run_reanalysis.py run --budget 2000000 --limit 5000     # 按优先级在预算内重新分析并写回
+"""
+import argparse
+import asyncio
+import logging
+
+from backend.agent.reanalysis import plan_reanalysis, run_reanalysis
+from backend.db import ElasticsearchClient, ArticleRepository
+from backend.llm import close_providers
+
+logging.basicConfig(level=logging.INFO)
+
+
+def _print_plan(plan):
+    print("\n" + "=" * 60)
+    print(f"当前分析版本: {', '.join(plan['versions'])}")
+    print(f"版本过期: {plan['stale']} 篇，本次选中 {len(plan['items'])} 篇")
+    print(f"估算 token: {plan['tokens']} / 预算 {plan['budget']}")
+    for doc_id, doc, tokens in plan["items"][:10]:
+        print(f"   {doc.get('scraped_at', '')}  {doc.get('title', '')[:40]}  (~{tokens} tokens)")
+    print("=" * 60)
+
+
+async def _run(repo, plan, args):
+    try:
+        return await run_reanalysis(repo, plan, batch_size=args.batch_size, max_concurrent=args.max_concurrent)
+    finally:
+        await close_providers()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="按版本选择性重新分析")
+    parser.add_argument("command", choices=["plan", "run"], help="plan / run")
+    parser.add_argument("--index", default="tophub_articles", help="Elasticsearch 索引")
+    parser.add_argument("--budget", type=int, required=True, help="token 预算（输入 + 预留输出的估算值）")
+    parser.add_argument("--limit", type=int, default=None, help="最多重新分析的篇数")
+    parser.add_argument("--recency-scale", default="7d", help="时间衰减尺度（距今该时长的文章优先级减半）")
+    parser.add_argument("--batch-size", type=int, default=16, help="每批篇数")
+    parser.add_argument("--max-concurrent", type=int, default=None, help="每批的最大并发 LLM 请求数")
+    args = parser.parse_args(argv)
+
+    es_client = ElasticsearchClient()
+    repo = ArticleRepository(es_client, index_name=args.index)
+    repo.ensure_analysis_mappings()
+    try:
+        plan = plan_reanalysis(repo, args.budget, limit=args.limit, recency_scale=args.recency_scale)
+        _print_plan(plan)
+        if args.command == "run" and plan["items"]:
+            report = asyncio.run(_run(repo, plan, args))
+            print(f"重新分析: 成功 {report['reanalyzed']} 篇，失败 {report['failed']} 篇（保留原结果），"
+                  f"写回 ES {report['updated']} 篇")
+    finally:
+        es_client.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+"""
+测试文章分析结果的持久化缓存
+"""
+import asyncio
+import json
+import os
+import tempfile
+import time
+
+import backend.agent.agent_content_keyword_analysis as analysis_module
+from backend.agent.analysis_cache import AnalysisCache, diff_stats, make_cache_key
+
+
+RESULT = {
+    "keywords": ["Kubernetes", "调度"],
+    "topics": ["云原生"],
+    "summary": "Kubernetes 1.31 改进了调度器。",
+    "sentiment": "positive",
+    "category": "科技",
+    "entities": [{"name": "Kubernetes", "type": "技术"}],
+    "analysis_success": True,
+}
+
+
+def test_cache_key_normalization():
+    """测试标题排版差异不影响缓存键，提示词版本和模型变化时缓存键不同"""
+    key = make_cache_key("Kubernetes 1.31 发布", "正文内容", "1", "siliconflow/qwen")
+    assert key == make_cache_key("  kubernetes　1.31  发布 ", "正文内容\n", "1", "siliconflow/qwen")
+    assert key != make_cache_key("Kubernetes 1.31 发布", "正文内容", "2", "siliconflow/qwen")
+    assert key != make_cache_key("Kubernetes 1.31 发布", "正文内容", "1", "openai/gpt-4o-mini")
+    print("✓ 缓存键规范化正常")
+
+
+def test_ttl_eviction_and_stats():
+    """测试 TTL 过期、容量淘汰和命中统计"""
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "cache", "analysis.sqlite3")
+        cache = AnalysisCache(path, ttl_seconds=3600, max_entries=2, evict_interval=1000)
+
+        cache.put("a", RESULT, latency_s=1.5, tokens=800)
+        assert cache.get("a") == RESULT
+        assert cache.get("missing") is None
+        assert cache.stats() == {
+            "hits": 1, "misses": 1, "hit_rate": 0.5, "saved_latency_s": 1.5, "saved_tokens": 800,
+        }
+
+        # 按最近访问时间淘汰：a 刚被访问过，b 最久未访问
+        cache.put("b", RESULT)
+        cache.put("c", RESULT)
+        cache.get("a")
+        assert cache.evict() == 1
+        assert cache.get("b") is None
+        assert cache.get("a") == RESULT
+
+        cache.ttl_seconds = 0.01
+        time.sleep(0.02)
+        assert cache.get("a") is None
+        assert cache.evict() == 2
+        assert len(cache) == 0
+        cache.close()
+
+        # 重新打开后数据仍在（持久化）
+        reopened = AnalysisCache(path)
+        reopened.put("d", RESULT)
+        reopened.close()
+        assert AnalysisCache(path).get("d") == RESULT
+    print("✓ 缓存淘汰和统计正常")
+
+
+def test_analyze_uses_cache(monkeypatch):
+    """测试相同文章只调用一次 LLM，第二次直接命中缓存"""
+    calls = []
+
+    async def fake_chat_completion(messages, **kwargs):
+        calls.append(messages)
+        await asyncio.sleep(0.01)
+        return "```json\n" + json.dumps(RESULT, ensure_ascii=False) + "\n```"
+
+    cache = AnalysisCache(":memory:")
+    monkeypatch.setattr(analysis_module, "chat_completion", fake_chat_completion)
+    # 假的 chat_completion 只模拟非流式调用
+    monkeypatch.setattr(analysis_module, "ANALYSIS_STRUCTURED_OUTPUT", False)
+    monkeypatch.setattr(analysis_module, "get_analysis_cache", lambda: cache)
+
+    before = cache.stats()
+
+    async def run():
+        first = await analysis_module.analyze_article_keywords("Kubernetes 1.31 发布", "正文内容" * 100)
+        second = await analysis_module.analyze_article_keywords("kubernetes 1.31 发布 ", "正文内容" * 100)
+        return first, second
+
+    first, second = asyncio.run(run())
+
+    assert len(calls) == 1
+    assert first == second
+    assert second["keywords"] == RESULT["keywords"]
+    report = diff_stats(before, cache.stats())
+    assert report["hits"] == 1 and report["misses"] == 1
+    assert report["saved_latency_s"] > 0
+    assert report["saved_tokens"] > 0
+    print(f"✓ 分析缓存命中: {report}")
+
+
+if __name__ == "__main__":
+    test_cache_key_normalization()
+    test_ttl_eviction_and_stats()
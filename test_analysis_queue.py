@@ -0,0 +1,143 @@
+"""
+测试持久化分析队列（入队 → 后台分析 → 局部更新 ES）
+"""
+import asyncio
+import time
+
+import backend.agent.analysis_queue as queue_module
+from backend.agent.analysis_queue import (
+    AnalysisQueue,
+    AnalysisWorker,
+    mark_analysis_pending,
+    process_queue_batch,
+)
+
+LONG_CONTENT = "大模型推理框架发布新版本，显著降低了显存占用并提升了吞吐量。" * 10
+
+
+class _FakeRepository:
+    def __init__(self, failed_ids=()):
+        self.updates = {}
+        self.failed_ids = set(failed_ids)
+
+    def bulk_update_documents(self, updates):
+        failed = [{"update": {"_id": doc_id}} for doc_id in updates if doc_id in self.failed_ids]
+        for doc_id, fields in updates.items():
+            if doc_id not in self.failed_ids:
+                self.updates[doc_id] = fields
+        return {"success": len(updates) - len(failed), "failed": len(failed), "failed_items": failed}
+
+
+def _article(title, content=LONG_CONTENT):
+    return {"title": title, "content": content, "category": "机器之心", "original_url": f"https://example.com/{title}"}
+
+
+def _fake_analysis(monkeypatch, fail_titles=()):
+    calls = []
+
+    async def fake_batch(articles, **kwargs):
+        calls.extend(a["title"] for a in articles)
+        for article in articles:
+            article["content_analysis"] = {"analysis_success": article["title"] not in fail_titles}
+        return articles
+
+    monkeypatch.setattr(queue_module, "batch_analyze_articles", fake_batch)
+    monkeypatch.setenv("ANALYSIS_TRIAGE", "0")
+    return calls
+
+
+def test_queue_claim_lease_and_fail(tmp_path):
+    """测试按顺序取出、租约到期重新取出、失败次数用尽后标记为 failed"""
+    queue = AnalysisQueue(str(tmp_path / "queue.sqlite3"), max_attempts=2)
+    queue.enqueue([("a", _article("a")), ("b", _article("b"))])
+
+    first = queue.claim(1, lease_s=60)
+    assert [doc_id for doc_id, _ in first] == ["a"]
+    assert set(first[0][1]) == {"title", "content", "category"}
+    assert [doc_id for doc_id, _ in queue.claim(10, lease_s=0)] == ["b"]
+    time.sleep(0.01)
+    # a 的租约未到期，b 的租约已到期
+    assert [doc_id for doc_id, _ in queue.claim(10)] == ["b"]
+
+    assert queue.fail("b", "boom") is True
+    assert queue.fail("a", "boom") is False
+    assert queue.stats() == {"pending": 1, "leased": 0, "failed": 1}
+    assert len(queue) == 1
+
+    queue.complete(["a"])
+    assert len(queue) == 0
+    queue.close()
+
+
+def test_failed_items_back_off(tmp_path):
+    """测试失败的条目按指数退避延后重试，等待期间不会被取出"""
+    queue = AnalysisQueue(str(tmp_path / "queue.sqlite3"), max_attempts=5, retry_base_s=0.05, retry_max_s=0.1)
+    queue.enqueue([("a", _article("a"))])
+    assert [queue.retry_delay(n) for n in (1, 2, 3)] == [0.05, 0.1, 0.1]
+
+    assert queue.claim(1)
+    assert queue.fail("a", "provider down") is False
+    assert queue.claim(1) == [] and queue.stats()["pending"] == 1
+    time.sleep(0.06)
+    assert [doc_id for doc_id, _ in queue.claim(1)] == ["a"]
+    queue.close()
+
+
+def test_expired_leases_stop_after_max_attempts(monkeypatch, tmp_path):
+    """测试每次都导致消费者崩溃（租约到期未确认）的文章达到最多次数后标记为失败，不再被取出"""
+    queue = AnalysisQueue(str(tmp_path / "queue.sqlite3"), max_attempts=2)
+    queue.enqueue([("crash", _article("crash"))])
+    for _ in range(2):
+        assert [doc_id for doc_id, _ in queue.claim(1, lease_s=0)] == ["crash"]
+        time.sleep(0.01)
+    assert queue.claim(1) == []
+
+    _fake_analysis(monkeypatch)
+    repository = _FakeRepository()
+    report = asyncio.run(process_queue_batch(repository, queue))
+    assert report["failed"] == 1 and report["processed"] == 0
+    assert repository.updates["crash"] == {"analysis_status": "failed"}
+    assert queue.stats() == {"pending": 0, "leased": 0, "failed": 1}
+    assert queue.fail_exhausted_leases() == []
+    queue.close()
+
+
+def test_process_queue_batch_updates_es(monkeypatch, tmp_path):
+    """测试分析结果局部写回 ES，分析失败的文章留在队列中重试，写回失败的文章不确认"""
+    calls = _fake_analysis(monkeypatch, fail_titles={"失败"})
+    queue = AnalysisQueue(str(tmp_path / "queue.sqlite3"))
+    queue.enqueue([(t, _article(t)) for t in ("成功", "失败", "写回失败")])
+    repository = _FakeRepository(failed_ids={"写回失败"})
+
+    report = asyncio.run(process_queue_batch(repository, queue, batch_size=10))
+
+    assert calls == ["成功", "失败", "写回失败"]
+    assert report["processed"] == 3 and report["analyzed"] == 2 and report["retried"] == 1
+    assert report["updated"] == 1
+    assert repository.updates["成功"]["analysis_status"] == "done"
+    assert repository.updates["成功"]["content_analysis"]["analysis_success"]
+    assert queue.stats()["pending"] == 1
+    assert queue.stats()["leased"] == 1
+
+
+def test_mark_analysis_pending():
+    """测试写入前的待分析标记"""
+    article = mark_analysis_pending(_article("a"))
+    assert article["analysis_status"] == "pending"
+    assert article["content_analysis"]["analysis_success"] is False
+
+
+def test_worker_drains_on_stop(monkeypatch, tmp_path):
+    """测试后台线程处理入队的文章，stop(drain=True) 等待队列处理完"""
+    calls = _fake_analysis(monkeypatch)
+    queue = AnalysisQueue(str(tmp_path / "queue.sqlite3"))
+    repository = _FakeRepository()
+
+    worker = AnalysisWorker(repository, queue, batch_size=2, poll_interval=0.05).start()
+    queue.enqueue([(str(i), _article(str(i))) for i in range(5)])
+    worker.notify()
+    report = worker.stop(drain=True, timeout=10)
+
+    assert sorted(calls) == [str(i) for i in range(5)]
+    assert report["processed"] == 5 and report["updated"] == 5
+    assert len(queue) == 0
@@ -0,0 +1,87 @@
+"""
+测试 Article 的 markdown 转换缓存与流式转换
+"""
+import backend.utils.url_to_markdown as url_to_markdown
+from backend.utils.url_to_markdown import Article
+
+
+PARAGRAPH = "PostgreSQL 17 引入了增量备份功能，大幅缩短了大型数据库的备份时间。"
+
+HTML = f"""
+<div>
+  <h2>增量备份</h2>
+  <p>{PARAGRAPH}</p>
+  <blockquote><p>{PARAGRAPH}引用段落。</p></blockquote>
+  <ul><li>{PARAGRAPH}列表项一</li><li>{PARAGRAPH}列表项二</li></ul>
+  <p>{PARAGRAPH}最后一段。</p>
+</div>
+"""
+
+
+def test_conversions_are_memoized(monkeypatch):
+    """测试多次调用只转换一次，修改 HTML 后缓存失效"""
+    calls = []
+    original_md = url_to_markdown.md
+
+    def counting_md(html, *args, **kwargs):
+        calls.append(html)
+        return original_md(html, *args, **kwargs)
+
+    monkeypatch.setattr(url_to_markdown, "md", counting_md)
+
+    article = Article(title="PostgreSQL 17 新特性", html_content=HTML)
+    first = article.to_markdown()
+    assert article.to_markdown() is first
+    article.to_message()
+    article.to_markdown(including_title=False)
+    assert len(calls) == 1
+    assert first.startswith("# PostgreSQL 17 新特性")
+
+    # 消息块每次返回新的 dict，调用方修改不影响缓存
+    message = article.to_message()
+    message[0]["text"] = "changed"
+    assert article.to_message()[0]["text"] == first
+
+    article.html_content = f"<p>{PARAGRAPH}新的内容。</p>"
+    assert "新的内容" in article.to_markdown()
+    assert len(calls) == 2
+    print("✓ markdown 转换缓存正常")
+
+
+def test_streaming_conversion_matches_blocks(monkeypatch):
+    """测试流式转换按块输出，超过阈值时 to_markdown 自动使用流式路径"""
+    article = Article(title="PostgreSQL 17 新特性", html_content=HTML)
+    blocks = list(article.iter_markdown(chunk_size=64))
+
+    assert len(blocks) == 5
+    assert blocks[0].startswith("增量备份")
+    assert blocks[2].startswith(">")
+    assert "列表项二" in blocks[3]
+    assert blocks[4].endswith("最后一段。")
+    assert list(Article(title="空", html_content="").iter_markdown()) == []
+
+    monkeypatch.setattr(url_to_markdown, "MARKDOWN_STREAM_THRESHOLD", 10)
+    streamed = Article(title="PostgreSQL 17 新特性", html_content=HTML)
+    assert streamed.raw_markdown() == "\n\n".join(blocks)
+    assert PARAGRAPH in streamed.to_markdown()
+    print("✓ 流式转换正常")
+
+
+def test_streaming_keeps_loose_text():
+    """测试流式转换保留不在块级元素内的文字（div 中直接的文字、br 分隔的行），并保持原顺序"""
+    html = (
+        f"<div>{PARAGRAPH}开头<br>第二行 &amp; <b>加粗</b>"
+        f"<section>小节文字<p>{PARAGRAPH}段落</p>段落之后</section>"
+        f"<h2>标题</h2><span>结尾文字</span></div>"
+    )
+    blocks = list(Article(title="零散文字", html_content=html).iter_markdown(chunk_size=32))
+    streamed = "\n\n".join(blocks)
+    expected = ["开头", "第二行 & **加粗**", "小节文字", "段落", "段落之后", "标题", "结尾文字"]
+    positions = [streamed.find(text) for text in expected]
+    assert all(position >= 0 for position in positions), streamed
+    assert positions == sorted(positions)
+
+
+if __name__ == "__main__":
+    import pytest
+    pytest.main([__file__, "-v"])
@@ -0,0 +1,156 @@
+"""
+测试分析结果回填（切片滚动 + 检查点续跑）
+"""
+import asyncio
+import json
+import zlib
+
+import pytest
+
+import backend.agent.analysis_queue as queue_module
+from backend.agent.backfill import BackfillCheckpoint, backfill_query, run_backfill
+from backend.db.elasticsearch_client import ArticleRepository
+
+LONG_CONTENT = "大模型推理框架发布新版本，显著降低了显存占用并提升了吞吐量。" * 10
+
+
+class _FakeRepository:
+    """按 backfill_query 的语义过滤文档，按文档 ID 哈希切片"""
+
+    def __init__(self, docs):
+        self.docs = docs
+
+    def _matches(self, doc, query):
+        for clause in query["bool"]["must_not"]:
+            if "terms" in clause:
+                if doc.get("analysis_status") in clause["terms"]["analysis_status"]:
+                    return False
+            elif "content_analysis.analysis_success" in clause["term"]:
+                if (doc.get("content_analysis") or {}).get("analysis_success"):
+                    return False
+            elif doc.get("analysis_backfill") == clause["term"]["analysis_backfill"]:
+                return False
+        return True
+
+    def scroll_documents(self, query=None, size=500, slice_id=None, max_slices=None, source=None, **kwargs):
+        ids = [
+            doc_id for doc_id, doc in self.docs.items()
+            if self._matches(doc, query) and zlib.crc32(doc_id.encode()) % max_slices == slice_id
+        ]
+        for start in range(0, len(ids), size):
+            yield [(doc_id, {k: self.docs[doc_id][k] for k in source if k in self.docs[doc_id]})
+                   for doc_id in ids[start:start + size]]
+
+    def bulk_update_documents(self, updates):
+        for doc_id, fields in updates.items():
+            self.docs[doc_id].update(fields)
+        return {"success": len(updates), "failed": 0, "failed_items": []}
+
+
+def _docs():
+    docs = {f"doc-{i}": {"title": f"文章{i}", "content": LONG_CONTENT} for i in range(10)}
+    docs["doc-0"]["content_analysis"] = {"analysis_success": True}
+    docs["doc-1"]["analysis_status"] = "skipped"
+    docs["doc-2"]["analysis_status"] = "pending"
+    return docs
+
+
+def _fake_analysis(monkeypatch, fail_titles=(), crash_title=None):
+    calls = []
+
+    async def fake_batch(articles, **kwargs):
+        for article in articles:
+            if article["title"] == crash_title:
+                raise KeyboardInterrupt
+        calls.extend(a["title"] for a in articles)
+        for article in articles:
+            article["content_analysis"] = {"analysis_success": article["title"] not in fail_titles}
+        return articles
+
+    monkeypatch.setattr(queue_module, "batch_analyze_articles", fake_batch)
+    monkeypatch.setenv("ANALYSIS_TRIAGE", "0")
+    return calls
+
+
+def test_backfill_query_excludes_done_and_skipped():
+    """测试查询排除成功分析、分流跳过、队列中和本次运行已处理的文章"""
+    query = backfill_query("run-1")
+    must_not = query["bool"]["must_not"]
+    assert {"term": {"content_analysis.analysis_success": True}} in must_not
+    assert {"terms": {"analysis_status": ["skipped", "pending"]}} in must_not
+    assert {"term": {"analysis_backfill": "run-1"}} in must_not
+    assert {"terms": {"analysis_status": ["skipped"]}} in backfill_query(include_pending=True)["bool"]["must_not"]
+
+
+def test_run_backfill_updates_documents(monkeypatch, tmp_path):
+    """测试各切片重新分析并写回，失败的文章标记 failed 且本轮不再重试"""
+    calls = _fake_analysis(monkeypatch, fail_titles={"文章3"})
+    repository = _FakeRepository(_docs())
+    checkpoint = str(tmp_path / "backfill.json")
+
+    report = asyncio.run(run_backfill(repository, checkpoint_path=checkpoint, slices=3, page_size=2))
+
+    assert sorted(calls) == sorted(f"文章{i}" for i in range(3, 10))
+    assert report["completed"] and report["scanned"] == 7
+    assert report["analyzed"] == 6 and report["failed"] == 1 and report["updated"] == 7
+    assert repository.docs["doc-4"]["analysis_status"] == "done"
+    assert repository.docs["doc-3"]["analysis_status"] == "failed"
+    assert repository.docs["doc-3"]["analysis_backfill"] == report["run_id"]
+    assert "analysis_backfill" not in repository.docs["doc-2"]
+    saved = json.loads((tmp_path / "backfill.json").read_text(encoding="utf-8"))
+    assert sorted(saved["completed_slices"]) == [0, 1, 2]
+
+
+def test_run_backfill_resumes_from_checkpoint(monkeypatch, tmp_path):
+    """测试中断后从检查点继续：已处理的文章不重复分析，沿用同一运行 ID"""
+    repository = _FakeRepository(_docs())
+    checkpoint = str(tmp_path / "backfill.json")
+
+    _fake_analysis(monkeypatch, crash_title="文章7")
+    with pytest.raises(KeyboardInterrupt):
+        asyncio.run(run_backfill(repository, checkpoint_path=checkpoint, slices=1, page_size=2))
+    first = json.loads((tmp_path / "backfill.json").read_text(encoding="utf-8"))
+    assert first["completed_slices"] == []
+    processed = {doc_id for doc_id, doc in repository.docs.items() if doc.get("analysis_backfill")}
+
+    calls = _fake_analysis(monkeypatch)
+    report = asyncio.run(run_backfill(repository, checkpoint_path=checkpoint, slices=1, page_size=2))
+
+    assert report["run_id"] == first["run_id"] and report["completed"]
+    assert not {f"文章{doc_id.split('-')[1]}" for doc_id in processed} & set(calls)
+    assert report["scanned"] == 7 and report["analyzed"] == 7
+
+    # 未完成的检查点不能换切片数继续
+    (tmp_path / "backfill.json").write_text(json.dumps(first), encoding="utf-8")
+    with pytest.raises(ValueError):
+        BackfillCheckpoint(checkpoint, slices=2)
+
+
+def test_scroll_documents_slices_and_clears():
+    """测试切片滚动的请求参数、翻页和清理滚动上下文"""
+    class _FakeES:
+        def __init__(self):
+            self.search_kwargs = None
+            self.cleared = []
+            self.pages = [[{"_id": "b", "_source": {}}], []]
+
+        def search(self, **kwargs):
+            self.search_kwargs = kwargs
+            return {"_scroll_id": "s1", "hits": {"hits": [{"_id": "a", "_source": {"title": "A"}}]}}
+
+        def scroll(self, scroll_id, scroll):
+            return {"_scroll_id": "s2", "hits": {"hits": self.pages.pop(0)}}
+
+        def clear_scroll(self, scroll_id):
+            self.cleared.append(scroll_id)
+
+    repository = ArticleRepository.__new__(ArticleRepository)
+    repository.es = _FakeES()
+    repository.index_name = "articles"
+
+    pages = list(repository.scroll_documents(query={"match_all": {}}, size=1, slice_id=1, max_slices=4, source=["title"]))
+
+    assert pages == [[("a", {"title": "A"})], [("b", {})]]
+    assert repository.es.search_kwargs["slice"] == {"id": 1, "max": 4}
+    assert repository.es.search_kwargs["source"] == ["title"]
+    assert repository.es.cleared == ["s2"]
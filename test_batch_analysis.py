@@ -0,0 +1,157 @@
+"""
+测试离线批处理分析（JSONL 请求文件 → 批处理任务 → 写回 ES）
+"""
+import asyncio
+import json
+
+import httpx
+
+import backend.agent.batch_analysis as batch_analysis_module
+import backend.llm.batch as batch_module
+from backend.agent.batch_analysis import (
+    PENDING_ANALYSIS_QUERY,
+    build_analysis_requests,
+    load_manifest,
+    parse_analysis_results,
+    run_batch_analysis,
+)
+from backend.agent.backfill import backfill_query
+from backend.llm.batch import LocalBatchClient, OpenAIBatchClient, parse_batch_output, read_batch_file, wait_for_batch
+
+
+class _FakeRepository:
+    def __init__(self, docs):
+        self.docs = docs
+        self.queries = []
+        self.updates = {}
+
+    def search(self, query=None, size=10, **kwargs):
+        self.queries.append(query)
+        hits = [{"_id": doc_id, "_source": doc} for doc_id, doc in list(self.docs.items())[:size]]
+        return {"hits": {"hits": hits, "total": {"value": len(hits)}}}
+
+    def bulk_update_documents(self, updates):
+        self.updates.update(updates)
+        return {"success": len(updates), "failed": 0, "failed_items": []}
+
+
+class _FakeQueue:
+    def __init__(self, completed):
+        self.completed = completed
+
+    def complete(self, doc_ids):
+        self.completed.extend(doc_ids)
+
+
+def _result_line(custom_id, content=None, status_code=200, error=None):
+    response = None
+    if content is not None or status_code != 200:
+        response = {"status_code": status_code, "body": {"choices": [{"message": {"content": content}}]}}
+    return json.dumps({"custom_id": custom_id, "response": response, "error": error}, ensure_ascii=False)
+
+
+def test_parse_batch_output_separates_errors():
+    """测试结果文件解析：成功、请求错误、非 200 分开统计"""
+    text = "\n".join([
+        _result_line("a", "内容"),
+        _result_line("b", error={"code": "rate_limit", "message": "too many requests"}),
+        _result_line("c", status_code=500),
+        "不是 JSON",
+    ])
+    outputs, errors = parse_batch_output(text)
+    assert outputs == {"a": "内容"}
+    assert errors["b"] == "too many requests"
+    assert "c" in errors
+
+
+def test_build_and_parse_analysis_requests():
+    """测试请求行使用文档 ID 作为 custom_id，结果解析为标准化的分析结果"""
+    requests = build_analysis_requests(
+        [("doc-1", {"title": "标题", "content": "正文"}), ("doc-2", {"title": "", "content": "无标题"})],
+        model="batch-model",
+    )
+    assert [r["custom_id"] for r in requests] == ["doc-1"]
+    assert requests[0]["url"] == "/v1/chat/completions"
+    assert requests[0]["body"]["model"] == "batch-model"
+    assert "标题：标题" in requests[0]["body"]["messages"][-1]["content"]
+
+    analysis = {"keywords": ["k"], "summary": "s", "sentiment": "neutral", "category": "科技", "entities": []}
+    results, errors = parse_analysis_results("\n".join([
+        _result_line("doc-1", "```json\n" + json.dumps(analysis) + "\n```"),
+        _result_line("doc-2", "不是 JSON"),
+    ]))
+    assert results["doc-1"]["keywords"] == ["k"] and results["doc-1"]["analysis_success"]
+    assert "doc-2" in errors
+
+
+def test_run_batch_analysis_with_local_client(monkeypatch, tmp_path):
+    """测试完整流程：写请求文件、本地替身执行、写回 ES 并记录任务清单"""
+    async def fake_chat_completion(messages, provider=None, model=None, **kwargs):
+        if "失败" in messages[-1]["content"]:
+            raise RuntimeError("boom")
+        return json.dumps({"keywords": ["批处理"], "summary": "摘要"}, ensure_ascii=False)
+
+    monkeypatch.setattr(batch_module, "chat_completion", fake_chat_completion)
+    completed = []
+    monkeypatch.setattr(batch_analysis_module, "get_analysis_queue", lambda: _FakeQueue(completed))
+    repository = _FakeRepository({
+        "doc-1": {"title": "第一篇", "content": "正文一"},
+        "doc-2": {"title": "失败的文章", "content": "正文二"},
+    })
+    request_file = str(tmp_path / "requests.jsonl")
+
+    async def run():
+        client = LocalBatchClient()
+        return await run_batch_analysis(repository, client, request_file, model="m", poll_interval=0.01)
+
+    report = asyncio.run(run())
+
+    assert repository.queries == [PENDING_ANALYSIS_QUERY] == [backfill_query()]
+    assert len(read_batch_file(request_file)) == 2
+    assert report["requests"] == 2 and report["succeeded"] == 1 and report["failed"] == 1
+    assert list(repository.updates) == ["doc-1"]
+    assert repository.updates["doc-1"]["content_analysis"]["keywords"] == ["批处理"]
+    assert repository.updates["doc-1"]["analysis_status"] == "done"
+    assert completed == ["doc-1"]
+    manifest = load_manifest(request_file)
+    assert manifest["status"] == "completed" and manifest["report"]["updated"] == 1
+
+
+def test_openai_batch_client_protocol(tmp_path):
+    """测试 OpenAI 兼容接口：上传文件、创建任务、轮询、下载结果"""
+    seen = []
+    polls = {"count": 0}
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        seen.append((request.method, request.url.path))
+        path = request.url.path
+        if path == "/v1/files":
+            assert b'name="purpose"' in request.content and b"batch" in request.content
+            return httpx.Response(200, json={"id": "file-in"})
+        if path == "/v1/batches":
+            assert json.loads(request.content)["input_file_id"] == "file-in"
+            return httpx.Response(200, json={"id": "batch-1", "status": "validating"})
+        if path == "/v1/batches/batch-1":
+            polls["count"] += 1
+            status = "completed" if polls["count"] >= 2 else "in_progress"
+            return httpx.Response(200, json={"id": "batch-1", "status": status, "output_file_id": "file-out"})
+        if path == "/v1/files/file-out/content":
+            return httpx.Response(200, text=_result_line("doc-1", "{}") + "\n")
+        return httpx.Response(404)
+
+    request_file = tmp_path / "requests.jsonl"
+    request_file.write_text('{"custom_id": "doc-1"}\n', encoding="utf-8")
+
+    async def run():
+        http_client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+        client = OpenAIBatchClient(api_key="k", base_url="https://batch.test/v1", http_client=http_client)
+        batch_id = await client.submit(str(request_file))
+        batch = await wait_for_batch(client, batch_id, poll_interval=0)
+        text = await client.download(batch_id)
+        await http_client.aclose()
+        return batch, text
+
+    batch, text = asyncio.run(run())
+    assert batch["status"] == "completed"
+    assert parse_batch_output(text)[0] == {"doc-1": "{}"}
+    assert seen[:2] == [("POST", "/v1/files"), ("POST", "/v1/batches")]
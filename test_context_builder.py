@@ -0,0 +1,86 @@
+"""
+测试 LLM 分析上下文构建（按 token 预算抽取句子）
+"""
+from backend.agent.context_builder import GAP_MARKER, build_analysis_context, split_into_chunks, split_sentences
+from backend.agent.tech_detection import detect_tech_content
+from backend.llm.token_estimator import estimate_tokens
+
+TITLE = "vLLM 发布新版本，推理加速提升两倍"
+FILLER = "作者回忆了自己第一次参加技术大会时的经历，那天下着大雨，会场里人很多。"
+CONTENT = "\n".join([
+    "vLLM 今天发布了新版本，推理吞吐提升两倍。",
+    "欢迎关注我们的公众号，点赞在看。",
+    FILLER * 30,
+    "新版本支持 LoRA 适配器热加载，并改进了 TensorRT 后端的量化推理。",
+    FILLER * 30,
+    "版权所有，转载请注明出处。",
+])
+
+
+def test_short_content_is_unchanged():
+    """测试未超出预算的正文原样返回"""
+    content = "vLLM 发布新版本。\n支持 LoRA。"
+    assert build_analysis_context(TITLE, content, 1000) == content
+
+
+def test_split_sentences_keeps_paragraphs():
+    """测试中英文句子切分并记录段落序号"""
+    sentences = split_sentences("第一句。第二句！\nFirst sentence. Second one?\n\n最后")
+    assert sentences == [
+        (0, "第一句。"), (0, "第二句！"),
+        (1, "First sentence."), (1, "Second one?"),
+        (2, "最后"),
+    ]
+
+
+def test_long_content_keeps_informative_sentences_within_budget():
+    """测试长文只保留开头和关键词密集的句子，丢弃模板文本"""
+    budget = 120
+    context = build_analysis_context(TITLE, CONTENT, budget)
+
+    assert estimate_tokens(context) <= budget + estimate_tokens(GAP_MARKER) * 4
+    assert "vLLM 今天发布了新版本" in context
+    assert "LoRA 适配器热加载" in context
+    assert "公众号" not in context
+    assert "版权所有" not in context
+    assert GAP_MARKER in context
+    # 抽取后仍能识别出原文的技术关键词
+    assert detect_tech_content(context, TITLE)["is_tech_related"]
+    print(f"✓ {estimate_tokens(CONTENT)} tokens -> {estimate_tokens(context)} tokens")
+
+
+def test_sentences_keep_original_order():
+    """测试选中的句子按原文顺序拼接"""
+    context = build_analysis_context(TITLE, CONTENT, 120)
+    assert context.index("vLLM 今天发布了新版本") < context.index("LoRA 适配器热加载")
+
+
+def test_single_oversized_sentence_falls_back_to_prefix():
+    """测试没有可用句子时按预算截取开头"""
+    content = "大" * 500
+    context = build_analysis_context("", content, 50)
+    assert context == "大" * 50
+
+
+def test_english_sentences_keep_spaces():
+    """测试英文句子拼接时保留空格，中文句子直接拼接"""
+    english = " ".join(f"Sentence {i} talks about Python and GPU inference." for i in range(60))
+    content = f"{english}\n第一句介绍 vLLM。第二句介绍 LoRA。"
+
+    context = build_analysis_context("Python GPU inference", content, 200)
+    assert "inference.Sentence" not in context
+    assert "inference. Sentence" in context
+
+    chunks = split_into_chunks(content, 100)
+    assert all("inference.Sentence" not in chunk for chunk in chunks)
+    assert "about Python and GPU inference. Sentence 1" in chunks[0]
+    assert "第一句介绍 vLLM。第二句介绍 LoRA。" in chunks[-1]
+
+
+if __name__ == "__main__":
+    test_short_content_is_unchanged()
+    test_split_sentences_keeps_paragraphs()
+    test_long_content_keeps_informative_sentences_within_budget()
+    test_sentences_keep_original_order()
+    test_single_oversized_sentence_falls_back_to_prefix()
+    test_english_sentences_keep_spaces()
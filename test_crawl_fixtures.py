@@ -0,0 +1,114 @@
+"""
+测试爬虫夹具录制与离线回放
+"""
+import os
+import tempfile
+
+from readabilipy import simple_json_from_html_string
+
+from backend.agent.crawl_fixtures import (
+    FixtureArchive,
+    FixtureRecorder,
+    REPLAY_STAGES,
+    replay_fixtures,
+)
+from backend.utils.url_to_markdown import Article
+
+
+PARAGRAPH = "大模型推理加速是近期开源社区最受关注的方向之一，vLLM 和 TensorRT 都发布了新版本。"
+
+SAMPLE_HTML = f"""
+<html>
+  <head><title>开源项目 vLLM 发布新版本</title><script>var tracking = 1;</script></head>
+  <body>
+    <nav>首页 | 导航</nav>
+    <article>
+      <h1>开源项目 vLLM 发布新版本</h1>
+      <p>{PARAGRAPH * 3}</p>
+      <p>{PARAGRAPH * 2}</p>
+    </article>
+  </body>
+</html>
+"""
+
+
+class PythonExtractor:
+    """纯 Python 提取器（测试环境不依赖 Node.js）"""
+
+    def extract_article(self, html: str) -> Article:
+        article = simple_json_from_html_string(html, use_readability=False)
+        return Article(title=article.get("title"), html_content=article.get("content"))
+
+
+def _record_sample(path: str, pages: int = 3) -> None:
+    articles = [
+        {"category": "GitHub", "title": f"测试文章 {i}", "tophub_url": f"https://tophub.today/l?e={i}"}
+        for i in range(pages)
+    ]
+    with FixtureRecorder(path) as recorder:
+        recorder.record_listing(articles)
+        for article_info in articles:
+            recorder.record_page(article_info["tophub_url"], SAMPLE_HTML, article_info)
+        # 同一 URL 重复录制只保留一次
+        recorder.record_page(articles[0]["tophub_url"], SAMPLE_HTML, articles[0])
+
+
+def test_record_and_read_archive():
+    """测试录制后可以完整读回榜单和页面"""
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "fixtures", "tophub.zip")
+        _record_sample(path)
+
+        with FixtureArchive(path) as archive:
+            listings = archive.listings()
+            assert len(listings) == 1
+            assert len(listings[0]["articles"]) == 3
+            assert archive.page_count() == 3
+
+            pages = list(archive.iter_pages())
+            assert pages[0][0]["article_info"]["title"] == "测试文章 0"
+            assert pages[0][1] == SAMPLE_HTML
+    print("✓ 夹具录制/读取正常")
+
+
+def test_interrupted_recording_is_replayable():
+    """测试录制中途出错（如 Ctrl-C）时，已录制的页面仍带清单、可以读回"""
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "tophub.zip")
+        article_info = {"category": "GitHub", "title": "测试文章", "tophub_url": "https://tophub.today/l?e=1"}
+        try:
+            with FixtureRecorder(path) as recorder:
+                recorder.record_listing([article_info])
+                recorder.record_page(article_info["tophub_url"], SAMPLE_HTML, article_info)
+                raise KeyboardInterrupt
+        except KeyboardInterrupt:
+            pass
+
+        with FixtureArchive(path) as archive:
+            assert archive.page_count() == 1
+    print("✓ 中断后的夹具可以读回")
+
+
+def test_replay_report():
+    """测试回放报告包含各阶段吞吐和分位数"""
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "tophub.zip")
+        _record_sample(path)
+
+        report = replay_fixtures(path, repeat=2, extractor=PythonExtractor())
+
+        assert report["pages"] == 6
+        assert report["failed"] == 0
+        assert set(report["stages"]) == set(REPLAY_STAGES)
+        for stage in REPLAY_STAGES:
+            stats = report["stages"][stage]
+            assert stats["count"] == 6
+            assert stats["p50_ms"] <= stats["p99_ms"]
+        assert report["end_to_end"]["count"] == 6
+    print(f"✓ 回放报告正常: {report['pages_per_s']} 页/秒")
+
+
+if __name__ == "__main__":
+    test_record_and_read_archive()
+    test_interrupted_recording_is_replayable()
+    test_replay_report()
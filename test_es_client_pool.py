@@ -0,0 +1,140 @@
+"""
+测试共享 Elasticsearch 客户端（连接池配置、健康检查缓存、请求之间复用同一个客户端）
+"""
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+import backend.db.elasticsearch_client as es_module
+from backend.api import health as health_api
+from backend.api import statistics as statistics_api
+from backend.db import ArticleRepository, ElasticsearchClient, close_shared_es_client, get_shared_es_client
+
+
+class _FakeIndices:
+    def __init__(self):
+        self.existing = set()
+        self.put_mappings = []
+
+    def exists(self, index):
+        return index in self.existing
+
+    def put_mapping(self, index, properties):
+        self.put_mappings.append((index, properties))
+
+
+class _FakeElasticsearch:
+    """记录构造参数和调用次数的假 Elasticsearch 客户端"""
+
+    instances = []
+
+    def __init__(self, **kwargs):
+        self.kwargs = kwargs
+        self.info_calls = 0
+        self.ping_calls = 0
+        self.ping_result = True
+        self.closed = False
+        self.indices = _FakeIndices()
+        _FakeElasticsearch.instances.append(self)
+
+    def info(self):
+        self.info_calls += 1
+        return {"version": {"number": "9.2.1"}}
+
+    def ping(self):
+        self.ping_calls += 1
+        if isinstance(self.ping_result, Exception):
+            raise self.ping_result
+        return self.ping_result
+
+    def search(self, **kwargs):
+        return {"hits": {"total": {"value": 0}, "hits": []}, "aggregations": {}}
+
+    def close(self):
+        self.closed = True
+
+
+@pytest.fixture
+def fake_es(monkeypatch):
+    _FakeElasticsearch.instances = []
+    monkeypatch.setattr(es_module, "Elasticsearch", _FakeElasticsearch)
+    monkeypatch.setattr(es_module, "_shared_client", None)
+    yield _FakeElasticsearch
+    close_shared_es_client()
+
+
+def test_pool_size_and_connection_check(fake_es, monkeypatch):
+    """测试连接池大小读取环境变量，verify_connection=False 时不调用 info()"""
+    monkeypatch.setenv("ELASTICSEARCH_POOL_SIZE", "32")
+    monkeypatch.setenv("ELASTICSEARCH_REQUEST_TIMEOUT", "7.5")
+    client = ElasticsearchClient(verify_connection=False)
+    assert client.client.kwargs["connections_per_node"] == 32
+    assert client.client.kwargs["request_timeout"] == 7.5
+    assert client.client.info_calls == 0
+
+    verified = ElasticsearchClient(pool_size=4)
+    assert verified.client.kwargs["connections_per_node"] == 4 and verified.client.info_calls == 1
+
+
+def test_check_health_caches_and_counts_failures(fake_es):
+    """测试健康检查在 max_age 内复用结果，失败时累计连续失败次数，恢复后清零"""
+    client = ElasticsearchClient(verify_connection=False)
+    assert client.check_health()["healthy"] is True
+    assert client.check_health(max_age=60)["checks"] == 1 and client.client.ping_calls == 1
+
+    client.client.ping_result = False
+    client.check_health()
+    client.client.ping_result = ConnectionError("refused")
+    health = client.check_health()
+    assert health["healthy"] is False and health["consecutive_failures"] == 2
+    assert health["failures"] == 2 and health["last_error"] == "refused"
+
+    client.client.ping_result = True
+    health = client.check_health()
+    assert health["healthy"] and health["consecutive_failures"] == 0 and health["checks"] == 4
+
+
+def test_shared_client_is_reused_and_closed(fake_es):
+    """测试共享客户端只创建一次，关闭后再获取会重新创建"""
+    first = get_shared_es_client()
+    assert get_shared_es_client() is first and len(fake_es.instances) == 1
+    close_shared_es_client()
+    assert first.client.closed
+    assert get_shared_es_client() is not first and len(fake_es.instances) == 2
+
+
+def test_requests_share_one_client(fake_es, monkeypatch):
+    """测试多次请求 /health 和统计接口不新建客户端、不调用 info()，健康检查结果被缓存"""
+    monkeypatch.delenv("ELASTICSEARCH_POOL_SIZE", raising=False)
+    app = FastAPI()
+    app.include_router(health_api.router)
+    app.include_router(statistics_api.router, prefix="/api/statistics")
+
+    with TestClient(app) as client:
+        responses = [client.get("/health") for _ in range(3)]
+        stats = [client.get("/api/statistics/categories") for _ in range(2)]
+
+    assert all(r.json()["status"] == "healthy" for r in responses)
+    assert all(r.status_code == 200 for r in stats)
+    assert responses[0].json()["pool_size"] == 10
+    assert len(fake_es.instances) == 1
+    assert fake_es.instances[0].info_calls == 0 and fake_es.instances[0].ping_calls == 1
+
+
+def test_existing_index_gets_analysis_mappings(fake_es):
+    """测试已有索引补齐分析字段的映射（keyword），索引不存在时不调用 put_mapping"""
+    client = ElasticsearchClient(verify_connection=False)
+    repo = ArticleRepository(client, index_name="tophub_articles")
+    assert repo.ensure_analysis_mappings() is False and client.client.indices.put_mappings == []
+
+    client.client.indices.existing.add("tophub_articles")
+    assert repo.create_index() is True
+    index, properties = client.client.indices.put_mappings[0]
+    assert index == "tophub_articles"
+    assert properties["analysis_status"] == {"type": "keyword"}
+    assert properties["content_analysis"]["properties"]["analysis_model"] == {"type": "keyword"}
+    assert properties["triage"]["properties"]["decision"] == {"type": "keyword"}
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
@@ -0,0 +1,147 @@
+"""
+测试确定性的假 LLM 服务（延迟分布、故障注入、分析提示词的确定回复）
+"""
+import asyncio
+import json
+import random
+
+import httpx
+import pytest
+
+import backend.agent.agent_content_keyword_analysis as analysis_module
+import backend.llm.provider_registry as registry_module
+from backend.agent.agent_content_keyword_analysis import (
+    _build_packed_messages,
+    analyze_article_keywords,
+    build_analysis_messages,
+    build_classification_messages,
+)
+from backend.llm import LLMProvider, ProviderRegistry
+from backend.llm.fake_server import (
+    FakeLLMConfig,
+    FakeLLMServer,
+    LatencyDistribution,
+    create_fake_llm_app,
+    fake_completion,
+)
+
+TITLE = "OpenAI 发布新的推理模型"
+CONTENT = "OpenAI 发布了新的推理模型，推理速度显著提升。开发者可以通过 API 调用。" * 3
+MESSAGES = [{"role": "user", "content": "你好"}]
+
+
+def _client(config):
+    app = create_fake_llm_app(config)
+    return app, httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://fake.test")
+
+
+def test_latency_distributions():
+    """测试延迟分布的解析和按种子确定的采样"""
+    assert LatencyDistribution.parse("200").sample(random.Random()) == 0.2
+    uniform = LatencyDistribution.parse("uniform:100,300")
+    samples = [uniform.sample(random.Random(7)) for _ in range(3)]
+    assert len(set(samples)) == 1 and 0.1 <= samples[0] <= 0.3
+    lognormal = LatencyDistribution.parse("lognormal:300,0.5")
+    rng = random.Random(1)
+    values = sorted(lognormal.sample(rng) for _ in range(2000))
+    assert 0.25 <= values[1000] <= 0.35
+    with pytest.raises(ValueError):
+        LatencyDistribution.parse("poisson:3")
+
+
+def test_fake_completion_matches_prompts():
+    """测试单篇、打包和分类提示词得到确定且一致的结果"""
+    single = json.loads(fake_completion(build_analysis_messages(TITLE, CONTENT, max_keywords=4)))
+    assert single == json.loads(fake_completion(build_analysis_messages(TITLE, CONTENT, max_keywords=4)))
+    assert len(single["keywords"]) == 4 and "OpenAI" in single["keywords"]
+    assert single["sentiment"] in ("positive", "neutral", "negative")
+
+    packed = json.loads(fake_completion(_build_packed_messages([("其他文章", "内容。"), (TITLE, CONTENT)], 4, 5)))
+    assert [entry["index"] for entry in packed] == [0, 1]
+    assert {k: v for k, v in packed[1].items() if k != "index"} == single
+
+    classification = json.loads(fake_completion(build_classification_messages(TITLE, CONTENT)))
+    assert classification["category"] == single["category"]
+    assert 0 <= classification["relevance"] <= 1
+
+
+def test_completion_and_stream_responses():
+    """测试非流式响应带 usage，流式响应按 SSE 分块并在最后返回 usage"""
+    async def run():
+        app, client = _client(FakeLLMConfig())
+        async with client:
+            response = await client.post("/v1/chat/completions", json={"messages": MESSAGES})
+            body = response.json()
+            stream = await client.post("/v1/chat/completions", json={
+                "messages": MESSAGES, "stream": True, "stream_options": {"include_usage": True},
+            })
+        return app, body, stream.text
+
+    app, body, text = asyncio.run(run())
+    content = body["choices"][0]["message"]["content"]
+    assert body["usage"]["completion_tokens"] > 0
+    events = [json.loads(line[6:]) for line in text.splitlines() if line.startswith("data: {")]
+    assert "".join(e["choices"][0]["delta"].get("content", "") for e in events if e["choices"]) == content
+    assert events[-1]["usage"] == body["usage"]
+    assert text.rstrip().endswith("data: [DONE]")
+    assert app.state.stats["completed"] == 2 and app.state.stats["in_flight"] == 0
+
+
+def test_error_and_rate_limit_injection():
+    """测试按比例注入 429（带 Retry-After）/ 500，超过服务端并发上限时返回 429"""
+    async def statuses(config, concurrent=1):
+        app, client = _client(config)
+        async with client:
+            responses = await asyncio.gather(*[
+                client.post("/v1/chat/completions", json={"messages": MESSAGES}) for _ in range(concurrent)
+            ])
+        return app, responses
+
+    _, responses = asyncio.run(statuses(FakeLLMConfig(rate_limit_rate=1.0, retry_after=2)))
+    assert responses[0].status_code == 429 and responses[0].headers["Retry-After"] == "2"
+    _, responses = asyncio.run(statuses(FakeLLMConfig(error_rate=1.0)))
+    assert responses[0].status_code == 500
+
+    config = FakeLLMConfig(latency=LatencyDistribution("constant", [50]), max_concurrent=2)
+    app, responses = asyncio.run(statuses(config, concurrent=5))
+    assert sorted(r.status_code for r in responses) == [200, 200, 429, 429, 429]
+    assert app.state.stats["rate_limited"] == 3
+
+    mixed = FakeLLMConfig(error_rate=0.2, rate_limit_rate=0.2, seed=3)
+    first = [r.status_code for r in asyncio.run(statuses(mixed, concurrent=30))[1]]
+    second = [r.status_code for r in asyncio.run(statuses(mixed, concurrent=30))[1]]
+    assert first == second and {200, 429, 500} <= set(first)
+
+
+def test_analysis_through_local_provider(monkeypatch):
+    """测试分析流程通过 LocalProvider 调用假服务，得到确定的分析结果"""
+    app = create_fake_llm_app(FakeLLMConfig())
+    monkeypatch.setenv("LOCAL_LLM_BASE_URL", "http://fake.test/v1")
+    monkeypatch.setenv("DEFAULT_LLM_MODEL", "fake-model")
+    monkeypatch.setattr(analysis_module, "get_analysis_cache", lambda: None)
+    monkeypatch.setattr(registry_module, "_registry", ProviderRegistry(
+        client_factory=lambda timeout: httpx.AsyncClient(transport=httpx.ASGITransport(app=app), timeout=timeout)
+    ))
+
+    async def run():
+        try:
+            return await analyze_article_keywords(TITLE, CONTENT, provider=LLMProvider.LOCAL)
+        finally:
+            await registry_module.close_providers()
+
+    result = asyncio.run(run())
+    assert result["analysis_success"]
+    assert "OpenAI" in result["keywords"]
+    assert app.state.stats["completed"] == 1
+
+
+def test_server_runs_in_background_thread():
+    """测试后台线程启动服务（随机端口）并可以通过 HTTP 访问"""
+    with FakeLLMServer(FakeLLMConfig()) as server:
+        response = httpx.post(f"{server.base_url}/chat/completions", json={"messages": MESSAGES}, timeout=5)
+        assert response.status_code == 200
+        assert server.stats()["completed"] == 1
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
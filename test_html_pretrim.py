@@ -0,0 +1,110 @@
+"""
+测试 readability 之前的 HTML 预裁剪
+"""
+import os
+import tempfile
+
+from readabilipy import simple_json_from_html_string
+
+from backend.agent.crawl_fixtures import FixtureRecorder, compare_pretrim
+from backend.utils.url_to_markdown import Article, pretrim_html
+
+
+BODY_TEXT = "CSDN 博客正文：介绍如何使用 LoRA 对大模型进行微调，并给出完整的训练脚本。"
+
+HEAVY_HTML = f"""<!DOCTYPE html>
+<html>
+  <head>
+    <title>LoRA 微调实战</title>
+    <style>{"body {{ color: red; }} " * 200}</style>
+    <script>{"window.__INITIAL_STATE__ = {{}}; " * 500}</script>
+  </head>
+  <body>
+    <!-- 广告位 -->
+    <nav class="toolbar"><a href="/">首页</a><a href="/blog">博客</a></nav>
+    <div role="banner">登录 / 注册</div>
+    <article>
+      <h1>LoRA 微调实战</h1>
+      <p>{BODY_TEXT}<script>track();</script>尾部文字保留</p>
+      <svg width="10" height="10"><path d="M0 0 L10 10"/></svg>
+    </article>
+    <footer>版权所有</footer>
+    <noscript>请启用 JavaScript</noscript>
+  </body>
+</html>
+"""
+
+
+class PythonPretrimExtractor:
+    """纯 Python 提取器（测试环境不依赖 Node.js），支持预裁剪开关"""
+
+    def __init__(self, pretrim: bool = True):
+        self.pretrim = pretrim
+        self.last_pretrim_stats = None
+
+    def extract_article(self, html: str) -> Article:
+        if self.pretrim:
+            html, self.last_pretrim_stats = pretrim_html(html)
+        article = simple_json_from_html_string(html, use_readability=False)
+        return Article(title=article.get("title"), html_content=article.get("content"))
+
+
+def test_pretrim_removes_chrome():
+    """测试删除脚本、样式、SVG、注释和页面框架，保留正文"""
+    trimmed, stats = pretrim_html(HEAVY_HTML)
+
+    for marker in ("<script", "<style", "<svg", "<nav", "<footer", "<noscript", "广告位", "登录 / 注册"):
+        assert marker not in trimmed, marker
+    assert BODY_TEXT in trimmed
+    assert "尾部文字保留" in trimmed
+    assert "<title>LoRA 微调实战</title>" in trimmed
+
+    assert stats["removed_bytes"] > stats["trimmed_bytes"]
+    assert stats["original_bytes"] == stats["trimmed_bytes"] + stats["removed_bytes"]
+    assert stats["removed_nodes"] >= 8
+    print(f"✓ 预裁剪删除 {stats['removed_bytes']} 字节 ({stats['removed_nodes']} 个节点)")
+
+
+def test_pretrim_handles_encoding_declaration():
+    """测试带 XML 编码声明的页面也能裁剪"""
+    html = '<?xml version="1.0" encoding="utf-8"?><html><body><p>正文内容</p><script>x()</script></body></html>'
+    trimmed, stats = pretrim_html(html)
+    assert "正文内容" in trimmed
+    assert "<script" not in trimmed
+    print("✓ 编码声明处理正常")
+
+
+def test_pretrim_keeps_form_wrapped_article():
+    """测试用 <form> 包住整个页面（ASP.NET / CMS 常见）时正文不被删除"""
+    paragraphs = "".join(f"<p>第 {i} 段：{BODY_TEXT}</p>" for i in range(30))
+    html = (
+        "<html><body><form action='/post' method='post'><div class='article'>"
+        f"{paragraphs}<button>提交评论</button></div></form></body></html>"
+    )
+    trimmed, _ = pretrim_html(html)
+    assert "第 29 段" in trimmed and trimmed.count(BODY_TEXT) == 30
+    assert "<button" not in trimmed
+    print("✓ form 包裹的正文保留")
+
+
+def test_compare_pretrim_report():
+    """测试逐页报告删除字节数和节省时间"""
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "tophub.zip")
+        with FixtureRecorder(path) as recorder:
+            recorder.record_page("https://blog.csdn.net/a/1", HEAVY_HTML)
+
+        report = compare_pretrim(path, extractor_class=PythonPretrimExtractor)
+
+        assert len(report["pages"]) == 1
+        page = report["pages"][0]
+        assert page["removed_bytes"] > 0
+        assert page["removed_pct"] > 50
+        assert report["total_removed_bytes"] == page["removed_bytes"]
+    print(f"✓ 对比报告正常: 节省 {report['total_saved_ms']} ms")
+
+
+if __name__ == "__main__":
+    test_pretrim_removes_chrome()
+    test_pretrim_handles_encoding_declaration()
+    test_compare_pretrim_report()
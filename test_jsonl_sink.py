@@ -0,0 +1,79 @@
+"""
+测试按日期分区、可轮转、可压缩的 JSONL 输出器
+"""
+import os
+import tempfile
+import time
+from datetime import datetime
+
+from backend.utils.jsonl_sink import JsonlSink, iter_jsonl_records, list_jsonl_files
+
+
+def _records(count: int):
+    return [{"title": f"文章 {i}", "content": "内容" * 20, "index": i} for i in range(count)]
+
+
+def test_partition_and_read_back():
+    """测试输出按日期分区，并可流式读回"""
+    with tempfile.TemporaryDirectory() as tmp:
+        with JsonlSink(tmp, prefix="tophub_articles") as sink:
+            sink.write_many(_records(10))
+
+        partition = os.path.join(tmp, f"dt={datetime.now().strftime('%Y-%m-%d')}")
+        assert os.path.isdir(partition)
+        assert len(sink.files) == 1
+        assert sink.records_written == 10
+
+        records = list(iter_jsonl_records(partition))
+        assert [r["index"] for r in records] == list(range(10))
+        assert records[0]["title"] == "文章 0"
+    print("✓ 日期分区和读回正常")
+
+
+def test_size_rotation_with_gzip():
+    """测试按大小轮转和 gzip 压缩"""
+    with tempfile.TemporaryDirectory() as tmp:
+        with JsonlSink(tmp, prefix="tech_articles", compression="gzip",
+                       rotate_bytes=1024, buffer_size=256) as sink:
+            sink.write_many(_records(50))
+
+        assert len(sink.files) > 1
+        assert all(path.endswith(".jsonl.gz") for path in sink.files)
+
+        records = list(iter_jsonl_records(tmp, prefix="tech_articles"))
+        assert [r["index"] for r in records] == list(range(50))
+        assert list_jsonl_files(tmp, prefix="tophub_articles") == []
+    print(f"✓ 轮转正常: {len(sink.files)} 个文件")
+
+
+def test_buffered_until_flush():
+    """测试写入先进入缓冲区，flush 后才落盘"""
+    with tempfile.TemporaryDirectory() as tmp:
+        sink = JsonlSink(tmp, buffer_size=1024 * 1024, flush_interval=60)
+        sink.write({"title": "缓冲"})
+        assert list_jsonl_files(tmp) == []
+
+        sink.flush(fsync=True)
+        assert len(list(iter_jsonl_records(tmp))) == 1
+        sink.close()
+    print("✓ 缓冲写入正常")
+
+
+def test_periodic_flush_on_write():
+    """测试缓冲区未攒满时，超过 flush_interval 的写入也会把缓冲写入文件"""
+    with tempfile.TemporaryDirectory() as tmp:
+        sink = JsonlSink(tmp, buffer_size=1024 * 1024, flush_interval=0.05)
+        sink.write({"title": "第一条"})
+        assert list_jsonl_files(tmp) == []
+        time.sleep(0.06)
+        sink.write({"title": "第二条"})
+        assert [r["title"] for r in iter_jsonl_records(tmp)] == ["第一条", "第二条"]
+        sink.close()
+    print("✓ 周期刷新正常")
+
+
+if __name__ == "__main__":
+    test_partition_and_read_back()
+    test_size_rotation_with_gzip()
+    test_buffered_until_flush()
+    test_periodic_flush_on_write()
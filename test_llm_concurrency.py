@@ -0,0 +1,166 @@
+"""
+测试按提供商的自适应（AIMD）并发限流
+"""
+import asyncio
+import threading
+
+import httpx
+import pytest
+
+from backend.llm.concurrency import AdaptiveConcurrencyLimiter, diff_concurrency_stats, is_overload_error, latency_class
+
+
+def _status_error(code: int) -> httpx.HTTPStatusError:
+    request = httpx.Request("POST", "http://llm.test/v1/chat/completions")
+    return httpx.HTTPStatusError("error", request=request, response=httpx.Response(code, request=request))
+
+
+def test_overload_error_classification():
+    """测试过载错误识别"""
+    assert is_overload_error(_status_error(429))
+    assert is_overload_error(_status_error(503))
+    assert is_overload_error(httpx.ReadTimeout("timeout"))
+    assert is_overload_error(asyncio.TimeoutError())
+    assert not is_overload_error(_status_error(400))
+    assert not is_overload_error(ValueError("bad json"))
+    print("✓ 过载错误识别正常")
+
+
+def test_limit_caps_in_flight_requests():
+    """测试进行中的请求数不超过当前上限"""
+    limiter = AdaptiveConcurrencyLimiter("test", initial_limit=2, max_limit=2)
+    peak = 0
+
+    async def request():
+        nonlocal peak
+        async with limiter.slot():
+            peak = max(peak, limiter.in_flight)
+            await asyncio.sleep(0.01)
+
+    async def run():
+        await asyncio.gather(*[request() for _ in range(10)])
+
+    asyncio.run(run())
+    assert peak == 2
+    assert limiter.in_flight == 0
+    assert limiter.stats()["completed"] == 10
+    print("✓ 并发上限生效")
+
+
+def test_additive_increase_and_multiplicative_decrease():
+    """测试延迟稳定时加性增加，429 时乘性减少"""
+    limiter = AdaptiveConcurrencyLimiter("test", initial_limit=2, max_limit=16)
+    for _ in range(30):
+        limiter.record_success(0.1)
+    grown = limiter.limit
+    assert grown > 2
+    assert limiter.increases == grown - 2
+
+    limiter.record_error(_status_error(429))
+    assert limiter.limit == grown // 2
+    # 冷却时间内的后续错误不再重复退避
+    limiter.record_error(_status_error(429))
+    assert limiter.limit == grown // 2
+    assert limiter.decreases == 1
+    assert limiter.overload_errors == 2
+
+    # 非过载错误不影响上限
+    limiter.record_error(ValueError("bad json"))
+    assert limiter.overload_errors == 2
+    print(f"✓ AIMD 调整正常: 2 -> {grown} -> {limiter.limit}")
+
+
+def test_latency_spike_backs_off():
+    """测试延迟突增时退避"""
+    limiter = AdaptiveConcurrencyLimiter("test", initial_limit=8, max_limit=8, latency_tolerance=2.0)
+    for _ in range(10):
+        limiter.record_success(0.1)
+    limiter._last_decrease = 0.0
+    limiter.record_success(1.0)
+    assert limiter.limit == 4
+    assert limiter.stats()["latency_baseline_ms"] == 100.0
+    print("✓ 延迟突增退避正常")
+
+
+def test_latency_baseline_per_call_class():
+    """测试延迟基线按调用类别分别计算：长输出请求不和短分类请求的基线比较"""
+    assert latency_class(100) == "out<=128" and latency_class(1700) == "out<=2048" and latency_class(None) == "default"
+    limiter = AdaptiveConcurrencyLimiter("test", initial_limit=8, max_limit=8, latency_tolerance=2.0)
+    for _ in range(10):
+        limiter.record_success(0.1, latency_class(100))
+    limiter._last_decrease = 0.0
+    for _ in range(10):
+        limiter.record_success(1.5, latency_class(1700))
+    assert limiter.decreases == 0 and limiter.limit == 8
+    assert limiter.stats()["latency_baselines_ms"] == {"out<=128": 100.0, "out<=2048": 1500.0}
+
+    # 同一类别内的突增仍然退避
+    limiter.record_success(4.0, latency_class(1700))
+    assert limiter.decreases == 1 and limiter.limit == 4
+
+
+def test_diff_concurrency_stats():
+    """测试单次报告只统计期间的增量，限流器状态取当前值，没有请求的提供商不出现"""
+    limiter = AdaptiveConcurrencyLimiter("busy", initial_limit=2, max_limit=16)
+    idle = AdaptiveConcurrencyLimiter("idle", initial_limit=2, max_limit=16)
+    for _ in range(5):
+        limiter.record_success(0.1)
+    before = {"busy": limiter.stats(), "idle": idle.stats()}
+    for _ in range(3):
+        limiter.record_success(0.1)
+    report = diff_concurrency_stats(before, {"busy": limiter.stats(), "idle": idle.stats()})
+    assert list(report) == ["busy"]
+    assert report["busy"]["completed"] == 3 and report["busy"]["limit"] == limiter.limit
+
+
+def test_shared_across_event_loops():
+    """测试多个线程中的事件循环共享同一个限流器"""
+    limiter = AdaptiveConcurrencyLimiter("test", initial_limit=3, max_limit=3)
+    peak = 0
+    lock = threading.Lock()
+
+    async def request():
+        nonlocal peak
+        async with limiter.slot(record_latency=False):
+            with lock:
+                peak = max(peak, limiter.in_flight)
+            await asyncio.sleep(0.01)
+
+    def worker():
+        async def run():
+            await asyncio.gather(*[request() for _ in range(6)])
+        asyncio.run(run())
+
+    threads = [threading.Thread(target=worker) for _ in range(3)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join(timeout=10)
+
+    assert peak <= 3
+    assert limiter.in_flight == 0
+    print("✓ 跨事件循环共享正常")
+
+
+def test_cancelled_waiter_releases_slot():
+    """测试排队中被取消的请求不会占用名额"""
+    limiter = AdaptiveConcurrencyLimiter("test", initial_limit=1, max_limit=1)
+
+    async def run():
+        await limiter.acquire()
+        waiter = asyncio.create_task(limiter.acquire())
+        await asyncio.sleep(0)
+        waiter.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await waiter
+        limiter.release()
+        await asyncio.wait_for(limiter.acquire(), timeout=1)
+        limiter.release()
+
+    asyncio.run(run())
+    assert limiter.in_flight == 0
+    print("✓ 取消排队正常")
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
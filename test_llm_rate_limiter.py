@@ -0,0 +1,116 @@
+"""
+测试按提供商的 RPM / TPM 令牌桶限流
+"""
+import asyncio
+import time
+
+import httpx
+import pytest
+
+import backend.llm.provider_registry as registry_module
+import backend.llm.rate_limiter as rate_limiter_module
+from backend.llm import LLMProvider, ProviderRegistry, chat_completion
+from backend.llm.rate_limiter import RateLimiter
+
+
+def test_reserve_waits_when_budget_exhausted():
+    """测试额度用尽后排队等待，而不是失败"""
+    limiter = RateLimiter("test", tpm=6000)  # 每秒补充 100 token
+
+    async def run():
+        first = await limiter.reserve(6000)
+        started = time.monotonic()
+        second = await limiter.reserve(20)
+        return first, second, time.monotonic() - started
+
+    first, second, waited = asyncio.run(run())
+    assert first.wait_s == 0
+    assert 0.15 <= second.wait_s <= 0.25
+    assert waited >= 0.15
+    assert limiter.stats()["waited_requests"] == 1
+    print(f"✓ 额度不足时排队 {waited:.2f}s")
+
+
+def test_requests_per_minute():
+    """测试 RPM 限制：超出的请求按到达顺序排队"""
+    limiter = RateLimiter("test", rpm=600)  # 每秒 10 个请求
+    order = []
+
+    async def request(i):
+        await limiter.reserve(0)
+        order.append(i)
+
+    async def run():
+        await asyncio.gather(*[request(i) for i in range(602)])
+
+    started = time.monotonic()
+    asyncio.run(run())
+    assert time.monotonic() - started >= 0.15
+    assert order[-2:] == [600, 601]
+    print("✓ RPM 限流按顺序排队")
+
+
+def test_reconcile_refunds_unused_tokens():
+    """测试按实际用量对账：少用的退还，多用的补扣"""
+    limiter = RateLimiter("test", tpm=1000)
+
+    async def run():
+        reservation = await limiter.reserve(800)
+        limiter.reconcile(reservation, 300)
+        assert limiter.stats()["available_tokens"] >= 500
+        reservation = await limiter.reserve(100)
+        limiter.reconcile(reservation, 400)
+
+    asyncio.run(run())
+    stats = limiter.stats()
+    assert 290 <= stats["available_tokens"] <= 310
+    assert stats["reconciled_tokens"] == 700
+    print("✓ 对账正常")
+
+
+def test_disabled_limiter_never_waits():
+    """测试未配置限额时不限流"""
+    limiter = RateLimiter("test")
+    assert not limiter.enabled
+
+    async def run():
+        return [await limiter.reserve(10 ** 9) for _ in range(3)]
+
+    assert all(r.wait_s == 0 for r in asyncio.run(run()))
+
+
+def test_chat_completion_reconciles_reported_usage(monkeypatch):
+    """测试 chat_completion 预留额度并按服务端返回的 usage 对账"""
+    def handler(request: httpx.Request) -> httpx.Response:
+        return httpx.Response(200, json={
+            "id": "chatcmpl-test",
+            "object": "chat.completion",
+            "created": 0,
+            "model": "test-model",
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": "好"}, "finish_reason": "stop"}],
+            "usage": {"prompt_tokens": 11, "completion_tokens": 7, "total_tokens": 18},
+        })
+
+    monkeypatch.setenv("LOCAL_LLM_BASE_URL", "http://llm.test/v1")
+    monkeypatch.setenv("LOCAL_TPM", "100000")
+    monkeypatch.setenv("LOCAL_RPM", "100")
+    monkeypatch.setattr(rate_limiter_module, "_limiters", {})
+    monkeypatch.setattr(registry_module, "_registry", ProviderRegistry(
+        client_factory=lambda timeout: httpx.AsyncClient(transport=httpx.MockTransport(handler), timeout=timeout)
+    ))
+
+    async def run():
+        reply = await chat_completion([{"role": "user", "content": "你好"}], provider=LLMProvider.LOCAL, max_tokens=500)
+        await registry_module.close_providers()
+        return reply
+
+    assert asyncio.run(run()) == "好"
+    stats = rate_limiter_module.get_rate_limiter("local").stats()
+    assert stats["reserved_requests"] == 1
+    assert stats["reserved_tokens"] > 500
+    assert stats["reconciled_tokens"] == 18
+    print("✓ 实际用量对账正常")
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
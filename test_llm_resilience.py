@@ -0,0 +1,164 @@
+"""
+测试 LLM 调用的重试（指数退避 + 抖动）与对冲请求
+"""
+import asyncio
+import json
+import random
+import time
+
+import httpx
+import pytest
+
+import backend.agent.agent_content_keyword_analysis as analysis_module
+import backend.llm.resilience as resilience_module
+from backend.agent.agent_content_keyword_analysis import analyze_article_keywords
+from backend.llm import LLMProvider, RetryPolicy, diff_resilience_stats, resilience_stats, resilient_call
+from backend.llm.resilience import LatencyTracker, is_retryable_error
+
+FAST_POLICY = RetryPolicy(max_attempts=3, base_delay=0.001, max_delay=0.01)
+
+
+def _status_error(status_code: int, headers=None) -> httpx.HTTPStatusError:
+    request = httpx.Request("POST", "http://llm.test/v1/chat/completions")
+    response = httpx.Response(status_code, headers=headers, request=request)
+    return httpx.HTTPStatusError(f"HTTP {status_code}", request=request, response=response)
+
+
+def test_retryable_errors():
+    """测试可重试错误的判断"""
+    assert is_retryable_error(_status_error(429))
+    assert is_retryable_error(_status_error(503))
+    assert is_retryable_error(_status_error(500))
+    assert is_retryable_error(httpx.ConnectError("connection refused"))
+    assert is_retryable_error(asyncio.TimeoutError())
+    assert not is_retryable_error(_status_error(400))
+    assert not is_retryable_error(_status_error(401))
+    assert not is_retryable_error(ValueError("bad json"))
+
+
+def test_backoff_is_jittered_and_capped():
+    """测试等待时间在指数上限内随机分布，并遵守 Retry-After"""
+    policy = RetryPolicy(base_delay=0.5, max_delay=4.0, rng=random.Random(1))
+    for attempt in range(6):
+        ceiling = min(4.0, 0.5 * 2 ** attempt)
+        delays = [policy.delay(attempt) for _ in range(50)]
+        assert all(0 <= d <= ceiling for d in delays)
+        assert len(set(delays)) > 1
+    assert policy.delay(0, _status_error(429, headers={"Retry-After": "2"})) == 2.0
+    assert policy.delay(0, _status_error(429, headers={"Retry-After": "60"})) == 4.0
+
+
+def test_retries_until_success():
+    """测试可重试错误重试后成功"""
+    attempts = []
+
+    async def call(provider):
+        attempts.append(provider)
+        if len(attempts) < 3:
+            raise _status_error(503)
+        return "ok"
+
+    before = resilience_stats()
+    assert asyncio.run(resilient_call(call, provider=LLMProvider.LOCAL, policy=FAST_POLICY, hedge=False)) == "ok"
+    assert attempts == [LLMProvider.LOCAL] * 3
+    assert resilience_stats()["retries"] - before["retries"] == 2
+
+
+def test_non_retryable_and_exhausted_errors_raise():
+    """测试不可重试的错误立即抛出，重试用尽后抛出最后一个错误"""
+    attempts = []
+
+    async def bad_request(provider):
+        attempts.append(1)
+        raise _status_error(400)
+
+    with pytest.raises(httpx.HTTPStatusError):
+        asyncio.run(resilient_call(bad_request, policy=FAST_POLICY, hedge=False))
+    assert len(attempts) == 1
+
+    async def always_overloaded(provider):
+        attempts.append(1)
+        raise _status_error(429)
+
+    with pytest.raises(httpx.HTTPStatusError):
+        asyncio.run(resilient_call(always_overloaded, policy=FAST_POLICY, hedge=False))
+    assert len(attempts) == 1 + FAST_POLICY.max_attempts
+
+
+def test_hedged_request_wins_over_slow_primary(monkeypatch):
+    """测试原请求超过 p95 后发送对冲请求，先返回的结果生效，慢请求被取消"""
+    tracker = LatencyTracker()
+    for _ in range(20):
+        tracker.record("hedge-test:local", 0.02)
+    monkeypatch.setattr(resilience_module, "_latency", tracker)
+
+    calls = []
+    cancelled = []
+
+    async def call(provider):
+        calls.append(provider)
+        try:
+            # 第一个请求是慢的离群请求
+            await asyncio.sleep(5 if len(calls) == 1 else 0.01)
+        except asyncio.CancelledError:
+            cancelled.append(provider)
+            raise
+        return provider.value
+
+    before = resilience_stats()
+    started = time.perf_counter()
+    result = asyncio.run(resilient_call(
+        call, provider=LLMProvider.LOCAL, key="hedge-test", policy=FAST_POLICY, hedge=True
+    ))
+    elapsed = time.perf_counter() - started
+
+    assert result == "local"
+    assert elapsed < 1
+    assert len(calls) == 2
+    assert cancelled == [LLMProvider.LOCAL]
+    report = diff_resilience_stats(before, resilience_stats())
+    assert report["hedges_sent"] == 1 and report["hedges_won"] == 1
+    print(f"✓ 对冲请求在 {elapsed * 1000:.0f}ms 内返回")
+
+
+def test_hedge_to_another_provider(monkeypatch):
+    """测试对冲请求发往 LLM_HEDGE_PROVIDER 指定的提供商"""
+    tracker = LatencyTracker()
+    for _ in range(20):
+        tracker.record("hedge-other:siliconflow", 0.02)
+    monkeypatch.setattr(resilience_module, "_latency", tracker)
+    monkeypatch.setenv("LLM_HEDGE_PROVIDER", "local")
+
+    async def call(provider):
+        await asyncio.sleep(5 if provider == LLMProvider.SILICONFLOW else 0.01)
+        return provider.value
+
+    result = asyncio.run(resilient_call(
+        call, provider=LLMProvider.SILICONFLOW, key="hedge-other", policy=FAST_POLICY, hedge=True
+    ))
+    assert result == "local"
+
+
+def test_analysis_retries_transient_errors(monkeypatch):
+    """测试文章分析遇到临时错误时重试，而不是直接返回失败结果"""
+    attempts = []
+
+    async def flaky_chat_completion(messages, **kwargs):
+        attempts.append(1)
+        if len(attempts) == 1:
+            raise _status_error(502)
+        return json.dumps({"keywords": ["重试"], "summary": "成功"}, ensure_ascii=False)
+
+    monkeypatch.setattr(analysis_module, "chat_completion", flaky_chat_completion)
+    monkeypatch.setattr(analysis_module, "ANALYSIS_STRUCTURED_OUTPUT", False)
+    monkeypatch.setattr(analysis_module, "get_analysis_cache", lambda: None)
+    monkeypatch.setenv("LLM_RETRY_BASE_DELAY", "0.001")
+
+    result = asyncio.run(analyze_article_keywords("标题", "正文内容。"))
+    assert result["analysis_success"]
+    assert result["keywords"] == ["重试"]
+    assert len(attempts) == 2
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
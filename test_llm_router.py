@@ -0,0 +1,199 @@
+"""
+测试多提供商路由：权重、p95 延迟、熔断和故障转移（使用本地桩服务器）
+"""
+import asyncio
+import json
+import random
+import threading
+from contextlib import aclosing
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+import backend.llm.concurrency as concurrency_module
+import backend.llm.provider_registry as registry_module
+from backend.llm import LLMProvider, LLMRouter, ProviderRegistry, chat_completion
+from backend.llm.router import parse_weights
+
+
+def _start_stub_server(content: str, fail: bool = False):
+    """启动 OpenAI 兼容的桩服务器，返回 (server, 请求计数)"""
+    hits = []
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_POST(self):
+            self.rfile.read(int(self.headers.get("Content-Length", 0)))
+            hits.append(self.path)
+            if fail:
+                body = json.dumps({"error": {"message": "upstream overloaded"}}).encode()
+                self.send_response(500)
+                # 让 OpenAI SDK 不在内部重试，由路由器负责转移
+                self.send_header("x-should-retry", "false")
+            else:
+                body = json.dumps({
+                    "id": "chatcmpl-stub",
+                    "object": "chat.completion",
+                    "created": 0,
+                    "model": "stub",
+                    "choices": [{"index": 0, "message": {"role": "assistant", "content": content}, "finish_reason": "stop"}],
+                    "usage": {"prompt_tokens": 5, "completion_tokens": 1, "total_tokens": 6},
+                }).encode()
+                self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, hits
+
+
+def _base_url(server) -> str:
+    return f"http://127.0.0.1:{server.server_address[1]}/v1"
+
+
+def test_parse_weights():
+    """测试权重配置解析"""
+    weights = parse_weights("siliconflow=3, local:1, unknown=2, openai=0, alibaba")
+    assert weights == {LLMProvider.SILICONFLOW: 3.0, LLMProvider.LOCAL: 1.0, LLMProvider.ALIBABA: 1.0}
+
+
+def test_order_prefers_fast_and_reliable_providers():
+    """测试得分随 p95 延迟和错误率变化"""
+    router = LLMRouter({LLMProvider.SILICONFLOW: 1, LLMProvider.LOCAL: 1}, rng=random.Random(0))
+    for _ in range(20):
+        router.record_success(LLMProvider.SILICONFLOW, 2.0)
+        router.record_success(LLMProvider.LOCAL, 0.2)
+
+    firsts = [router.order()[0] for _ in range(500)]
+    assert firsts.count(LLMProvider.LOCAL) > 400
+
+    stats = router.stats()
+    assert stats["local"]["p95_ms"] == 200.0
+    assert stats["local"]["score"] > stats["siliconflow"]["score"]
+
+    # 错误率升高后快的提供商得分下降
+    router.record_failure(LLMProvider.LOCAL, RuntimeError("boom"))
+    router.record_success(LLMProvider.LOCAL, 0.2)
+    assert router.stats()["local"]["error_rate"] > 0
+    print("✓ 路由偏向低延迟、低错误率的提供商")
+
+
+def test_circuit_opens_after_consecutive_failures():
+    """测试连续失败后熔断，熔断中的提供商排在最后"""
+    router = LLMRouter({LLMProvider.SILICONFLOW: 100, LLMProvider.LOCAL: 1}, failure_threshold=2, cooldown_s=60)
+    router.record_failure(LLMProvider.SILICONFLOW, RuntimeError("boom"))
+    assert not router.stats()["siliconflow"]["circuit_open"]
+    router.record_failure(LLMProvider.SILICONFLOW, RuntimeError("boom"))
+
+    assert router.stats()["siliconflow"]["circuit_open"]
+    assert all(router.order() == [LLMProvider.LOCAL, LLMProvider.SILICONFLOW] for _ in range(20))
+
+    router.record_success(LLMProvider.SILICONFLOW, 0.1)
+    assert not router.stats()["siliconflow"]["circuit_open"]
+
+
+def test_failover_between_stub_servers(monkeypatch):
+    """测试一批请求中故障的提供商被熔断，请求转移到健康的提供商"""
+    broken, broken_hits = _start_stub_server("", fail=True)
+    healthy, healthy_hits = _start_stub_server("来自本地模型")
+    try:
+        monkeypatch.setenv("SILICONFLOW_API_KEY", "test-key")
+        monkeypatch.setenv("SILICONFLOW_BASE_URL", _base_url(broken))
+        monkeypatch.setenv("LOCAL_LLM_BASE_URL", _base_url(healthy))
+        monkeypatch.setenv("LLM_ROUTER_WEIGHTS", "siliconflow=100,local=1")
+        monkeypatch.setenv("LLM_ROUTER_FAILURE_THRESHOLD", "2")
+        monkeypatch.setattr(registry_module, "_registry", ProviderRegistry())
+        monkeypatch.setattr(concurrency_module, "_limiters", {})
+
+        async def run():
+            results = []
+            for _ in range(6):
+                results.append(await chat_completion([{"role": "user", "content": "你好"}]))
+            await registry_module.close_providers()
+            return results
+
+        results = asyncio.run(run())
+    finally:
+        broken.shutdown()
+        healthy.shutdown()
+
+    assert results == ["来自本地模型"] * 6
+    assert len(healthy_hits) == 6
+    # 故障提供商权重更高，但熔断后不再被优先尝试
+    assert len(broken_hits) == 2
+
+    from backend.llm import get_router
+    stats = get_router().stats()
+    assert stats["siliconflow"]["circuit_open"]
+    assert stats["local"]["requests"] == 6
+    print("✓ 故障转移正常")
+
+
+def test_routes_calls_with_default_model(monkeypatch):
+    """测试设置了 DEFAULT_LLM_MODEL 的调用（文章分析的常规配置）也经过路由器，模型按提供商映射"""
+    monkeypatch.setenv("LLM_ROUTER_WEIGHTS", "siliconflow=1,local=1")
+    monkeypatch.setenv("DEFAULT_LLM_PROVIDER", "siliconflow")
+    monkeypatch.setenv("DEFAULT_LLM_MODEL", "Qwen/Qwen2.5-72B-Instruct")
+    monkeypatch.setenv("LOCAL_MODEL", "local-7b")
+    monkeypatch.delenv("SILICONFLOW_MODEL", raising=False)
+    calls = []
+
+    async def fake_completion(messages, provider=None, model=None, **kwargs):
+        calls.append((provider, model))
+        if provider == LLMProvider.SILICONFLOW:
+            raise RuntimeError("siliconflow down")
+        return "ok"
+
+    monkeypatch.setattr("backend.llm.router.chat_completion", fake_completion)
+    result = asyncio.run(chat_completion([{"role": "user", "content": "你好"}], model="Qwen/Qwen2.5-72B-Instruct"))
+
+    assert result == "ok"
+    assert (LLMProvider.LOCAL, "local-7b") in calls
+    assert all(model == "Qwen/Qwen2.5-72B-Instruct" for provider, model in calls if provider == LLMProvider.SILICONFLOW)
+
+
+def test_all_providers_failing_raises(monkeypatch):
+    """测试所有提供商都失败时抛出最后一个错误"""
+    router = LLMRouter({LLMProvider.SILICONFLOW: 1, LLMProvider.LOCAL: 1})
+    calls = []
+
+    async def failing(messages, provider=None, **kwargs):
+        calls.append(provider)
+        raise RuntimeError(f"{provider.value} down")
+
+    monkeypatch.setattr("backend.llm.router.chat_completion", failing)
+    with pytest.raises(RuntimeError, match="down"):
+        asyncio.run(router.chat_completion([{"role": "user", "content": "你好"}]))
+    assert sorted(p.value for p in calls) == ["local", "siliconflow"]
+
+
+def test_stream_records_latency(monkeypatch):
+    """测试流式请求（包括调用方提前停止读取的）也记录耗时，p95 不再为空"""
+    router = LLMRouter({LLMProvider.LOCAL: 1})
+
+    async def fake_stream(messages, provider=None, model=None, **kwargs):
+        for chunk in ("a", "b", "c"):
+            yield chunk
+
+    monkeypatch.setattr("backend.llm.router.chat_completion_stream", fake_stream)
+
+    async def run():
+        for stop_early in (False, True) * 3:
+            async with aclosing(router.chat_completion_stream([{"role": "user", "content": "你好"}])) as chunks:
+                async for _ in chunks:
+                    if stop_early:
+                        break
+
+    asyncio.run(run())
+    stats = router.stats()["local"]
+    assert stats["requests"] == 6 and stats["error_rate"] == 0
+    assert stats["p95_ms"] is not None
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
@@ -0,0 +1,172 @@
+"""
+测试 LLM 调用遥测（延迟直方图、token 用量、重试和费用）
+"""
+import asyncio
+import json
+
+import httpx
+import pytest
+
+import backend.llm.provider_registry as registry_module
+import backend.llm.telemetry as telemetry_module
+from backend.llm import (
+    BaseLLMProvider,
+    LLMProvider,
+    ProviderRegistry,
+    RetryPolicy,
+    chat_completion,
+    chat_completion_stream,
+    diff_llm_metrics,
+    llm_metrics,
+    resilient_call,
+)
+from backend.llm.telemetry import LLMTelemetry, RollingHistogram, instrument_completion, parse_prices
+
+MESSAGES = [{"role": "user", "content": "你好"}]
+
+
+@pytest.fixture
+def telemetry(monkeypatch):
+    telemetry = LLMTelemetry(prices=parse_prices("test-model=1:2"))
+    monkeypatch.setattr(telemetry_module, "_telemetry", telemetry)
+    return telemetry
+
+
+class _FlakyProvider(BaseLLMProvider):
+    provider_type = LLMProvider.LOCAL
+
+    def __init__(self, failures=0):
+        super().__init__(model="flaky-model")
+        self.failures = failures
+
+    @instrument_completion
+    async def chat_completion(self, messages, model=None, **kwargs):
+        if self.failures:
+            self.failures -= 1
+            raise httpx.ConnectError("connection refused")
+        await asyncio.sleep(0.01)
+        yield "好"
+        yield "的"
+
+
+def test_rolling_histogram_quantiles_and_window():
+    """测试分位数取所在桶的上限，过期时间片被丢弃"""
+    histogram = RollingHistogram(buckets=(10, 100, 1000), window_s=60, slots=6)
+    for value in [5] * 90 + [50] * 8 + [5000] * 2:
+        histogram.observe(value, now=1000.0)
+
+    snapshot = histogram.snapshot(now=1000.0)
+    assert snapshot["count"] == 100
+    assert (snapshot["p50"], snapshot["p95"], snapshot["p99"]) == (10.0, 100.0, 5000.0)
+    assert snapshot["buckets"] == {"10": 90, "100": 8, "1000": 0, "+Inf": 2}
+
+    histogram.observe(20, now=1055.0)
+    assert histogram.snapshot(now=1055.0)["count"] == 101
+    assert histogram.snapshot(now=1065.0)["count"] == 1
+    assert histogram.snapshot(now=1200.0)["p50"] is None
+
+
+def test_parse_prices():
+    """测试单价解析：默认单价、只给一个单价、忽略错误项"""
+    prices = parse_prices("gpt-4o-mini=0.15:0.6, *=1, bad=x:y, broken")
+    assert prices == {"gpt-4o-mini": (0.15, 0.6), "*": (1.0, 1.0)}
+    assert telemetry_module.estimate_cost("other", 1_000_000, 0, prices) == 1.0
+    assert telemetry_module.estimate_cost("other", 10, 10, {}) is None
+
+
+def test_chat_completion_records_reported_usage(monkeypatch, telemetry):
+    """测试便捷函数调用按提供商/模型记录延迟、服务端返回的 token 数和费用"""
+    def handler(request: httpx.Request) -> httpx.Response:
+        return httpx.Response(200, json={
+            "id": "chatcmpl-test",
+            "object": "chat.completion",
+            "created": 0,
+            "model": "test-model",
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": "好"}, "finish_reason": "stop"}],
+            "usage": {"prompt_tokens": 1000, "completion_tokens": 500, "total_tokens": 1500},
+        })
+
+    monkeypatch.setenv("LOCAL_LLM_BASE_URL", "http://llm.test/v1")
+    monkeypatch.setattr(registry_module, "_registry", ProviderRegistry(
+        client_factory=lambda timeout: httpx.AsyncClient(transport=httpx.MockTransport(handler), timeout=timeout)
+    ))
+
+    async def run():
+        await chat_completion(MESSAGES, provider=LLMProvider.LOCAL, model="test-model")
+        await registry_module.close_providers()
+
+    asyncio.run(run())
+    metrics = llm_metrics()["local/test-model"]
+    assert metrics["calls"] == 1 and metrics["errors"] == 0
+    assert (metrics["prompt_tokens"], metrics["completion_tokens"]) == (1000, 500)
+    assert metrics["estimated_usage"] == 0
+    assert metrics["cost"] == pytest.approx(0.002)
+    assert metrics["latency_ms"]["count"] == 1 and metrics["ttft_ms"]["count"] == 1
+
+
+def test_alibaba_stream_records_reported_usage(monkeypatch, telemetry):
+    """测试阿里百炼流式调用按最后一个 SSE 事件的 usage 记录 token 数"""
+    def event(content, output_tokens):
+        return "data:" + json.dumps({
+            "output": {"choices": [{"message": {"role": "assistant", "content": content}}]},
+            "usage": {"input_tokens": 1000, "output_tokens": output_tokens},
+        }, ensure_ascii=False) + "\n\n"
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        body = event("好", 1) + event("的", 500)
+        return httpx.Response(200, headers={"Content-Type": "text/event-stream"}, content=body.encode())
+
+    monkeypatch.setenv("ALIBABA_API_KEY", "test-key")
+    monkeypatch.setattr(registry_module, "_registry", ProviderRegistry(
+        client_factory=lambda timeout: httpx.AsyncClient(transport=httpx.MockTransport(handler), timeout=timeout)
+    ))
+
+    async def run():
+        chunks = [c async for c in chat_completion_stream(MESSAGES, provider=LLMProvider.ALIBABA, model="test-model")]
+        await registry_module.close_providers()
+        return chunks
+
+    assert asyncio.run(run()) == ["好", "的"]
+    metrics = llm_metrics()["alibaba/test-model"]
+    assert (metrics["prompt_tokens"], metrics["completion_tokens"]) == (1000, 500)
+    assert metrics["estimated_usage"] == 0
+    assert metrics["cost"] == pytest.approx(0.002)
+
+
+def test_retries_and_errors_are_attributed(telemetry):
+    """测试 resilient_call 的重试计入所用模型，失败的调用计为错误，没有 usage 时估算 token"""
+    provider = _FlakyProvider(failures=2)
+
+    async def call(_):
+        return "".join([chunk async for chunk in provider.chat_completion(MESSAGES)])
+
+    policy = RetryPolicy(max_attempts=3, base_delay=0.001, max_delay=0.01)
+    assert asyncio.run(resilient_call(call, policy=policy, hedge=False)) == "好的"
+
+    metrics = telemetry.snapshot()["local/flaky-model"]
+    assert metrics["calls"] == 3 and metrics["errors"] == 2 and metrics["retries"] == 2
+    assert metrics["estimated_usage"] == 3 and metrics["completion_tokens"] > 0
+    assert metrics["ttft_ms"]["count"] == 1 and metrics["latency_ms"]["count"] == 3
+    assert metrics["ttft_ms"]["mean"] >= 10
+    assert metrics["cost"] is None
+
+
+def test_early_stop_is_cancelled_and_diff(telemetry):
+    """测试提前停止读取计为取消，diff_llm_metrics 只包含期间有调用的模型"""
+    provider = _FlakyProvider()
+    before = telemetry.snapshot()
+
+    async def run():
+        chunks = provider.chat_completion(MESSAGES)
+        await chunks.__anext__()
+        await chunks.aclose()
+
+    asyncio.run(run())
+    report = diff_llm_metrics(before, telemetry.snapshot())
+    assert list(report) == ["local/flaky-model"]
+    assert report["local/flaky-model"]["calls"] == 1 and report["local/flaky-model"]["cancelled"] == 1
+    assert diff_llm_metrics(telemetry.snapshot(), telemetry.snapshot()) == {}
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
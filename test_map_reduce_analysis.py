@@ -0,0 +1,135 @@
+"""
+测试长文 map-reduce 分析
+"""
+import asyncio
+import json
+import re
+
+import backend.agent.agent_content_keyword_analysis as analysis_module
+from backend.agent.agent_content_keyword_analysis import (
+    analyze_article_keywords,
+    batch_analyze_articles,
+    merge_chunk_analyses,
+    plan_article_chunks,
+)
+from backend.llm.token_estimator import estimate_tokens
+
+PARAGRAPH = "第{i}部分介绍了 vLLM 的调度器设计和显存管理策略，并给出了基准测试结果。"
+
+
+def _long_content(parts: int) -> str:
+    return "\n".join(PARAGRAPH.format(i=i) * 20 for i in range(parts))
+
+
+def _install_fake_llm(monkeypatch, fail_chunk=None):
+    """安装假的 chat_completion，记录 map / reduce 请求"""
+    calls = {"map": [], "reduce": 0, "single": 0}
+
+    async def fake_chat_completion(messages, **kwargs):
+        prompt = messages[-1]["content"]
+        await asyncio.sleep(0)
+        part = re.search(r"的第 (\d+)/(\d+) 部分", prompt)
+        if part:
+            index = int(part.group(1))
+            calls["map"].append(index)
+            if index == fail_chunk:
+                raise RuntimeError("upstream error")
+            return json.dumps({
+                "keywords": ["vLLM", f"关键词{index}"],
+                "topics": ["推理优化"],
+                "summary": f"第{index}块摘要",
+                "sentiment": "positive" if index > 1 else "neutral",
+                "category": "科技",
+                "entities": [{"name": "vLLM", "type": "技术"}, {"name": f"实体{index}", "type": "组织"}],
+            }, ensure_ascii=False)
+        if "各部分的摘要" in prompt:
+            calls["reduce"] += 1
+            return "全文摘要。"
+        calls["single"] += 1
+        return json.dumps({"keywords": ["短文"], "summary": "短文摘要"}, ensure_ascii=False)
+
+    monkeypatch.setattr(analysis_module, "chat_completion", fake_chat_completion)
+    # 假的 chat_completion 只模拟非流式调用
+    monkeypatch.setattr(analysis_module, "ANALYSIS_STRUCTURED_OUTPUT", False)
+    monkeypatch.setattr(analysis_module, "get_analysis_cache", lambda: None)
+    monkeypatch.setattr(analysis_module, "ANALYSIS_SINGLE_CALL_TOKENS", 1000)
+    monkeypatch.setattr(analysis_module, "ANALYSIS_CHUNK_TOKENS", 800)
+    monkeypatch.setattr(analysis_module, "ANALYSIS_MAX_CHUNKS", 4)
+    return calls
+
+
+def test_plan_chunks_respects_budget(monkeypatch):
+    """测试分块不超过预算和块数上限"""
+    _install_fake_llm(monkeypatch)
+    chunks = plan_article_chunks("标题", _long_content(3))
+    assert 2 <= len(chunks) <= 4
+    assert all(estimate_tokens(chunk) <= 800 for chunk in chunks)
+
+    # 超过块数上限时每块压缩到预算内
+    chunks = plan_article_chunks("标题", _long_content(12))
+    assert len(chunks) <= 4
+    assert all(estimate_tokens(chunk) <= 800 for chunk in chunks)
+
+
+def test_long_article_is_map_reduced(monkeypatch):
+    """测试长文分块并发分析并在本地合并"""
+    calls = _install_fake_llm(monkeypatch)
+    result = asyncio.run(analyze_article_keywords("vLLM 深度解析", _long_content(3)))
+
+    assert len(calls["map"]) >= 2
+    assert calls["reduce"] == 1
+    assert calls["single"] == 0
+    assert result["analysis_success"]
+    assert result["summary"] == "全文摘要。"
+    # 各块都出现的关键词排在最前，实体按名称去重
+    assert result["keywords"][0] == "vLLM"
+    assert [e["name"] for e in result["entities"]].count("vLLM") == 1
+    assert result["topics"] == ["推理优化"]
+    print(f"✓ 长文分 {len(calls['map'])} 块分析")
+
+
+def test_short_article_uses_single_call(monkeypatch):
+    """测试未超出单次预算的文章不走 map-reduce"""
+    calls = _install_fake_llm(monkeypatch)
+    result = asyncio.run(analyze_article_keywords("短文", "一段很短的正文。"))
+    assert calls["single"] == 1 and not calls["map"]
+    assert result["keywords"] == ["短文"]
+
+
+def test_failed_chunk_is_skipped(monkeypatch):
+    """测试部分分块失败时合并其余分块"""
+    calls = _install_fake_llm(monkeypatch, fail_chunk=1)
+    result = asyncio.run(analyze_article_keywords("vLLM 深度解析", _long_content(3)))
+    assert result["analysis_success"]
+    assert "关键词1" not in result["keywords"]
+    assert len(calls["map"]) >= 2
+
+
+def test_long_articles_are_not_packed(monkeypatch):
+    """测试批量分析时长文不参与打包"""
+    calls = _install_fake_llm(monkeypatch)
+    articles = [{"title": "vLLM 深度解析", "content": _long_content(3)}]
+    asyncio.run(batch_analyze_articles(articles, pack=True))
+    assert calls["reduce"] == 1
+    assert articles[0]["content_analysis"]["summary"] == "全文摘要。"
+
+
+def test_merge_majority_votes():
+    """测试情感和分类多数投票"""
+    merged = merge_chunk_analyses(
+        [
+            {"keywords": ["A", "b"], "topics": [], "sentiment": "negative", "category": "财经", "entities": []},
+            {"keywords": ["B", "c"], "topics": [], "sentiment": "negative", "category": "科技", "entities": []},
+            {"keywords": ["b"], "topics": [], "sentiment": "neutral", "category": "科技", "entities": []},
+        ],
+        max_keywords=2,
+        max_topics=5,
+    )
+    assert merged["keywords"] == ["b", "A"]
+    assert merged["sentiment"] == "negative"
+    assert merged["category"] == "科技"
+
+
+if __name__ == "__main__":
+    import pytest
+    pytest.main([__file__, "-v"])
@@ -0,0 +1,82 @@
+"""
+测试两级模型级联分析（分类模型筛选 + 完整分析模型）
+"""
+import asyncio
+import json
+import re
+
+import backend.agent.agent_content_keyword_analysis as analysis_module
+from backend.agent.agent_content_keyword_analysis import batch_analyze_articles, classify_article
+
+
+def _install_fake_llm(monkeypatch, classifier_error=False):
+    """安装假的 chat_completion：分类请求按标题是否含"技术"给出相关度，记录每次请求的模型"""
+    calls = []
+
+    async def fake_chat_completion(messages, model=None, **kwargs):
+        prompt = messages[-1]["content"]
+        title = re.search(r"^标题：(.*)$", prompt, flags=re.MULTILINE).group(1)
+        calls.append((model, title))
+        await asyncio.sleep(0)
+        if "快速判断" in prompt:
+            if classifier_error:
+                raise RuntimeError("classifier unavailable")
+            relevance = 0.9 if "技术" in title else 0.1
+            return json.dumps({"category": "科技", "sentiment": "positive", "relevance": relevance})
+        return json.dumps({
+            "keywords": [title], "topics": ["测试"], "summary": f"{title} 的摘要",
+            "sentiment": "neutral", "category": "科技", "entities": [],
+        }, ensure_ascii=False)
+
+    monkeypatch.setattr(analysis_module, "chat_completion", fake_chat_completion)
+    monkeypatch.setattr(analysis_module, "ANALYSIS_STRUCTURED_OUTPUT", False)
+    monkeypatch.setattr(analysis_module, "get_analysis_cache", lambda: None)
+    monkeypatch.setattr(analysis_module, "ANALYSIS_CLASSIFIER_MODEL", "small-model")
+    monkeypatch.setattr(analysis_module, "ANALYSIS_CLASSIFIER_PROVIDER", None)
+    monkeypatch.setattr(analysis_module, "ANALYSIS_RELEVANCE_THRESHOLD", 0.5)
+    monkeypatch.setenv("DEFAULT_LLM_MODEL", "large-model")
+    return calls
+
+
+def _articles():
+    return [
+        {"title": "新技术发布", "content": "某团队开源了新的推理框架。" * 5},
+        {"title": "明星八卦", "content": "某明星昨天出席了活动。" * 5},
+    ]
+
+
+def test_classify_article_clamps_relevance(monkeypatch):
+    """测试分类结果的层级和相关度"""
+    _install_fake_llm(monkeypatch)
+    result = asyncio.run(classify_article("新技术发布", "正文"))
+    assert result["analysis_tier"] == "classifier"
+    assert result["relevance"] == 0.9
+    assert result["category"] == "科技" and result["keywords"] == []
+
+
+def test_cascade_only_escalates_relevant_articles(monkeypatch):
+    """测试只有相关度达到阈值的文章调用完整分析模型，结果记录层级"""
+    calls = _install_fake_llm(monkeypatch)
+    tech, gossip = asyncio.run(batch_analyze_articles(_articles(), pack=False))
+
+    assert sorted(calls) == [("large-model", "新技术发布"), ("small-model", "新技术发布"), ("small-model", "明星八卦")]
+    assert tech["content_analysis"]["analysis_tier"] == "full"
+    assert tech["content_analysis"]["relevance"] == 0.9
+    assert gossip["content_analysis"]["analysis_tier"] == "classifier"
+    assert gossip["content_analysis"]["summary"] == ""
+
+
+def test_classifier_failure_falls_back_to_full_analysis(monkeypatch):
+    """测试分类模型失败时按完整分析处理"""
+    monkeypatch.setenv("LLM_RETRY_MAX_ATTEMPTS", "1")
+    _install_fake_llm(monkeypatch, classifier_error=True)
+    results = asyncio.run(batch_analyze_articles(_articles(), pack=False))
+    assert [a["content_analysis"]["analysis_tier"] for a in results] == ["full", "full"]
+
+
+def test_cascade_disabled_without_classifier_model(monkeypatch):
+    """测试未配置分类模型时所有文章直接完整分析"""
+    calls = _install_fake_llm(monkeypatch)
+    monkeypatch.setattr(analysis_module, "ANALYSIS_CLASSIFIER_MODEL", None)
+    asyncio.run(batch_analyze_articles(_articles(), pack=False))
+    assert {model for model, _ in calls} == {"large-model"}
@@ -0,0 +1,195 @@
+"""
+测试按需分析接口（SSE 流式输出、并发请求合并、已有结果直接返回）
+"""
+import asyncio
+import json
+import time
+
+import httpx
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+import backend.agent.agent_content_keyword_analysis as analysis_module
+import backend.llm.provider_registry as registry_module
+import backend.service.analysis_service as service_module
+import backend.service.article_service as article_service_module
+from backend.agent.agent_content_keyword_analysis import analysis_version, stream_article_analysis
+from backend.api import articles as articles_api
+from backend.llm import ProviderRegistry
+from backend.llm.fake_server import FakeLLMConfig, LatencyDistribution, create_fake_llm_app
+from backend.schemas.article import ArticleDetail
+from backend.service.analysis_service import AnalysisService
+from backend.service.article_service import ArticleService
+
+TITLE = "开源推理框架发布新版本"
+CONTENT = "某团队开源了新的推理框架，显著降低了显存占用。开发者可以直接替换现有部署。" * 3
+
+
+class _FakeRepository:
+    def __init__(self, docs):
+        self.docs = docs
+        self.updates = []
+
+    def get_document(self, doc_id):
+        return self.docs.get(doc_id)
+
+    def update_document(self, doc_id, updates):
+        self.updates.append((doc_id, updates))
+        self.docs[doc_id].update(updates)
+        return {"result": "updated"}
+
+
+class _FakeQueue:
+    def __init__(self):
+        self.completed = []
+
+    def complete(self, doc_ids):
+        self.completed.extend(doc_ids)
+
+
+@pytest.fixture
+def fake_llm(monkeypatch):
+    """让分析走假 LLM 服务，返回服务应用（app.state.stats 为请求统计）"""
+    app = create_fake_llm_app(FakeLLMConfig(latency=LatencyDistribution("constant", [100])))
+    monkeypatch.setenv("DEFAULT_LLM_PROVIDER", "local")
+    monkeypatch.setenv("DEFAULT_LLM_MODEL", "fake-model")
+    monkeypatch.setenv("LOCAL_LLM_BASE_URL", "http://fake.test/v1")
+    monkeypatch.setattr(analysis_module, "get_analysis_cache", lambda: None)
+    monkeypatch.setattr(registry_module, "_registry", ProviderRegistry(
+        client_factory=lambda timeout: httpx.AsyncClient(transport=httpx.ASGITransport(app=app), timeout=timeout)
+    ))
+    monkeypatch.setattr(AnalysisService, "_instance", None)
+    return app
+
+
+@pytest.fixture
+def queue(monkeypatch):
+    queue = _FakeQueue()
+    monkeypatch.setattr(service_module, "get_analysis_queue", lambda: queue)
+    return queue
+
+
+def _article(content_analysis=None):
+    return ArticleDetail(
+        id="doc-1", url="https://example.com/1", title=TITLE, category="科技", published_time="",
+        content=CONTENT, content_analysis=content_analysis, created_at="",
+    )
+
+
+async def _collect(events):
+    return [event async for event in events]
+
+
+def test_stream_article_analysis_yields_deltas_then_result(fake_llm):
+    """测试流式分析先输出文本片段，再输出带版本的最终结果"""
+    async def run():
+        try:
+            return await _collect(stream_article_analysis(TITLE, CONTENT))
+        finally:
+            await registry_module.close_providers()
+
+    events = asyncio.run(run())
+    kinds = [kind for kind, _ in events]
+    assert kinds[-1] == "result" and set(kinds[:-1]) == {"delta"} and len(kinds) > 2
+    result = events[-1][1]
+    assert json.loads("".join(text for kind, text in events[:-1]))["keywords"][:2] == result["keywords"][:2]
+    assert result["analysis_success"] and result["analysis_version"] == analysis_version()
+
+
+def test_concurrent_requests_coalesce(fake_llm, queue):
+    """测试同一篇文章的并发请求只调用一次 LLM，所有请求收到相同的输出，结果只写回一次"""
+    repository = _FakeRepository({"doc-1": {}})
+    service = AnalysisService()
+
+    async def run():
+        try:
+            return await asyncio.gather(*[
+                _collect(service.stream_analysis(_article(), repository)) for _ in range(3)
+            ])
+        finally:
+            await registry_module.close_providers()
+
+    streams = asyncio.run(run())
+    assert fake_llm.state.stats["requests"] == 1
+    results = [events[-1]["data"] for events in streams]
+    assert [r["coalesced"] for r in results] == [False, True, True]
+    assert all(events[:-1] == streams[0][:-1] for events in streams)
+    assert all(r["persisted"] and r["content_analysis"] == results[0]["content_analysis"] for r in results)
+    assert len(repository.updates) == 1 and repository.docs["doc-1"]["analysis_status"] == "done"
+    assert queue.completed == ["doc-1"]
+    assert service.stats()["coalesced"] == 2 and service.stats()["llm_runs"] == 1
+
+
+def test_current_analysis_is_served_without_llm(fake_llm, queue):
+    """测试已有当前版本的分析结果时直接返回，force 时重新分析"""
+    repository = _FakeRepository({"doc-1": {}})
+    service = AnalysisService()
+    article = _article({"keywords": ["推理"], "summary": "已有结果", "analysis_version": analysis_version()})
+
+    events = asyncio.run(_collect(service.stream_analysis(article, repository)))
+    assert [e["event"] for e in events] == ["result"]
+    assert events[0]["data"]["cached"] and events[0]["data"]["content_analysis"]["summary"] == "已有结果"
+    assert fake_llm.state.stats["requests"] == 0
+
+    async def run_forced():
+        try:
+            return await _collect(service.stream_analysis(article, repository, force=True))
+        finally:
+            await registry_module.close_providers()
+
+    events = asyncio.run(run_forced())
+    assert events[-1]["data"]["persisted"] and fake_llm.state.stats["requests"] == 1
+
+
+def test_analyze_endpoint_streams_sse(fake_llm, queue):
+    """测试 POST /api/articles/{id}/analyze 以 SSE 返回 delta 和 result 事件，不存在的文章返回 404"""
+    repository = _FakeRepository({"doc-1": {"title": TITLE, "content": CONTENT, "category": "科技"}})
+    app = FastAPI()
+    app.include_router(articles_api.router, prefix="/api/articles")
+    app.dependency_overrides[articles_api.get_article_service] = lambda: ArticleService(repository)
+
+    with TestClient(app) as client:
+        response = client.post("/api/articles/doc-1/analyze")
+        assert client.post("/api/articles/missing/analyze").status_code == 404
+
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/event-stream")
+    blocks = [block for block in response.text.split("\n\n") if block]
+    events = [block.split("\n", 1)[0].removeprefix("event: ") for block in blocks]
+    assert events[-1] == "result" and "delta" in events
+    result = json.loads(blocks[-1].split("data: ", 1)[1])
+    assert result["persisted"] and result["content_analysis"]["analysis_success"]
+    assert repository.docs["doc-1"]["content_analysis"]["analysis_version"] == analysis_version()
+
+
+def test_detail_view_upgrades_in_background(fake_llm, queue, monkeypatch):
+    """测试打开详情页立即返回分类结果，升级在后台完成：并发查看只调用一次 LLM，写回后更新状态和队列"""
+    monkeypatch.setattr(article_service_module, "ANALYSIS_UPGRADE_ON_VIEW", True)
+    classifier_result = {"category": "科技", "sentiment": "positive", "relevance": 0.3, "analysis_tier": "classifier"}
+    repository = _FakeRepository({"doc-1": {
+        "title": TITLE, "content": CONTENT, "category": "科技", "content_analysis": classifier_result,
+    }})
+    app = FastAPI()
+    app.include_router(articles_api.router, prefix="/api/articles")
+    app.dependency_overrides[articles_api.get_article_service] = lambda: ArticleService(repository)
+    service = AnalysisService()
+
+    with TestClient(app) as client:
+        responses = [client.get("/api/articles/doc-1") for _ in range(3)]
+        assert all(r.json()["content_analysis"]["analysis_tier"] == "classifier" for r in responses)
+        deadline = time.monotonic() + 5
+        while service._tasks and time.monotonic() < deadline:
+            time.sleep(0.01)
+        upgraded = client.get("/api/articles/doc-1").json()
+
+    assert fake_llm.state.stats["requests"] == 1
+    assert service.stats()["coalesced"] == 2
+    assert len(repository.updates) == 1 and repository.docs["doc-1"]["analysis_status"] == "done"
+    assert queue.completed == ["doc-1"]
+    assert upgraded["content_analysis"]["analysis_tier"] == "full"
+    assert upgraded["content_analysis"]["relevance"] == 0.3
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
@@ -0,0 +1,117 @@
+"""
+测试多篇文章打包分析
+"""
+import asyncio
+import json
+import re
+
+import backend.agent.agent_content_keyword_analysis as analysis_module
+from backend.agent.agent_content_keyword_analysis import batch_analyze_articles, plan_packed_batches
+
+
+def _fake_result(title: str) -> dict:
+    return {
+        "keywords": [title],
+        "topics": ["测试"],
+        "summary": f"{title} 的摘要",
+        "sentiment": "neutral",
+        "category": "科技",
+        "entities": [],
+    }
+
+
+def _install_fake_llm(monkeypatch, max_packed=None, drop_index=None):
+    """
+    安装假的 chat_completion，记录每次请求包含的文章数
+
+    Args:
+        max_packed: 打包文章数超过该值时请求失败
+        drop_index: 打包响应中故意漏掉的文章编号
+    """
+    calls = []
+
+    async def fake_chat_completion(messages, **kwargs):
+        prompt = messages[-1]["content"]
+        packed = re.findall(r"^\[(\d+)\] 标题：(.*)$", prompt, flags=re.MULTILINE)
+        await asyncio.sleep(0)
+        if not packed:
+            title = re.search(r"^标题：(.*)$", prompt, flags=re.MULTILINE).group(1)
+            calls.append(1)
+            return json.dumps(_fake_result(title), ensure_ascii=False)
+
+        calls.append(len(packed))
+        if max_packed is not None and len(packed) > max_packed:
+            raise RuntimeError("context length exceeded")
+        entries = [
+            {"index": int(index), **_fake_result(title)}
+            for index, title in packed
+            if int(index) != drop_index
+        ]
+        return "```json\n" + json.dumps(entries, ensure_ascii=False) + "\n```"
+
+    monkeypatch.setattr(analysis_module, "chat_completion", fake_chat_completion)
+    # 假的 chat_completion 只模拟非流式调用
+    monkeypatch.setattr(analysis_module, "ANALYSIS_STRUCTURED_OUTPUT", False)
+    monkeypatch.setattr(analysis_module, "get_analysis_cache", lambda: None)
+    return calls
+
+
+def _articles(count: int):
+    return [{"title": f"热榜文章{i}", "content": f"第 {i} 篇文章的正文内容。" * 10} for i in range(count)]
+
+
+def test_plan_packed_batches():
+    """测试按上下文和输出上限分组"""
+    assert plan_packed_batches([100] * 10, overhead_tokens=200, context_tokens=100000, max_articles=4) == [
+        [0, 1, 2, 3], [4, 5, 6, 7], [8, 9],
+    ]
+    # 上下文放不下时提前分组：每篇 100 + 400 输出预留
+    assert plan_packed_batches([100] * 5, overhead_tokens=200, context_tokens=1300, max_articles=8) == [
+        [0, 1], [2, 3], [4],
+    ]
+    # 输出上限限制每批文章数
+    assert plan_packed_batches([10] * 5, overhead_tokens=0, context_tokens=100000,
+                               max_articles=8, max_output_tokens=800) == [[0, 1], [2, 3], [4]]
+    print("✓ 打包分组正常")
+
+
+def test_packed_batch_reduces_requests(monkeypatch):
+    """测试多篇短文章合并为少量请求，结果按编号回填"""
+    calls = _install_fake_llm(monkeypatch)
+    monkeypatch.setattr(analysis_module, "ANALYSIS_PACK_MAX_ARTICLES", 8)
+
+    articles = _articles(10)
+    result = asyncio.run(batch_analyze_articles(articles, pack=True))
+
+    assert calls == [8, 2]
+    for i, article in enumerate(result):
+        analysis = article["content_analysis"]
+        assert analysis["analysis_success"] is True
+        assert analysis["keywords"] == [f"热榜文章{i}"]
+    print("✓ 10 篇文章 2 次请求完成")
+
+
+def test_failed_batch_splits(monkeypatch):
+    """测试打包请求失败时二分拆小，缺失的文章单独重试"""
+    calls = _install_fake_llm(monkeypatch, max_packed=2, drop_index=0)
+
+    articles = _articles(5)
+    result = asyncio.run(batch_analyze_articles(articles, pack=True))
+
+    # 5 -> 失败 -> [2, 3]；3 -> 失败 -> [1, 2]；每个成功的打包请求漏掉编号 0，单独重试
+    assert sorted(calls) == sorted([5, 2, 1, 3, 1, 2, 1])
+    assert all(a["content_analysis"]["analysis_success"] for a in result)
+    assert [a["content_analysis"]["keywords"][0] for a in result] == [f"热榜文章{i}" for i in range(5)]
+    print("✓ 失败批次自动拆分")
+
+
+def test_pack_disabled_keeps_single_requests(monkeypatch):
+    """测试关闭打包时每篇文章一次请求"""
+    calls = _install_fake_llm(monkeypatch)
+    asyncio.run(batch_analyze_articles(_articles(3), pack=False))
+    assert calls == [1, 1, 1]
+    print("✓ 单篇模式正常")
+
+
+if __name__ == "__main__":
+    test_plan_packed_batches()
@@ -0,0 +1,152 @@
+"""
+测试进程级 LLM provider 注册表（共享连接池 + 非流式调用）
+"""
+import asyncio
+import http.server
+import json
+import logging
+import threading
+
+import httpx
+import pytest
+
+import backend.llm.provider_registry as registry_module
+from backend.llm import LLMProvider, ProviderRegistry, chat_completion
+
+
+def _completion_response(content: str) -> dict:
+    return {
+        "id": "chatcmpl-test",
+        "object": "chat.completion",
+        "created": 0,
+        "model": "test-model",
+        "choices": [{"index": 0, "message": {"role": "assistant", "content": content}, "finish_reason": "stop"}],
+        "usage": {"prompt_tokens": 5, "completion_tokens": 3, "total_tokens": 8},
+    }
+
+
+@pytest.fixture
+def mock_registry(monkeypatch):
+    """使用 MockTransport 的注册表，记录请求和创建的客户端数量"""
+    requests = []
+    clients = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        requests.append(json.loads(request.content))
+        return httpx.Response(200, json=_completion_response('{"keywords": ["测试"]}'))
+
+    def client_factory(timeout):
+        client = httpx.AsyncClient(transport=httpx.MockTransport(handler), timeout=timeout)
+        clients.append(client)
+        return client
+
+    monkeypatch.setenv("LOCAL_LLM_BASE_URL", "http://llm.test/v1")
+    registry = ProviderRegistry(client_factory=client_factory)
+    monkeypatch.setattr(registry_module, "_registry", registry)
+    return registry, requests, clients
+
+
+def test_provider_reused_within_loop(mock_registry):
+    """测试同一事件循环内复用 provider 和连接池，并使用非流式请求"""
+    registry, requests, clients = mock_registry
+
+    async def run():
+        messages = [{"role": "user", "content": "你好"}]
+        results = await asyncio.gather(*[
+            chat_completion(messages, provider=LLMProvider.LOCAL) for _ in range(5)
+        ])
+        assert registry.get(LLMProvider.LOCAL) is registry.get(LLMProvider.LOCAL)
+        assert registry.get(LLMProvider.LOCAL, base_url="http://other.test/v1") is not registry.get(LLMProvider.LOCAL)
+        await registry.close()
+        return results
+
+    results = asyncio.run(run())
+
+    assert results == ['{"keywords": ["测试"]}'] * 5
+    assert len(requests) == 5
+    assert all(r["stream"] is False for r in requests)
+    assert len(clients) == 2
+    assert all(c.is_closed for c in clients)
+    assert len(registry) == 0
+    print("✓ 同一事件循环复用连接池")
+
+
+def test_registry_isolated_per_loop(mock_registry):
+    """测试不同事件循环各自创建连接池，已关闭循环的条目被清理"""
+    registry, _, clients = mock_registry
+
+    async def get_local():
+        return registry.get(LLMProvider.LOCAL)
+
+    first = asyncio.run(get_local())
+    second = asyncio.run(get_local())
+
+    assert first is not second
+    assert len(clients) == 2
+    # 第一个循环已关闭，其条目在下一次 get 时被清理
+    assert len(registry) == 1
+    print("✓ 事件循环隔离正常")
+
+
+def test_orphaned_connections_are_shut_down(monkeypatch, caplog):
+    """测试事件循环结束前没有关闭注册表时，清理条目会断开遗留的 keep-alive 连接并记录日志"""
+    disconnected = threading.Event()
+
+    class Handler(http.server.BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def do_POST(self):
+            self.rfile.read(int(self.headers["Content-Length"]))
+            body = json.dumps(_completion_response("ok")).encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def finish(self):
+            super().finish()
+            disconnected.set()
+
+        def log_message(self, *args):
+            pass
+
+    server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    monkeypatch.setenv("LOCAL_LLM_BASE_URL", f"http://127.0.0.1:{server.server_address[1]}/v1")
+    registry = ProviderRegistry()
+    monkeypatch.setattr(registry_module, "_registry", registry)
+
+    async def call():
+        return await chat_completion([{"role": "user", "content": "你好"}], provider=LLMProvider.LOCAL)
+
+    try:
+        assert asyncio.run(call()) == "ok"
+        assert not disconnected.is_set()
+        with caplog.at_level(logging.WARNING, logger=registry_module.__name__):
+            asyncio.run(call())
+        assert disconnected.wait(timeout=5)
+        assert "断开 1 个连接" in caplog.text
+        assert len(registry) == 1
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+def test_shared_client_not_closed_by_provider(mock_registry):
+    """测试 provider.close() 不关闭注册表持有的共享客户端"""
+    registry, _, clients = mock_registry
+
+    async def run():
+        llm = registry.get(LLMProvider.LOCAL)
+        await llm.close()
+        assert not clients[0].is_closed
+        await registry.close()
+        assert clients[0].is_closed
+
+    asyncio.run(run())
+    print("✓ 共享客户端生命周期正常")
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
@@ -0,0 +1,129 @@
+"""
+测试正文提取引擎（纯 Python / 常驻 Node 进程）
+"""
+import os
+import shutil
+import tempfile
+
+import pytest
+
+from backend.agent.crawl_fixtures import FixtureRecorder, compare_engines
+from backend.utils.readability_worker import NodeReadabilityPool, NodeReadabilityWorker
+from backend.utils.url_to_markdown import ReadabilityExtractor, resolve_readability_engine
+
+
+PARAGRAPH = "Rust 异步运行时 Tokio 发布新版本，调度器性能显著提升，社区反响热烈。"
+
+SAMPLE_HTML = f"""
+<html>
+  <head><title>Tokio 新版本发布</title></head>
+  <body>
+    <nav>首页 | 导航</nav>
+    <article><h1>Tokio 新版本发布</h1><p>{PARAGRAPH * 3}</p><p>{PARAGRAPH * 2}</p></article>
+  </body>
+</html>
+"""
+
+# 模拟 @mozilla/readability 和 jsdom 的最小实现，只用于验证常驻进程的通信协议
+FAKE_JSDOM = """
+class VirtualConsole {}
+class JSDOM {
+  constructor(html) { this.window = { document: { html: html }, close() {} }; }
+}
+module.exports = { JSDOM, VirtualConsole };
+"""
+
+FAKE_READABILITY = """
+class Readability {
+  constructor(doc) { this.doc = doc; }
+  parse() {
+    if (this.doc.html.includes('CRASH')) { throw new Error('boom'); }
+    const m = this.doc.html.match(/<title>(.*?)<\\/title>/);
+    return { title: m ? m[1] : null, content: '<div>' + this.doc.html.length + '</div>', pid: process.pid };
+  }
+}
+module.exports = { Readability };
+"""
+
+
+@pytest.fixture
+def fake_node_modules(monkeypatch):
+    if shutil.which("node") is None:
+        pytest.skip("node 不可用")
+    with tempfile.TemporaryDirectory() as tmp:
+        for package, source in (("jsdom", FAKE_JSDOM), ("@mozilla/readability", FAKE_READABILITY)):
+            package_dir = os.path.join(tmp, package)
+            os.makedirs(package_dir)
+            with open(os.path.join(package_dir, "index.js"), "w", encoding="utf-8") as f:
+                f.write(source)
+        monkeypatch.setenv("READABILITY_NODE_MODULES", tmp)
+        yield tmp
+
+
+def test_python_engine_extracts_article():
+    """测试纯 Python 引擎提取标题和正文"""
+    assert resolve_readability_engine("python") == "python"
+    with pytest.raises(ValueError):
+        resolve_readability_engine("unknown")
+
+    article = ReadabilityExtractor(engine="python").extract_article(SAMPLE_HTML)
+    assert article.title == "Tokio 新版本发布"
+    assert "调度器性能显著提升" in article.html_content
+    print("✓ 纯 Python 引擎提取正常")
+
+
+def test_node_worker_is_reused(fake_node_modules):
+    """测试常驻进程复用同一个 node 进程，并在出错后继续服务"""
+    worker = NodeReadabilityWorker(timeout=10, max_tasks=4)
+    try:
+        first = worker.parse(SAMPLE_HTML)
+        second = worker.parse(SAMPLE_HTML)
+        assert first["title"] == "Tokio 新版本发布"
+        assert first["pid"] == second["pid"]
+
+        with pytest.raises(RuntimeError):
+            worker.parse("<html>CRASH</html>")
+        assert worker.parse(SAMPLE_HTML)["pid"] == first["pid"]
+
+        # 达到 max_tasks 后重启进程
+        assert worker.parse(SAMPLE_HTML)["pid"] != first["pid"]
+        assert worker.restarts == 1
+    finally:
+        worker.close()
+    print("✓ 常驻进程复用正常")
+
+
+def test_node_pool_concurrent_parse(fake_node_modules):
+    """测试进程池在多线程下并发提取"""
+    from concurrent.futures import ThreadPoolExecutor
+
+    pool = NodeReadabilityPool(size=2, timeout=10)
+    try:
+        with ThreadPoolExecutor(max_workers=4) as executor:
+            results = list(executor.map(pool.parse, [SAMPLE_HTML] * 8))
+        assert all(r["title"] == "Tokio 新版本发布" for r in results)
+        assert pool.stats()["tasks_done"] == 8
+    finally:
+        pool.close()
+    print("✓ 进程池并发提取正常")
+
+
+def test_compare_engines_skips_unavailable(monkeypatch):
+    """测试引擎对比报告，不可用的引擎标记为跳过"""
+    monkeypatch.setenv("READABILITY_NODE_MODULES", "/nonexistent/node_modules")
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "tophub.zip")
+        with FixtureRecorder(path) as recorder:
+            for i in range(3):
+                recorder.record_page(f"https://example.com/{i}", SAMPLE_HTML)
+
+        report = compare_engines(path, engines=["python", "node"], repeat=2)
+
+    assert report["engines"]["python"]["count"] == 5
+    assert report["engines"]["python"]["first_call_ms"] is not None
+    assert "skipped" in report["engines"]["node"]
+    print("✓ 引擎对比报告正常")
+
+
+if __name__ == "__main__":
+    test_python_engine_extracts_article()
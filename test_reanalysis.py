@@ -0,0 +1,199 @@
+"""
+测试分析版本标记和按版本选择性重新分析
+"""
+import asyncio
+import json
+
+import httpx
+
+import backend.agent.agent_content_keyword_analysis as analysis_module
+import backend.agent.reanalysis as reanalysis_module
+import backend.llm.provider_registry as registry_module
+from backend.agent.agent_content_keyword_analysis import (
+    analysis_version,
+    analyze_article_keywords,
+    current_analysis_versions,
+)
+from backend.agent.analysis_cache import AnalysisCache
+from backend.agent.batch_analysis import parse_analysis_results
+from backend.llm import LLMProvider, ProviderRegistry
+from backend.agent.reanalysis import (
+    estimate_reanalysis_tokens,
+    plan_reanalysis,
+    run_reanalysis,
+    stale_analysis_query,
+)
+
+CONTENT = "某团队开源了新的推理框架，显著降低了显存占用。" * 5
+
+
+class _FakeRepository:
+    def __init__(self, docs):
+        self.docs = docs
+        self.count_query = None
+        self.scroll_kwargs = None
+        self.updates = {}
+
+    def count(self, query=None):
+        self.count_query = query
+        return len(self.docs)
+
+    def scroll_documents(self, **kwargs):
+        self.scroll_kwargs = kwargs
+        items = list(self.docs.items())
+        for start in range(0, len(items), 2):
+            yield items[start:start + 2]
+
+    def bulk_update_documents(self, updates):
+        self.updates.update(updates)
+        return {"success": len(updates), "failed": 0, "failed_items": []}
+
+
+def _install_fake_llm(monkeypatch):
+    async def fake_chat_completion(messages, model=None, **kwargs):
+        return json.dumps({"keywords": ["推理"], "summary": "摘要"}, ensure_ascii=False)
+
+    monkeypatch.setattr(analysis_module, "chat_completion", fake_chat_completion)
+    monkeypatch.setattr(analysis_module, "ANALYSIS_STRUCTURED_OUTPUT", False)
+    monkeypatch.setattr(analysis_module, "get_analysis_cache", lambda: None)
+    monkeypatch.setenv("DEFAULT_LLM_MODEL", "model-a")
+
+
+def test_analysis_version_tracks_prompt_and_model(monkeypatch):
+    """测试提示词模板、模型或提示词版本变化时版本哈希随之变化"""
+    monkeypatch.setenv("DEFAULT_LLM_MODEL", "model-a")
+    base = analysis_version()
+    assert base == analysis_version(model="model-a")
+    assert base != analysis_version(model="model-b")
+    assert base != analysis_version(max_keywords=5)
+
+    monkeypatch.setattr(analysis_module, "ANALYSIS_SYSTEM_PROMPT", "新的系统提示词")
+    assert analysis_version() != base
+    monkeypatch.undo()
+
+    monkeypatch.setattr(analysis_module, "ANALYSIS_PROMPT_VERSION", "2")
+    monkeypatch.setenv("DEFAULT_LLM_MODEL", "model-a")
+    assert analysis_version() != base
+
+
+def test_analysis_results_are_stamped(monkeypatch):
+    """测试在线分析和批处理结果都带有版本和模型"""
+    _install_fake_llm(monkeypatch)
+    result = asyncio.run(analyze_article_keywords("推理框架发布", CONTENT))
+    assert result["analysis_version"] == analysis_version()
+    assert result["analysis_model"].endswith("/model-a")
+
+    line = json.dumps({
+        "custom_id": "doc-1",
+        "response": {"status_code": 200, "body": {"choices": [{"message": {"content": "{}"}}]}},
+    })
+    results, _ = parse_analysis_results(line, model="model-a")
+    assert results["doc-1"]["analysis_version"] == analysis_version(model="model-a")
+    assert "analysis_version" not in parse_analysis_results(line)[0]["doc-1"]
+
+
+def test_routed_result_is_stamped_with_serving_model(monkeypatch):
+    """测试路由到其他提供商时，版本、模型标记和缓存键使用实际响应的提供商和模型"""
+    requested_models = []
+    text = json.dumps({"keywords": ["推理"], "topics": ["部署"], "summary": "开源推理框架。",
+                       "sentiment": "positive", "category": "科技", "entities": []}, ensure_ascii=False)
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        requested_models.append(json.loads(request.content)["model"])
+        events = ["data: " + json.dumps({
+            "id": "chatcmpl-test", "object": "chat.completion.chunk", "created": 0, "model": "stub",
+            "choices": [{"index": 0, "delta": {"content": text}, "finish_reason": None}],
+        }, ensure_ascii=False) + "\n\n", "data: [DONE]\n\n"]
+        return httpx.Response(200, headers={"Content-Type": "text/event-stream"}, content="".join(events).encode())
+
+    monkeypatch.setenv("DEFAULT_LLM_PROVIDER", "siliconflow")
+    monkeypatch.setenv("DEFAULT_LLM_MODEL", "big-model")
+    monkeypatch.setenv("LOCAL_MODEL", "local-7b")
+    monkeypatch.setenv("LOCAL_LLM_BASE_URL", "http://llm.test/v1")
+    monkeypatch.setenv("LLM_ROUTER_WEIGHTS", "local=1")
+    monkeypatch.setattr(registry_module, "_registry", ProviderRegistry(
+        client_factory=lambda timeout: httpx.AsyncClient(transport=httpx.MockTransport(handler), timeout=timeout)
+    ))
+    cache = AnalysisCache(":memory:")
+    monkeypatch.setattr(analysis_module, "get_analysis_cache", lambda: cache)
+    monkeypatch.setattr(analysis_module, "ANALYSIS_STRUCTURED_OUTPUT", True)
+
+    async def run():
+        try:
+            first = await analyze_article_keywords("开源推理框架发布", CONTENT)
+            second = await analyze_article_keywords("开源推理框架发布", CONTENT)
+        finally:
+            await registry_module.close_providers()
+        return first, second
+
+    first, second = asyncio.run(run())
+
+    assert requested_models == ["local-7b"]
+    assert first["analysis_model"] == "local/local-7b"
+    assert first["analysis_version"] == analysis_version(LLMProvider.LOCAL, "local-7b")
+    assert first["analysis_version"] != analysis_version(LLMProvider.SILICONFLOW, "big-model")
+    assert first["analysis_version"] in current_analysis_versions()
+    # 缓存写在实际模型的键下，再次分析命中
+    assert second == first and cache.stats()["hits"] == 1
+
+
+def test_stale_query_excludes_current_version_and_cheap_tiers():
+    """测试过期查询只选取其他版本（或没有版本）的完整分析结果"""
+    query = stale_analysis_query("v1")
+    assert {"term": {"content_analysis.analysis_success": True}} in query["bool"]["filter"]
+    assert {"terms": {"content_analysis.analysis_version": ["v1"]}} in query["bool"]["must_not"]
+    assert {"terms": {"content_analysis.analysis_tier": ["local", "classifier"]}} in query["bool"]["must_not"]
+
+
+def test_routed_provider_versions_are_current(monkeypatch):
+    """测试配置了路由时，路由中各提供商产生的结果都是当前版本，不会被反复重新分析"""
+    monkeypatch.setenv("DEFAULT_LLM_PROVIDER", "siliconflow")
+    monkeypatch.setenv("DEFAULT_LLM_MODEL", "big-model")
+    monkeypatch.setenv("LOCAL_MODEL", "local-7b")
+    monkeypatch.delenv("SILICONFLOW_MODEL", raising=False)
+    monkeypatch.setenv("LLM_ROUTER_WEIGHTS", "siliconflow=3,local=1")
+    versions = [analysis_version(LLMProvider.SILICONFLOW, "big-model"), analysis_version(LLMProvider.LOCAL, "local-7b")]
+    assert current_analysis_versions() == versions
+    assert {"terms": {"content_analysis.analysis_version": versions}} in stale_analysis_query()["bool"]["must_not"]
+
+    monkeypatch.delenv("LLM_ROUTER_WEIGHTS")
+    assert current_analysis_versions() == [analysis_version()]
+
+
+def test_plan_respects_priority_and_budget():
+    """测试按优先级顺序在预算内选取，超出预算即停止"""
+    docs = {f"doc-{i}": {"title": f"文章{i}", "content": CONTENT} for i in range(5)}
+    per_article = estimate_reanalysis_tokens("文章0", CONTENT)
+    repository = _FakeRepository(docs)
+
+    plan = plan_reanalysis(repository, token_budget=per_article * 3 + 1, version="v1")
+
+    assert [doc_id for doc_id, _, _ in plan["items"]] == ["doc-0", "doc-1", "doc-2"]
+    assert plan["tokens"] <= plan["budget"] and plan["stale"] == 5
+    assert repository.count_query == stale_analysis_query("v1")
+    assert "function_score" in repository.scroll_kwargs["query"]
+    assert repository.scroll_kwargs["sort"] == [{"_score": "desc"}]
+    assert len(plan_reanalysis(repository, token_budget=10 ** 6, limit=2, version="v1")["items"]) == 2
+
+
+def test_run_reanalysis_keeps_old_result_on_failure(monkeypatch):
+    """测试只写回分析成功且为当前版本的结果"""
+    async def fake_batch(articles, **kwargs):
+        assert kwargs["cascade"] is False
+        for article in articles:
+            ok = article["title"] != "失败"
+            article["content_analysis"] = {"analysis_success": ok, "analysis_version": "v2" if ok else None}
+        return articles
+
+    monkeypatch.setattr(reanalysis_module, "batch_analyze_articles", fake_batch)
+    repository = _FakeRepository({})
+    plan = {
+        "version": "v2",
+        "versions": ["v2"],
+        "items": [("a", {"title": "成功", "content": CONTENT}, 10), ("b", {"title": "失败", "content": CONTENT}, 10)],
+    }
+
+    report = asyncio.run(run_reanalysis(repository, plan, batch_size=1))
+
+    assert report == {"selected": 2, "reanalyzed": 1, "failed": 1, "updated": 1}
+    assert list(repository.updates) == ["a"]
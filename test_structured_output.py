@@ -0,0 +1,227 @@
+"""
+测试结构化输出：流式 JSON 增量校验、提前中止、本地修复和重试
+"""
+import asyncio
+import json
+
+import httpx
+import pytest
+
+import backend.llm.concurrency as concurrency_module
+import backend.llm.provider_registry as registry_module
+import backend.llm.structured as structured_module
+from backend.llm import AdaptiveConcurrencyLimiter, LLMProvider, ProviderRegistry, latency_class
+from backend.llm.json_stream import IncrementalJSONValidator, JSONSchemaViolation
+from backend.llm.structured import StructuredOutputError, structured_completion, structured_output_stats
+from backend.schemas.article import ContentAnalysis
+
+SCHEMA = ContentAnalysis.model_json_schema()
+VALID = {
+    "keywords": ["vLLM", "推理"],
+    "topics": ["推理优化"],
+    "summary": "vLLM 发布新版本，\"吞吐\"提升两倍。",
+    "sentiment": "positive",
+    "category": "科技",
+    "entities": [{"name": "vLLM", "type": "技术"}],
+}
+MESSAGES = [{"role": "user", "content": "请以 JSON 格式返回分析结果"}]
+
+
+def _chunks(text: str, size: int = 5):
+    return [text[i:i + size] for i in range(0, len(text), size)]
+
+
+def test_validator_accepts_valid_stream_in_any_chunking():
+    """测试任意切分方式都能校验通过，并去掉代码块标记"""
+    text = "```json\n" + json.dumps(VALID, ensure_ascii=False) + "\n```"
+    for size in (1, 2, 7, 1000):
+        validator = IncrementalJSONValidator(SCHEMA)
+        complete = False
+        for chunk in _chunks(text, size):
+            complete = validator.feed(chunk)
+            if complete:
+                break
+        assert complete
+        assert json.loads(validator.text) == VALID
+
+
+def test_validator_rejects_divergence_immediately():
+    """测试字段类型不符时在偏离处立即报错"""
+    validator = IncrementalJSONValidator(SCHEMA)
+    text = '{"keywords": ["a"], "summary": ["不应该是数组"'
+    with pytest.raises(JSONSchemaViolation) as excinfo:
+        validator.feed(text)
+    assert excinfo.value.position == text.index('["不应该')
+
+    with pytest.raises(JSONSchemaViolation):
+        IncrementalJSONValidator(SCHEMA).feed("好的，以下是分析结果：")
+    with pytest.raises(JSONSchemaViolation):
+        IncrementalJSONValidator(SCHEMA).feed('{"keywords": [tru')
+
+
+def test_validator_repair():
+    """测试截断和偏离输出的本地修复"""
+    validator = IncrementalJSONValidator(SCHEMA)
+    validator.feed('{"keywords": ["a", "b"], "summary": "写到一半')
+    assert validator.repair() == {"keywords": ["a", "b"], "summary": "写到一半"}
+
+    validator = IncrementalJSONValidator(SCHEMA)
+    validator.feed('{"keywords": ["a", "b"], "sum')
+    assert validator.repair() == {"keywords": ["a", "b"]}
+
+    validator = IncrementalJSONValidator(SCHEMA)
+    with pytest.raises(JSONSchemaViolation):
+        validator.feed('{"keywords": ["a"], "summary": "完整", "entities": {"name": "x"}')
+    assert validator.repair() == {"keywords": ["a"], "summary": "完整"}
+
+
+def _install_fake_stream(monkeypatch, responses):
+    """
+    安装假的 chat_completion_stream，按顺序返回 responses 中的输出
+
+    Returns:
+        dict: 每次调用读取的分块数、是否被关闭、收到的参数
+    """
+    log = {"consumed": [], "closed": [], "kwargs": []}
+
+    async def fake_stream(messages, **kwargs):
+        text = responses[len(log["consumed"])]
+        log["consumed"].append(0)
+        log["closed"].append(False)
+        log["kwargs"].append(kwargs)
+        try:
+            for chunk in _chunks(text):
+                log["consumed"][-1] += 1
+                await asyncio.sleep(0)
+                yield chunk
+        finally:
+            log["closed"][-1] = True
+
+    monkeypatch.setattr(structured_module, "chat_completion_stream", fake_stream)
+    return log
+
+
+def test_stops_reading_once_json_is_complete(monkeypatch):
+    """测试根值完整后不再读取剩余输出"""
+    text = json.dumps(VALID, ensure_ascii=False) + "\n\n以上是分析结果，希望对你有帮助。" * 20
+    log = _install_fake_stream(monkeypatch, [text])
+
+    result = asyncio.run(structured_completion(MESSAGES, SCHEMA, provider=LLMProvider.LOCAL))
+    assert result == VALID
+    assert log["consumed"][0] < len(_chunks(text)) // 2
+    assert log["closed"] == [True]
+
+
+def test_divergence_aborts_then_retries(monkeypatch):
+    """测试偏离后立即中止生成，带错误信息重试"""
+    bad = '{"keywords": "不是数组' + "，后面还有很多无用的输出" * 100
+    log = _install_fake_stream(monkeypatch, [bad, json.dumps(VALID, ensure_ascii=False)])
+    before = structured_output_stats()
+
+    result = asyncio.run(structured_completion(MESSAGES, SCHEMA, provider=LLMProvider.LOCAL, required=("keywords",)))
+    after = structured_output_stats()
+
+    assert result == VALID
+    # 偏离发生在第 3 个分块，之后的输出没有被读取
+    assert log["consumed"][0] == 3
+    assert log["closed"][0]
+    assert after["violations"] - before["violations"] == 1
+    assert after["retries"] - before["retries"] == 1
+    assert 0 < after["wasted_tokens"] - before["wasted_tokens"] < 20
+    print(f"✓ 偏离后中止，浪费 {after['wasted_tokens'] - before['wasted_tokens']} tokens")
+
+
+def test_truncated_output_is_repaired_without_retry(monkeypatch):
+    """测试输出被截断但包含必需字段时本地修复，不再调用模型"""
+    log = _install_fake_stream(monkeypatch, ['{"keywords": ["a"], "summary": "被截断的摘要'])
+    result = asyncio.run(structured_completion(
+        MESSAGES, SCHEMA, provider=LLMProvider.LOCAL, required=("keywords", "summary")
+    ))
+    assert result == {"keywords": ["a"], "summary": "被截断的摘要"}
+    assert len(log["consumed"]) == 1
+
+
+def test_gives_up_after_retries(monkeypatch):
+    """测试重试后仍失败时抛出 StructuredOutputError"""
+    _install_fake_stream(monkeypatch, ["抱歉，我无法完成。", "还是不行。"])
+    with pytest.raises(StructuredOutputError):
+        asyncio.run(structured_completion(MESSAGES, SCHEMA, provider=LLMProvider.LOCAL, max_retries=1))
+
+
+def test_response_format_per_provider(monkeypatch):
+    """测试按提供商选择 JSON 模式"""
+    monkeypatch.delenv("LLM_ROUTER_WEIGHTS", raising=False)
+    assert structured_module.response_format_for(LLMProvider.LOCAL, SCHEMA)["type"] == "json_schema"
+    assert structured_module.response_format_for(LLMProvider.SILICONFLOW, SCHEMA) == {"type": "json_object"}
+    monkeypatch.setenv("SILICONFLOW_RESPONSE_FORMAT", "none")
+    assert structured_module.response_format_for(LLMProvider.SILICONFLOW, SCHEMA) is None
+    assert structured_module.response_format_for(LLMProvider.LOCAL, {"type": "array"}) is None
+
+
+def test_end_to_end_with_json_schema_mode(monkeypatch):
+    """测试通过真实的流式调用链路发送 response_format 并校验 SSE 输出"""
+    requests = []
+    text = json.dumps(VALID, ensure_ascii=False)
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        requests.append(json.loads(request.content))
+        events = []
+        for chunk in _chunks(text, 8):
+            events.append("data: " + json.dumps({
+                "id": "chatcmpl-test", "object": "chat.completion.chunk", "created": 0, "model": "stub",
+                "choices": [{"index": 0, "delta": {"content": chunk}, "finish_reason": None}],
+            }, ensure_ascii=False) + "\n\n")
+        events.append("data: [DONE]\n\n")
+        return httpx.Response(200, headers={"Content-Type": "text/event-stream"}, content="".join(events).encode())
+
+    monkeypatch.setenv("LOCAL_LLM_BASE_URL", "http://llm.test/v1")
+    monkeypatch.delenv("LLM_ROUTER_WEIGHTS", raising=False)
+    monkeypatch.setattr(registry_module, "_registry", ProviderRegistry(
+        client_factory=lambda timeout: httpx.AsyncClient(transport=httpx.MockTransport(handler), timeout=timeout)
+    ))
+
+    async def run():
+        result = await structured_completion(MESSAGES, SCHEMA, provider=LLMProvider.LOCAL)
+        await registry_module.close_providers()
+        return result
+
+    assert asyncio.run(run()) == VALID
+    assert requests[0]["response_format"]["type"] == "json_schema"
+    assert requests[0]["stream"] is True
+
+
+def test_structured_calls_grow_concurrency_limit(monkeypatch):
+    """测试结构化输出（流式、JSON 完整后提前停止）的成功请求计入自适应并发，上限随之增长"""
+    text = "```json\n" + json.dumps(VALID, ensure_ascii=False) + "\n```"
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        events = ["data: " + json.dumps({
+            "id": "chatcmpl-test", "object": "chat.completion.chunk", "created": 0, "model": "stub",
+            "choices": [{"index": 0, "delta": {"content": chunk}, "finish_reason": None}],
+        }, ensure_ascii=False) + "\n\n" for chunk in _chunks(text, 16)]
+        events.append("data: [DONE]\n\n")
+        return httpx.Response(200, headers={"Content-Type": "text/event-stream"}, content="".join(events).encode())
+
+    monkeypatch.setenv("LOCAL_LLM_BASE_URL", "http://llm.test/v1")
+    monkeypatch.delenv("LLM_ROUTER_WEIGHTS", raising=False)
+    monkeypatch.setattr(registry_module, "_registry", ProviderRegistry(
+        client_factory=lambda timeout: httpx.AsyncClient(transport=httpx.MockTransport(handler), timeout=timeout)
+    ))
+    # 假服务端的耗时抖动相对很大，放宽延迟容忍度，只验证成功请求被计入
+    limiter = AdaptiveConcurrencyLimiter("local", initial_limit=4, max_limit=32, latency_tolerance=1000.0)
+    monkeypatch.setattr(concurrency_module, "_limiters", {"local": limiter})
+
+    async def run():
+        for _ in range(12):
+            assert await structured_completion(MESSAGES, SCHEMA, provider=LLMProvider.LOCAL, max_tokens=1000) == VALID
+        await registry_module.close_providers()
+
+    asyncio.run(run())
+    stats = limiter.stats()
+    assert stats["completed"] == 12 and stats["in_flight"] == 0
+    assert stats["limit"] > 4 and stats["increases"] >= 1
+    assert list(stats["latency_baselines_ms"]) == [latency_class(1000)]
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
@@ -0,0 +1,126 @@
+"""
+测试分析前的本地分流
+"""
+import asyncio
+
+import backend.agent.analysis_queue as queue_module
+import backend.agent.triage as triage_module
+from backend.agent.triage import (
+    KeywordExtractor,
+    TriagePolicy,
+    get_triage_policy,
+    parse_board_modes,
+    tokenize,
+    triage_articles,
+)
+
+TECH_CONTENT = "vLLM 发布了新版本，推理加速明显。" * 20
+GOSSIP_CONTENT = "昨晚的比赛下半场球队逆转，球迷在现场看得热血沸腾，赛后主教练接受了采访。" * 10
+
+
+def _article(title, content, category):
+    return {"title": title, "content": content, "category": category}
+
+
+def test_parse_board_modes_ignores_invalid_entries():
+    """测试榜单模式解析，跳过未知模式"""
+    assert parse_board_modes("虎扑社区=skip, 知乎=TECH,GitHub=whatever,*=local") == {
+        "虎扑社区": "skip", "知乎": "tech", "*": "local",
+    }
+
+
+def test_policy_decisions():
+    """测试按榜单、长度和技术检测分流"""
+    policy = TriagePolicy(board_modes={"虎扑社区": "tech", "UI 中国": "skip"}, min_chars=20, llm_min_chars=200)
+    tech = {"is_tech_related": True}
+    other = {"is_tech_related": False}
+
+    assert policy.decide(_article("标题", "很短", "知乎"), tech)[0] == "skip"
+    assert policy.decide(_article("标题", TECH_CONTENT, "UI 中国"), tech)[0] == "skip"
+    assert policy.decide(_article("标题", TECH_CONTENT, "虎扑社区"), tech)[0] == "llm"
+    assert policy.decide(_article("标题", GOSSIP_CONTENT, "虎扑社区"), other)[0] == "local"
+    assert policy.decide(_article("标题", GOSSIP_CONTENT, "知乎"), other)[0] == "llm"
+    assert policy.decide(_article("标题", GOSSIP_CONTENT[:100], "知乎"), other)[0] == "local"
+
+
+def test_env_policy_overrides_defaults(monkeypatch):
+    """测试环境变量覆盖内置榜单模式，"*" 设置默认模式"""
+    monkeypatch.setenv("ANALYSIS_TRIAGE_POLICY", "虎扑社区=skip,*=tech")
+    policy = get_triage_policy()
+    assert policy.mode_for("虎扑社区") == "skip"
+    assert policy.mode_for("知乎") == "tech"
+
+    monkeypatch.setenv("ANALYSIS_TRIAGE", "0")
+    assert get_triage_policy() is None
+
+
+def test_tokenize_without_jieba(monkeypatch):
+    """测试未安装 jieba 时按英文单词和中文双字切分"""
+    monkeypatch.setattr(triage_module, "jieba", None)
+    assert tokenize("vLLM 推理加速 and") == ["vllm", "推理", "理加", "加速"]
+
+
+def test_keyword_extractor_prefers_rare_terms(tmp_path):
+    """测试 TF-IDF：语料中常见的词排在罕见词之后，语料可保存和加载"""
+    extractor = KeywordExtractor()
+    extractor.add_documents(["今天 比赛 结果", "比赛 直播 回放", "比赛 球迷 评论"])
+    keywords = extractor.extract("比赛 比赛 量化 量化", top_k=2)
+    assert keywords[0] == "量化"
+
+    path = str(tmp_path / "corpus.json")
+    extractor.save(path)
+    loaded = KeywordExtractor.load(path)
+    assert loaded.documents == 3
+    assert loaded.idf("比赛") == extractor.idf("比赛")
+    assert KeywordExtractor.load(str(tmp_path / "missing.json")).documents == 0
+
+
+def test_triage_articles_assigns_local_results():
+    """测试只有需要 LLM 的文章被返回，其余文章带上本地分析结果或默认结果"""
+    articles = [
+        _article("vLLM 新版本发布", TECH_CONTENT, "虎扑社区"),
+        _article("球队逆转取胜", GOSSIP_CONTENT, "虎扑社区"),
+        _article("一句话", "哈哈", "知乎"),
+    ]
+    before = triage_module.triage_stats()
+    policy = TriagePolicy(board_modes={"虎扑社区": "tech"})
+    to_llm = triage_articles(articles, policy=policy, extractor=KeywordExtractor())
+
+    assert to_llm == [articles[0]]
+    assert "content_analysis" not in articles[0]
+    assert articles[0]["tech_detection"]["is_tech_related"]
+
+    local = articles[1]["content_analysis"]
+    assert local["analysis_success"] and local["analysis_tier"] == "local"
+    assert local["keywords"] and local["summary"].startswith("昨晚的比赛")
+    assert articles[1]["triage"]["decision"] == "local"
+
+    assert articles[2]["content_analysis"]["analysis_success"] is False
+    assert articles[2]["triage"]["decision"] == "skip"
+
+    report = triage_module.diff_triage_stats(before, triage_module.triage_stats())
+    assert report["llm_calls_avoided"] == 2 and report["llm"] == 1
+    assert report["boards"] == {"虎扑社区": {"llm": 1, "local": 1}, "知乎": {"skip": 1}}
+
+
+def test_queue_sends_only_llm_articles(monkeypatch):
+    """测试分析队列只把分流后需要 LLM 的文章交给批量分析"""
+    sent = []
+
+    async def fake_batch(articles, **kwargs):
+        sent.extend(articles)
+        for article in articles:
+            article["content_analysis"] = {"analysis_success": True}
+        return articles
+
+    monkeypatch.setattr(queue_module, "batch_analyze_articles", fake_batch)
+    monkeypatch.setenv("ANALYSIS_TRIAGE_POLICY", "虎扑社区=tech")
+    monkeypatch.setattr(triage_module, "_extractor", KeywordExtractor())
+    articles = [
+        _article("vLLM 新版本发布", TECH_CONTENT, "虎扑社区"),
+        _article("球队逆转取胜", GOSSIP_CONTENT, "虎扑社区"),
+    ]
+    result = asyncio.run(queue_module.triage_and_analyze(articles))
+
+    assert sent == [articles[0]]
+    assert all(a["content_analysis"]["analysis_success"] for a in result)